@@ -5,25 +5,31 @@ import os
 import json
 import base64
 import datetime as dt
-from typing import Literal, Dict, Any, List, Optional, TypedDict, Tuple
-from dotenv import load_dotenv
+import threading
+import time
+from typing import TYPE_CHECKING, AsyncIterator, ContextManager, Literal, Dict, Any, List, Optional, TypedDict, Tuple
 
-# LangChain / LangGraph
-from langchain_openai import ChatOpenAI
+# LangChain / LangGraph: sólo langchain_core.tools al importar (decoradores @tool); el modelo
+# (langchain_openai), create_agent (langchain.agents/langgraph) y httpx se cargan al construir el agente
 from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
-from langgraph.graph import StateGraph, END
-from langchain.agents import create_agent
-from langchain.agents.structured_output import ToolStrategy
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_core.messages import BaseMessage
+    from langchain_openai import ChatOpenAI
 
 
 # --- Esquemas ---
 from apps.backend.schema.spec_schema import SpecModel
 from apps.backend.schema.topology_schema import TopologyModel
 from apps.backend.schema.netlist_schema import NetlistModel
+from apps.backend.schema.spice_schema import SpiceEmitInput
 # --- Toolkit (grafo) y herramientas externas
 #   Asegúrate de que estos módulos existen en tu repo
 from apps.backend.toolkit.toolkit import Toolkit  # tu clase Toolkit (apply_*_json)
+from apps.backend.toolkit.registry import ToolkitRegistry
+from apps.backend.toolkit.memo import ToolMemo
+from apps.backend.graph.journal import journal_for_thread
 from apps.backend.tools.run_tools import (
     spice_autorun,
     kicad_cli_exec,
@@ -31,16 +37,23 @@ from apps.backend.tools.run_tools import (
     kicad_erc,
     kicad_drc,
 )
+from apps.backend.tools.sweep import spice_sweep
+from apps.backend.env import load_env
 
 
 # =========================================================
 # Config y LLM
 # =========================================================
-load_dotenv()
-os.environ.setdefault("NGSPICE", r"C:\Program Files\Spice64\bin\ngspice.exe")
-os.environ.setdefault("KICAD_CLI", r"C:\Program Files\KiCad\8.0\bin\kicad-cli.exe")
+load_env()
+
 
-llm_base = ChatOpenAI(model="gpt-4.1-nano", temperature=0.1)
+def __getattr__(name: str) -> Any:
+    # llm_base se crea en el primer acceso (importa langchain_openai y abre el pool HTTP)
+    if name == "llm_base":
+        llm = _chat_model("gpt-4.1-nano", temperature=0.1)
+        globals()["llm_base"] = llm
+        return llm
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # =========================================================
@@ -76,7 +89,7 @@ class IntentData(TypedDict):
     steps: Dict[StepName, ProcessStepData]
 
 class WorkflowState(TypedDict):
-    messages: List[BaseMessage]
+    messages: List["BaseMessage"]
     current_task: str
     workflow_step: StepName
     should_proceed: bool
@@ -89,14 +102,20 @@ class WorkflowState(TypedDict):
 # =========================================================
 # THREAD REGISTRIES (separados) + Tools del grafo
 # =========================================================
-_GRAPH_THREADS: Dict[str, Toolkit] = {}
+def _new_graph_toolkit(thread_id: str) -> Toolkit:
+    # con KORELIA_GRAPH_JOURNAL_DIR el grafo del hilo sobrevive a reinicios del worker
+    return Toolkit(journal=journal_for_thread(thread_id))
+
+# Acotado (LRU por nº de hilos y tamaño de grafo + TTL de inactividad); ver ToolkitRegistry
+_GRAPH_THREADS = ToolkitRegistry.from_env(_new_graph_toolkit)
 
-def _get_graph_toolkit(thread_id: str) -> Toolkit:
-    tk = _GRAPH_THREADS.get(thread_id)
-    if tk is None:
-        tk = Toolkit()
-        _GRAPH_THREADS[thread_id] = tk
-    return tk
+def _graph_toolkit(thread_id: str) -> ContextManager[Toolkit]:
+    """Toolkit del hilo, fijado en el registro mientras dura la tool (no se expulsa a mitad de un cambio)."""
+    return _GRAPH_THREADS.use(thread_id)
+
+# Llamadas repetidas del LLM con el mismo JSON sobre el mismo grafo: se devuelve el resultado anterior
+# (válido mientras no cambie la versión del grafo del hilo); ver ToolMemo
+_TOOL_MEMO = ToolMemo.from_env()
 
 
 # =========================================================
@@ -120,39 +139,63 @@ def save_local_file(path: str, content: str, binary: str = "false") -> str:
 # =========================================================
 @tool("spec_schema_validator")
 def spec_schema_validator(spec_json: SpecModel, thread_id: str = "default") -> str:
-    """Valida y aplica spec.json (DIG). Devuelve {ok, errors[], graph_patch}."""
-    tk = _get_graph_toolkit(thread_id)
-    try:
-        payload = spec_json.model_dump(exclude_none=True)
-    except Exception as e:
-        return json.dumps({"ok": False, "errors": [f"JSON inválido: {e}"]}, ensure_ascii=False)
-    return json.dumps(tk.apply_spec_json(payload), ensure_ascii=False)
+    """Valida y aplica spec.json (DIG). Devuelve {ok, errors[], graph_patch, snapshot_id}."""
+    with _graph_toolkit(thread_id) as tk:
+        try:
+            payload = spec_json.model_dump(exclude_none=True)
+        except Exception as e:
+            return json.dumps({"ok": False, "errors": [f"JSON inválido: {e}"]}, ensure_ascii=False)
+        return _TOOL_MEMO.call(tk.store, "spec_schema_validator", payload,
+                               lambda: json.dumps(tk.apply_spec_json(payload), ensure_ascii=False))
 
 @tool("topology_schema_validator")
 def topology_schema_validator(topology_json: TopologyModel, thread_id: str = "default") -> str:
-    """Valida y aplica topology.json (FTG). Devuelve {ok, errors[], graph_patch}."""
-    tk = _get_graph_toolkit(thread_id)
-    try:
-        payload = topology_json.model_dump(exclude_none=True)
-    except Exception as e:
-        return json.dumps({"ok": False, "errors": [f"JSON inválido: {e}"]}, ensure_ascii=False)
-    result_str = json.dumps(tk.apply_topology_json(payload), ensure_ascii=False)
-    return result_str
+    """Valida y aplica topology.json (FTG). Devuelve {ok, errors[], graph_patch, snapshot_id}."""
+    with _graph_toolkit(thread_id) as tk:
+        try:
+            payload = topology_json.model_dump(exclude_none=True)
+        except Exception as e:
+            return json.dumps({"ok": False, "errors": [f"JSON inválido: {e}"]}, ensure_ascii=False)
+        return _TOOL_MEMO.call(tk.store, "topology_schema_validator", payload,
+                               lambda: json.dumps(tk.apply_topology_json(payload), ensure_ascii=False))
 
 @tool("graph_apply_netlist_json")
 def graph_apply_netlist_json(netlist_json: NetlistModel, allow_autolock: str = "true", thread_id: str = "default") -> str:
-    """Aplica netlist.json → CIG y ejecuta validaciones. Devuelve {ok,warnings,errors,violations,applied_patch}."""
-    tk = _get_graph_toolkit(thread_id)
-    try:
-        payload = netlist_json.model_dump(exclude_none=True)
-    except Exception as e:
-        return json.dumps({"error": f"JSON inválido: {e}"}, ensure_ascii=False)
-    try:
-        res = tk.apply_netlist_json(payload)  # allow_autolock no-op aquí
-        result_str = json.dumps(res, ensure_ascii=False)
-        return result_str
-    except Exception as e:
-        return json.dumps({"error": str(e)}, ensure_ascii=False)
+    """Aplica netlist.json → CIG y ejecuta validaciones. Devuelve {ok,warnings,errors,violations,applied_patch,snapshot_id}."""
+    with _graph_toolkit(thread_id) as tk:
+        try:
+            payload = netlist_json.model_dump(exclude_none=True)
+        except Exception as e:
+            return json.dumps({"error": f"JSON inválido: {e}"}, ensure_ascii=False)
+
+        def apply() -> str:
+            try:
+                res = tk.apply_netlist_json(payload)  # allow_autolock no-op aquí
+                return json.dumps(res, ensure_ascii=False)
+            except Exception as e:
+                return json.dumps({"error": str(e)}, ensure_ascii=False)
+
+        return _TOOL_MEMO.call(tk.store, "graph_apply_netlist_json", payload, apply, allow_autolock)
+
+
+@tool("graph_emit_spice")
+def graph_emit_spice(emit_json: SpiceEmitInput, thread_id: str = "default") -> str:
+    """Genera el netlist ngspice del CIG (sin LLM) según device_map/build_policy/probe_contract. Devuelve {ok,netlist,probes,warnings,errors,models,version}."""
+    with _graph_toolkit(thread_id) as tk:
+        try:
+            # exclude_unset: las prioridades (hint > device_map > build_policy) distinguen lo explícito
+            payload = emit_json.model_dump(exclude_unset=True)
+        except Exception as e:
+            return json.dumps({"ok": False, "errors": [f"JSON inválido: {e}"]}, ensure_ascii=False)
+        return _TOOL_MEMO.call(tk.store, "graph_emit_spice", payload,
+                               lambda: json.dumps(tk.emit_spice(payload), ensure_ascii=False))
+
+
+@tool("graph_rollback")
+def graph_rollback(snapshot_id: str, thread_id: str = "default") -> str:
+    """Deshace en el grafo el paso que devolvió `snapshot_id` (spec/topology/netlist). Devuelve {ok, errors[], snapshot_id}."""
+    with _graph_toolkit(thread_id) as tk:
+        return json.dumps(tk.rollback(snapshot_id), ensure_ascii=False)
 
 
 # =========================================================
@@ -163,9 +206,12 @@ _TOOL_REGISTRY: Dict[str, Any] = {
     "spec_schema_validator": spec_schema_validator,
     "topology_schema_validator": topology_schema_validator,
     "graph_apply_netlist_json": graph_apply_netlist_json,
+    "graph_rollback": graph_rollback,
+    "graph_emit_spice": graph_emit_spice,
 
     # external EDA
     "spice_autorun": spice_autorun,
+    "spice_sweep": spice_sweep,
     "kicad_project_manager": kicad_project_manager,
     "kicad_cli_exec": kicad_cli_exec,
     "kicad_erc": kicad_erc,
@@ -178,14 +224,16 @@ _TOOL_REGISTRY: Dict[str, Any] = {
 
 PROCESS_PROMPT = (
     "Eres un agente EDA graph-first. Trabaja por pasos y NO avances si hay errores/violations bloqueantes.\n\n"
-    "Flujo: 1) spec_schema_validator  2) topology_schema_validator  3) graph_apply_netlist_json  4) spice_autorun  5) kicad_*.\n"
-    "En cada paso: llama tool, parsea JSON; si hay errores severos corrige y reintenta (≤3); si persisten, retrocede un paso.\n\n"
+    "Flujo: 1) spec_schema_validator  2) topology_schema_validator  3) graph_apply_netlist_json  4) graph_emit_spice  5) spice_autorun  6) kicad_*.\n"
+    "En cada paso: llama tool, parsea JSON; si hay errores severos corrige y reintenta (≤3); si persisten, retrocede un paso.\n"
+    "Las tools de grafo devuelven 'snapshot_id' (estado previo al paso): antes de reintentar o retroceder llama graph_rollback con él para no acumular nodos del intento fallido.\n\n"
     "TopologyModel (contrato breve):\n"
     "- 'connections' conecta IDs de 'blocks' o 'ports' (sin jerarquías). Si necesitas un port global, decláralo en 'ports' y conéctalo.\n\n"
     "NetlistModel (contrato breve):\n"
     "- Conexiones SOLO en 'connections' {component_ref,pin_id,net}. Enum de 'class' permitido (no inventes clases).\n"
     "- 'nets' debe contener TODAS las nets usadas y una GROUND si aplica (is_reference_ground=true).\n\n"
     "Construcción SPICE (antes de spice_autorun):\n"
+    "- Genera el netlist con 'graph_emit_spice' (determinista desde el grafo, con los mismos contratos: device_map, build_policy, component_hints, probe_contract, analyses) y pásalo tal cual a spice_autorun junto con sus 'probes' resueltas. Si devuelve errors, corrige el grafo (graph_apply_netlist_json) o los hints; escribe el netlist a mano sólo si el emisor no cubre el caso.\n"
     "- Usa SpiceAutorunInput como CONTRATO de construcción, no para parchear.\n"
     "- Respeta: library_resolution (includes absolutos o modelos inline según 'mode'); control_contract (un solo .control, con líneas mínimas y WRDATA/.print a partir de 'probes' si ownership=agent_injects o auto lo requiere);\n"
     "- source_intent (si hay .tran y red CA: SINE(0 Vrms*√2, f) en la fuente de línea; evita 'AC' en .tran).\n"
@@ -199,37 +247,206 @@ PROCESS_PROMPT = (
     "- Si library_resolution exige inline/absolutas, cúmplelo. Si faltan modelos requeridos, inclúyelos explícitamente.\n"
     "- Si kpi_contract existe, selecciona probes/análisis que permitan evaluar esos KPIs.\n\n"
     "Simulación y reintentos:\n"
-    "- Llama 'spice_autorun' con input_text autocontenido y probes ya resueltas. Si falla por vectores inexistentes, control inválido o modelos ausentes, considera incumplido el CONTRATO y RECONSTRUYE (≤3). Si persiste, retrocede a 'graph_apply_netlist_json'.\n\n"
+    "- Llama 'spice_autorun' con input_text autocontenido y probes ya resueltas. Si falla por vectores inexistentes, control inválido o modelos ausentes, considera incumplido el CONTRATO y RECONSTRUYE (≤3). Si persiste, retrocede a 'graph_apply_netlist_json'.\n"
+    "- Para explorar valores o tolerancias (rejilla de componentes, Monte Carlo) usa 'spice_sweep' con el netlist ya validado por spice_autorun, no bucles de spice_autorun.\n"
+    "- En transitorios largos de fuentes conmutadas pon un tstop holgado y stop_at_steady_state=true: la simulación se detiene al llegar al régimen permanente (ver 'steady.converged_at').\n\n"
     "Tras cada tool: emite mini-resumen JSON {step, attempt, decision:'retry'|'backtrack'|'proceed', fix_plan?}.\n"
 )
 
 
+_PROCESS_TOOLS = (
+    "spec_schema_validator",
+    "topology_schema_validator",
+    "graph_apply_netlist_json",
+    "graph_rollback",
+    "graph_emit_spice",
+    "spice_autorun",
+    "spice_sweep",
+    "kicad_project_manager",
+    "kicad_cli_exec",
+    "kicad_erc",
+    "kicad_drc",
+    "save_local_file",
+)
+
+
+# =========================================================
+# Agente compilado (uno por proceso) + cliente HTTP compartido
+# =========================================================
+# create_agent reconstruye schemas de tools, cliente del modelo y grafo compilado: se hace una vez por
+# (modelo, tools) y se comparte entre peticiones (el grafo no guarda estado entre invocaciones). Todos
+# los ChatOpenAI usan el mismo pool de conexiones httpx (keep-alive con la API entre peticiones).
+DEFAULT_AGENT_MODEL = "gpt-5-mini"
+
+# clave: (modelo, tools, id del checkpointer o None)
+_AGENTS: Dict[Tuple[str, Tuple[str, ...], Optional[int]], Any] = {}
+_AGENTS_LOCK = threading.Lock()
+# lock propio: un hit no debe esperar a que termine un create_agent en curso
+_AGENT_STATS_LOCK = threading.Lock()
+_AGENT_STATS = {"builds": 0, "hits": 0, "build_s": 0.0}
+_HTTP: Dict[str, Any] = {}
+
+
+def _http_limits() -> "httpx.Limits":
+    import httpx
+
+    return httpx.Limits(
+        max_connections=int(os.getenv("KORELIA_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("KORELIA_HTTP_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("KORELIA_HTTP_KEEPALIVE_S", "60")),
+    )
+
+
+def _http_clients() -> Tuple["httpx.Client", "httpx.AsyncClient"]:
+    """Clientes httpx (sync y async) del proceso; se crean con el primer modelo."""
+    import httpx
+
+    with _AGENTS_LOCK:
+        if not _HTTP:
+            # mismo timeout por defecto que el SDK de OpenAI (las respuestas largas del LLM tardan)
+            timeout = httpx.Timeout(600.0, connect=5.0)
+            _HTTP["sync"] = httpx.Client(limits=_http_limits(), timeout=timeout)
+            _HTTP["async"] = httpx.AsyncClient(limits=_http_limits(), timeout=timeout)
+        return _HTTP["sync"], _HTTP["async"]
+
+
+def _chat_model(model: str, **kwargs: Any) -> "ChatOpenAI":
+    from langchain_openai import ChatOpenAI
+
+    sync_client, async_client = _http_clients()
+    return ChatOpenAI(model=model, http_client=sync_client, http_async_client=async_client, **kwargs)
+
+
+# ---------- Checkpointer (sesiones reanudables) ----------
+# Con KORELIA_CHECKPOINT_DB cada paso del agente (mensajes, llamadas y resultados de tools) se guarda
+# en SQLite por thread_id; una sesión cortada se reanuda desde el último paso completado.
+_CHECKPOINTERS: Dict[str, Any] = {}
+
+
+def get_checkpointer() -> Any:
+    """SqliteCheckpointer de KORELIA_CHECKPOINT_DB, uno por fichero (None si no está configurado)."""
+    path = os.getenv("KORELIA_CHECKPOINT_DB")
+    if not path:
+        return None
+    saver = _CHECKPOINTERS.get(path)
+    if saver is None:
+        from apps.backend.checkpointer import SqliteCheckpointer
+
+        with _AGENTS_LOCK:
+            saver = _CHECKPOINTERS.get(path)
+            if saver is None:
+                saver = _CHECKPOINTERS[path] = SqliteCheckpointer.from_env()
+    return saver
+
+
+def close_checkpointers() -> None:
+    with _AGENTS_LOCK:
+        savers = list(_CHECKPOINTERS.values())
+        _CHECKPOINTERS.clear()
+        # los agentes compilados con esos checkpointers se descartan con ellos
+        for key in [k for k in _AGENTS if k[2] is not None]:
+            del _AGENTS[key]
+    for saver in savers:
+        saver.close()
+
+
+def get_agent(model: str = DEFAULT_AGENT_MODEL, tools: Tuple[str, ...] = _PROCESS_TOOLS,
+              durable: bool = False) -> Any:
+    """
+    Agente compilado para (modelo, tools), construido la primera vez y reutilizado después.
+    ``durable=True`` lo compila con el checkpointer (hay que invocarlo con ``thread_id``).
+    """
+    checkpointer = get_checkpointer() if durable else None
+    key = (model, tuple(tools), id(checkpointer) if checkpointer is not None else None)
+    agent = _AGENTS.get(key)
+    if agent is not None:
+        with _AGENT_STATS_LOCK:
+            _AGENT_STATS["hits"] += 1
+        return agent
+    from langchain.agents import create_agent
+
+    llm = _chat_model(model)
+    with _AGENTS_LOCK:
+        agent = _AGENTS.get(key)
+        if agent is None:
+            t0 = time.perf_counter()
+            agent = create_agent(
+                model=llm,
+                tools=[_TOOL_REGISTRY[name] for name in key[1]],
+                system_prompt=PROCESS_PROMPT,
+                checkpointer=checkpointer,
+            )
+            _AGENTS[key] = agent
+            with _AGENT_STATS_LOCK:
+                _AGENT_STATS["builds"] += 1
+                _AGENT_STATS["build_s"] += time.perf_counter() - t0
+        else:
+            with _AGENT_STATS_LOCK:
+                _AGENT_STATS["hits"] += 1
+        return agent
+
+
+def warm_agents(models: Optional[List[str]] = None) -> None:
+    """Compila los agentes al arrancar el worker (KORELIA_AGENT_WARMUP=modelo1,modelo2; vacío = sin warm-up)."""
+    if models is None:
+        models = [m.strip() for m in os.getenv("KORELIA_AGENT_WARMUP", DEFAULT_AGENT_MODEL).split(",") if m.strip()]
+    durable = get_checkpointer() is not None
+    for model in models:
+        get_agent(model)
+        if durable:
+            get_agent(model, durable=True)
+
+
+def agent_stats() -> Dict[str, Any]:
+    saver = _CHECKPOINTERS.get(os.getenv("KORELIA_CHECKPOINT_DB") or "")
+    with _AGENT_STATS_LOCK:
+        stats = dict(_AGENT_STATS)
+    return {
+        "agents": len(_AGENTS),
+        "builds": stats["builds"],
+        "hits": stats["hits"],
+        "build_s": round(stats["build_s"], 4),
+        "http_pool": bool(_HTTP),
+        "checkpointer": saver.stats() if saver is not None else None,
+    }
+
+
+async def close_http_clients() -> None:
+    """Cierra el pool HTTP compartido (shutdown del worker); los agentes y llm_base se descartan con él."""
+    with _AGENTS_LOCK:
+        clients = dict(_HTTP)
+        _HTTP.clear()
+        _AGENTS.clear()
+        # llm_base usa los mismos clientes: el siguiente acceso lo recrea con un pool nuevo
+        globals().pop("llm_base", None)
+    if "sync" in clients:
+        clients["sync"].close()
+    if "async" in clients:
+        await clients["async"].aclose()
+
+
+def _message_text(content: Any) -> str:
+    """Texto de un mensaje/chunk (content str o lista de bloques {'type':'text','text':...})."""
+    if isinstance(content, str):
+        return content
+    return "".join(b.get("text", "") for b in content if isinstance(b, dict)) if isinstance(content, list) else ""
+
+
 def run_single_agent_workflow_stream(task: str):
     """Stream agent workflow events, yielding text chunks and step information."""
     print(f"[AGENT] Function called with task: {task[:100]}...")
-    tools = [
-        _TOOL_REGISTRY["spec_schema_validator"],
-        _TOOL_REGISTRY["topology_schema_validator"],
-        _TOOL_REGISTRY["graph_apply_netlist_json"],
-        _TOOL_REGISTRY["spice_autorun"],
-        _TOOL_REGISTRY["kicad_project_manager"],
-        _TOOL_REGISTRY["kicad_cli_exec"],
-        _TOOL_REGISTRY["kicad_erc"],
-        _TOOL_REGISTRY["kicad_drc"],
-        _TOOL_REGISTRY["save_local_file"],
-    ]
-
-    agent = create_agent(
-        model="gpt-5-mini",
-        tools=tools,
-        system_prompt=PROCESS_PROMPT,
-    )
+    agent = get_agent()
 
-    # Stream with updates mode to see agent steps
-    for chunk in agent.stream(
+    # Stream with updates mode to see agent steps (+ custom: progreso de tools largas, p.ej. spice_sweep)
+    for mode, chunk in agent.stream(
         {"messages": [{"role": "user", "content": task}]},
-        stream_mode="updates"
+        stream_mode=["updates", "custom"]
     ):
+        if mode == "custom":
+            progress = chunk.get("spice_sweep") if isinstance(chunk, dict) else None
+            if progress:
+                yield f"[spice_sweep] {progress['done']}/{progress['total']} ({progress['elapsed_s']}s)\n"
+            continue
         # chunk is a dict with step name as key
         for step, data in chunk.items():
             print(f"step: {step}")
@@ -237,27 +454,62 @@ def run_single_agent_workflow_stream(task: str):
             yield f"[{step}] {data['messages'][-1].content}\n"
 
 
+async def run_single_agent_workflow_astream(task: Optional[str],
+                                            thread_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Versión async de run_single_agent_workflow_stream (``agent.astream``) con el texto del modelo
+    token a token. Eventos:
+    - {'type': 'token', 'text', 'node'}: chunk de texto del LLM;
+    - {'type': 'step', 'step', 'content'?, 'tool_calls'?}: paso terminado (el texto del modelo ya
+      salió como tokens; 'content' sólo para los resultados de tools);
+    - {'type': 'progress', 'tool', ...}: progreso de tools largas (spice_sweep);
+    - {'type': 'resume', 'thread_id', 'next'}: se continúa una ejecución cortada del hilo.
+    Con ``thread_id`` y checkpointer configurado la sesión es durable: si la última ejecución del hilo
+    quedó a medias se reanuda desde el último paso completado (antes de procesar ``task``, que puede
+    ser None para sólo reanudar). Cancelar el consumidor cancela la ejecución del agente.
+    """
+    durable = bool(thread_id) and get_checkpointer() is not None
+    agent = get_agent(durable=durable)
+    config = {"configurable": {"thread_id": thread_id}} if durable else None
+    if durable:
+        state = await agent.aget_state(config)
+        if state.next:
+            yield {"type": "resume", "thread_id": thread_id, "next": list(state.next)}
+            async for event in _astream_events(agent, None, config):
+                yield event
+    if task:
+        async for event in _astream_events(agent, {"messages": [{"role": "user", "content": task}]}, config):
+            yield event
+
+
+async def _astream_events(agent: Any, payload: Optional[Dict[str, Any]],
+                          config: Optional[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    from langchain_core.messages import AIMessage, AIMessageChunk
+
+    async for mode, chunk in agent.astream(payload, config, stream_mode=["messages", "updates", "custom"]):
+        if mode == "messages":
+            msg, meta = chunk
+            text = _message_text(msg.content) if isinstance(msg, AIMessageChunk) else ""
+            if text:
+                yield {"type": "token", "text": text, "node": (meta or {}).get("langgraph_node")}
+        elif mode == "custom":
+            progress = chunk.get("spice_sweep") if isinstance(chunk, dict) else None
+            if progress:
+                yield {"type": "progress", "tool": "spice_sweep", **progress}
+        else:
+            for step, data in (chunk or {}).items():
+                messages = (data or {}).get("messages") or []
+                last = messages[-1] if messages else None
+                event: Dict[str, Any] = {"type": "step", "step": step}
+                if isinstance(last, AIMessage):
+                    if last.tool_calls:
+                        event["tool_calls"] = [tc["name"] for tc in last.tool_calls]
+                elif last is not None:
+                    event["content"] = _message_text(last.content)
+                yield event
+
+
 def create_agent_graph():
     """Create a LangGraph-compatible agent graph from create_agent."""
-    tools = [
-        _TOOL_REGISTRY["spec_schema_validator"],
-        _TOOL_REGISTRY["topology_schema_validator"],
-        _TOOL_REGISTRY["graph_apply_netlist_json"],
-        _TOOL_REGISTRY["spice_autorun"],
-        _TOOL_REGISTRY["kicad_project_manager"],
-        _TOOL_REGISTRY["kicad_cli_exec"],
-        _TOOL_REGISTRY["kicad_erc"],
-        _TOOL_REGISTRY["kicad_drc"],
-        _TOOL_REGISTRY["save_local_file"],
-    ]
-
-    # Create agent using create_agent (this is what Agent Chat UI expects)
-    agent = create_agent(
-        #model="gpt-5-mini",
-        model="gpt-4o-mini",
-        tools=tools,
-        system_prompt=PROCESS_PROMPT,
-    )
-    
-    # Return the agent runnable (create_agent returns a Runnable)
-    return agent
\ No newline at end of file
+    # Create agent using create_agent (this is what Agent Chat UI expects); compartido por proceso
+    return get_agent(os.getenv("KORELIA_GRAPH_MODEL") or "gpt-4o-mini")
@@ -0,0 +1,302 @@
+"""
+Checkpointer de LangGraph sobre SQLite (modo WAL) para sesiones reanudables del agente.
+
+Mismo modelo que ``InMemorySaver``: ``checkpoints`` (uno por paso del grafo), ``blobs`` (valor de cada
+canal por versión, así un checkpoint sólo guarda los canales que cambiaron) y ``writes`` (pending writes
+por tarea). Con el mismo ``thread_id`` una ejecución cortada se reanuda desde el último paso completado
+y los resultados de tools ya escritos no se vuelven a ejecutar.
+
+Escrituras por lotes (group commit): cada ``put``/``put_writes`` serializa fuera del lock y encola sus
+filas; el hilo que toma el lock de escritura vuelca todo lo encolado (de todas las sesiones) en una sola
+transacción con ``executemany`` y los demás vuelven sin escribir si su lote ya está confirmado. Con WAL
+y ``synchronous=NORMAL`` un commit no hace fsync; las lecturas usan una conexión por hilo y no bloquean
+al escritor.
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint,
+                                       CheckpointMetadata, CheckpointTuple, SerializerProtocol,
+                                       get_checkpoint_id, get_checkpoint_metadata)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT, type TEXT, checkpoint BLOB, meta_type TEXT, metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, version TEXT NOT NULL,
+    type TEXT, blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT, type TEXT, value BLOB, task_path TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+_PUT_CHECKPOINT = "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_PUT_BLOB = "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)"
+# writes normales: la primera gana (reintentos idénticos); especiales (idx < 0, p.ej. errores): se reemplazan
+_PUT_WRITE = "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+_PUT_SPECIAL_WRITE = "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+_COLS = "checkpoint_id, parent_checkpoint_id, type, checkpoint, meta_type, metadata"
+
+_Op = List[Tuple[str, List[tuple]]]
+
+
+def _writes_sort_key(task_path: str, task_id: str, idx: int) -> Tuple[str, str, int]:
+    # orden en que el paso aplica las writes de sus tareas (task_path, task_id, idx); no todas las versiones
+    # de langgraph-checkpoint exportan writes_sort_key
+    return (task_path or "", task_id, idx)
+
+
+class SqliteCheckpointer(BaseCheckpointSaver[str]):
+    """``BaseCheckpointSaver`` persistente en un fichero SQLite (WAL), seguro entre hilos."""
+
+    def __init__(self, path: str, *, serde: Optional[SerializerProtocol] = None, synchronous: str = "NORMAL"):
+        super().__init__(serde=serde)
+        self.path = path
+        self.synchronous = synchronous
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._local = threading.local()
+        # cola de group commit
+        self._mu = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: List[Tuple[int, _Op]] = []
+        self._seq = 0
+        self._committed = 0
+        self._failed: Dict[int, BaseException] = {}
+        self._counters = {"ops": 0, "commits": 0, "rows": 0}
+        self._writer = self._connect()
+        self._writer.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> Optional["SqliteCheckpointer"]:
+        path = os.getenv("KORELIA_CHECKPOINT_DB")
+        if not path:
+            return None
+        return cls(path, synchronous=os.getenv("KORELIA_CHECKPOINT_SYNC", "NORMAL").upper())
+
+    # ---------- Conexiones ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        with self._conns_lock:
+            self._conns.append(conn)
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def close(self) -> None:
+        with self._write_lock, self._conns_lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
+        self._local = threading.local()
+
+    def stats(self) -> Dict[str, Any]:
+        c = dict(self._counters)
+        # ops confirmadas por transacción (>1 cuando se agrupan escrituras concurrentes)
+        c["ops_per_commit"] = round(c["ops"] / c["commits"], 2) if c["commits"] else 0.0
+        c["path"] = self.path
+        return c
+
+    # ---------- Escritura (group commit) ----------
+
+    def _submit(self, op: _Op) -> None:
+        with self._mu:
+            self._seq += 1
+            seq = self._seq
+            self._pending.append((seq, op))
+        with self._write_lock:
+            if self._committed < seq:
+                with self._mu:
+                    batch, self._pending = self._pending, []
+                self._commit(batch)
+            exc = self._failed.pop(seq, None)
+        if exc is not None:
+            raise exc
+
+    def _commit(self, batch: List[Tuple[int, _Op]]) -> None:
+        cur = self._writer
+        rows = 0
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            for _, op in batch:
+                for sql, params in op:
+                    if params:
+                        cur.executemany(sql, params)
+                        rows += len(params)
+            cur.execute("COMMIT")
+        except BaseException as exc:
+            if cur.in_transaction:
+                cur.execute("ROLLBACK")
+            # cada llamada del lote recibe el error (nada del lote quedó escrito)
+            for seq, _ in batch:
+                self._failed[seq] = exc
+        else:
+            self._counters["ops"] += len(batch)
+            self._counters["commits"] += 1
+            self._counters["rows"] += rows
+        self._committed = batch[-1][0]
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        c = checkpoint.copy()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        values: Dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        blobs = [
+            (thread_id, checkpoint_ns, k, str(v),
+             *(self.serde.dumps_typed(values[k]) if k in values else ("empty", b"")))
+            for k, v in new_versions.items()
+        ]
+        row = (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+               *self.serde.dumps_typed(c), *self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)))
+        self._submit([(_PUT_BLOB, blobs), (_PUT_CHECKPOINT, [row])])
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        normal, special = [], []
+        for idx, (channel, value) in enumerate(writes):
+            i = WRITES_IDX_MAP.get(channel, idx)
+            row = (thread_id, checkpoint_ns, checkpoint_id, task_id, i, channel,
+                   *self.serde.dumps_typed(value), task_path)
+            (normal if i >= 0 else special).append(row)
+        self._submit([(_PUT_WRITE, normal), (_PUT_SPECIAL_WRITE, special)])
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._submit([(f"DELETE FROM {table} WHERE thread_id = ?", [(thread_id,)])
+                      for table in ("checkpoints", "blobs", "writes")])
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # como InMemorySaver: "<n>.<aleatorio>" ordenable como texto
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ---------- Lectura ----------
+
+    def _tuple(self, conn: sqlite3.Connection, thread_id: str, checkpoint_ns: str, row: tuple,
+               config: Optional[RunnableConfig] = None, metadata: Optional[Dict[str, Any]] = None) -> CheckpointTuple:
+        checkpoint_id, parent_id, ctype, cblob, mtype, mblob = row
+        checkpoint: Checkpoint = self.serde.loads_typed((ctype, cblob))
+        values: Dict[str, Any] = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            blob = conn.execute(
+                "SELECT type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version))).fetchone()
+            if blob is not None and blob[0] != "empty":
+                values[channel] = self.serde.loads_typed(blob)
+        writes = conn.execute(
+            "SELECT task_id, idx, channel, type, value, task_path FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+            (thread_id, checkpoint_ns, checkpoint_id)).fetchall()
+        writes.sort(key=lambda w: _writes_sort_key(w[5], w[0], w[1]))
+        ids = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        return CheckpointTuple(
+            config=config or {"configurable": {**ids, "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=metadata if metadata is not None else self.serde.loads_typed((mtype, mblob)),
+            parent_config={"configurable": {**ids, "checkpoint_id": parent_id}} if parent_id else None,
+            pending_writes=[(w[0], w[2], self.serde.loads_typed((w[3], w[4]))) for w in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        conn = self._reader()
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            row = conn.execute(
+                f"SELECT {_COLS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint_id)).fetchone()
+        else:
+            row = conn.execute(
+                f"SELECT {_COLS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1", (thread_id, checkpoint_ns)).fetchone()
+        if row is None:
+            return None
+        return self._tuple(conn, thread_id, checkpoint_ns, row, config if checkpoint_id else None)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        where, params = [], []
+        if config:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                where.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                where.append("checkpoint_id = ?")
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            where.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        sql = f"SELECT thread_id, checkpoint_ns, {_COLS} FROM checkpoints"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        conn = self._reader()
+        # fetchall: el generador puede quedar suspendido mientras el hilo usa la conexión para otra cosa
+        rows = conn.execute(sql + " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC", params).fetchall()
+        for thread_id, checkpoint_ns, *row in rows:
+            metadata = self.serde.loads_typed((row[4], row[5]))
+            if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield self._tuple(conn, thread_id, checkpoint_ns, tuple(row), metadata=metadata)
+
+    # ---------- Async (fuera del event loop) ----------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for t in tuples:
+            yield t
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
@@ -0,0 +1,17 @@
+"""
+Entorno del backend: ``.env`` y rutas por defecto de los binarios EDA, una sola vez por proceso.
+
+Lo llaman los módulos que leen variables de entorno al importarse (``agent``, ``run_tools``); las
+variables ya definidas en el entorno tienen prioridad sobre ``.env`` y ``.env`` sobre los defaults.
+"""
+import os
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def load_env() -> None:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    os.environ.setdefault("NGSPICE", r"C:\Program Files\Spice64\bin\ngspice.exe")
+    os.environ.setdefault("KICAD_CLI", r"C:\Program Files\KiCad\8.0\bin\kicad-cli.exe")
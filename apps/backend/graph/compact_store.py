@@ -0,0 +1,552 @@
+from __future__ import annotations
+from array import array
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Iterator, List, Mapping, Optional, Tuple
+import threading
+import weakref
+
+from .store import GraphStore, ChangeSet, ReadOnlyGraphStore, _UndoJournal
+
+
+_EMPTY_PROPS: Mapping[str, Any] = MappingProxyType({})
+
+
+def _read_only(props: Optional[Mapping[str, Any]]) -> Mapping[str, Any]:
+    # los dicts de props se comparten entre nodos/edges con props iguales: nunca se entregan mutables
+    return MappingProxyType(props) if props else _EMPTY_PROPS
+
+
+# Pendientes (altas + tombstones) a partir de los cuales se reconstruye el CSR en vez de usar overflow
+_REBUILD_MIN = 256
+
+
+class _OrderedHandles:
+    """Secuencia de handles en orden de inserción con tombstones (-1); ``pos`` la lleva el dueño."""
+    __slots__ = ("seq", "dead")
+
+    def __init__(self) -> None:
+        self.seq = array("i")
+        self.dead = 0
+
+    def append(self, h: int, pos: array) -> None:
+        pos[h] = len(self.seq)
+        self.seq.append(h)
+
+    def discard(self, h: int, pos: array) -> None:
+        i = pos[h]
+        if 0 <= i < len(self.seq) and self.seq[i] == h:
+            self.seq[i] = -1
+            pos[h] = -1
+            self.dead += 1
+            if self.dead > 64 and self.dead * 2 > len(self.seq):
+                self._compact(pos)
+
+    def _compact(self, pos: array) -> None:
+        seq = array("i", (h for h in self.seq if h >= 0))
+        for i, h in enumerate(seq):
+            pos[h] = i
+        self.seq, self.dead = seq, 0
+
+    def __iter__(self) -> Iterator[int]:
+        return (h for h in self.seq if h >= 0)
+
+
+class CompactConnectivity:
+    """
+    Misma interfaz que ``ConnectivityIndex`` pero servida desde la adyacencia CSR del
+    CompactGraphStore: no guarda mapas propios, filtra las aristas ``onNet``/``pinOf`` del nodo.
+    """
+    ON_NET = "onNet"
+    PIN_OF = "pinOf"
+
+    def __init__(self, store: "CompactGraphStore") -> None:
+        self._store = store
+
+    def _ends(self, node_id: str, type_name: str, incoming: bool) -> List[str]:
+        s = self._store
+        h = s._handle.get(node_id)
+        t = s._edge_types.get(type_name)
+        if h is None or t is None:
+            return []
+        # antes de leer los arrays: una reconstrucción del CSR los sustituye y renumera los edges
+        s._sync_adjacency()
+        ends = s._e_src if incoming else s._e_dst
+        out: Dict[str, None] = {}
+        for e in (s._in_edges(h) if incoming else s._out_edges(h)):
+            if s._e_type[e] == t:
+                out[s._ids[ends[e]]] = None
+        return list(out)
+
+    def terminals_of_net(self, net_id: str) -> List[str]:
+        """Terminales (pins/ports) conectados a la net vía onNet."""
+        return self._ends(net_id, self.ON_NET, True)
+
+    def degree_of_net(self, net_id: str) -> int:
+        return len(self.terminals_of_net(net_id))
+
+    def net_of_terminal(self, terminal_id: str) -> Optional[str]:
+        """Primera net a la que está conectado un terminal (None si está suelto)."""
+        nets = self._ends(terminal_id, self.ON_NET, False)
+        return nets[0] if nets else None
+
+    def nets_of_terminal(self, terminal_id: str) -> List[str]:
+        return self._ends(terminal_id, self.ON_NET, False)
+
+    def pins_of_component(self, cmp_id: str) -> List[str]:
+        """Pins que pertenecen a un componente (pinOf)."""
+        return self._ends(cmp_id, self.PIN_OF, True)
+
+    def component_of_pin(self, pin_id: str) -> Optional[str]:
+        cmps = self._ends(pin_id, self.PIN_OF, False)
+        return cmps[0] if cmps else None
+
+
+class CompactGraphStore(_UndoJournal):
+    """
+    Backend compacto con la misma API pública que ``GraphStore`` (sin ``g`` de networkx),
+    pensado para mantener varios diseños de decenas de miles de pins por worker.
+
+    - Ids de nodo internados: cada id se guarda una vez y se usa un handle entero en los arrays.
+    - Tipos de nodo/edge y labels en tablas pequeñas; por nodo sólo un índice en un ``array``.
+    - Props vacías no ocupan nada y las props hashables repetidas (p.ej. ``{"name": "1"}`` de los
+      pins) se comparten. Los dicts guardados nunca se mutan: ``update_*`` crea uno nuevo y
+      ``node_props``/``nodes_iter``/``edges_iter`` los entregan como ``MappingProxyType``.
+    - Edges en arrays paralelos (src, dst, tipo) con adyacencia CSR de entrada y salida.
+      Las altas posteriores al último build van a un overflow por nodo y las bajas dejan
+      tombstones; el CSR se reconstruye (compactando) cuando los pendientes crecen.
+    - ``snapshot``/``restore`` como en GraphStore (diario de deshacer, ver _UndoJournal).
+    """
+    def __init__(self) -> None:
+        self._trackers: "weakref.WeakSet[ChangeSet]" = weakref.WeakSet()
+        self.version = 0
+        self.connectivity = CompactConnectivity(self)
+
+        # nodos (por handle)
+        self._ids: List[Optional[str]] = []
+        self._handle: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._ntype = array("h")
+        self._nlabels = array("h")
+        self._nprops: List[Optional[Mapping[str, Any]]] = []
+        self._seq_pos = array("i")
+        self._type_pos = array("i")
+        self._order = _OrderedHandles()
+        self._by_type: List[_OrderedHandles] = []
+
+        # tablas internadas
+        self._node_type_names: List[str] = []
+        self._node_types: Dict[str, int] = {}
+        self._edge_type_names: List[Optional[str]] = []
+        self._edge_types: Dict[Optional[str], int] = {}
+        self._label_table: List[Tuple[str, ...]] = [()]
+        self._label_ids: Dict[Tuple[str, ...], int] = {(): 0}
+        self._props_pool: Dict[tuple, Mapping[str, Any]] = {}
+
+        # edges (por handle); tipo -1 = tombstone
+        self._e_src = array("i")
+        self._e_dst = array("i")
+        self._e_type = array("h")
+        self._e_ids: List[Optional[str]] = []
+        self._e_props: Dict[int, Mapping[str, Any]] = {}
+        self._edge_handle: Dict[str, int] = {}
+
+        # adyacencia CSR + overflow
+        self._csr_n = 0
+        self._csr_m = 0
+        self._out_off = array("i", [0])
+        self._out_e = array("i")
+        self._in_off = array("i", [0])
+        self._in_e = array("i")
+        self._out_extra: Dict[int, List[int]] = {}
+        self._in_extra: Dict[int, List[int]] = {}
+        self._extra_upto = 0
+        self._dead_edges = 0
+        self._adj_lock = threading.Lock()
+        self._init_journal()
+
+    # ---------- Seguimiento de cambios ----------
+
+    track_changes = GraphStore.track_changes
+    _touch_node = GraphStore._touch_node
+    _touch_edge = GraphStore._touch_edge
+
+    # ---------- Internado ----------
+
+    @staticmethod
+    def _intern_id(table: Dict[Any, int], names: list, name: Any) -> int:
+        i = table.get(name)
+        if i is None:
+            i = table[name] = len(names)
+            names.append(name)
+        return i
+
+    def _intern_props(self, props: Optional[Mapping[str, Any]]) -> Optional[Mapping[str, Any]]:
+        if not props:
+            return None
+        try:
+            # el tipo entra en la clave para no confundir 1, 1.0 y True
+            key = tuple((k, type(v), v) for k, v in props.items())
+            shared = self._props_pool.get(key)
+        except TypeError:
+            # valores no hashables (p.ej. {"value", "unit"}): copia propia
+            return dict(props)
+        if shared is None:
+            shared = self._props_pool[key] = dict(props)
+        return shared
+
+    def _intern_labels(self, labels) -> int:
+        if not labels:
+            return 0
+        return self._intern_id(self._label_ids, self._label_table, tuple(labels))
+
+    def _edge_type_id(self, type: Optional[str]) -> int:
+        return self._intern_id(self._edge_types, self._edge_type_names, type)
+
+    # ---------- Nodos ----------
+
+    def _new_handle(self, node_id: str) -> int:
+        if self._free:
+            h = self._free.pop()
+            self._ids[h] = node_id
+            self._ntype[h] = -1
+            self._nlabels[h] = 0
+            self._nprops[h] = None
+        else:
+            h = len(self._ids)
+            self._ids.append(node_id)
+            self._ntype.append(-1)
+            self._nlabels.append(0)
+            self._nprops.append(None)
+            self._seq_pos.append(-1)
+            self._type_pos.append(-1)
+        self._handle[node_id] = h
+        self._order.append(h, self._seq_pos)
+        return h
+
+    def _ensure_node(self, node_id: str) -> int:
+        """Handle del nodo; lo crea sin tipo ni props si no existe (como networkx al añadir edges)."""
+        h = self._handle.get(node_id)
+        if h is None:
+            h = self._new_handle(node_id)
+            self._touch_node(node_id)
+        return h
+
+    def _set_type(self, h: int, type: Optional[str]) -> None:
+        t = -1 if type is None else self._intern_id(self._node_types, self._node_type_names, type)
+        prev = self._ntype[h]
+        if prev == t:
+            return
+        if prev >= 0:
+            self._by_type[prev].discard(h, self._type_pos)
+        if t >= 0:
+            while len(self._by_type) <= t:
+                self._by_type.append(_OrderedHandles())
+            self._by_type[t].append(h, self._type_pos)
+        self._ntype[h] = t
+
+    def _node_state(self, node_id: str) -> Optional[Tuple[Optional[str], Mapping[str, Any], List[str]]]:
+        h = self._handle.get(node_id)
+        if h is None:
+            return None
+        t = self._ntype[h]
+        return (None if t < 0 else self._node_type_names[t], self._nprops[h] or {},
+                list(self._label_table[self._nlabels[h]]))
+
+    def _put_node(self, node_id: str, type: str, props: Optional[Dict[str, Any]], labels) -> None:
+        if self._undo is not None:
+            self._journal_node(node_id)
+        h = self._handle.get(node_id)
+        if h is None:
+            h = self._new_handle(node_id)
+        self._set_type(h, type)
+        self._nprops[h] = self._intern_props(props)
+        self._nlabels[h] = self._intern_labels(labels)
+        self._touch_node(node_id)
+
+    # ---------- Adyacencia ----------
+
+    def _sync_adjacency(self) -> None:
+        """Pone al día CSR/overflow con las altas y bajas de edges desde el último build."""
+        m = len(self._e_type)
+        if self._extra_upto == m and not (self._dead_edges and self._needs_rebuild(m)):
+            return
+        with self._adj_lock:
+            m = len(self._e_type)
+            if self._needs_rebuild(m):
+                self._rebuild_adjacency()
+                return
+            e_src, e_dst, e_type = self._e_src, self._e_dst, self._e_type
+            for e in range(self._extra_upto, m):
+                if e_type[e] >= 0:
+                    self._out_extra.setdefault(e_src[e], []).append(e)
+                    self._in_extra.setdefault(e_dst[e], []).append(e)
+            self._extra_upto = m
+
+    def _needs_rebuild(self, m: int) -> bool:
+        pending = (m - self._csr_m) + self._dead_edges
+        return pending > max(_REBUILD_MIN, self._csr_m // 8)
+
+    def _rebuild_adjacency(self) -> None:
+        # compacta edges vivos (renumera handles) y reconstruye ambos CSR
+        if self._dead_edges:
+            keep = [e for e in range(len(self._e_type)) if self._e_type[e] >= 0]
+            self._e_src = array("i", (self._e_src[e] for e in keep))
+            self._e_dst = array("i", (self._e_dst[e] for e in keep))
+            self._e_type = array("h", (self._e_type[e] for e in keep))
+            ids = [self._e_ids[e] for e in keep]
+            props = {}
+            for new, old in enumerate(keep):
+                self._edge_handle[ids[new]] = new
+                p = self._e_props.get(old)
+                if p is not None:
+                    props[new] = p
+            self._e_ids, self._e_props = ids, props
+            self._dead_edges = 0
+
+        n, m = len(self._ids), len(self._e_type)
+        self._out_off, self._out_e = self._csr(self._e_src, n, m)
+        self._in_off, self._in_e = self._csr(self._e_dst, n, m)
+        self._out_extra, self._in_extra = {}, {}
+        self._csr_n, self._csr_m, self._extra_upto = n, m, m
+
+    @staticmethod
+    def _csr(keys: array, n: int, m: int) -> Tuple[array, array]:
+        off = array("i", bytes(4 * (n + 1)))
+        for e in range(m):
+            off[keys[e] + 1] += 1
+        for i in range(n):
+            off[i + 1] += off[i]
+        fill = array("i", off[:n])
+        adj = array("i", bytes(4 * m))
+        for e in range(m):
+            k = keys[e]
+            adj[fill[k]] = e
+            fill[k] += 1
+        return off, adj
+
+    def _out_edges(self, h: int) -> Iterator[int]:
+        self._sync_adjacency()
+        return self._incident(h, self._out_off, self._out_e, self._out_extra)
+
+    def _in_edges(self, h: int) -> Iterator[int]:
+        self._sync_adjacency()
+        return self._incident(h, self._in_off, self._in_e, self._in_extra)
+
+    def _incident(self, h: int, off: array, adj: array, extra: Dict[int, List[int]]) -> Iterator[int]:
+        e_type = self._e_type
+        if h < self._csr_n:
+            for i in range(off[h], off[h + 1]):
+                e = adj[i]
+                if e_type[e] >= 0:
+                    yield e
+        for e in extra.get(h, ()):
+            if e_type[e] >= 0:
+                yield e
+
+    def _kill_edge(self, e: int) -> None:
+        t = self._e_type[e]
+        self._touch_edge(self._edge_type_names[t], self._ids[self._e_src[e]], self._ids[self._e_dst[e]])
+        self._e_type[e] = -1
+        self._e_props.pop(e, None)
+        self._edge_handle.pop(self._e_ids[e], None)
+        self._e_ids[e] = None
+        self._dead_edges += 1
+
+    def _edge_state(self, edge_id: str) -> Optional[Tuple[Optional[str], str, str, Mapping[str, Any]]]:
+        e = self._edge_handle.get(edge_id)
+        if e is None:
+            return None
+        return (self._edge_type_names[self._e_type[e]], self._ids[self._e_src[e]], self._ids[self._e_dst[e]],
+                self._e_props.get(e) or {})
+
+    def _incident_edge_ids(self, node_id: str) -> List[str]:
+        h = self._handle.get(node_id)
+        if h is None:
+            return []
+        return [self._e_ids[e] for e in list(self._in_edges(h)) + list(self._out_edges(h))]
+
+    def _put_edge(self, edge_id: str, type: str, from_id: str, to_id: str, props: Optional[Dict[str, Any]]) -> None:
+        if self._undo is not None:
+            self._journal_endpoints(from_id, to_id)
+            self._journal_edge(edge_id)
+        u = self._ensure_node(from_id)
+        v = self._ensure_node(to_id)
+        t = self._edge_type_id(type)
+        e = self._edge_handle.get(edge_id)
+        if e is not None and (self._e_src[e], self._e_dst[e]) == (u, v):
+            # mismo id y extremos: se reemplazan tipo y props en su sitio
+            if self._e_type[e] != t:
+                self._touch_edge(self._edge_type_names[self._e_type[e]], from_id, to_id)
+            self._e_type[e] = t
+        else:
+            if e is not None:
+                self._kill_edge(e)
+            e = len(self._e_type)
+            self._e_src.append(u)
+            self._e_dst.append(v)
+            self._e_type.append(t)
+            self._e_ids.append(edge_id)
+            self._edge_handle[edge_id] = e
+        p = self._intern_props(props)
+        if p is None:
+            self._e_props.pop(e, None)
+        else:
+            self._e_props[e] = p
+        self._touch_edge(type, from_id, to_id)
+
+    # ---------- Mutadores ----------
+
+    def add_node(self, node_id: str, type: str, props: Optional[Dict[str, Any]] = None, labels=None):
+        self.version += 1
+        self._put_node(node_id, type, props, labels)
+
+    def add_nodes_from(self, nodes: Iterable[Tuple[str, str, Optional[Dict[str, Any]], Any]]):
+        """Alta masiva. Items: (node_id, type, props, labels)."""
+        self.version += 1
+        for node_id, type, props, labels in nodes:
+            self._put_node(node_id, type, props, labels)
+
+    def update_node(self, node_id: str, props: Dict[str, Any]):
+        h = self._handle.get(node_id)
+        if h is None:
+            return
+        if self._undo is not None:
+            self._journal_node(node_id)
+        merged = dict(self._nprops[h] or ())
+        merged.update(props or {})
+        self._nprops[h] = self._intern_props(merged)
+        self.version += 1
+        self._touch_node(node_id)
+
+    def add_edge(self, edge_id: str, type: str, from_id: str, to_id: str, props: Optional[Dict[str, Any]] = None):
+        self.version += 1
+        self._put_edge(edge_id, type, from_id, to_id, props)
+
+    def add_edges_from(self, edges: Iterable[Tuple[str, str, str, str, Optional[Dict[str, Any]]]]):
+        """Alta masiva. Items: (edge_id, type, from, to, props)."""
+        self.version += 1
+        for edge_id, type, from_id, to_id, props in edges:
+            self._put_edge(edge_id, type, from_id, to_id, props)
+
+    def update_edge(self, edge_id: str, props: Dict[str, Any]):
+        e = self._edge_handle.get(edge_id)
+        if e is None:
+            return
+        if self._undo is not None:
+            self._journal_edge(edge_id)
+        merged = dict(self._e_props.get(e) or ())
+        merged.update(props or {})
+        p = self._intern_props(merged)
+        if p is None:
+            self._e_props.pop(e, None)
+        else:
+            self._e_props[e] = p
+        self.version += 1
+        self._touch_edge(self._edge_type_names[self._e_type[e]], self._ids[self._e_src[e]], self._ids[self._e_dst[e]])
+
+    def remove_node(self, node_id: str):
+        h = self._handle.get(node_id)
+        if h is None:
+            return
+        if self._undo is not None:
+            self._journal_node(node_id, with_edges=True)
+        for e in list(self._in_edges(h)) + list(self._out_edges(h)):
+            if self._e_type[e] >= 0:
+                self._kill_edge(e)
+        if self._ntype[h] >= 0:
+            self._by_type[self._ntype[h]].discard(h, self._type_pos)
+        self._order.discard(h, self._seq_pos)
+        del self._handle[node_id]
+        self._ids[h] = None
+        self._nprops[h] = None
+        self._free.append(h)
+        self.version += 1
+        self._touch_node(node_id)
+
+    def remove_edge(self, edge_id: str):
+        e = self._edge_handle.get(edge_id)
+        if e is not None:
+            if self._undo is not None:
+                self._journal_edge(edge_id)
+            self._kill_edge(e)
+            self.version += 1
+
+    # ---------- Consultas ----------
+
+    def node_ids(self) -> Iterator[str]:
+        """Ids de nodo en orden de inserción."""
+        ids = self._ids
+        return (ids[h] for h in self._order)
+
+    def nodes_by_type(self, type_name: str):
+        t = self._node_types.get(type_name)
+        if t is None or t >= len(self._by_type):
+            return []
+        ids = self._ids
+        return [ids[h] for h in self._by_type[t]]
+
+    def node_type(self, node_id: str) -> Optional[str]:
+        h = self._handle.get(node_id)
+        if h is None or self._ntype[h] < 0:
+            return None
+        return self._node_type_names[self._ntype[h]]
+
+    def adjacent(self, node_id: str, edge_types: Iterable[str]) -> Iterator[str]:
+        """Vecinos (entrantes y salientes) unidos por edges de alguno de ``edge_types``."""
+        h = self._handle.get(node_id)
+        if h is None:
+            return
+        wanted = {self._edge_types[t] for t in edge_types if t in self._edge_types}
+        if not wanted:
+            return
+        self._sync_adjacency()
+        ids, e_type, e_src, e_dst = self._ids, self._e_type, self._e_src, self._e_dst
+        for e in self._in_edges(h):
+            if e_type[e] in wanted:
+                yield ids[e_src[e]]
+        for e in self._out_edges(h):
+            if e_type[e] in wanted:
+                yield ids[e_dst[e]]
+
+    def edge_endpoints(self, edge_id: str) -> Optional[Tuple[str, str]]:
+        e = self._edge_handle.get(edge_id)
+        if e is None:
+            return None
+        return self._ids[self._e_src[e]], self._ids[self._e_dst[e]]
+
+    def node_props(self, node_id: str) -> Mapping[str, Any]:
+        h = self._handle.get(node_id)
+        if h is None:
+            return _EMPTY_PROPS
+        return _read_only(self._nprops[h])
+
+    def has_node(self, node_id: str) -> bool:
+        return node_id in self._handle
+
+    def size(self) -> int:
+        """Nodos + edges vivos."""
+        return len(self._handle) + len(self._edge_handle)
+
+    exists_node = GraphStore.exists_node
+
+    def nodes_iter(self) -> Iterator[Tuple[str, Optional[str], Mapping[str, Any], List[str]]]:
+        """(node_id, type, props, labels) en orden de inserción."""
+        for h in self._order:
+            t = self._ntype[h]
+            yield (self._ids[h], None if t < 0 else self._node_type_names[t],
+                   _read_only(self._nprops[h]), list(self._label_table[self._nlabels[h]]))
+
+    def edges_iter(self):
+        """(from, to, edge_id, {"type", "props"}) de cada edge vivo."""
+        ids, names = self._ids, self._edge_type_names
+        for e in range(len(self._e_type)):
+            t = self._e_type[e]
+            if t < 0:
+                continue
+            yield (ids[self._e_src[e]], ids[self._e_dst[e]], self._e_ids[e],
+                   {"type": names[t], "props": _read_only(self._e_props.get(e))})
+
+    def read_only(self) -> ReadOnlyGraphStore:
+        # la adyacencia se sincroniza aquí para que las lecturas concurrentes no la reconstruyan
+        self._sync_adjacency()
+        return ReadOnlyGraphStore(self)
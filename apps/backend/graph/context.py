@@ -1,19 +1,86 @@
-from typing import Dict, Any
-from .store import GraphStore
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
+import weakref
+from .store import GraphStore, ChangeSet
+
+
+def _node_context(props: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Valores de contexto que aporta un nodo: props escalares o {'value', ...}."""
+    out: Optional[Dict[str, Any]] = None
+    for k, v in props.items():
+        if isinstance(v, dict) and "value" in v:
+            val = v["value"]
+        elif isinstance(v, (int, float)):
+            val = v
+        else:
+            continue
+        if out is None:
+            out = {}
+        out[k] = val
+    return out
+
+
+class _ContextCache:
+    """Aportaciones por nodo + snapshot fusionado, válido mientras no cambie ``store.version``."""
+    def __init__(self, store: GraphStore) -> None:
+        self.changes: ChangeSet = store.track_changes()
+        self.version = store.version
+        self.by_node: Dict[str, Dict[str, Any]] = {}
+        for n in store.node_ids():
+            c = _node_context(store.node_props(n))
+            if c:
+                self.by_node[n] = c
+        self.snapshot = self._merge(store)
+
+    def _merge(self, store: GraphStore) -> Mapping[str, Any]:
+        ctx: Dict[str, Any] = {}
+        # orden del grafo: ante claves repetidas gana el último nodo, como en el escaneo completo
+        if self.by_node:
+            by_node = self.by_node
+            for n in store.node_ids():
+                c = by_node.get(n)
+                if c:
+                    ctx.update(c)
+        # typical keys you might set via ESG/DIG bindings
+        if "T_ambient" not in ctx and "ambient" in ctx:
+            ctx["T_ambient"] = ctx["ambient"]
+        return MappingProxyType(ctx)
+
+    def refresh(self, store: GraphStore) -> Mapping[str, Any]:
+        if self.version == store.version:
+            return self.snapshot
+        delta = self.changes.drain()
+        self.version = store.version
+        changed = False
+        for n in delta.nodes:
+            c = _node_context(store.node_props(n)) if store.has_node(n) else None
+            prev = self.by_node.pop(n, None)
+            if c:
+                self.by_node[n] = c
+            # un nodo re-creado cambia de posición aunque aporte lo mismo: se re-fusiona
+            changed = changed or bool(c) or bool(prev)
+        if changed:
+            self.snapshot = self._merge(store)
+        return self.snapshot
+
+
+_CONTEXT_CACHES: "weakref.WeakKeyDictionary[GraphStore, _ContextCache]" = weakref.WeakKeyDictionary()
+
+
+def context_snapshot(store: GraphStore) -> Mapping[str, Any]:
+    """
+    Snapshot de sólo lectura del contexto de diseño, compartido mientras ``store.version`` no cambie.
+    Tras una mutación sólo se re-escanean los nodos tocados. Pensado para que varias reglas
+    de ratings consulten el mismo contexto en una ejecución del motor.
+    """
+    cache = _CONTEXT_CACHES.get(store)
+    if cache is None:
+        cache = _ContextCache(store)
+        _CONTEXT_CACHES[store] = cache
+        return cache.snapshot
+    return cache.refresh(store)
 
 
 def get_context_values(store: GraphStore) -> Dict[str, Any]:
     """Collects design context values from DIG/ESG into a flat dict for rules (e.g., Vbus_peak, T_ambient)."""
-    ctx: Dict[str, Any] = {}
-    # naive extraction: scan nodes for props with simple names
-    for n, data in store.g.nodes(data=True):
-        props = data.get("props", {})
-        for k,v in props.items():
-            if isinstance(v, dict) and "value" in v:
-                ctx[k] = v["value"]
-            elif isinstance(v, (int,float)):
-                ctx[k] = v
-    # typical keys you might set via ESG/DIG bindings
-    if "T_ambient" not in ctx and "ambient" in ctx:
-        ctx["T_ambient"] = ctx["ambient"]
-    return ctx
+    return dict(context_snapshot(store))
@@ -1,12 +1,186 @@
-from typing import Dict, Any, List, Callable
-from .store import GraphStore
-from .rulesets import RULESET_POWER_BASE
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Mapping, Optional, Set, Tuple
+import weakref
+from .store import GraphStore, ChangeSet
+from .context import context_snapshot
+from .rulesets import RuleSpec, get_ruleset
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- Estado incremental por store ----------
+
+class _RuleCache:
+    __slots__ = ("units", "ctx_values")
+
+    def __init__(self) -> None:
+        self.units: Dict[str, List[Dict[str, Any]]] = {}
+        self.ctx_values: Optional[tuple] = None
+
+
+class _EngineState:
+    """Violations cacheadas por (regla, unidad) + ChangeSet del store desde la última ejecución."""
+    def __init__(self, store: GraphStore) -> None:
+        self.changes: ChangeSet = store.track_changes()
+        self.rules: Dict[str, _RuleCache] = {}
+
+
+_ENGINE_STATES: "weakref.WeakKeyDictionary[GraphStore, _EngineState]" = weakref.WeakKeyDictionary()
+
+
+def _affected_units(store: GraphStore, rule: RuleSpec, delta: ChangeSet) -> Set[str]:
+    """Unidades de ``rule`` cuyo resultado puede haber cambiado según el delta."""
+    seeds: Set[str] = set()
+    for n in delta.nodes:
+        t = store.node_type(n)
+        if t is None or t in rule.node_types or t == rule.unit_type:
+            seeds.add(n)
+    for et, u, v in delta.edges:
+        if et in rule.edge_types:
+            seeds.add(u)
+            seeds.add(v)
+
+    affected: Set[str] = set()
+    for n in seeds:
+        if store.node_type(n) == rule.unit_type:
+            affected.add(n)
+        if rule.edge_types:
+            for m in store.adjacent(n, rule.edge_types):
+                if store.node_type(m) == rule.unit_type:
+                    affected.add(m)
+    return affected
+
+
+def _run_rule_incremental(store: GraphStore, rule: RuleSpec, cache: _RuleCache,
+                          delta: Optional[ChangeSet], ctx: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    ctx_values = tuple(ctx.get(k) for k in rule.context_keys)
+    if delta is None or ctx_values != cache.ctx_values:
+        cache.units = {}
+        dirty: Set[str] = set()
+    else:
+        dirty = _affected_units(store, rule, delta)
+    cache.ctx_values = ctx_values
+
+    units: Dict[str, List[Dict[str, Any]]] = {}
+    out: List[Dict[str, Any]] = []
+    for unit in store.nodes_by_type(rule.unit_type):
+        viols = cache.units.get(unit)
+        if viols is None or unit in dirty:
+            viols = rule.check(store, unit, ctx)
+        units[unit] = viols
+        out.extend(viols)
+    cache.units = units
+    return out
+
+
+# ---------- Ejecución (secuencial o en pool) ----------
+
+# Por debajo de este coste total el reparto en hilos no compensa su overhead
+PARALLEL_MIN_COST = 8.0
+
+
+def _default_workers() -> int:
+    default = max(1, min(4, os.cpu_count() or 1))
+    env = os.getenv("KORELIA_RULE_WORKERS")
+    if not env:
+        return default
+    try:
+        return max(1, int(env))
+    except ValueError:
+        # se evalúa al importar: un valor inválido no debe impedir cargar el paquete graph
+        logger.warning("KORELIA_RULE_WORKERS=%r no es un entero; se usan %d workers", env, default)
+        return default
+
+
+_DEFAULT_WORKERS = _default_workers()
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=_DEFAULT_WORKERS, thread_name_prefix="rules")
+        return _EXECUTOR
+
+
+def _rule_cost(rule: Any) -> float:
+    return float(getattr(rule, "cost", 1.0))
+
+
+def run_rulesets(store: GraphStore, design_id: str, incremental: bool = True,
+                 rules: Optional[Dict[str, RuleSpec]] = None,
+                 max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """Run all registered rulesets and return violations.
+
+    Con ``incremental=True`` sólo se re-evalúan las unidades (nets/componentes) afectadas por los
+    cambios del store desde la última ejecución; el resto reutiliza las violations cacheadas.
+    El resultado es idéntico al de una ejecución completa (``incremental=False``).
+
+    Las reglas sólo leen, así que se ejecutan sobre una vista de sólo lectura y, si su coste
+    declarado lo justifica, en un pool de hilos. Las violations se concatenan siempre en el orden
+    del registro y ``timings_ms`` informa del tiempo de pared de cada regla.
+    """
+    rules = get_ruleset() if rules is None else rules
+    workers = _DEFAULT_WORKERS if max_workers is None else max(1, max_workers)
+
+    state: Optional[_EngineState] = None
+    delta: Optional[ChangeSet] = None
+    if incremental:
+        state = _ENGINE_STATES.get(store)
+        if state is None:
+            state = _EngineState(store)
+            _ENGINE_STATES[store] = state
+        else:
+            delta = state.changes.drain()
+
+    # un único snapshot de contexto compartido por todas las reglas de la ejecución
+    ctx: Mapping[str, Any] = {}
+    if any(getattr(r, "context_keys", ()) for r in rules.values()):
+        ctx = context_snapshot(store)
+    view = store.read_only()
+
+    def _job(name: str, rule: Any) -> Tuple[List[Dict[str, Any]], float]:
+        t0 = time.perf_counter()
+        if not isinstance(rule, RuleSpec):
+            # reglas legacy (callable(store)) sin declaración de lecturas: siempre completas
+            viols = rule(view)
+        elif state is None:
+            viols = rule(view, ctx if rule.context_keys else {})
+        else:
+            cache = state.rules.get(name)
+            rule_delta = delta
+            if cache is None:
+                cache = state.rules[name] = _RuleCache()
+                rule_delta = None
+            viols = _run_rule_incremental(view, rule, cache, rule_delta, ctx if rule.context_keys else {})
+        return viols, (time.perf_counter() - t0) * 1000.0
+
+    results: Dict[str, Tuple[List[Dict[str, Any]], float]] = {}
+    parallel = workers > 1 and len(rules) > 1 and sum(_rule_cost(r) for r in rules.values()) >= PARALLEL_MIN_COST
+    if parallel:
+        # las más caras primero para equilibrar la carga entre hilos
+        ordered = sorted(rules.items(), key=lambda kv: -_rule_cost(kv[1]))
+        pool = _executor()
+        futures = {name: pool.submit(_job, name, rule) for name, rule in ordered}
+        for name, fut in futures.items():
+            results[name] = fut.result()
+    else:
+        for name, rule in rules.items():
+            results[name] = _job(name, rule)
 
-def run_rulesets(store: GraphStore, design_id: str) -> Dict[str, Any]:
-    """Run all registered rulesets and return violations."""
     checks: List[str] = []
     violations: List[Dict[str, Any]] = []
-    for name, fn in RULESET_POWER_BASE.items():
+    timings: Dict[str, float] = {}
+    for name in rules:
+        viols, ms = results[name]
         checks.append(name)
-        violations.extend(fn(store))
-    return {"design_id": design_id, "checks_run": checks, "violations": violations}
\ No newline at end of file
+        violations.extend(viols)
+        timings[name] = round(ms, 3)
+    return {"design_id": design_id, "checks_run": checks, "violations": violations, "timings_ms": timings}
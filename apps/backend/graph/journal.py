@@ -0,0 +1,206 @@
+"""
+Journal persistente de GraphPatch: fichero JSONL append-only + snapshot compactado.
+
+- ``<path>``: una línea por patch aplicado, ``{"seq": n, "patch": {...}}``.
+- ``<path>.snap``: volcado completo del store hasta ``seq`` (se escribe atómicamente).
+
+Al compactar se escribe el snapshot y después se vacía el JSONL; si el proceso muere entre
+ambos pasos, el replay ignora las líneas con ``seq`` ya cubierto por el snapshot.
+Una última línea truncada (caída a mitad de escritura) se descarta al reabrir.
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from .patcher import apply_patch_batch, gc_paused
+
+
+SNAPSHOT_FORMAT = 1
+
+# ops acumuladas en el JSONL a partir de las cuales append() compacta
+DEFAULT_COMPACT_EVERY = 200_000
+
+_DUMPS = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+# ---------- Volcado / carga del store ----------
+
+def dump_store(store, seq: int = 0) -> Dict[str, Any]:
+    """Estado completo del store (cualquier backend) como dict serializable a JSON."""
+    nodes, types = [], {}
+    for node_id, type, props, labels in store.nodes_iter():
+        nodes.append([node_id, type, dict(props), list(labels)])
+        if type is not None and type not in types:
+            types[type] = None
+    edges = [[k, d.get("type"), u, v, dict(d.get("props") or {})] for u, v, k, d in store.edges_iter()]
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "seq": seq,
+        "nodes": nodes,
+        # orden de nodes_by_type, que puede diferir del orden de nodos (re-tipados, nodos implícitos)
+        "type_order": {t: store.nodes_by_type(t) for t in types},
+        "edges": edges,
+    }
+
+
+def load_store(store, dump: Dict[str, Any]) -> None:
+    """Carga un volcado de ``dump_store`` en un store vacío, conservando el orden de nodos y de tipos."""
+    if dump.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format: {dump.get('format')}")
+    with gc_paused():
+        _load(store, dump)
+
+
+def _load(store, dump: Dict[str, Any]) -> None:
+    nodes = dump["nodes"]
+    by_type: Dict[str, List[str]] = {}
+    for n in nodes:
+        if n[1] is not None:
+            by_type.setdefault(n[1], []).append(n[0])
+    if by_type == dump["type_order"]:
+        # caso habitual: el orden de cada tipo coincide con el de los nodos, una sola pasada
+        store.add_nodes_from((n[0], n[1], n[2], n[3]) for n in nodes)
+    else:
+        # 1) orden de nodos, sin tipo  2) datos completos en el orden de cada tipo
+        data = {n[0]: n for n in nodes}
+        store.add_nodes_from((n[0], None, None, None) for n in nodes)
+        ordered: List[list] = []
+        for ids in dump["type_order"].values():
+            ordered.extend(data[i] for i in ids)
+        ordered.extend(n for n in nodes if n[1] is None)
+        store.add_nodes_from((n[0], n[1], n[2], n[3]) for n in ordered)
+    store.add_edges_from((e[0], e[1], e[2], e[3], e[4]) for e in dump["edges"])
+
+
+# ---------- Journal ----------
+
+class PatchJournal:
+    """
+    Journal append-only de los GraphPatch aplicados a un store.
+
+    Uso típico: ``journal.replay(store)`` al arrancar (reconstruye el store y lo enlaza) y
+    ``journal.append(patch)`` tras cada ``apply_patch``. Con ``fsync=True`` cada append llega a disco
+    antes de volver.
+    """
+    def __init__(self, path: str, compact_every: int = DEFAULT_COMPACT_EVERY, fsync: bool = True) -> None:
+        self.path = path
+        self.snapshot_path = path + ".snap"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.store = None
+        self.seq = 0
+        self.pending_ops = 0  # ops en el JSONL desde la última compactación
+        self._fh = None
+
+    # ---------- Lectura ----------
+
+    def _read_snapshot(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.snapshot_path):
+            return None
+        with open(self.snapshot_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _read_entries(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """(seq, patch) del JSONL; recorta una cola truncada para que los appends sigan siendo válidos."""
+        if not os.path.exists(self.path):
+            return
+        good = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    break
+                good += len(raw)
+                yield entry["seq"], entry["patch"]
+        if good < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+
+    def replay(self, store) -> int:
+        """
+        Reconstruye ``store`` (vacío) desde snapshot + JSONL y lo enlaza al journal.
+        Cada patch se aplica con su propio ``apply_patch_batch``, igual que al aplicarlo en vivo
+        (con el GC pausado durante todo el replay). Devuelve el nº de ops.
+        """
+        snap = self._read_snapshot()
+        base = 0
+        if snap is not None:
+            load_store(store, snap)
+            base = snap["seq"]
+        self.seq = base
+        n_ops = 0
+        with gc_paused():
+            for seq, patch in self._read_entries():
+                if seq <= base:
+                    continue
+                apply_patch_batch(store, patch)
+                n_ops += len(patch.get("ops", ()))
+                self.seq = seq
+        self.pending_ops = n_ops
+        self.store = store
+        return n_ops
+
+    # ---------- Escritura ----------
+
+    def _file(self):
+        if self._fh is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._fh = open(self.path, "ab")
+        return self._fh
+
+    def append(self, patch: Dict[str, Any]) -> int:
+        """Añade un patch ya aplicado al store enlazado. Compacta si el JSONL ha crecido demasiado."""
+        if not patch or not patch.get("ops"):
+            return self.seq
+        self.seq += 1
+        line = _DUMPS({"seq": self.seq, "patch": patch}) + "\n"
+        fh = self._file()
+        fh.write(line.encode("utf-8"))
+        fh.flush()
+        if self.fsync:
+            os.fsync(fh.fileno())
+        self.pending_ops += len(patch["ops"])
+        if self.store is not None and self.compact_every and self.pending_ops >= self.compact_every:
+            self.compact()
+        return self.seq
+
+    def compact(self) -> None:
+        """Escribe el snapshot del store enlazado (atómico) y vacía el JSONL."""
+        if self.store is None:
+            raise ValueError("PatchJournal.compact requiere un store enlazado (replay)")
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(_DUMPS(dump_store(self.store, self.seq)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self.close()
+        with open(self.path, "wb") as f:
+            os.fsync(f.fileno())
+        self.pending_ops = 0
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def thread_file_stem(thread_id: str) -> str:
+    """
+    Nombre de fichero (sin extensión) propio de ``thread_id``: prefijo saneado para leerlo a mano
+    más sha256 del id, porque el saneado solo confunde ids distintos ("a/b" y "a_b").
+    """
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", thread_id)[:40] or "default"
+    return f"{safe}-{hashlib.sha256(thread_id.encode('utf-8')).hexdigest()[:32]}"
+
+
+def journal_for_thread(thread_id: str) -> Optional[PatchJournal]:
+    """Journal de un hilo del agente en KORELIA_GRAPH_JOURNAL_DIR (None si no está configurado)."""
+    root = os.getenv("KORELIA_GRAPH_JOURNAL_DIR")
+    if not root:
+        return None
+    return PatchJournal(os.path.join(root, f"{thread_file_stem(thread_id)}.jsonl"))
@@ -1,7 +1,36 @@
-from typing import Dict, Any
+import gc
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, Set
 from .store import GraphStore
 
 
+_GC_LOCK = threading.Lock()
+_GC_PAUSES = 0
+_GC_WAS_ENABLED = False
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """
+    Pausa el GC cíclico durante el bloque. Las pausas se cuentan bajo un lock: con varios hilos
+    solapados el GC se reactiva al salir la última, y sólo si estaba activo al entrar la primera.
+    """
+    global _GC_PAUSES, _GC_WAS_ENABLED
+    with _GC_LOCK:
+        if _GC_PAUSES == 0:
+            _GC_WAS_ENABLED = gc.isenabled()
+            gc.disable()
+        _GC_PAUSES += 1
+    try:
+        yield
+    finally:
+        with _GC_LOCK:
+            _GC_PAUSES -= 1
+            if _GC_PAUSES == 0 and _GC_WAS_ENABLED:
+                gc.enable()
+
+
 def apply_patch(store: GraphStore, patch: Dict[str, Any]) -> None:
     """Apply a GraphPatch dictionary to the store (namespace ignored here; could be used to set labels)."""
     if not patch: return
@@ -24,8 +53,129 @@ def apply_patch(store: GraphStore, patch: Dict[str, Any]) -> None:
             store.add_edge(edge["id"], edge["type"], edge["from"], edge["to"], edge.get("props"))
         elif kind == "update_edge":
             edge = op["edge"]
-            store.update_edge(edge["id"], edge.get("from"), edge.get("to"), edge.get("props"))
+            store.update_edge(edge["id"], edge.get("props"))
+        elif kind == "remove_edge":
+            store.remove_edge(op["id"])
+        else:
+            raise ValueError(f"Unsupported op: {kind}")
+
+
+class _PendingBatch:
+    """
+    Acumula un tramo de ops add/update y lo vuelca con una llamada masiva por tipo.
+    Cualquier op cuyo resultado dependa del orden respecto al tramo pendiente fuerza un ``flush``
+    previo, de modo que el resultado es el mismo que aplicando op a op.
+    """
+    def __init__(self, store: GraphStore) -> None:
+        self.store = store
+        self._reset()
+
+    def _reset(self) -> None:
+        # node_id -> [type, props, labels]; props es el mismo dict del op (igual que en apply_patch)
+        self.nodes: Dict[str, list] = {}
+        self.node_updates: Dict[str, Dict[str, Any]] = {}
+        # edge_id -> [type, from, to, props]
+        self.edges: Dict[str, list] = {}
+        self.edge_updates: Dict[str, Dict[str, Any]] = {}
+        # nodos que networkx creará implícitamente al añadir los edges pendientes
+        self.implicit_nodes: Set[str] = set()
+
+    def add_node(self, node: Dict[str, Any]) -> None:
+        nid = node["id"]
+        prev = self.nodes.get(nid)
+        if nid in self.implicit_nodes or nid in self.node_updates or (prev is not None and prev[0] != node["type"]):
+            self.flush()
+        elif self.implicit_nodes and prev is None and not self.store.has_node(nid):
+            # un nodo nuevo va detrás de los creados implícitamente por edges pendientes
+            self.flush()
+        props = node.get("props")
+        self.nodes[nid] = [node["type"], {} if props is None else props, node.get("labels")]
+
+    def update_node(self, node: Dict[str, Any]) -> None:
+        nid = node["id"]
+        props = node.get("props", {}) or {}
+        pending = self.nodes.get(nid)
+        if pending is not None:
+            pending[1].update(props)
+        elif nid in self.implicit_nodes:
+            self.flush()
+            self.store.update_node(nid, props)
+        elif self.store.has_node(nid):
+            self.node_updates.setdefault(nid, {}).update(props)
+
+    def add_edge(self, edge: Dict[str, Any]) -> None:
+        eid = edge["id"]
+        u, v = edge["from"], edge["to"]
+        pending = self.edges.get(eid)
+        if pending is not None:
+            # re-alta con otros extremos: el edge anterior ya creó sus nodos implícitos (y en ese orden)
+            moved = (pending[1], pending[2]) != (u, v)
+        else:
+            # mover un edge del store antes que los pendientes cambiaría el orden de la adyacencia
+            stored = self.store.edge_endpoints(eid)
+            moved = bool(self.edges) and stored is not None and stored != (u, v)
+        if eid in self.edge_updates or moved:
+            self.flush()
+        props = edge.get("props")
+        self.edges[eid] = [edge["type"], u, v, {} if props is None else props]
+        for n in (u, v):
+            if n not in self.nodes and not self.store.has_node(n):
+                self.implicit_nodes.add(n)
+
+    def update_edge(self, edge: Dict[str, Any]) -> None:
+        eid = edge["id"]
+        props = edge.get("props") or {}
+        pending = self.edges.get(eid)
+        if pending is not None:
+            pending[3].update(props)
+        elif self.store.edge_endpoints(eid) is not None:
+            self.edge_updates.setdefault(eid, {}).update(props)
+
+    def flush(self) -> None:
+        store = self.store
+        if self.nodes:
+            store.add_nodes_from((nid, t, p, l) for nid, (t, p, l) in self.nodes.items())
+        for nid, props in self.node_updates.items():
+            store.update_node(nid, props)
+        if self.edges:
+            store.add_edges_from((eid, t, u, v, p) for eid, (t, u, v, p) in self.edges.items())
+        for eid, props in self.edge_updates.items():
+            store.update_edge(eid, props)
+        self._reset()
+
+
+def apply_patch_batch(store: GraphStore, patch: Optional[Dict[str, Any]]) -> None:
+    """
+    Variante masiva de ``apply_patch``: agrupa los add/update consecutivos por tipo
+    (``add_nodes_from``/``add_edges_from`` una vez por grupo) y fusiona los ``update_node``
+    sobre el mismo id. Los ``remove_*`` actúan como barrera y se aplican en su orden original.
+    El GC cíclico se pausa mientras dura: el alta masiva crea miles de dicts sin ciclos y las
+    colecciones intermedias dominaban el tiempo de aplicación.
+    """
+    if not patch: return
+    with gc_paused():
+        _apply_batch(store, patch)
+
+
+def _apply_batch(store: GraphStore, patch: Dict[str, Any]) -> None:
+    batch = _PendingBatch(store)
+    for op in patch.get("ops", []):
+        kind = op.get("op")
+        if kind == "add_node":
+            batch.add_node(op["node"])
+        elif kind == "update_node":
+            batch.update_node(op["node"])
+        elif kind == "add_edge":
+            batch.add_edge(op["edge"])
+        elif kind == "update_edge":
+            batch.update_edge(op["edge"])
+        elif kind == "remove_node":
+            batch.flush()
+            store.remove_node(op["id"])
         elif kind == "remove_edge":
+            batch.flush()
             store.remove_edge(op["id"])
         else:
+            batch.flush()
             raise ValueError(f"Unsupported op: {kind}")
+    batch.flush()
@@ -1,46 +1,23 @@
-from typing import List, Dict, Any, Callable, Optional, Set
+from dataclasses import dataclass
+from typing import List, Dict, Any, Callable, FrozenSet, Mapping, Optional, Tuple
 from .store import GraphStore
-from .context import get_context_values
+from .context import context_snapshot
 
 
 # ---------- Helpers específicos del grafo ----------
+# Conectividad servida por el índice del store (store.connectivity), sin recorrer edges.
 
-def _is_onnet_edge(store: GraphStore, u: str, v: str, key: Any) -> bool:
-    data = store.g.edges[u, v, key]
-    return data.get("type") == "onNet"
-
-def _is_pinof_edge(store: GraphStore, u: str, v: str, key: Any) -> bool:
-    data = store.g.edges[u, v, key]
-    return data.get("type") == "pinOf"
-
-def _onnet_sources_to_net(store: GraphStore, net_id: str) -> Set[str]:
+def _onnet_sources_to_net(store: GraphStore, net_id: str) -> List[str]:
     """Terminales (pins/ports) conectados a la net vía onNet (terminal -> net)."""
-    sources: Set[str] = set()
-    if net_id not in store.g:
-        return sources
-    for u, v, key in store.g.in_edges(net_id, keys=True):
-        if _is_onnet_edge(store, u, v, key):
-            sources.add(u)
-    return sources
-
-def _pins_of_component(store: GraphStore, cmp_id: str) -> Set[str]:
+    return store.connectivity.terminals_of_net(net_id)
+
+def _pins_of_component(store: GraphStore, cmp_id: str) -> List[str]:
     """Pins que pertenecen a un componente (pinOf: pin -> component)."""
-    pins: Set[str] = set()
-    if cmp_id not in store.g:
-        return pins
-    for u, v, key in store.g.in_edges(cmp_id, keys=True):
-        if _is_pinof_edge(store, u, v, key):
-            pins.add(u)
-    return pins
+    return store.connectivity.pins_of_component(cmp_id)
 
 def _net_of_terminal(store: GraphStore, terminal_node_id: str) -> Optional[str]:
     """Net conectada a un pin/port (onNet: terminal -> net)."""
-    if terminal_node_id not in store.g:
-        return None
-    for _, v, key in store.g.out_edges(terminal_node_id, keys=True):
-        if _is_onnet_edge(store, terminal_node_id, v, key):
-            return v
-    return None
+    return store.connectivity.net_of_terminal(terminal_node_id)
 
 def _get_numeric_param(value_or_dict: Any, unit_map: Dict[str, float] | None = None) -> Optional[float]:
     """Acepta escalar o dict {'value','unit'}; aplica escala si hay unidad."""
@@ -62,31 +39,172 @@ def _get_numeric_param(value_or_dict: Any, unit_map: Dict[str, float] | None = N
     return None
 
 
+# ---------- Declaración de reglas ----------
+
+RuleCheck = Callable[[GraphStore, str, Mapping[str, Any]], List[Dict[str, Any]]]
+
+
+@dataclass(frozen=True)
+class RuleSpec:
+    """
+    Regla evaluable por unidades: ``check(store, unit_id, ctx)`` inspecciona un nodo de tipo
+    ``unit_type`` y devuelve sus violations.
+    Lo que la regla lee se declara para que el motor incremental sepa qué re-evaluar:
+    - ``node_types``: tipos de nodo cuyos props/existencia afectan al resultado.
+    - ``edge_types``: tipos de edge que recorre desde la unidad (a 1 salto).
+    - ``context_keys``: claves del contexto de diseño de las que depende (cambian → re-evaluación total).
+      Las reglas que declaran claves reciben en ``ctx`` el snapshot compartido de ``context_snapshot``;
+      el resto recibe un dict vacío.
+    ``cost`` es un peso relativo (1.0 = barrido lineal simple) que el motor usa para decidir si
+    paraleliza y en qué orden reparte las reglas.
+    Llamar a la regla con ``rule(store)`` ejecuta la evaluación completa.
+    """
+    name: str
+    unit_type: str
+    check: RuleCheck
+    node_types: FrozenSet[str] = frozenset()
+    edge_types: FrozenSet[str] = frozenset()
+    context_keys: Tuple[str, ...] = ()
+    cost: float = 1.0
+
+    def context_for(self, store: GraphStore) -> Mapping[str, Any]:
+        return context_snapshot(store) if self.context_keys else {}
+
+    def __call__(self, store: GraphStore, ctx: Optional[Mapping[str, Any]] = None) -> List[Dict[str, Any]]:
+        if ctx is None:
+            ctx = self.context_for(store)
+        out: List[Dict[str, Any]] = []
+        for unit in store.nodes_by_type(self.unit_type):
+            out.extend(self.check(store, unit, ctx))
+        return out
+
+
 # ---------- Reglas ----------
 
+def _kcl_net(store: GraphStore, net_id: str, ctx: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    terminals = _onnet_sources_to_net(store, net_id)
+    deg = len(terminals)
+    if deg >= 2:
+        return []
+    sev = "high" if deg == 0 else "medium"
+    return [{
+        "id": f"viol:KCL:{net_id}",
+        "rule": "KCL",
+        "severity": sev,
+        "context": {"net": net_id, "degree": deg, "terminals": terminals},
+        "message": f"Net {net_id} has insufficient terminations (deg={deg}).",
+        "suggested_fixes": [
+            "Conecta el retorno o elimina la net si está sin uso",
+            "Verifica que todos los pins previstos estén realmente en la net (onNet)"
+        ]
+    }]
+
+
+def _vds_component(store: GraphStore, cid: str, ctx: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    vbus = ctx.get("Vbus_peak")
+    if vbus is None:
+        return []
+    unit_map = {"v": 1.0, "kv": 1000.0, "mv": 1e-3}
+    props = store.node_props(cid) or {}
+    cls = (props.get("class") or "").lower()
+    if cls not in ("mosfet", "igbt"):
+        return []
+    vds = _get_numeric_param(props.get("Vds_max"), unit_map=unit_map)
+    if vds is None:
+        return []
+    margin_req = 1.1 * float(vbus)
+    if vds >= margin_req:
+        return []
+    return [{
+        "id": f"viol:Ratings:Vds:{cid}",
+        "rule": "Ratings:Vds_margin",
+        "severity": "high",
+        "context": {"node": cid, "param": "Vds_max", "evidence": {"Vbus_peak": vbus}},
+        "message": f"Vds_max {vds} V < 1.1*Vbus_peak {margin_req:.2f} V",
+        "suggested_fixes": [
+            "Selecciona un MOSFET con mayor Vds_max",
+            "Reduce Vbus_peak o aumenta margen de seguridad"
+        ]
+    }]
+
+
+def _anti_ideal_loop_component(store: GraphStore, cid: str, ctx: Mapping[str, Any]) -> List[Dict[str, Any]]:
+    props = store.node_props(cid) or {}
+    cls = (props.get("class") or "").lower()
+    if cls not in ("source", "voltage_source", "current_source"):
+        return []
+
+    # pins del componente (pinOf: pin -> component)
+    pins = _pins_of_component(store, cid)
+
+    pos, neg = set(), set()
+    for p in pins:
+        pprops = store.node_props(p) or {}
+        role = (pprops.get("role") or "").lower()
+        name = (pprops.get("name") or "").lower()
+        if role in ("+", "pos", "positive") or name in ("+", "pos", "positive"):
+            pos.add(p)
+        if role in ("-", "neg", "negative") or name in ("-", "neg", "negative"):
+            neg.add(p)
+
+    if not pos or not neg:
+        return []
+
+    out: List[Dict[str, Any]] = []
+    for pp in pos:
+        net_p = _net_of_terminal(store, pp)
+        if not net_p:
+            continue
+        for nn in neg:
+            net_n = _net_of_terminal(store, nn)
+            if net_n and net_n == net_p:
+                out.append({
+                    "id": f"viol:AntiIdealLoop:{cid}",
+                    "rule": "AntiIdealLoop",
+                    "severity": "high",
+                    "context": {"source": cid, "net": net_p, "pins": {"pos": pp, "neg": nn}},
+                    "message": f"Fuente ideal '{cid}' tiene + y - en la misma net ({net_p}).",
+                    "suggested_fixes": [
+                        "Corrige el cableado: los terminales no pueden compartir net",
+                        "Añade impedancia si estás creando un lazo de prueba"
+                    ]
+                })
+                break
+    return out
+
+
+KCL_RULE = RuleSpec(
+    name="KCL",
+    unit_type="Net",
+    check=_kcl_net,
+    node_types=frozenset({"Net"}),
+    edge_types=frozenset({"onNet"}),
+)
+
+VDS_MARGIN_RULE = RuleSpec(
+    name="Ratings:Vds_margin",
+    unit_type="ComponentInstance",
+    check=_vds_component,
+    node_types=frozenset({"ComponentInstance"}),
+    context_keys=("Vbus_peak",),
+)
+
+ANTI_IDEAL_LOOP_RULE = RuleSpec(
+    name="AntiIdealLoop",
+    unit_type="ComponentInstance",
+    check=_anti_ideal_loop_component,
+    node_types=frozenset({"ComponentInstance", "Pin"}),
+    edge_types=frozenset({"pinOf", "onNet"}),
+    cost=2.0,
+)
+
+
 def kcl_degree(store: GraphStore) -> List[Dict[str, Any]]:
     """
     KCL simple: una net debe tener ≥ 2 terminales eléctricos.
     Cuenta únicamente terminales conectados por edges 'onNet'.
     """
-    out: List[Dict[str, Any]] = []
-    for net_id in store.nodes_by_type("Net"):
-        terminals = _onnet_sources_to_net(store, net_id)
-        deg = len(terminals)
-        if deg < 2:
-            sev = "high" if deg == 0 else "medium"
-            out.append({
-                "id": f"viol:KCL:{net_id}",
-                "rule": "KCL",
-                "severity": sev,
-                "context": {"net": net_id, "degree": deg, "terminals": list(terminals)},
-                "message": f"Net {net_id} has insufficient terminations (deg={deg}).",
-                "suggested_fixes": [
-                    "Conecta el retorno o elimina la net si está sin uso",
-                    "Verifica que todos los pins previstos estén realmente en la net (onNet)"
-                ]
-            })
-    return out
+    return KCL_RULE(store)
 
 
 def vds_margin(store: GraphStore) -> List[Dict[str, Any]]:
@@ -94,35 +212,7 @@ def vds_margin(store: GraphStore) -> List[Dict[str, Any]]:
     Check: Vds_max >= 1.1 * Vbus_peak
     Se aplica a MOSFET/IGBT (amplía si procede). Acepta escalar o {'value','unit'}.
     """
-    ctx = get_context_values(store)
-    vbus = ctx.get("Vbus_peak")
-    if vbus is None:
-        return []
-
-    unit_map = {"v": 1.0, "kv": 1000.0, "mv": 1e-3}
-    out: List[Dict[str, Any]] = []
-    for cid in store.nodes_by_type("ComponentInstance"):
-        props = store.node_props(cid) or {}
-        cls = (props.get("class") or "").lower()
-        if cls not in ("mosfet", "igbt"):
-            continue
-        vds = _get_numeric_param(props.get("Vds_max"), unit_map=unit_map)
-        if vds is None:
-            continue
-        margin_req = 1.1 * float(vbus)
-        if vds < margin_req:
-            out.append({
-                "id": f"viol:Ratings:Vds:{cid}",
-                "rule": "Ratings:Vds_margin",
-                "severity": "high",
-                "context": {"node": cid, "param": "Vds_max", "evidence": {"Vbus_peak": vbus}},
-                "message": f"Vds_max {vds} V < 1.1*Vbus_peak {margin_req:.2f} V",
-                "suggested_fixes": [
-                    "Selecciona un MOSFET con mayor Vds_max",
-                    "Reduce Vbus_peak o aumenta margen de seguridad"
-                ]
-            })
-    return out
+    return VDS_MARGIN_RULE(store)
 
 
 def anti_ideal_loop(store: GraphStore) -> List[Dict[str, Any]]:
@@ -130,58 +220,41 @@ def anti_ideal_loop(store: GraphStore) -> List[Dict[str, Any]]:
     Mínimo útil: detectar fuente ideal con + y - en la misma net.
     Requiere que los pins tengan role/name coherentes (+/-).
     """
-    out: List[Dict[str, Any]] = []
-    for cid in store.nodes_by_type("ComponentInstance"):
-        props = store.node_props(cid) or {}
-        cls = (props.get("class") or "").lower()
-        if cls not in ("source", "voltage_source", "current_source"):
-            continue
+    return ANTI_IDEAL_LOOP_RULE(store)
 
-        # pins del componente (pinOf: pin -> component)
-        pins = set()
-        for u, v, key in store.g.in_edges(cid, keys=True):
-            if store.g.edges[u, v, key].get("type") == "pinOf":
-                pins.add(u)
-
-        pos, neg = set(), set()
-        for p in pins:
-            pprops = store.node_props(p) or {}
-            role = (pprops.get("role") or "").lower()
-            name = (pprops.get("name") or "").lower()
-            if role in ("+", "pos", "positive") or name in ("+", "pos", "positive"):
-                pos.add(p)
-            if role in ("-", "neg", "negative") or name in ("-", "neg", "negative"):
-                neg.add(p)
-
-        if not pos or not neg:
-            continue
 
-        for pp in pos:
-            net_p = _net_of_terminal(store, pp)
-            if not net_p:
-                continue
-            for nn in neg:
-                net_n = _net_of_terminal(store, nn)
-                if net_n and net_n == net_p:
-                    out.append({
-                        "id": f"viol:AntiIdealLoop:{cid}",
-                        "rule": "AntiIdealLoop",
-                        "severity": "high",
-                        "context": {"source": cid, "net": net_p, "pins": {"pos": pp, "neg": nn}},
-                        "message": f"Fuente ideal '{cid}' tiene + y - en la misma net ({net_p}).",
-                        "suggested_fixes": [
-                            "Corrige el cableado: los terminales no pueden compartir net",
-                            "Añade impedancia si estás creando un lazo de prueba"
-                        ]
-                    })
-                    break
-    return out
+# ---------- Registro ----------
 
+_RULESETS: Dict[str, Dict[str, RuleSpec]] = {}
 
-# ---------- Registro ----------
 
-RULESET_POWER_BASE: Dict[str, Callable[[GraphStore], List[Dict[str, Any]]]] = {
-    "KCL": kcl_degree,
-    "Ratings:Vds_margin": vds_margin,
-    "AntiIdealLoop": anti_ideal_loop,
-}
+def register_rule(rule: RuleSpec, ruleset: str = "power_base") -> RuleSpec:
+    """Registra (o reemplaza por nombre) una regla en un ruleset. El orden de registro fija el orden del informe."""
+    _RULESETS.setdefault(ruleset, {})[rule.name] = rule
+    return rule
+
+
+def unregister_rule(name: str, ruleset: str = "power_base") -> None:
+    _RULESETS.get(ruleset, {}).pop(name, None)
+
+
+def declare_rule(name: str, unit_type: str, *, node_types=(), edge_types=(), context_keys=(),
+                 cost: float = 1.0, ruleset: str = "power_base") -> Callable[[RuleCheck], RuleCheck]:
+    """Decorador: declara y registra ``check(store, unit_id, ctx)`` como RuleSpec."""
+    def _decorator(check: RuleCheck) -> RuleCheck:
+        register_rule(RuleSpec(name=name, unit_type=unit_type, check=check,
+                               node_types=frozenset(node_types), edge_types=frozenset(edge_types),
+                               context_keys=tuple(context_keys), cost=cost), ruleset)
+        return check
+    return _decorator
+
+
+def get_ruleset(ruleset: str = "power_base") -> Dict[str, RuleSpec]:
+    return _RULESETS.setdefault(ruleset, {})
+
+
+for _r in (KCL_RULE, VDS_MARGIN_RULE, ANTI_IDEAL_LOOP_RULE):
+    register_rule(_r)
+
+# Vista viva del ruleset base (las reglas registradas después también aparecen aquí)
+RULESET_POWER_BASE: Dict[str, RuleSpec] = get_ruleset("power_base")
@@ -1,51 +1,426 @@
 from __future__ import annotations
-from typing import Dict, Any, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple
+import weakref
 import networkx as nx
 
 
-class GraphStore:
-    """Simple property multi-digraph using networkx."""
+@dataclass(eq=False)
+class ChangeSet:
+    """Delta acumulado por el store desde el último ``drain()``.
+
+    - ``nodes``: ids de nodos añadidos/actualizados/eliminados.
+    - ``edges``: (type, from, to) de edges añadidos/actualizados/eliminados.
+    """
+    nodes: Set[str] = field(default_factory=set)
+    edges: List[Tuple[Optional[str], str, str]] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not self.nodes and not self.edges
+
+    def drain(self) -> "ChangeSet":
+        """Devuelve una copia del delta y lo vacía."""
+        out = ChangeSet(self.nodes, self.edges)
+        self.nodes, self.edges = set(), []
+        return out
+
+
+class _UndoJournal:
+    """
+    Snapshots baratos por diario de deshacer (sin copiar el grafo).
+
+    Mientras haya algún snapshot vivo, cada mutador anota antes de actuar el estado previo
+    de lo que toca (nodo/edge o su ausencia). ``restore`` deshace en orden inverso a través de
+    los propios mutadores, así que ``version`` y los ChangeSet avanzan y las cachés derivadas
+    (contexto, motor de reglas) se actualizan de forma incremental.
+    El contenido restaurado es idéntico; un nodo borrado y restaurado pasa al final del orden.
+    El store concreto aporta ``_node_state``, ``_edge_state`` e ``_incident_edge_ids``.
+    """
+    # snapshots vivos como máximo; al crear uno más se libera el más antiguo
+    MAX_SNAPSHOTS = 16
+
+    def _init_journal(self) -> None:
+        self._undo: Optional[List[Tuple[str, str, Any]]] = None
+        self._undo_base = 0
+        self._snapshots: Dict[str, int] = {}
+        self._snapshot_seq = 0
+
+    def snapshot(self) -> str:
+        """Marca el estado actual y devuelve un id para ``restore``."""
+        if self._undo is None:
+            self._undo = []
+        self._snapshot_seq += 1
+        sid = f"snap:{self._snapshot_seq}"
+        self._snapshots[sid] = self._undo_base + len(self._undo)
+        while len(self._snapshots) > self.MAX_SNAPSHOTS:
+            self.release_snapshot(next(iter(self._snapshots)))
+        return sid
+
+    def restore(self, snapshot_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Vuelve al estado de ``snapshot_id`` (que sigue siendo válido). Devuelve el GraphPatch
+        equivalente a lo deshecho (p.ej. para el journal persistente) o None si no existe.
+        """
+        mark = self._snapshots.get(snapshot_id)
+        if mark is None:
+            return None
+        ops: List[Dict[str, Any]] = []
+        undo = self._undo
+        self._undo = None  # los mutadores no deben anotar mientras se deshace
+        try:
+            while self._undo_base + len(undo) > mark:
+                kind, key, state = undo.pop()
+                if kind == "node":
+                    if state is None:
+                        self.remove_node(key)
+                        ops.append({"op": "remove_node", "id": key})
+                    else:
+                        self.add_node(key, state[0], state[1], state[2])
+                        ops.append({"op": "add_node", "node": {"id": key, "type": state[0],
+                                                               "props": state[1], "labels": state[2]}})
+                elif state is None:
+                    self.remove_edge(key)
+                    ops.append({"op": "remove_edge", "id": key})
+                else:
+                    self.add_edge(key, state[0], state[1], state[2], state[3])
+                    ops.append({"op": "add_edge", "edge": {"id": key, "type": state[0], "from": state[1],
+                                                           "to": state[2], "props": state[3]}})
+        finally:
+            self._undo = undo
+        # los snapshots posteriores apuntan a estados que ya no existen
+        for sid, m in list(self._snapshots.items()):
+            if m > mark:
+                del self._snapshots[sid]
+        return {"namespace": None, "ops": ops}
+
+    def release_snapshot(self, snapshot_id: str) -> None:
+        """Libera un snapshot; recorta el diario que ya ningún snapshot necesita."""
+        if self._snapshots.pop(snapshot_id, None) is None:
+            return
+        if not self._snapshots:
+            self._undo, self._undo_base = None, 0
+            return
+        oldest = min(self._snapshots.values())
+        drop = oldest - self._undo_base
+        if drop > 0:
+            del self._undo[:drop]
+            self._undo_base = oldest
+
+    def snapshot_ids(self) -> List[str]:
+        return list(self._snapshots)
+
+    def _journal_node(self, node_id: str, with_edges: bool = False) -> None:
+        """Anota el estado previo de un nodo (y, si se va a borrar, el de sus edges)."""
+        if with_edges:
+            for edge_id in self._incident_edge_ids(node_id):
+                self._journal_edge(edge_id)
+        self._undo.append(("node", node_id, self._node_state(node_id)))
+
+    def _journal_edge(self, edge_id: str) -> None:
+        self._undo.append(("edge", edge_id, self._edge_state(edge_id)))
+
+    def _journal_endpoints(self, from_id: str, to_id: str) -> None:
+        # nodos que se crearán implícitamente al añadir el edge
+        for n in (from_id, to_id):
+            if not self.has_node(n):
+                self._undo.append(("node", n, None))
+
+
+class ConnectivityIndex:
+    """
+    Vista de conectividad mantenida por el store a medida que se añaden/eliminan edges
+    ``onNet`` (terminal -> net) y ``pinOf`` (pin -> componente). Consultas en O(1)/O(grado).
+    Cada relación guarda un contador de edges paralelos y conserva el orden de inserción.
+    """
+    ON_NET = "onNet"
+    PIN_OF = "pinOf"
+
+    def __init__(self) -> None:
+        self._net_terminals: Dict[str, Dict[str, int]] = {}
+        self._terminal_nets: Dict[str, Dict[str, int]] = {}
+        self._component_pins: Dict[str, Dict[str, int]] = {}
+        self._pin_components: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def _inc(index: Dict[str, Dict[str, int]], a: str, b: str) -> None:
+        bucket = index.setdefault(a, {})
+        bucket[b] = bucket.get(b, 0) + 1
+
+    @staticmethod
+    def _dec(index: Dict[str, Dict[str, int]], a: str, b: str) -> None:
+        bucket = index.get(a)
+        if not bucket or b not in bucket:
+            return
+        if bucket[b] > 1:
+            bucket[b] -= 1
+            return
+        del bucket[b]
+        if not bucket:
+            del index[a]
+
+    def _add(self, type: Optional[str], u: str, v: str) -> None:
+        if type == self.ON_NET:
+            self._inc(self._net_terminals, v, u)
+            self._inc(self._terminal_nets, u, v)
+        elif type == self.PIN_OF:
+            self._inc(self._component_pins, v, u)
+            self._inc(self._pin_components, u, v)
+
+    def _remove(self, type: Optional[str], u: str, v: str) -> None:
+        if type == self.ON_NET:
+            self._dec(self._net_terminals, v, u)
+            self._dec(self._terminal_nets, u, v)
+        elif type == self.PIN_OF:
+            self._dec(self._component_pins, v, u)
+            self._dec(self._pin_components, u, v)
+
+    def terminals_of_net(self, net_id: str) -> List[str]:
+        """Terminales (pins/ports) conectados a la net vía onNet."""
+        return list(self._net_terminals.get(net_id, ()))
+
+    def degree_of_net(self, net_id: str) -> int:
+        return len(self._net_terminals.get(net_id, ()))
+
+    def net_of_terminal(self, terminal_id: str) -> Optional[str]:
+        """Primera net a la que está conectado un terminal (None si está suelto)."""
+        nets = self._terminal_nets.get(terminal_id)
+        return next(iter(nets)) if nets else None
+
+    def nets_of_terminal(self, terminal_id: str) -> List[str]:
+        return list(self._terminal_nets.get(terminal_id, ()))
+
+    def pins_of_component(self, cmp_id: str) -> List[str]:
+        """Pins que pertenecen a un componente (pinOf)."""
+        return list(self._component_pins.get(cmp_id, ()))
+
+    def component_of_pin(self, pin_id: str) -> Optional[str]:
+        cmps = self._pin_components.get(pin_id)
+        return next(iter(cmps)) if cmps else None
+
+
+class GraphStore(_UndoJournal):
+    """Simple property multi-digraph using networkx.
+
+    ``version`` se incrementa en cada llamada a un mutador (cachés derivadas lo usan como clave).
+    Mantiene índices que todos los mutadores actualizan:
+    - ``_edge_index``: edge_id -> (u, v), para update/remove de edges sin recorrer el grafo.
+    - ``_type_index``: type -> {node_id: None} (set ordenado por inserción), para ``nodes_by_type``.
+    - ``connectivity``: adyacencia eléctrica (onNet/pinOf), ver ConnectivityIndex.
+    ``snapshot``/``restore`` permiten deshacer cambios, ver _UndoJournal.
+    """
     def __init__(self) -> None:
         self.g = nx.MultiDiGraph()
+        self._edge_index: Dict[str, Tuple[str, str]] = {}
+        self._type_index: Dict[str, Dict[str, None]] = {}
+        self._trackers: "weakref.WeakSet[ChangeSet]" = weakref.WeakSet()
+        self.version = 0
+        self.connectivity = ConnectivityIndex()
+        self._init_journal()
+
+    # ---------- Seguimiento de cambios ----------
+
+    def track_changes(self) -> ChangeSet:
+        """Registra un ChangeSet que los mutadores irán rellenando (se libera al perder la referencia)."""
+        cs = ChangeSet()
+        self._trackers.add(cs)
+        return cs
+
+    def _touch_node(self, node_id: str) -> None:
+        for cs in self._trackers:
+            cs.nodes.add(node_id)
+
+    def _touch_edge(self, type: Optional[str], u: str, v: str) -> None:
+        for cs in self._trackers:
+            cs.edges.append((type, u, v))
+
+    # ---------- Índices ----------
+
+    def _index_node_type(self, node_id: str, type: Optional[str]) -> None:
+        prev = self.g.nodes[node_id].get("type") if node_id in self.g.nodes else None
+        if prev == type:
+            return
+        if prev is not None:
+            bucket = self._type_index.get(prev)
+            if bucket is not None:
+                bucket.pop(node_id, None)
+        if type is not None:
+            self._type_index.setdefault(type, {})[node_id] = None
+
+    def _unindex_node(self, node_id: str) -> None:
+        t = self.g.nodes[node_id].get("type")
+        if t is not None:
+            bucket = self._type_index.get(t)
+            if bucket is not None:
+                bucket.pop(node_id, None)
+        tracking = bool(self._trackers)
+        for edges in (self.g.in_edges(node_id, keys=True, data="type"),
+                      self.g.out_edges(node_id, keys=True, data="type")):
+            for u, v, k, et in edges:
+                self._edge_index.pop(k, None)
+                self.connectivity._remove(et, u, v)
+                if tracking:
+                    self._touch_edge(et, u, v)
+
+    def _node_state(self, node_id: str) -> Optional[Tuple[Optional[str], Dict[str, Any], List[Any]]]:
+        if node_id not in self.g.nodes:
+            return None
+        data = self.g.nodes[node_id]
+        return data.get("type"), dict(data.get("props", {})), list(data.get("labels", []))
+
+    def _edge_state(self, edge_id: str) -> Optional[Tuple[Optional[str], str, str, Dict[str, Any]]]:
+        uv = self._edge_index.get(edge_id)
+        if uv is None:
+            return None
+        data = self.g.edges[uv[0], uv[1], edge_id]
+        return data.get("type"), uv[0], uv[1], dict(data.get("props", {}))
+
+    def _incident_edge_ids(self, node_id: str) -> List[str]:
+        return [k for _, _, k in self.g.in_edges(node_id, keys=True)] + \
+               [k for _, _, k in self.g.out_edges(node_id, keys=True)]
+
+    # ---------- Mutadores ----------
 
     def add_node(self, node_id: str, type: str, props: Optional[Dict[str, Any]] = None, labels=None):
+        self.version += 1
+        if self._undo is not None:
+            self._journal_node(node_id)
         if props is None:
             props = {}
+        self._index_node_type(node_id, type)
         self.g.add_node(node_id, type=type, props=props, labels=labels or [])
+        self._touch_node(node_id)
+
+    def add_nodes_from(self, nodes: Iterable[Tuple[str, str, Optional[Dict[str, Any]], Any]]):
+        """Alta masiva en una sola llamada a networkx. Items: (node_id, type, props, labels), ids únicos."""
+        self.version += 1
+        items = []
+        g = self.g
+        for node_id, type, props, labels in nodes:
+            if self._undo is not None:
+                self._journal_node(node_id)
+            if node_id in g:
+                self._index_node_type(node_id, type)
+            elif type is not None:
+                self._type_index.setdefault(type, {})[node_id] = None
+            items.append((node_id, {"type": type, "props": {} if props is None else props, "labels": labels or []}))
+        self.g.add_nodes_from(items)
+        if self._trackers:
+            for node_id, _ in items:
+                self._touch_node(node_id)
 
     def update_node(self, node_id: str, props: Dict[str, Any]):
         if node_id in self.g.nodes:
+            if self._undo is not None:
+                self._journal_node(node_id)
             current = self.g.nodes[node_id].get("props", {})
             current.update(props or {})
             self.g.nodes[node_id]["props"] = current
+            self.version += 1
+            self._touch_node(node_id)
+
+    def _prepare_edge(self, edge_id: str, type: str, from_id: str, to_id: str) -> None:
+        """Mantiene índices antes de (re)dar de alta un edge. El id de edge es estable:
+        si ya existe entre otros extremos, el edge anterior se reemplaza."""
+        prev = self._edge_index.get(edge_id)
+        if prev is not None:
+            prev_type = self.g.edges[prev[0], prev[1], edge_id].get("type")
+            if prev != (from_id, to_id):
+                self._touch_edge(prev_type, prev[0], prev[1])
+                self.connectivity._remove(prev_type, prev[0], prev[1])
+                self.g.remove_edge(prev[0], prev[1], edge_id)
+            elif prev_type != type:
+                self._touch_edge(prev_type, from_id, to_id)
+                self.connectivity._remove(prev_type, from_id, to_id)
+            else:
+                return
+        self._edge_index[edge_id] = (from_id, to_id)
+        self.connectivity._add(type, from_id, to_id)
 
     def add_edge(self, edge_id: str, type: str, from_id: str, to_id: str, props: Optional[Dict[str, Any]] = None):
+        self.version += 1
+        if self._undo is not None:
+            self._journal_endpoints(from_id, to_id)
+            self._journal_edge(edge_id)
         if props is None:
             props = {}
+        self._prepare_edge(edge_id, type, from_id, to_id)
         # MultiDiGraph usa clave (key) para edges paralelos; la usamos como id estable
         self.g.add_edge(from_id, to_id, key=edge_id, type=type, props=props)
+        self._touch_edge(type, from_id, to_id)
+
+    def add_edges_from(self, edges: Iterable[Tuple[str, str, str, str, Optional[Dict[str, Any]]]]):
+        """Alta masiva en una sola llamada a networkx. Items: (edge_id, type, from, to, props), ids únicos."""
+        self.version += 1
+        items = []
+        for edge_id, type, from_id, to_id, props in edges:
+            if self._undo is not None:
+                self._journal_endpoints(from_id, to_id)
+                self._journal_edge(edge_id)
+            self._prepare_edge(edge_id, type, from_id, to_id)
+            items.append((from_id, to_id, edge_id, {"type": type, "props": {} if props is None else props}))
+        self.g.add_edges_from(items)
+        if self._trackers:
+            for u, v, _, data in items:
+                self._touch_edge(data["type"], u, v)
 
     def update_edge(self, edge_id: str, props: Dict[str, Any]):
-        # Busca edge por key y actualiza props
-        for u, v, k in self.g.edges(keys=True):
-            if k == edge_id:
-                data = self.g.edges[u, v, k]
-                cur = data.get("props", {})
-                cur.update(props or {})
-                data["props"] = cur
+        uv = self._edge_index.get(edge_id)
+        if uv is None:
+            return
+        if self._undo is not None:
+            self._journal_edge(edge_id)
+        data = self.g.edges[uv[0], uv[1], edge_id]
+        cur = data.get("props", {})
+        cur.update(props or {})
+        data["props"] = cur
+        self.version += 1
+        self._touch_edge(data.get("type"), uv[0], uv[1])
 
     def remove_node(self, node_id: str):
         if node_id in self.g.nodes:
+            if self._undo is not None:
+                self._journal_node(node_id, with_edges=True)
+            self._unindex_node(node_id)
             self.g.remove_node(node_id)
+            self.version += 1
+            self._touch_node(node_id)
 
     def remove_edge(self, edge_id: str):
-        # Elimina edge por key
-        for u, v, k in list(self.g.edges(keys=True)):
-            if k == edge_id:
-                self.g.remove_edge(u, v, k)
+        if self._undo is not None and edge_id in self._edge_index:
+            self._journal_edge(edge_id)
+        uv = self._edge_index.pop(edge_id, None)
+        if uv is not None:
+            et = self.g.edges[uv[0], uv[1], edge_id].get("type")
+            self._touch_edge(et, uv[0], uv[1])
+            self.connectivity._remove(et, uv[0], uv[1])
+            self.g.remove_edge(uv[0], uv[1], edge_id)
+            self.version += 1
+
+    # ---------- Consultas ----------
+
+    def node_ids(self) -> Iterator[str]:
+        """Ids de nodo en orden de inserción del grafo."""
+        return iter(self.g)
 
     def nodes_by_type(self, type_name: str):
-        return [n for n, d in self.g.nodes(data=True) if d.get("type") == type_name]
+        return list(self._type_index.get(type_name, ()))
+
+    def node_type(self, node_id: str) -> Optional[str]:
+        return self.g.nodes[node_id].get("type") if node_id in self.g.nodes else None
+
+    def adjacent(self, node_id: str, edge_types: Iterable[str]) -> Iterator[str]:
+        """Vecinos (entrantes y salientes) unidos por edges de alguno de ``edge_types``."""
+        if node_id not in self.g.nodes:
+            return
+        for u, _, et in self.g.in_edges(node_id, data="type"):
+            if et in edge_types:
+                yield u
+        for _, v, et in self.g.out_edges(node_id, data="type"):
+            if et in edge_types:
+                yield v
+
+    def edge_endpoints(self, edge_id: str) -> Optional[Tuple[str, str]]:
+        return self._edge_index.get(edge_id)
 
     def node_props(self, node_id: str) -> Dict[str, Any]:
         return self.g.nodes[node_id].get("props", {}) if node_id in self.g.nodes else {}
@@ -53,9 +428,47 @@ class GraphStore:
     def has_node(self, node_id: str) -> bool:
         return node_id in self.g.nodes
 
+    def size(self) -> int:
+        """Nodos + edges: estimación O(1) del tamaño del grafo (p.ej. para cachés con límite de memoria)."""
+        return self.g.number_of_nodes() + self.g.number_of_edges()
+
     # Alias para compatibilidad con código que usa exists_node
     def exists_node(self, node_id: str) -> bool:
         return self.has_node(node_id)
 
+    def nodes_iter(self) -> Iterator[Tuple[str, Optional[str], Dict[str, Any], List[Any]]]:
+        """(node_id, type, props, labels) en orden de inserción."""
+        for n, data in self.g.nodes(data=True):
+            yield n, data.get("type"), data.get("props", {}), data.get("labels", [])
+
     def edges_iter(self):
         return self.g.edges(keys=True, data=True)
+
+    def read_only(self) -> "ReadOnlyGraphStore":
+        return ReadOnlyGraphStore(self)
+
+
+class ReadOnlyGraphStore:
+    """
+    Vista de sólo lectura sobre un GraphStore (p.ej. para reglas ejecutadas en paralelo).
+    Expone las consultas del store; ``g`` es una vista congelada de networkx y los mutadores no existen.
+    """
+    _READS = frozenset({
+        "node_ids", "nodes_by_type", "node_type", "adjacent", "edge_endpoints",
+        "node_props", "has_node", "exists_node", "nodes_iter", "edges_iter", "size", "version", "connectivity",
+    })
+
+    def __init__(self, store: GraphStore) -> None:
+        self._store = store
+        self._g = None
+
+    @property
+    def g(self):
+        if self._g is None:
+            self._g = self._store.g.copy(as_view=True)
+        return self._g
+
+    def __getattr__(self, name: str):
+        if name in ReadOnlyGraphStore._READS:
+            return getattr(self._store, name)
+        raise AttributeError(f"'{name}' no está disponible en la vista de sólo lectura del GraphStore")
@@ -1,13 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Literal
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
+import asyncio
+from contextlib import asynccontextmanager
 import logging
 import json
+import os
 
 # Import single-agent workflow
-from apps.backend.agent import run_single_agent_workflow_stream
+from apps.backend.agent import (run_single_agent_workflow_astream, _GRAPH_THREADS, _TOOL_MEMO, agent_stats,
+                                close_checkpointers, close_http_clients, warm_agents)
+from apps.backend.tools.sim_cache import get_sim_cache
+from apps.backend.tools.ngspice_shared import ngspice_stats
+from apps.backend.tools.async_exec import proc_stats
 
 # Models
 class ChatMessage(BaseModel):
@@ -16,12 +23,33 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
+    # sesión durable (KORELIA_CHECKPOINT_DB): el mismo thread_id retoma el historial y las ejecuciones cortadas
+    thread_id: Optional[str] = None
+    resume: bool = False  # sólo reanudar la ejecución cortada del hilo, sin mensaje nuevo
 
 class ChatResponse(BaseModel):
     content: str
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("backend")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # compila el agente (schemas de tools, cliente del modelo, grafo) antes de la primera petición
+    try:
+        await asyncio.to_thread(warm_agents)
+        logger.info("Agent warm-up done: %s", agent_stats())
+    except Exception as exc:
+        # sin credenciales el worker arranca igual; el agente se construye en la primera petición
+        logger.warning("Agent warm-up skipped: %s", exc)
+    yield
+    await close_http_clients()
+    close_checkpointers()
+
+
 # FastAPI app
-app = FastAPI(title="Single-Agent Chat API")
+app = FastAPI(title="Single-Agent Chat API", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -32,12 +60,88 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("backend")
+
+# ---------- Streaming SSE de /chat ----------
+# Cada conexión tiene una cola acotada entre el agente (productor) y el socket (consumidor): si el
+# cliente lee lento el agente se frena en la cola en vez de acumular memoria; si el cliente se va,
+# se cancela la ejecución del agente.
+_STREAM_QUEUE = int(os.getenv("KORELIA_STREAM_QUEUE", "64"))
+_STREAM_HEARTBEAT_S = float(os.getenv("KORELIA_STREAM_HEARTBEAT_S", "15"))
+_STREAM_COALESCE = 4096  # máx. caracteres de tokens agrupados en un frame
+
+_STREAM_STATS = {"active": 0, "completed": 0, "cancelled": 0, "errors": 0}
+_DONE = object()
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def _sse_stream(request: Request, events: AsyncIterator[Dict[str, Any]],
+                      maxsize: int = _STREAM_QUEUE, heartbeat_s: float = _STREAM_HEARTBEAT_S) -> AsyncIterator[str]:
+    """Frames SSE de ``events`` con cola acotada, heartbeat y cancelación al desconectarse el cliente."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def produce():
+        try:
+            async for ev in events:
+                await queue.put(ev)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception("Single-agent workflow failed: %s", exc)
+            _STREAM_STATS["errors"] += 1
+            await queue.put({"type": "error", "message": str(exc)})
+        await queue.put(_DONE)
+
+    _STREAM_STATS["active"] += 1
+    producer = asyncio.create_task(produce())
+    finished = False
+    pending = None
+    try:
+        # primer byte inmediato: el cliente sabe que el agente arrancó antes del primer token
+        yield _sse("start", {})
+        while True:
+            if pending is not None:
+                ev, pending = pending, None
+            else:
+                try:
+                    ev = await asyncio.wait_for(queue.get(), heartbeat_s)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+            if ev is _DONE:
+                finished = True
+                yield _sse("end", {})
+                break
+            if ev.get("type") == "token":
+                # agrupa los tokens ya encolados en un solo frame (menos frames con el LLM por delante)
+                text = ev["text"]
+                while len(text) < _STREAM_COALESCE and not queue.empty():
+                    nxt = queue.get_nowait()
+                    if nxt is _DONE or nxt.get("type") != "token":
+                        pending = nxt
+                        break
+                    text += nxt["text"]
+                yield _sse("token", {"text": text})
+            else:
+                yield _sse(ev.get("type", "message"), ev)
+    finally:
+        _STREAM_STATS["active"] -= 1
+        _STREAM_STATS["completed" if finished else "cancelled"] += 1
+        # cancelar el productor cancela el agente (y las tools async que esté esperando)
+        producer.cancel()
+        try:
+            await producer
+        except (asyncio.CancelledError, Exception):
+            pass
+        await events.aclose()
 
 
 @app.post("/chat")
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest, request: Request):
     logger.info("Chat request received: %d messages", len(req.messages))
     
     # Get the last user message
@@ -49,19 +153,28 @@ def chat(req: ChatRequest):
     
     if not user_task:
         user_task = "Please help me with an electronics design task."
+    if req.resume and req.thread_id:
+        user_task = None
     
-    logger.info("Running single-agent workflow (streaming) for: %s", user_task[:100])
+    logger.info("Running single-agent workflow (streaming) for: %s", (user_task or "<resume>")[:100])
 
-    def generate():
-        try:
-            for chunk in run_single_agent_workflow_stream(user_task):
-                yield chunk
-        except Exception as exc:
-            logger.exception("Single-agent workflow failed: %s", exc)
-            yield f"\n\nError: {str(exc)}\n"
-    
     return StreamingResponse(
-        generate(),
-        media_type="text/plain; charset=utf-8",
-        headers={"Cache-Control": "no-store"}
+        _sse_stream(request, run_single_agent_workflow_astream(user_task, req.thread_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
     )
+
+
+@app.get("/metrics")
+def metrics():
+    """Contadores internos del worker (registro de Toolkits por hilo, caché de simulación, pool de ngspice, subprocesos EDA, agentes compilados, memo de tools, streams de /chat)."""
+    cache = get_sim_cache()
+    return {
+        "toolkits": _GRAPH_THREADS.stats(),
+        "sim_cache": cache.stats() if cache is not None else None,
+        "ngspice_pool": ngspice_stats(),
+        "subprocesses": proc_stats(),
+        "agents": agent_stats(),
+        "tool_memo": _TOOL_MEMO.stats(),
+        "chat_streams": dict(_STREAM_STATS),
+    }
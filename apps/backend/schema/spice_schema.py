@@ -2,6 +2,7 @@ from __future__ import annotations
 from typing import List, Optional, Dict, Union, Literal
 from enum import Enum
 from pydantic import BaseModel, Field
+from .spec_schema import Quantity
 
 
 # ============================================================
@@ -232,7 +233,8 @@ class KPIContract(BaseModel):
 class SpiceAutorunInput(BaseModel):
     """Input schema para spice_autorun tool.
 
-    El runtime sólo necesita: input_text, mode, probes, node_expr, from_fraction, timeout_s.
+    El runtime sólo necesita: input_text, mode, probes, node_expr, from_fraction, timeout_s, use_cache, output, backend,
+    summary_points, stop_at_steady_state y steady_rel_tol (más kpi_contract.targets para elegir las probes vigiladas).
     Todo lo demás son CONTRATOS/HINTS para el LLM: debe usarlos para construir un netlist SPICE correcto
     ANTES de invocar la tool real.
     """
@@ -265,6 +267,34 @@ class SpiceAutorunInput(BaseModel):
         ge=1,
         description="Timeout en segundos para la ejecución"
     )
+    use_cache: bool = Field(
+        default=True,
+        description="Reutiliza el resultado de una simulación idéntica (netlist, probes, from_fraction, versión de ngspice). False fuerza re-ejecución."
+    )
+    output: Literal["csv", "raw"] = Field(
+        default="csv",
+        description="Salida de las probes: 'csv' (un WRDATA de texto por probe) o 'raw' (un único rawfile binario de ngspice, más rápido en transitorios largos)."
+    )
+    backend: Literal["auto", "batch", "shared"] = Field(
+        default="auto",
+        description="Ejecución de ngspice: 'batch' (un proceso por simulación), 'shared' (pool de sesiones libngspice) o 'auto' (KORELIA_SPICE_BACKEND; shared si hay libngspice)."
+    )
+    summary_points: int = Field(
+        default=32,
+        ge=0,
+        le=512,
+        description="Cubetas de la envolvente min/max del resumen por probe (forma de onda, rizado, régimen permanente, settling, overshoot). 0 desactiva el resumen."
+    )
+    stop_at_steady_state: bool = Field(
+        default=False,
+        description="Sólo .tran: compara ciclo a ciclo las probes de kpi_contract (o todas) y detiene ngspice al llegar al régimen permanente (backend shared/libngspice). En batch se simula hasta tstop y sólo se indica dónde habría convergido. Resultado en 'steady' (converged_at)."
+    )
+    steady_rel_tol: float = Field(
+        default=0.005,
+        gt=0.0,
+        le=0.1,
+        description="Tolerancia relativa del régimen permanente (deriva de la media entre ciclos); los KPIs con min/max usan además 1/10 de su banda."
+    )
 
     # ------- Hints SOLO para el LLM (no los usa directamente el runtime) -------
     dialect: SpiceDialect = Field(
@@ -341,3 +371,65 @@ class SpiceAutorunInput(BaseModel):
         default=None,
         description="(Opcional) KPIs objetivo para guiar construcción de probes/análisis."
     )
+
+
+# ============================================================
+# NETLIST DETERMINISTA DESDE EL CIG (graph_emit_spice)
+# ============================================================
+
+class SpiceEmitInput(BaseModel):
+    """Input schema para graph_emit_spice: mismos contratos que spice_autorun, sin input_text (sale del grafo)."""
+
+    title: Optional[str] = Field(default=None, description="Línea de título del netlist.")
+    probes: List[str] = Field(
+        default_factory=list,
+        description="Probes a resolver contra el grafo (alias, i(...), v(Vsrc) -> v(n+,n-)); se devuelven listas para spice_autorun."
+    )
+    analyses: List[SpiceAnalysis] = Field(default_factory=list, description="Análisis (.op/.tran/.ac/.dc); si faltan, build_policy.analyses_default o .op.")
+    libraries: List[SpiceLibrary] = Field(default_factory=list, description="Librerías (.include) y modelos inline disponibles.")
+    device_map: SpiceDeviceMap = Field(default_factory=SpiceDeviceMap, description="Estrategia de trafos y modelos por defecto.")
+    options: Dict[str, str] = Field(default_factory=dict, description="Opciones .options (si faltan, build_policy.options_default).")
+    controls: List[str] = Field(default_factory=list, description="Líneas del bloque .control (si faltan, build_policy.controls_default).")
+    build_policy: Optional[BuildPolicy] = Field(default=None, description="Naming, modelos preferidos/fallback y defaults.")
+    component_hints: List[ComponentHint] = Field(default_factory=list, description="Modelo/subcircuito/roles/trafo por referencia.")
+    net_name_map: Dict[str, str] = Field(default_factory=dict, description="Mapeo lógico→real de nodos para las probes.")
+    aliases: List[SpiceAlias] = Field(default_factory=list, description="Alias de nodos/ramas/expresiones para las probes.")
+    source_intent: Optional[SourceIntent] = Field(default=None, description="Estímulo de las fuentes AC_In (SINE/DC/PWL).")
+    library_resolution: LibraryResolutionContract = Field(default_factory=LibraryResolutionContract)
+    control_contract: ControlBlockContract = Field(default_factory=ControlBlockContract)
+    probe_contract: ProbeContract = Field(default_factory=ProbeContract)
+
+
+# ============================================================
+# BARRIDOS PARAMÉTRICOS / MONTE CARLO (spice_sweep)
+# ============================================================
+
+class SpiceSweepInput(BaseModel):
+    """Input schema para spice_sweep: netlist base + grid y/o tolerancias + probes."""
+
+    input_text: str = Field(..., description="Netlist SPICE base (texto). Los parámetros barridos se sustituyen en él.")
+    grid: Dict[str, List[Union[float, str]]] = Field(
+        default_factory=dict,
+        description="Barrido en rejilla: {nombre: [valores]} -> producto cartesiano. Nombre de un .param (p.ej. 'rload') o referencia R/C/L (p.ej. 'C1'); valores numéricos o con sufijo SPICE ('10k')."
+    )
+    tolerances: Dict[str, Quantity] = Field(
+        default_factory=dict,
+        description="Monte Carlo: {nombre: {value, tol:{value, unit}}}; tol relativa si unit='%', absoluta en otro caso."
+    )
+    samples: int = Field(default=32, ge=1, description="Sorteos Monte Carlo por punto del grid (sólo si hay tolerances).")
+    distribution: Literal["gauss", "uniform"] = Field(
+        default="gauss",
+        description="Distribución de los sorteos: 'gauss' (tol = 3σ) o 'uniform' (dentro de ±tol)."
+    )
+    seed: int = Field(default=0, description="Semilla para reproducir los sorteos Monte Carlo.")
+    probes: List[str] = Field(default_factory=lambda: ["v(VOUT)"], description="Expresiones SPICE a medir en cada punto.")
+    from_fraction: float = Field(default=0.5, ge=0.0, lt=1.0, description="Fracción del tiempo desde la que se calculan métricas.")
+    timeout_s: int = Field(default=120, ge=1, description="Timeout por punto en segundos.")
+    use_cache: bool = Field(default=True, description="Reutiliza puntos ya simulados (caché de spice_autorun).")
+    output: Literal["csv", "raw"] = Field(default="raw", description="Salida de probes de cada punto (ver spice_autorun).")
+    backend: Literal["auto", "batch", "shared"] = Field(default="auto", description="Backend de ngspice de cada punto (ver spice_autorun).")
+    max_workers: Optional[int] = Field(
+        default=None, ge=1,
+        description="Simulaciones simultáneas como máximo (por defecto, el tamaño del pool: KORELIA_SWEEP_WORKERS o nº de CPUs)."
+    )
+    max_points: int = Field(default=500, ge=1, description="Límite de puntos; el barrido se rechaza si lo supera.")
@@ -0,0 +1,59 @@
+"""
+Benchmark del coste de preparar el agente por petición (no lo recoge pytest).
+
+    PYTHONPATH=. OPENAI_API_KEY=... python apps/backend/tests/bench_agent_setup.py [n_peticiones]
+
+Compara construir el agente en cada petición (create_agent con modelo y tools) con el agente compilado
+por proceso: warm-up al arrancar y coste por petición después (no llama a la API).
+"""
+import gc
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from langchain.agents import create_agent  # noqa: E402
+
+from apps.backend import agent as agent_mod  # noqa: E402
+
+
+def _per_request() -> object:
+    # lo que hacía cada /chat antes de la caché
+    return create_agent(
+        model=agent_mod.DEFAULT_AGENT_MODEL,
+        tools=[agent_mod._TOOL_REGISTRY[name] for name in agent_mod._PROCESS_TOOLS],
+        system_prompt=agent_mod.PROCESS_PROMPT,
+    )
+
+
+def _timed(fn, n: int) -> list:
+    out = []
+    for _ in range(n):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def main(n: int = 20) -> None:
+    _per_request()  # imports perezosos de langchain fuera de la medida
+    rebuild = _timed(_per_request, n)
+
+    t0 = time.perf_counter()
+    agent_mod.warm_agents([agent_mod.DEFAULT_AGENT_MODEL])
+    t_warm = time.perf_counter() - t0
+    cached = _timed(agent_mod.get_agent, n)
+
+    print(f"peticiones={n}")
+    print(f"create_agent por petición: mediana={statistics.median(rebuild) * 1e3:.1f}ms "
+          f"máx={max(rebuild) * 1e3:.1f}ms")
+    print(f"warm-up al arrancar={t_warm * 1e3:.1f}ms  por petición: mediana={statistics.median(cached) * 1e6:.1f}µs "
+          f"máx={max(cached) * 1e6:.1f}µs")
+    print(agent_mod.agent_stats())
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,69 @@
+"""
+Benchmark de memoria del backend compacto frente a GraphStore (no lo recoge pytest).
+
+    PYTHONPATH=. python apps/backend/tests/bench_compact_store.py [n_pins]
+
+Construye el mismo diseño (componentes de 2 pins con ids URN como los de Toolkit) en ambos
+backends vía ``apply_patch_batch`` y mide la memoria retenida con tracemalloc.
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from apps.backend.graph.store import GraphStore
+from apps.backend.graph.compact_store import CompactGraphStore
+from apps.backend.graph.patcher import apply_patch_batch
+from apps.backend.graph.engine import run_rulesets
+
+
+def _patch(n_pins: int):
+    n_cmp, n_nets = n_pins // 2, max(1, n_pins // 10)
+    ops = [{"op": "add_node", "node": {"id": f"urn:cig:net:N{i}", "type": "Net",
+                                       "props": {"type": None, "domain": None, "is_reference_ground": False},
+                                       "labels": ["CIG"]}} for i in range(n_nets)]
+    for i in range(n_cmp):
+        cid = f"urn:cig:cmp:R{i}"
+        ops.append({"op": "add_node", "node": {"id": cid, "type": "ComponentInstance",
+                                               "props": {"part_ref": None, "domain": None, "class": "Resistor"},
+                                               "labels": ["CIG"]}})
+        ops.append({"op": "update_node", "node": {"id": cid, "props": {"R": {"value": 10.0, "unit": "ohm"}}}})
+        for p, net in (("1", i % n_nets), ("2", (i * 7 + 1) % n_nets)):
+            pin = f"{cid}#pin:{p}"
+            ops.append({"op": "add_node", "node": {"id": pin, "type": "Pin",
+                                                   "props": {"name": p, "role": None}, "labels": ["CIG"]}})
+            ops.append({"op": "add_edge", "edge": {"id": f"{pin}__of", "type": "pinOf",
+                                                   "from": pin, "to": cid, "props": {}}})
+            ops.append({"op": "add_edge", "edge": {"id": f"{pin}__on__urn:cig:net:N{net}", "type": "onNet",
+                                                   "from": pin, "to": f"urn:cig:net:N{net}", "props": {}}})
+    return {"namespace": "CIG", "ops": ops}
+
+
+def _measure(factory, n_pins: int):
+    patch = _patch(n_pins)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    store = factory()
+    apply_patch_batch(store, patch)
+    t_apply = time.perf_counter() - t0
+    del patch
+    gc.collect()
+    mem = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    t0 = time.perf_counter()
+    res = run_rulesets(store, "bench", incremental=False, max_workers=1)
+    t_rules = time.perf_counter() - t0
+    return mem, t_apply, t_rules, len(res["violations"])
+
+
+def main(n_pins: int = 50_000) -> None:
+    for name, factory in (("networkx", GraphStore), ("compact", CompactGraphStore)):
+        mem, t_apply, t_rules, nv = _measure(factory, n_pins)
+        print(f"{name:9s} pins={n_pins} mem={mem / 2**20:7.1f} MiB ({mem / n_pins:6.0f} B/pin) "
+              f"apply={t_apply:.2f}s rules={t_rules:.3f}s violations={nv}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,103 @@
+"""
+Benchmark del índice de conectividad (no lo recoge pytest).
+
+    PYTHONPATH=. python apps/backend/tests/bench_connectivity.py [n_componentes] [n_nets]
+
+Compara una pasada completa de KCL + AntiIdealLoop con los helpers basados en
+recorrer in/out edges (implementación previa) frente a ``store.connectivity``.
+"""
+import sys
+import time
+from typing import Any, Optional, Set
+
+from apps.backend.graph import rulesets
+from apps.backend.graph.store import GraphStore
+from apps.backend.graph.engine import run_rulesets
+
+
+# ---------- Helpers previos (recorrido de edges) ----------
+
+def _scan_sources_to_net(store: GraphStore, net_id: str) -> Set[str]:
+    sources: Set[str] = set()
+    if net_id not in store.g:
+        return sources
+    for u, v, key in store.g.in_edges(net_id, keys=True):
+        if store.g.edges[u, v, key].get("type") == "onNet":
+            sources.add(u)
+    return sources
+
+def _scan_pins_of_component(store: GraphStore, cmp_id: str) -> Set[str]:
+    pins: Set[str] = set()
+    if cmp_id not in store.g:
+        return pins
+    for u, v, key in store.g.in_edges(cmp_id, keys=True):
+        if store.g.edges[u, v, key].get("type") == "pinOf":
+            pins.add(u)
+    return pins
+
+def _scan_net_of_terminal(store: GraphStore, terminal_node_id: str) -> Optional[str]:
+    if terminal_node_id not in store.g:
+        return None
+    for _, v, key in store.g.out_edges(terminal_node_id, keys=True):
+        if store.g.edges[terminal_node_id, v, key].get("type") == "onNet":
+            return v
+    return None
+
+
+# ---------- Diseño sintético ----------
+
+def build(n_cmp: int, n_nets: int) -> GraphStore:
+    s = GraphStore()
+    s.add_nodes_from((f"net:{i}", "Net", None, ["CIG"]) for i in range(n_nets))
+    nodes, edges = [], []
+    for i in range(n_cmp):
+        cid = f"cmp:C{i}"
+        cls = "IdealVoltageSource" if i % 50 == 0 else "Capacitor"
+        nodes.append((cid, "ComponentInstance", {"class": cls}, ["CIG"]))
+        for p, net in (("1", i % n_nets), ("2", (i * 7 + 1) % n_nets)):
+            pid = f"{cid}#pin:{p}"
+            nodes.append((pid, "Pin", {"name": p}, ["CIG"]))
+            edges.append((f"{pid}__of", "pinOf", pid, cid, None))
+            edges.append((f"{pid}__on__net:{net}", "onNet", pid, f"net:{net}", None))
+    s.add_nodes_from(nodes)
+    s.add_edges_from(edges)
+    return s
+
+
+def _full_pass(store: GraphStore) -> Any:
+    t0 = time.perf_counter()
+    res = run_rulesets(store, "bench", incremental=False,
+                       rules={"KCL": rulesets.KCL_RULE, "AntiIdealLoop": rulesets.ANTI_IDEAL_LOOP_RULE}, max_workers=1)
+    return time.perf_counter() - t0, res
+
+
+def main(n_cmp: int = 50_000, n_nets: int = 10_000) -> None:
+    t0 = time.perf_counter()
+    store = build(n_cmp, n_nets)
+    t_build = time.perf_counter() - t0
+    print(f"pins={2 * n_cmp} nets={n_nets} build={t_build:.2f}s (incluye mantenimiento del índice)")
+
+    t0 = time.perf_counter()
+    for u, v, _, d in store.g.edges(keys=True, data=True):
+        store.connectivity._add(d.get("type"), u, v)
+        store.connectivity._remove(d.get("type"), u, v)
+    print(f"coste del índice en el alta: ~{time.perf_counter() - t0:.2f}s para {store.g.number_of_edges()} edges")
+
+    t_idx, res_idx = _full_pass(store)
+
+    indexed = (rulesets._onnet_sources_to_net, rulesets._pins_of_component, rulesets._net_of_terminal)
+    rulesets._onnet_sources_to_net = _scan_sources_to_net
+    rulesets._pins_of_component = _scan_pins_of_component
+    rulesets._net_of_terminal = _scan_net_of_terminal
+    try:
+        t_scan, res_scan = _full_pass(store)
+    finally:
+        rulesets._onnet_sources_to_net, rulesets._pins_of_component, rulesets._net_of_terminal = indexed
+
+    assert len(res_idx["violations"]) == len(res_scan["violations"])
+    print(f"KCL+AntiIdealLoop: scan={t_scan:.3f}s index={t_idx:.3f}s "
+          f"speedup={t_scan / t_idx:.1f}x violations={len(res_idx['violations'])}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
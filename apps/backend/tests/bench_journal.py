@@ -0,0 +1,89 @@
+"""
+Benchmark de replay del journal persistente (no lo recoge pytest).
+
+    PYTHONPATH=. python apps/backend/tests/bench_journal.py [n_ops] [backend]
+
+Escribe un journal de ~n_ops ops (patches de netlist de 1000 ops), lo reproduce en un store
+nuevo y comprueba que el volcado coincide con el del store vivo. Después compacta y mide el
+replay desde snapshot.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from apps.backend.graph.store import GraphStore
+from apps.backend.graph.compact_store import CompactGraphStore
+from apps.backend.graph.patcher import apply_patch_batch
+from apps.backend.graph.journal import PatchJournal, dump_store
+
+
+def _patches(n_ops: int, ops_per_patch: int = 1000):
+    n_nets = max(2, n_ops // 70)
+    nets = [{"op": "add_node", "node": {"id": f"urn:cig:net:N{i}", "type": "Net", "props": {}, "labels": ["CIG"]}}
+            for i in range(n_nets)]
+    emitted, i, ops = len(nets), 0, list(nets)
+    while emitted < n_ops:
+        start = len(ops)
+        cid = f"urn:cig:cmp:R{i}"
+        ops.append({"op": "add_node", "node": {"id": cid, "type": "ComponentInstance",
+                                               "props": {"class": "Resistor"}, "labels": ["CIG"]}})
+        ops.append({"op": "update_node", "node": {"id": cid, "props": {"R": {"value": i, "unit": "ohm"}}}})
+        for p, net in (("1", i % n_nets), ("2", (i * 7 + 1) % n_nets)):
+            pin = f"{cid}#pin:{p}"
+            ops.append({"op": "add_node", "node": {"id": pin, "type": "Pin", "props": {"name": p}, "labels": ["CIG"]}})
+            ops.append({"op": "add_edge", "edge": {"id": f"{pin}__of", "type": "pinOf", "from": pin, "to": cid, "props": {}}})
+            ops.append({"op": "add_edge", "edge": {"id": f"{pin}__on", "type": "onNet", "from": pin,
+                                                   "to": f"urn:cig:net:N{net}", "props": {}}})
+        if i % 50 == 49:
+            ops.append({"op": "remove_edge", "id": f"urn:cig:cmp:R{i - 1}#pin:2__on"})
+        emitted += len(ops) - start
+        i += 1
+        if len(ops) >= ops_per_patch:
+            yield {"namespace": "CIG", "ops": ops}
+            ops = []
+    if ops:
+        yield {"namespace": "CIG", "ops": ops}
+
+
+def main(n_ops: int = 1_000_000, backend: str = "networkx") -> None:
+    factory = CompactGraphStore if backend == "compact" else GraphStore
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.jsonl")
+        live = factory()
+        journal = PatchJournal(path, compact_every=0, fsync=False)
+        journal.replay(live)
+        t0 = time.perf_counter()
+        total = 0
+        for patch in _patches(n_ops):
+            apply_patch_batch(live, patch)
+            journal.append(patch)
+            total += len(patch["ops"])
+        journal.close()
+        print(f"[{backend}] write+apply {total} ops: {time.perf_counter() - t0:.2f}s, "
+              f"journal={os.path.getsize(path) / 2**20:.1f} MiB")
+
+        rebuilt = factory()
+        t0 = time.perf_counter()
+        PatchJournal(path).replay(rebuilt)
+        print(f"[{backend}] replay JSONL: {time.perf_counter() - t0:.2f}s")
+        expected = dump_store(live)
+        assert dump_store(rebuilt) == expected, "replay no reconstruye el mismo store"
+        del rebuilt
+
+        journal.store = live
+        t0 = time.perf_counter()
+        journal.compact()
+        print(f"[{backend}] compact: {time.perf_counter() - t0:.2f}s, "
+              f"snapshot={os.path.getsize(path + '.snap') / 2**20:.1f} MiB")
+        rebuilt = factory()
+        t0 = time.perf_counter()
+        PatchJournal(path).replay(rebuilt)
+        print(f"[{backend}] replay snapshot: {time.perf_counter() - t0:.2f}s")
+        assert dump_store(rebuilt) == expected, "snapshot no reconstruye el mismo store"
+        print(f"[{backend}] OK: stores idénticos")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 1_000_000, args[1] if len(args) > 1 else "networkx")
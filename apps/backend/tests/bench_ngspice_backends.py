@@ -0,0 +1,62 @@
+"""
+Benchmark de simulaciones por segundo: ngspice batch (un proceso por run) frente al pool
+de sesiones libngspice (no lo recoge pytest).
+
+    PYTHONPATH=. python apps/backend/tests/bench_ngspice_backends.py [runs] [pool_size]
+
+Simula ``runs`` veces un RC pequeño (el caso en el que el arranque domina) por cada backend
+disponible, sin caché. Los backends que falten (binario ``ngspice`` o libngspice) se saltan.
+"""
+import json
+import os
+import sys
+import time
+
+from apps.backend.tools import ngspice_shared as ns
+from apps.backend.tools.run_tools import spice_autorun, _resolve_ngspice
+from apps.backend.schema.spice_schema import SpiceAutorunInput
+
+
+NETLIST = """* RC step
+V1 in 0 PULSE(0 1 0 1n 1n 5u 10u)
+R1 in out 1k
+C1 out 0 1n
+.tran 10n 100u
+.end
+"""
+
+
+def _bench(backend: str, runs: int) -> float:
+    inp = SpiceAutorunInput(input_text=NETLIST, probes=["v(out)", "v(in)"], use_cache=False, backend=backend)
+    first = json.loads(spice_autorun.invoke({"input_data": inp}))  # arranque / calentamiento
+    want = "ngspice_shared" if backend == "shared" else "ngspice_wrdata"
+    if first.get("method") != want or first.get("returncode") != 0:
+        raise RuntimeError(f"{backend}: ejecución fallida: {first.get('error') or first.get('log_tail', '')[-500:]}")
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        json.loads(spice_autorun.invoke({"input_data": inp}))
+    return runs / (time.perf_counter() - t0)
+
+
+def main(runs: int = 200, pool_size: int = 1) -> None:
+    os.environ["KORELIA_SIM_CACHE"] = "0"
+    os.environ["KORELIA_NGSPICE_POOL_SIZE"] = str(pool_size)
+    rates = {}
+    if _resolve_ngspice():
+        rates["batch"] = _bench("batch", runs)
+        print(f"batch : {rates['batch']:8.1f} runs/s")
+    else:
+        print("batch : ngspice no encontrado, se omite")
+    lib = ns.find_libngspice()
+    if lib:
+        rates["shared"] = _bench("shared", runs)
+        print(f"shared: {rates['shared']:8.1f} runs/s  ({lib}, pool={pool_size})")
+        print(ns.ngspice_stats())
+    else:
+        print("shared: libngspice no encontrada (NGSPICE_LIBRARY), se omite")
+    if len(rates) == 2:
+        print(f"speedup shared/batch: {rates['shared'] / rates['batch']:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
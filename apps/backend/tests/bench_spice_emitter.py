@@ -0,0 +1,75 @@
+"""
+Benchmark del emisor SPICE desde el CIG (no lo recoge pytest).
+
+    PYTHONPATH=. python apps/backend/tests/bench_spice_emitter.py [n_componentes] [n_nets]
+
+Emisión en frío, repetición con la misma versión (caché) y re-emisión tras tocar un componente
+(sólo se regenera ese dispositivo).
+"""
+import gc
+import sys
+import time
+
+from apps.backend.graph.store import GraphStore
+from apps.backend.schema.spice_schema import SpiceAnalysis, SpiceEmitInput
+from apps.backend.tools.spice_emitter import emit_spice
+
+
+_CLASSES = (("Resistor", "R", {"value": 10, "unit": "kOhm"}), ("Capacitor", "C", {"value": 100, "unit": "nF"}),
+            ("Inductor", "L", {"value": 4.7, "unit": "uH"}), ("Diode", "D", None))
+
+
+def build(n_cmp: int, n_nets: int) -> GraphStore:
+    s = GraphStore()
+    s.add_node("urn:cig:net:GND", "Net", {"type": "GROUND", "is_reference_ground": True}, ["CIG"])
+    s.add_nodes_from((f"urn:cig:net:N{i}", "Net", {"type": "SIGNAL"}, ["CIG"]) for i in range(1, n_nets))
+    nodes, edges = [], []
+    for i in range(n_cmp):
+        cls, letter, value = _CLASSES[i % len(_CLASSES)]
+        cid = f"urn:cig:cmp:{letter}{i}"
+        props = {"class": cls}
+        if value:
+            props[letter] = value
+        nodes.append((cid, "ComponentInstance", props, ["CIG"]))
+        for p, role, net in (("1", "A", i % n_nets), ("2", "K", (i * 7 + 1) % n_nets)):
+            pid = f"{cid}#pin:{p}"
+            net_id = "urn:cig:net:GND" if net == 0 else f"urn:cig:net:N{net}"
+            nodes.append((pid, "Pin", {"name": p, "role": role}, ["CIG"]))
+            edges.append((f"{pid}__of", "pinOf", pid, cid, None))
+            edges.append((f"{pid}__on__{net_id}", "onNet", pid, net_id, None))
+    s.add_nodes_from(nodes)
+    s.add_edges_from(edges)
+    return s
+
+
+def main(n_cmp: int = 10_000, n_nets: int = 2_000) -> None:
+    store = build(n_cmp, n_nets)
+    spec = SpiceEmitInput(probes=["v(N1)", "i(R0)"],
+                          analyses=[SpiceAnalysis(kind="tran", params={"tstop": "1m"})])
+
+    # cada medida empieza sin colecciones pendientes del paso anterior
+    gc.collect()
+    t0 = time.perf_counter()
+    res = emit_spice(store, spec)
+    t_cold = time.perf_counter() - t0
+    assert res["ok"], res["errors"][:3]
+
+    gc.collect()
+    t0 = time.perf_counter()
+    hit = emit_spice(store, spec)
+    t_hit = time.perf_counter() - t0
+    assert hit["cache"]["hit"] and hit["netlist"] == res["netlist"]
+
+    store.update_node("urn:cig:cmp:R0", {"R": {"value": 22, "unit": "kOhm"}})
+    gc.collect()
+    t0 = time.perf_counter()
+    inc = emit_spice(store, spec)
+    t_inc = time.perf_counter() - t0
+    assert "R0 0 N1 22k" in inc["netlist"]
+
+    print(f"componentes={n_cmp} nets={n_nets} líneas={res['stats']['lines']}")
+    print(f"frío={t_cold * 1e3:.1f}ms caché={t_hit * 1e3:.3f}ms tras 1 cambio={t_inc * 1e3:.1f}ms")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
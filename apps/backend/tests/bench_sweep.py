@@ -0,0 +1,85 @@
+"""
+Benchmark de escalado de spice_sweep con el número de workers (no lo recoge pytest).
+
+    PYTHONPATH=. python apps/backend/tests/bench_sweep.py [points] [max_workers]
+
+Barre ``points`` valores de la carga de un buck conmutado (``.tran`` corto, sin caché) con
+1, 2, 4... hasta ``max_workers`` procesos (por defecto, nº de CPUs) y muestra puntos/s, speedup
+y eficiencia. Si no hay ngspice en el PATH (ni ``NGSPICE``) usa un simulador falso que quema
+~50 ms de CPU por punto, para medir sólo el reparto del pool.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from apps.backend.tests.conftest import write_fake_ngspice
+from apps.backend.tools.sweep import close_sweep_pool, run_sweep
+from apps.backend.tools.run_tools import _resolve_ngspice
+from apps.backend.schema.spice_schema import SpiceSweepInput
+
+
+NETLIST = """* buck sweep
+.param rload=5
+V1 in 0 DC 12
+S1 in sw ctl 0 SW1
+.model SW1 SW(Ron=10m Roff=1Meg Vt=0.5)
+Vctl ctl 0 PULSE(0 1 0 10n 10n 4u 10u)
+D1 0 sw DMOD
+.model DMOD D(Is=1e-9 Rs=10m)
+L1 sw out 22u
+C1 out 0 47u
+R1 out 0 {rload}
+.tran 10n 500u
+.end
+"""
+
+_FAKE = """import re, sys, time
+if sys.argv[1:] == ["-v"]:
+    print("** ngspice-42 : fake"); sys.exit(0)
+log, net = sys.argv[sys.argv.index("-o") + 1], sys.argv[-1]
+t0 = time.process_time()
+while time.process_time() - t0 < 0.05:
+    pass
+for path in re.findall(r'wrdata "([^"]+)"', open(net).read()):
+    open(path, "w").write("".join(f"{i * 1e-6} {i}\\n" for i in range(500)))
+open(log, "w").write("")
+"""
+
+
+def main(points: int = 64, max_workers: int = 0) -> None:
+    os.environ["KORELIA_SIM_CACHE"] = "0"
+    max_workers = max_workers or os.cpu_count() or 1
+    os.environ["KORELIA_SWEEP_WORKERS"] = str(max_workers)
+    tmp = None
+    if not _resolve_ngspice():
+        tmp = tempfile.mkdtemp()
+        os.environ["NGSPICE"] = write_fake_ngspice(tmp, _FAKE)
+        print("ngspice no encontrado: simulador falso (50 ms de CPU por punto)")
+    grid = {"rload": [1.0 + 0.25 * i for i in range(points)]}
+    spec = dict(input_text=NETLIST, grid=grid, probes=["v(out)", "i(L1)"], use_cache=False,
+                output="csv", backend="batch")
+    print(f"CPUs: {os.cpu_count()}  puntos: {points}")
+    try:
+        run_sweep(SpiceSweepInput(**dict(spec, grid={"rload": [1.0]})))  # arranque de los workers
+        base = None
+        workers = 1
+        while True:
+            t0 = time.perf_counter()
+            res = run_sweep(SpiceSweepInput(**spec, max_workers=workers))
+            rate = points / (time.perf_counter() - t0)
+            base = base or rate
+            print(f"workers={workers:3d}  {rate:8.1f} puntos/s  speedup {rate / base:5.2f}x  "
+                  f"eficiencia {rate / base / workers:5.0%}  ok={res['ok']}/{res['points']}")
+            if workers >= max_workers:
+                break
+            workers = min(workers * 2, max_workers)
+    finally:
+        close_sweep_pool()
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
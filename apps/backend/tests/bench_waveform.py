@@ -0,0 +1,96 @@
+"""
+Benchmark del post-proceso de WRDATA (no lo recoge pytest).
+
+    PYTHONPATH=. python apps/backend/tests/bench_waveform.py [rows] [probes]
+
+Genera un ``v_vout.csv`` de ``rows`` filas (5M por defecto) con paso de tiempo variable, como
+el de un ``.tran`` largo de ngspice, y compara el bucle Python anterior (``split``/``float``)
+con la carga vectorizada y las métricas ponderadas por tiempo de ``tools/waveform.py``.
+Mide también el resumen de tamaño fijo (``summarize``). Después compara la salida CSV (un fichero por probe, cada uno con su columna de tiempo) con un
+único rawfile binario de ``probes`` vectores leído con memmap.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from apps.backend.tools.waveform import RawFile, Waveform, load_wrdata, summarize, window_metrics, write_rawfile
+
+
+def _legacy_metrics(path: str, frac: float):
+    """Implementación anterior de ``_metrics_from_csv`` (línea a línea, sin ponderar)."""
+    ys = []
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) >= 2:
+                try:
+                    float(parts[0])
+                    ys.append(float(parts[1]))
+                except Exception:
+                    continue
+    n0 = int(len(ys) * frac)
+    yw = ys[n0:]
+    n = len(yw)
+    return {"avg": sum(yw) / n, "rms": (sum(v * v for v in yw) / n) ** 0.5, "p2p": max(yw) - min(yw)}
+
+
+def _write_tran(path: str, rows: int) -> None:
+    rng = np.random.default_rng(0)
+    # paso fino en las conmutaciones de un PWM de 100 kHz, grueso en los tramos planos
+    dt = np.where(rng.random(rows) < 0.2, 1e-9, 5e-8)
+    t = np.cumsum(dt)
+    v = 12.0 + 0.05 * np.sin(2 * np.pi * 1e5 * t) + np.where((t * 1e5) % 1.0 < 0.5, 0.5, 0.0)
+    # mismo formato que WRDATA (``% e``: ancho fijo, espacio en lugar del signo positivo)
+    np.savetxt(path, np.column_stack((t, v)), fmt="% .15e", delimiter=" ")
+
+
+def main(rows: int = 5_000_000, probes: int = 4, frac: float = 0.5) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "v_vout.csv")
+        t0 = time.perf_counter()
+        _write_tran(path, rows)
+        print(f"generado {rows} filas ({os.path.getsize(path) / 2**20:.0f} MiB) en {time.perf_counter() - t0:.1f}s")
+
+        t0 = time.perf_counter()
+        old = _legacy_metrics(path, frac)
+        t_old = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        x, y = load_wrdata(path)
+        t_load = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        new = window_metrics(x, y, frac)
+        t_metrics = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        summary = summarize(x, y, frac)
+        t_summary = time.perf_counter() - t0
+
+        raw_path = os.path.join(tmp, "probes.raw")
+        write_rawfile(raw_path, "Transient Analysis", "time", x, [(f"v(n{i})", y + i) for i in range(probes)])
+        csv_bytes = os.path.getsize(path) * probes
+        raw_bytes = os.path.getsize(raw_path)
+        t0 = time.perf_counter()
+        for _ in range(probes):
+            window_metrics(*load_wrdata(path), frac)
+        t_csv = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        raw = RawFile(raw_path)
+        for i in range(probes):
+            Waveform(f"v(n{i})", raw_path, raw).metrics(frac)
+        t_raw = time.perf_counter() - t0
+
+    print(f"legacy   : {t_old:6.2f}s  avg={old['avg']:.6f} rms={old['rms']:.6f}")
+    print(f"waveform : {t_load + t_metrics:6.2f}s  (carga {t_load:.2f}s, métricas {t_metrics:.3f}s)  "
+          f"avg={new['avg']:.6f} rms={new['rms']:.6f}")
+    print(f"speedup  : {t_old / (t_load + t_metrics):.1f}x")
+    print(f"summary  : {t_summary:6.2f}s  ripple={summary['ripple_hz']:.0f} Hz steady={summary['steady_state']} "
+          f"({len(str(summary))} caracteres)")
+    print(f"{probes} probes csv : {t_csv:6.2f}s  {csv_bytes / 2**20:6.0f} MiB")
+    print(f"{probes} probes raw : {t_raw:6.2f}s  {raw_bytes / 2**20:6.0f} MiB  ({t_csv / t_raw:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
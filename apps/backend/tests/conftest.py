@@ -0,0 +1,94 @@
+"""
+Fixtures compartidas de los tests de simulación: ngspice falsos instalados como ``NGSPICE``.
+
+Todos fuerzan ``KORELIA_SPICE_BACKEND=batch`` y un pool libngspice vacío, para que el binario falso
+sea el que se ejecuta aunque la máquina tenga libngspice (la imagen Docker define ``NGSPICE_LIBRARY``).
+Los tests del backend compartido lo piden explícitamente con ``backend="shared"``.
+"""
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+from apps.backend.tools import ngspice_shared as ns
+from apps.backend.tools import sim_cache as sim_cache_mod
+from apps.backend.tools.sim_cache import SimCache
+
+
+# ngspice mínimo: escribe cada WRDATA como CSV de dos columnas, cada write como rawfile binario
+# y un log con una medida; cuenta las llamadas en <log>.calls
+FAKE_NGSPICE = textwrap.dedent("""\
+    import re, struct, sys
+    if sys.argv[1:] == ["-v"]:
+        print("******\\n** ngspice-42 : fake\\n******")
+        sys.exit(0)
+    log, net = sys.argv[sys.argv.index("-o") + 1], sys.argv[-1]
+    with open(log + ".calls", "a") as f:
+        f.write("run\\n")
+    for path in re.findall(r'wrdata "([^"]+)"', open(net).read()):
+        with open(path, "w") as f:
+            f.write("".join(f"{i * 1e-4} {i}\\n" for i in range(10)))
+    for path, exprs in re.findall(r'write "([^"]+)" (.+)', open(net).read()):
+        names = ["time"] + exprs.split()
+        head = ["Title: fake", "Plotname: Transient Analysis", "Flags: real",
+                f"No. Variables: {len(names)}", "No. Points: 10", "Variables:"]
+        head += [f"\\t{i}\\t{n}\\tvoltage" for i, n in enumerate(names)]
+        with open(path, "wb") as f:
+            f.write(("\\n".join(head) + "\\nBinary:\\n").encode())
+            for i in range(10):
+                f.write(struct.pack(f"<{len(names)}d", i * 1e-4, *[float(i)] * (len(names) - 1)))
+    with open(log, "w") as f:
+        f.write("vmax = 9.0\\n")
+""")
+
+
+def write_fake_ngspice(directory: str, source: str) -> str:
+    """Escribe ``source`` como ejecutable ``ngspice`` (con el intérprete actual) y devuelve su ruta."""
+    path = os.path.join(directory, "ngspice")
+    with open(path, "w") as f:
+        f.write(f"#!{sys.executable}\n" + source)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+@pytest.fixture
+def install_ngspice(tmp_path, monkeypatch):
+    """Instala el script dado como ``NGSPICE`` (backend batch, pool libngspice nuevo) y devuelve su ruta."""
+    monkeypatch.setattr(ns, "_POOL", None)
+
+    def install(source: str = FAKE_NGSPICE) -> str:
+        path = write_fake_ngspice(str(tmp_path), source)
+        # los workers de los barridos (spawn) heredan el entorno
+        monkeypatch.setenv("NGSPICE", path)
+        monkeypatch.setenv("KORELIA_SPICE_BACKEND", "batch")
+        return path
+
+    yield install
+    if ns._POOL is not None:
+        ns._POOL.close()
+
+
+@pytest.fixture
+def sim_cache(tmp_path, monkeypatch):
+    """Caché de simulaciones propia del test, en ``tmp_path/cache``."""
+    cache = SimCache(str(tmp_path / "cache"))
+    monkeypatch.setattr(sim_cache_mod, "_CACHE", cache)
+    return cache
+
+
+@pytest.fixture
+def fake_ngspice(install_ngspice, sim_cache):
+    """ngspice falso (``FAKE_NGSPICE``) con caché propia; devuelve la caché."""
+    install_ngspice()
+    return sim_cache
+
+
+@pytest.fixture
+def batch_only(tmp_path, monkeypatch, install_ngspice):
+    """ngspice batch falso, sin caché y con un pool nuevo en cada test."""
+    install_ngspice()
+    monkeypatch.setenv("KORELIA_SIM_CACHE", "0")
+    monkeypatch.setattr(sim_cache_mod, "_CACHE", None)
+    return tmp_path
@@ -0,0 +1,74 @@
+"""Tests del agente compilado por proceso (caché por modelo y tools, warm-up al arrancar y pool HTTP compartido)."""
+import asyncio
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from apps.backend import agent as agent_mod  # noqa: E402
+from apps.backend import main  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(agent_mod, "_AGENTS", {})
+    monkeypatch.setattr(agent_mod, "_HTTP", {})
+    monkeypatch.setattr(agent_mod, "_AGENT_STATS", {"builds": 0, "hits": 0, "build_s": 0.0})
+
+
+def test_agent_is_built_once_per_model_and_tool_set():
+    a = agent_mod.get_agent()
+    assert agent_mod.get_agent() is a
+    assert agent_mod.get_agent("gpt-4o-mini") is not a
+    small = agent_mod.get_agent(tools=("spice_autorun",))
+    assert small is not a and agent_mod.get_agent(tools=["spice_autorun"]) is small
+    assert agent_mod.create_agent_graph() is agent_mod.get_agent("gpt-4o-mini")
+    stats = agent_mod.agent_stats()
+    assert stats["agents"] == 3 and stats["builds"] == 3 and stats["hits"] == 4
+
+
+def test_graph_model_comes_from_env(monkeypatch):
+    monkeypatch.setenv("KORELIA_GRAPH_MODEL", "gpt-5-mini")
+    assert agent_mod.create_agent_graph() is agent_mod.get_agent("gpt-5-mini")
+    assert agent_mod.agent_stats()["builds"] == 1
+
+
+def test_models_share_one_http_pool():
+    sync_client, async_client = agent_mod._http_clients()
+    llm = agent_mod._chat_model("gpt-5-mini")
+    other = agent_mod._chat_model("gpt-4o-mini")
+    assert agent_mod._http_clients() == (sync_client, async_client)
+    assert llm.root_client._client is other.root_client._client is sync_client
+    assert llm.root_async_client._client is async_client
+
+
+def test_startup_warms_agents_and_shutdown_releases_pool(monkeypatch):
+    monkeypatch.setenv("KORELIA_AGENT_WARMUP", "gpt-5-mini, gpt-4o-mini")
+    with TestClient(main.app) as client:
+        stats = client.get("/metrics").json()["agents"]
+        assert stats["builds"] == 2 and stats["http_pool"]
+        # la primera petición ya encuentra el agente compilado
+        agent_mod.get_agent()
+        assert agent_mod.agent_stats()["builds"] == 2
+    assert agent_mod.agent_stats()["agents"] == 0 and not agent_mod._HTTP
+
+
+def test_empty_warmup_list_skips_build(monkeypatch):
+    monkeypatch.setenv("KORELIA_AGENT_WARMUP", "")
+    agent_mod.warm_agents()
+    assert agent_mod.agent_stats()["builds"] == 0
+
+
+def test_shutdown_drops_the_cached_base_llm(monkeypatch):
+    monkeypatch.delitem(vars(agent_mod), "llm_base", raising=False)
+    llm = agent_mod.llm_base
+    assert llm.root_client._client is agent_mod._http_clients()[0]
+    asyncio.run(agent_mod.close_http_clients())
+    assert "llm_base" not in vars(agent_mod)
+    # se recrea sobre el pool nuevo, no sobre los clientes cerrados
+    fresh = agent_mod.llm_base
+    assert fresh is not llm and not fresh.root_client._client.is_closed
+    asyncio.run(agent_mod.close_http_clients())
@@ -0,0 +1,126 @@
+"""Tests de la ejecución asíncrona de subprocesos y de las variantes async de las tools EDA."""
+import asyncio
+import json
+import os
+import stat
+import subprocess
+import sys
+import time
+
+import pytest
+
+from apps.backend.tools.async_exec import proc_stats, run_async
+from apps.backend.tools.run_tools import kicad_cli_exec, spice_autorun
+from apps.backend.schema.spice_schema import SpiceAutorunInput
+from apps.backend.tests.test_sim_cache import NETLIST
+
+posix_only = pytest.mark.skipif(os.name != "posix", reason="grupos de procesos POSIX")
+
+# padre que deja un nieto vivo (como un snippet que lanza ngspice) y se queda esperando
+_SPAWNER = (
+    "import subprocess, sys, time\n"
+    "p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+    "open(sys.argv[1], 'w').write(str(p.pid))\n"
+    "time.sleep(60)\n"
+)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # un zombi (ya muerto, sin recoger por su padre) cuenta como muerto
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except OSError:
+        return True
+
+
+def _wait_dead(pid: int, timeout: float = 5.0) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if not _alive(pid):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_run_async_returns_completed_process():
+    r = asyncio.run(run_async([sys.executable, "-c", "import sys; print('ok'); sys.exit(3)"], "spice", 10))
+    assert (r.returncode, r.stdout.strip()) == (3, "ok")
+
+
+@posix_only
+def test_timeout_kills_whole_process_group(tmp_path):
+    pidfile = tmp_path / "child.pid"
+    with pytest.raises(subprocess.TimeoutExpired):
+        asyncio.run(run_async([sys.executable, "-c", _SPAWNER, str(pidfile)], "spice", 1.0))
+    assert _wait_dead(int(pidfile.read_text()))
+    assert proc_stats()["spice"]["timeouts"] >= 1
+
+
+@posix_only
+def test_cancel_kills_whole_process_group(tmp_path):
+    pidfile = tmp_path / "child.pid"
+
+    async def main():
+        task = asyncio.create_task(run_async([sys.executable, "-c", _SPAWNER, str(pidfile)], "kicad", 30))
+        while not pidfile.exists() or not pidfile.read_text():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert _wait_dead(int(pidfile.read_text()))
+
+
+def test_concurrency_is_limited_per_tool_type(monkeypatch):
+    monkeypatch.setenv("KORELIA_KICAD_CONCURRENCY", "1")
+    cmd = [sys.executable, "-c", "import time; time.sleep(0.4)"]
+
+    async def main():
+        t0 = time.perf_counter()
+        # dos kicad se serializan; el de spice no espera a ninguno
+        spice = asyncio.create_task(run_async(cmd, "spice", 10))
+        await asyncio.gather(run_async(cmd, "kicad", 10), run_async(cmd, "kicad", 10))
+        kicad_elapsed = time.perf_counter() - t0
+        await spice
+        return kicad_elapsed
+
+    assert asyncio.run(main()) >= 0.8
+
+
+def test_spice_autorun_ainvoke_matches_invoke(fake_ngspice):
+    inp = SpiceAutorunInput(input_text=NETLIST, probes=["v(out)"], use_cache=False)
+    sync = json.loads(spice_autorun.invoke({"input_data": inp}))
+    res = json.loads(asyncio.run(spice_autorun.ainvoke({"input_data": inp})))
+    assert res["returncode"] == sync["returncode"] == 0
+    assert res["method"] == sync["method"] == "ngspice_wrdata"
+    assert res["probes"][0]["metrics"] == sync["probes"][0]["metrics"]
+    assert res["measures"] == {"vmax": 9.0}
+
+
+def test_netlist_run_is_bounded_by_timeout(install_ngspice):
+    install_ngspice("import sys, time\nif sys.argv[1:] == ['-v']: sys.exit(0)\ntime.sleep(30)\n")
+    inp = SpiceAutorunInput(input_text=NETLIST, probes=["v(out)"], use_cache=False, timeout_s=1)
+    t0 = time.perf_counter()
+    res = json.loads(asyncio.run(spice_autorun.ainvoke({"input_data": inp})))
+    assert res["error"] == "Timeout after 1s"
+    res = json.loads(spice_autorun.invoke({"input_data": inp}))
+    assert res["error"] == "Timeout after 1s"
+    assert time.perf_counter() - t0 < 10
+
+
+def test_kicad_cli_exec_async_and_timeout(tmp_path, monkeypatch):
+    script = tmp_path / "kicad-cli"
+    script.write_text(f"#!{sys.executable}\nimport sys, time\nprint(' '.join(sys.argv[1:]))\n"
+                      "if 'slow' in sys.argv: time.sleep(30)\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("KICAD_CLI", str(script))
+    res = json.loads(asyncio.run(kicad_cli_exec.ainvoke({"args_json": '["sch", "export"]'})))
+    assert (res["returncode"], res["stdout"].strip()) == (0, "sch export")
+    res = json.loads(kicad_cli_exec.invoke({"args_json": '["slow"]', "timeout_s": "1"}))
+    assert res["error"] == "kicad-cli timeout > 1s"
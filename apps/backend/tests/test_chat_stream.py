@@ -0,0 +1,122 @@
+"""Tests del streaming SSE de /chat (frames, agrupación de tokens, errores y cancelación al desconectarse)."""
+import asyncio
+import json
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from apps.backend import main  # noqa: E402
+
+
+def _frames(body: str):
+    out = []
+    for block in body.split("\n\n"):
+        if not block or block.startswith(":"):
+            continue
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+
+def _post(monkeypatch, events):
+    async def fake(task, thread_id=None):
+        assert task == "diseña un buck"
+        for ev in events:
+            if isinstance(ev, Exception):
+                raise ev
+            yield ev
+
+    monkeypatch.setattr(main, "run_single_agent_workflow_astream", fake)
+    client = TestClient(main.app)
+    resp = client.post("/chat", json={"messages": [{"role": "user", "content": "diseña un buck"}]})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    assert resp.headers["x-accel-buffering"] == "no"
+    return _frames(resp.text)
+
+
+def test_chat_streams_sse_frames_and_coalesces_queued_tokens(monkeypatch):
+    frames = _post(monkeypatch, [
+        {"type": "token", "text": "Hola"}, {"type": "token", "text": ", "}, {"type": "token", "text": "buck"},
+        {"type": "step", "step": "tools", "content": "{\"ok\": true}"},
+        {"type": "progress", "tool": "spice_sweep", "done": 1, "total": 4},
+        {"type": "token", "text": "listo"},
+    ])
+    kinds = [k for k, _ in frames]
+    assert kinds[0] == "start" and kinds[-1] == "end"
+    # los tokens que ya estaban en la cola salen juntos; nunca se reordenan respecto a los pasos
+    text = "".join(d["text"] for k, d in frames if k == "token")
+    assert text == "Hola, bucklisto"
+    assert kinds.index("step") < kinds.index("progress") < len(kinds) - 2
+    assert ("step", {"type": "step", "step": "tools", "content": "{\"ok\": true}"}) in frames
+
+
+def test_agent_failure_becomes_error_event(monkeypatch):
+    frames = _post(monkeypatch, [{"type": "token", "text": "a"}, RuntimeError("boom")])
+    assert [k for k, _ in frames] == ["start", "token", "error", "end"]
+    assert frames[2][1]["message"] == "boom"
+    assert main.metrics()["chat_streams"]["errors"] >= 1
+
+
+class _GoneRequest:
+    async def is_disconnected(self):
+        return True
+
+
+def test_client_disconnect_cancels_agent_run():
+    state = {"closed": False, "cancelled": False}
+
+    async def hanging():
+        try:
+            yield {"type": "token", "text": "a"}
+            await asyncio.sleep(3600)
+            yield {"type": "token", "text": "never"}
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        finally:
+            state["closed"] = True
+
+    async def run():
+        before = dict(main._STREAM_STATS)
+        frames = [f async for f in main._sse_stream(_GoneRequest(), hanging(), heartbeat_s=0.05)]
+        return before, frames
+
+    before, frames = asyncio.run(run())
+    assert frames[0].startswith("event: start") and frames[1].startswith("event: token")
+    assert not any(f.startswith("event: end") for f in frames)
+    assert state == {"closed": True, "cancelled": True}
+    assert main._STREAM_STATS["cancelled"] == before["cancelled"] + 1
+    assert main._STREAM_STATS["active"] == before["active"]
+
+
+def test_slow_client_bounds_the_buffer():
+    produced = []
+
+    async def fast():
+        for i in range(1000):
+            produced.append(i)
+            yield {"type": "step", "step": str(i)}
+
+    async def run():
+        gen = main._sse_stream(_GoneRequest(), fast(), maxsize=8, heartbeat_s=5)
+        await gen.__anext__()  # start
+        await gen.__anext__()
+        await asyncio.sleep(0.05)
+        # el productor se queda bloqueado con la cola llena en vez de consumir el agente entero
+        seen = len(produced)
+        await gen.aclose()
+        return seen
+
+    seen = asyncio.run(run())
+    assert seen <= 8 + 3
+    assert len(produced) < 1000
+
+
+def test_sse_frame_escapes_newlines():
+    data = {"text": "ñ\n\nfin"}
+    frame = main._sse("token", data)
+    assert frame.count("\n\n") == 1 and frame.endswith("\n\n")
+    assert json.loads(frame.split("data: ", 1)[1]) == data
@@ -0,0 +1,173 @@
+"""Tests del checkpointer SQLite (WAL): historial por hilo, reanudación tras un corte y escrituras agrupadas."""
+import asyncio
+import operator
+import os
+import sqlite3
+import threading
+from typing import Annotated, List, TypedDict
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from langchain_core.messages import AIMessage, ToolMessage  # noqa: E402
+from langgraph.graph import END, START, MessagesState, StateGraph  # noqa: E402
+
+from apps.backend import agent as agent_mod  # noqa: E402
+from apps.backend.checkpointer import SqliteCheckpointer  # noqa: E402
+
+
+class _State(TypedDict):
+    log: Annotated[List[str], operator.add]
+
+
+def _graph(saver, calls, fail):
+    """spec -> (sim_a || sim_b) -> report; ``fail`` contiene los nodos que fallan en la próxima ejecución."""
+    def node(name):
+        def run(state):
+            calls.append(name)
+            if name in fail:
+                fail.discard(name)
+                raise RuntimeError(f"{name} cortado")
+            return {"log": [name]}
+        return run
+
+    g = StateGraph(_State)
+    for name in ("spec", "sim_a", "sim_b", "report"):
+        g.add_node(name, node(name))
+    g.add_edge(START, "spec")
+    g.add_edge("spec", "sim_a")
+    g.add_edge("spec", "sim_b")
+    g.add_edge(["sim_a", "sim_b"], "report")
+    g.add_edge("report", END)
+    return g.compile(checkpointer=saver)
+
+
+def test_wal_mode_and_history_per_thread(tmp_path):
+    saver = SqliteCheckpointer(str(tmp_path / "cp.db"))
+    calls = []
+    graph = _graph(saver, calls, set())
+    cfg = {"configurable": {"thread_id": "t1"}}
+    assert sorted(graph.invoke({"log": []}, cfg)["log"][:1]) == ["spec"]
+    other = graph.invoke({"log": ["x"]}, {"configurable": {"thread_id": "t2"}})
+    assert other["log"][0] == "x"
+
+    assert sqlite3.connect(saver.path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    history = list(graph.get_state_history(cfg))
+    assert history[0].values["log"][-1] == "report" and not history[0].next
+    assert [s.metadata["step"] for s in history] == sorted((s.metadata["step"] for s in history), reverse=True)
+    assert len(list(saver.list(cfg, limit=2))) == 2
+    assert {t.config["configurable"]["thread_id"] for t in saver.list(None)} == {"t1", "t2"}
+    assert [t.metadata["source"] for t in saver.list(cfg, filter={"source": "input"})] == ["input"]
+
+    saver.delete_thread("t2")
+    assert saver.get_tuple({"configurable": {"thread_id": "t2"}}) is None
+    assert saver.get_tuple(cfg) is not None
+
+
+def test_interrupted_run_resumes_from_last_completed_step(tmp_path):
+    path = str(tmp_path / "cp.db")
+    calls = []
+    with pytest.raises(RuntimeError):
+        _graph(SqliteCheckpointer(path), calls, {"sim_b"}).invoke({"log": []}, {"configurable": {"thread_id": "s"}})
+    assert sorted(calls) == ["sim_a", "sim_b", "spec"]
+
+    # "reinicio del worker": checkpointer nuevo sobre el mismo fichero
+    calls.clear()
+    graph = _graph(SqliteCheckpointer(path), calls, set())
+    cfg = {"configurable": {"thread_id": "s"}}
+    assert graph.get_state(cfg).next == ("sim_b",)  # sim_a ya terminó: su resultado está guardado
+    out = graph.invoke(None, cfg)
+    # spec no se repite y el resultado de sim_a (pending write) tampoco
+    assert calls == ["sim_b", "report"]
+    assert out["log"][0] == "spec" and sorted(out["log"][1:3]) == ["sim_a", "sim_b"] and out["log"][3] == "report"
+
+
+def test_concurrent_writes_are_group_committed(tmp_path):
+    saver = SqliteCheckpointer(str(tmp_path / "cp.db"))
+    release = threading.Event()
+    real = saver._commit
+
+    def slow_commit(batch):
+        release.wait(5)
+        real(batch)
+
+    saver._commit = slow_commit
+    cfg = {"configurable": {"thread_id": "g", "checkpoint_ns": "", "checkpoint_id": "c1"}}
+    threads = [threading.Thread(target=saver.put_writes, args=(cfg, [("log", i)], f"task{i}")) for i in range(8)]
+    for t in threads:
+        t.start()
+    # el primero bloquea el lock de escritura mientras los demás encolan
+    while len(saver._pending) < 7 and any(t.is_alive() for t in threads):
+        threading.Event().wait(0.01)
+    release.set()
+    for t in threads:
+        t.join(5)
+    stats = saver.stats()
+    assert stats["ops"] == 8 and stats["commits"] < 8 and stats["rows"] == 8
+    rows = sqlite3.connect(saver.path).execute("SELECT COUNT(*) FROM writes WHERE thread_id = 'g'").fetchone()
+    assert rows[0] == 8
+
+
+def test_failed_batch_raises_in_every_caller(tmp_path):
+    saver = SqliteCheckpointer(str(tmp_path / "cp.db"))
+    cfg = {"configurable": {"thread_id": "e", "checkpoint_ns": "", "checkpoint_id": "c1"}}
+    saver._writer.execute("DROP TABLE writes")
+    with pytest.raises(sqlite3.OperationalError):
+        saver.put_writes(cfg, [("log", 1)], "task")
+    assert saver.stats()["commits"] == 0
+
+
+def _messages_agent(saver, calls, fail):
+    def model(state):
+        calls.append("model")
+        if any(isinstance(m, ToolMessage) for m in state["messages"]):
+            return {"messages": [AIMessage("Vout = 24 V")]}
+        return {"messages": [AIMessage("", tool_calls=[{"name": "spice_autorun", "args": {}, "id": "c1"}])]}
+
+    def tools(state):
+        calls.append("tools")
+        if fail:
+            fail.clear()
+            raise RuntimeError("conexión cortada")
+        return {"messages": [ToolMessage('{"ok": true}', tool_call_id="c1")]}
+
+    g = StateGraph(MessagesState)
+    g.add_node("model", model)
+    g.add_node("tools", tools)
+    g.add_edge(START, "model")
+    g.add_conditional_edges("model", lambda s: "tools" if s["messages"][-1].tool_calls else END)
+    g.add_edge("tools", "model")
+    return g.compile(checkpointer=saver)
+
+
+def test_chat_session_resumes_by_thread_id(tmp_path, monkeypatch):
+    monkeypatch.setenv("KORELIA_CHECKPOINT_DB", str(tmp_path / "sessions.db"))
+    monkeypatch.setattr(agent_mod, "_CHECKPOINTERS", {})
+    calls, fail = [], {"tools"}
+    monkeypatch.setattr(agent_mod, "get_agent",
+                        lambda durable=False: _messages_agent(agent_mod.get_checkpointer() if durable else None,
+                                                              calls, fail))
+
+    async def run(task):
+        return [ev async for ev in agent_mod.run_single_agent_workflow_astream(task, thread_id="sess")]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run("simula el buck"))
+    assert calls == ["model", "tools"]
+
+    calls.clear()
+    events = asyncio.run(run(None))
+    assert events[0] == {"type": "resume", "thread_id": "sess", "next": ["tools"]}
+    # el modelo no repite su llamada: se reanuda en la tool cortada
+    assert calls == ["tools", "model"]
+    assert [e["step"] for e in events if e["type"] == "step"] == ["tools", "model"]
+    assert agent_mod.agent_stats()["checkpointer"]["commits"] > 0
+
+    # un mensaje nuevo en el mismo hilo continúa el historial guardado
+    calls.clear()
+    asyncio.run(run("y la eficiencia?"))
+    state = agent_mod.get_checkpointer().get_tuple({"configurable": {"thread_id": "sess"}})
+    texts = [m.content for m in state.checkpoint["channel_values"]["messages"]]
+    assert texts[0] == "simula el buck" and "y la eficiencia?" in texts
+    agent_mod.close_checkpointers()
@@ -0,0 +1,144 @@
+"""Tests del backend compacto: misma API y mismos resultados que GraphStore."""
+import copy
+
+import pytest
+
+from apps.backend.graph.store import GraphStore
+from apps.backend.graph.compact_store import CompactGraphStore
+from apps.backend.graph.patcher import apply_patch, apply_patch_batch
+from apps.backend.graph.engine import run_rulesets
+from apps.backend.graph.context import get_context_values
+
+
+def _node(id, type, props=None):
+    return {"op": "add_node", "node": {"id": id, "type": type, "props": props, "labels": ["CIG"]}}
+
+
+def _edge(id, type, frm, to, props=None):
+    return {"op": "add_edge", "edge": {"id": id, "type": type, "from": frm, "to": to, "props": props}}
+
+
+def _design(n_cmp: int, n_nets: int):
+    ops = [_node(f"net:{i}", "Net") for i in range(n_nets)]
+    ops.append(_node("env", "Environment", {"Vbus_peak": 380}))
+    for i in range(n_cmp):
+        cid = f"cmp:C{i}"
+        if i % 10 == 0:
+            ops.append(_node(cid, "ComponentInstance", {"class": "MOSFET", "Vds_max": {"value": 400, "unit": "V"}}))
+        else:
+            ops.append(_node(cid, "ComponentInstance", {"class": "Source" if i % 7 == 0 else "Resistor"}))
+        for p, role, net in (("p", "+", i % n_nets), ("n", "-", (i * 3) % n_nets)):
+            pid = f"{cid}#pin:{p}"
+            ops.append(_node(pid, "Pin", {"name": p, "role": role}))
+            ops.append(_edge(f"{pid}__of", "pinOf", pid, cid))
+            ops.append(_edge(f"{pid}__on", "onNet", pid, f"net:{net}"))
+    return {"namespace": "CIG", "ops": ops}
+
+
+EDITS = {"namespace": "CIG", "ops": [
+    {"op": "remove_node", "id": "net:3"},
+    _node("net:3", "Net", {"domain": "primary"}),
+    _edge("cmp:C1#pin:p__on", "onNet", "cmp:C1#pin:p", "net:3"),
+    _edge("cmp:C2#pin:n__on", "connects", "cmp:C2#pin:n", "net:4"),
+    {"op": "remove_edge", "id": "cmp:C5#pin:p__on"},
+    {"op": "update_node", "node": {"id": "cmp:C10", "props": {"Vds_max": {"value": 600, "unit": "V"}}}},
+    {"op": "update_node", "node": {"id": "env", "props": {"Vbus_peak": 500}}},
+    _edge("x__on", "onNet", "x:P1", "net:dangling"),
+    _node("x:P1", "Port", {"name": "P1"}),
+    {"op": "remove_node", "id": "cmp:C7"},
+]}
+
+
+def _public_state(s):
+    types = ("Net", "Pin", "ComponentInstance", "Port", "Environment")
+    c = s.connectivity
+    return (
+        list(s.node_ids()),
+        {t: s.nodes_by_type(t) for t in types},
+        {n: (s.node_type(n), dict(s.node_props(n))) for n in s.node_ids()},
+        sorted((u, v, k, d["type"], repr(dict(d["props"]))) for u, v, k, d in s.edges_iter()),
+        {n: sorted(s.adjacent(n, {"onNet", "pinOf", "connects"})) for n in s.node_ids()},
+        {n: (sorted(c.terminals_of_net(n)), c.degree_of_net(n)) for n in s.nodes_by_type("Net")},
+        {n: (c.net_of_terminal(n), c.component_of_pin(n)) for n in s.nodes_by_type("Pin")},
+        {n: sorted(c.pins_of_component(n)) for n in s.nodes_by_type("ComponentInstance")},
+    )
+
+
+def _rules(s):
+    res = run_rulesets(s, "d", max_workers=1)
+    return res["checks_run"], res["violations"]
+
+
+def test_compact_store_matches_graph_store_across_edits():
+    ref, compact = GraphStore(), CompactGraphStore()
+    apply_patch(ref, _design(40, 12))
+    apply_patch_batch(compact, _design(40, 12))
+    assert _public_state(ref) == _public_state(compact)
+    assert _rules(ref) == _rules(compact)
+    assert get_context_values(ref) == get_context_values(compact)
+
+    apply_patch(ref, copy.deepcopy(EDITS))
+    apply_patch(compact, copy.deepcopy(EDITS))
+    assert _public_state(ref) == _public_state(compact)
+    # incremental en ambos: mismas violations que la evaluación completa de referencia
+    assert _rules(compact) == _rules(ref)
+    assert _rules(compact)[1] == run_rulesets(ref, "d", incremental=False)["violations"]
+    assert get_context_values(ref) == get_context_values(compact)
+    assert compact.edge_endpoints("cmp:C1#pin:p__on") == ("cmp:C1#pin:p", "net:3")
+    assert compact.edge_endpoints("cmp:C5#pin:p__on") is None
+
+
+def test_compact_store_rebuilds_adjacency_after_many_changes():
+    ref, compact = GraphStore(), CompactGraphStore()
+    for s in (ref, compact):
+        apply_patch_batch(s, _design(300, 50))
+    compact.connectivity.terminals_of_net("net:0")  # primer build del CSR
+
+    # suficientes bajas/altas como para forzar compactación y reconstrucción del CSR
+    ops = [{"op": "remove_edge", "id": f"cmp:C{i}#pin:n__on"} for i in range(0, 300, 2)]
+    ops += [_edge(f"cmp:C{i}#pin:n__on2", "onNet", f"cmp:C{i}#pin:n", "net:1") for i in range(0, 300, 2)]
+    ops += [{"op": "remove_node", "id": f"cmp:C{i}#pin:p"} for i in range(0, 300, 3)]
+    for s in (ref, compact):
+        apply_patch(s, {"ops": ops})
+    assert _public_state(ref) == _public_state(compact)
+    assert _rules(ref) == _rules(compact)
+
+
+def test_queries_after_removals_that_force_a_rebuild():
+    ref, by_net, by_adj = GraphStore(), CompactGraphStore(), CompactGraphStore()
+    ops = []
+    for i in range(400):
+        ops += [_node(f"net{i}", "Net"), _node(f"p{i}a", "Pin"), _node(f"p{i}b", "Pin"),
+                _edge(f"e{i}a", "onNet", f"p{i}a", f"net{i}"),
+                _edge(f"e{i}b", "pinOf" if i < 200 else "onNet", f"p{i}b", f"net{i}")]
+    for s in (ref, by_net, by_adj):
+        apply_patch_batch(s, {"ops": ops})
+    for s in (by_net, by_adj):
+        s.connectivity.terminals_of_net("net0")  # primer build del CSR
+    # más bajas que _REBUILD_MIN: la siguiente consulta directa (sin read_only) reconstruye y renumera
+    removals = {"ops": [{"op": "remove_edge", "id": f"e{i}a"} for i in range(400)]}
+    for s in (ref, by_net, by_adj):
+        apply_patch(s, copy.deepcopy(removals))
+    assert list(by_adj.adjacent("net399", {"onNet"})) == list(ref.adjacent("net399", {"onNet"})) == ["p399b"]
+    assert by_net.connectivity.terminals_of_net("net399") == ref.connectivity.terminals_of_net("net399") == ["p399b"]
+    assert by_net.connectivity.net_of_terminal("p250b") == "net250"
+
+
+def test_compact_store_shares_repeated_props_without_aliasing():
+    s = CompactGraphStore()
+    s.add_node("a", "Pin", {"name": "1"})
+    s.add_node("b", "Pin", {"name": "1"})
+    assert s._nprops[s._handle["a"]] is s._nprops[s._handle["b"]]
+    # el dict compartido no se entrega mutable: cambiar "a" no puede arrastrar a "b"
+    with pytest.raises(TypeError):
+        s.node_props("a")["name"] = "x"
+    with pytest.raises(TypeError):
+        next(p for n, _, p, _ in s.nodes_iter() if n == "a")["name"] = "x"
+    assert s.node_props("b") == {"name": "1"}
+    s.update_node("a", {"name": "2"})
+    assert s.node_props("a") == {"name": "2"}
+    assert s.node_props("b") == {"name": "1"}
+    # 1 y True no se confunden al compartir
+    s.add_node("c", "Pin", {"x": 1})
+    s.add_node("d", "Pin", {"x": True})
+    assert s.node_props("d")["x"] is True
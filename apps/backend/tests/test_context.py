@@ -0,0 +1,50 @@
+"""Tests del snapshot de contexto cacheado por versión del store."""
+from apps.backend.graph import context as context_mod
+from apps.backend.graph.store import GraphStore
+from apps.backend.graph.context import context_snapshot, get_context_values
+
+
+def _naive_context(store: GraphStore):
+    ctx = {}
+    for _, data in store.g.nodes(data=True):
+        for k, v in data.get("props", {}).items():
+            if isinstance(v, dict) and "value" in v:
+                ctx[k] = v["value"]
+            elif isinstance(v, (int, float)):
+                ctx[k] = v
+    if "T_ambient" not in ctx and "ambient" in ctx:
+        ctx["T_ambient"] = ctx["ambient"]
+    return ctx
+
+
+def test_snapshot_is_shared_until_store_changes():
+    s = GraphStore()
+    s.add_node("env", "Environment", {"Vbus_peak": 400, "ambient": {"value": 40, "unit": "C"}})
+    first = context_snapshot(s)
+    assert context_snapshot(s) is first
+    assert first["T_ambient"] == 40
+    s.update_node("env", {"Vbus_peak": 420})
+    assert context_snapshot(s) is not first
+    assert context_snapshot(s)["Vbus_peak"] == 420
+
+
+def test_cached_context_matches_full_scan_and_rescans_only_touched_nodes(monkeypatch):
+    s = GraphStore()
+    for i in range(50):
+        s.add_node(f"c{i}", "ComponentInstance", {"class": "Resistor", "R": {"value": i, "unit": "ohm"}})
+    s.add_node("env", "Environment", {"Vbus_peak": 400})
+    assert get_context_values(s) == _naive_context(s)
+
+    scanned = []
+    real = context_mod._node_context
+
+    def _counting(props):
+        scanned.append(props)
+        return real(props)
+
+    monkeypatch.setattr(context_mod, "_node_context", _counting)
+    s.update_node("c3", {"R": {"value": 99, "unit": "ohm"}})
+    s.remove_node("c49")
+    s.add_node("c0", "ComponentInstance", {"class": "Resistor"})
+    assert get_context_values(s) == _naive_context(s)
+    assert len(scanned) == 2  # c3 y c0 (c49 ya no existe)
@@ -0,0 +1,159 @@
+"""Tests del motor de reglas: la evaluación incremental debe coincidir con la completa."""
+import pytest
+
+from apps.backend.graph.store import GraphStore
+from apps.backend.graph.compact_store import CompactGraphStore
+from apps.backend.graph.patcher import apply_patch
+from apps.backend.graph import engine
+from apps.backend.graph.engine import run_rulesets
+from apps.backend.graph.rulesets import RuleSpec, RULESET_POWER_BASE
+
+
+def _node(id, type, props=None):
+    return {"op": "add_node", "node": {"id": id, "type": type, "props": props or {}, "labels": ["CIG"]}}
+
+
+def _edge(id, type, frm, to):
+    return {"op": "add_edge", "edge": {"id": id, "type": type, "from": frm, "to": to, "props": {}}}
+
+
+def _component(ref, cls, pins, props=None):
+    cid = f"urn:cig:cmp:{ref}"
+    ops = [_node(cid, "ComponentInstance", {"class": cls, **(props or {})})]
+    for pin_id, role in pins:
+        pin = f"{cid}#pin:{pin_id}"
+        ops.append(_node(pin, "Pin", {"name": pin_id, "role": role}))
+        ops.append(_edge(f"{pin}__of", "pinOf", pin, cid))
+    return ops
+
+
+def _connect(ref, pin_id, net):
+    pin = f"urn:cig:cmp:{ref}#pin:{pin_id}"
+    net_urn = f"urn:cig:net:{net}"
+    return _edge(f"{pin}__on__{net_urn}", "onNet", pin, net_urn)
+
+
+def _base_store(store_cls=GraphStore) -> GraphStore:
+    s = store_cls()
+    ops = [_node("urn:cig:net:VIN", "Net"), _node("urn:cig:net:GND", "Net"), _node("urn:cig:net:SW", "Net")]
+    ops += _component("V1", "Source", [("p", "+"), ("n", "-")])
+    ops += _component("Q1", "MOSFET", [("d", "D"), ("g", "G"), ("s", "S")], {"Vds_max": {"value": 400, "unit": "V"}})
+    ops += _component("R1", "Resistor", [("1", None), ("2", None)])
+    ops += [_connect("V1", "p", "VIN"), _connect("V1", "n", "GND"),
+            _connect("Q1", "d", "SW"), _connect("Q1", "s", "GND"),
+            _connect("R1", "1", "VIN"), _connect("R1", "2", "SW")]
+    ops.append(_node("urn:dig:env:1", "Environment", {"Vbus_peak": 380}))
+    apply_patch(s, {"namespace": "CIG", "ops": ops})
+    return s
+
+
+def _assert_same_as_full(s: GraphStore):
+    inc = run_rulesets(s, "d")
+    full = run_rulesets(s, "d", incremental=False)
+    assert inc["checks_run"] == full["checks_run"]
+    assert inc["violations"] == full["violations"]
+    return inc
+
+
+def test_incremental_matches_full_run_across_edits():
+    s = _base_store()
+    first = _assert_same_as_full(s)
+    assert [v["rule"] for v in first["violations"]] == ["Ratings:Vds_margin"]
+
+    edits = [
+        # net colgante
+        [_node("urn:cig:net:FLOAT", "Net")],
+        # cortocircuito de la fuente ideal
+        [{"op": "remove_edge", "id": "urn:cig:cmp:V1#pin:n__on__urn:cig:net:GND"}, _connect("V1", "n", "VIN")],
+        # baja Vbus_peak → re-evaluación total de la regla de contexto
+        [{"op": "update_node", "node": {"id": "urn:dig:env:1", "props": {"Vbus_peak": 300}}}],
+        # cambia el rol de un pin de la fuente
+        [{"op": "update_node", "node": {"id": "urn:cig:cmp:V1#pin:p", "props": {"role": "~"}}}],
+        # elimina una net con terminales
+        [{"op": "remove_node", "id": "urn:cig:net:SW"}],
+        # añade un componente nuevo conectado a nets existentes
+        _component("C1", "Capacitor", [("1", None), ("2", None)])
+        + [_connect("C1", "1", "FLOAT"), _connect("C1", "2", "GND")],
+        # elimina el componente fuente entero
+        [{"op": "remove_node", "id": "urn:cig:cmp:V1"}],
+    ]
+    for ops in edits:
+        apply_patch(s, {"namespace": "CIG", "ops": ops})
+        _assert_same_as_full(s)
+
+
+@pytest.mark.parametrize("store_cls", [GraphStore, CompactGraphStore])
+def test_incremental_sees_retyped_edge_with_same_endpoints(store_cls):
+    s = _base_store(store_cls)
+    _assert_same_as_full(s)
+    # mismo id y extremos, otro tipo: las reglas del tipo anterior (onNet → KCL) deben re-evaluarse
+    edge_id = "urn:cig:cmp:R1#pin:1__on__urn:cig:net:VIN"
+    apply_patch(s, {"namespace": "CIG", "ops": [_edge(edge_id, "pinOf", "urn:cig:cmp:R1#pin:1", "urn:cig:net:VIN")]})
+    _assert_same_as_full(s)
+    apply_patch(s, {"namespace": "CIG", "ops": [_connect("R1", "1", "VIN")]})
+    _assert_same_as_full(s)
+
+
+def test_incremental_only_rechecks_affected_units():
+    calls = []
+
+    def _check(store, unit, ctx):
+        calls.append(unit)
+        return RULESET_POWER_BASE["KCL"].check(store, unit, ctx)
+
+    rule = RuleSpec(name="KCL", unit_type="Net", check=_check,
+                    node_types=frozenset({"Net"}), edge_types=frozenset({"onNet"}))
+    s = _base_store()
+    run_rulesets(s, "d", rules={"KCL": rule})
+    assert len(calls) == 3
+
+    calls.clear()
+    apply_patch(s, {"namespace": "CIG", "ops": [_node("urn:cig:net:NEW", "Net")]})
+    run_rulesets(s, "d", rules={"KCL": rule})
+    assert calls == ["urn:cig:net:NEW"]
+
+    # el pin tocado arrastra sus nets vecinas (VIN); GND y SW se reutilizan de la caché
+    calls.clear()
+    apply_patch(s, {"namespace": "CIG", "ops": [_connect("R1", "1", "NEW")]})
+    run_rulesets(s, "d", rules={"KCL": rule})
+    assert sorted(calls) == ["urn:cig:net:NEW", "urn:cig:net:VIN"]
+
+
+def test_parallel_run_is_deterministic_and_reports_timings():
+    def _slow_check(store, unit, ctx):
+        return [{"id": f"viol:Slow:{unit}", "rule": "Slow", "severity": "low"}]
+
+    rules = dict(RULESET_POWER_BASE)
+    rules["Slow"] = RuleSpec(name="Slow", unit_type="Net", check=_slow_check,
+                             node_types=frozenset({"Net"}), cost=20.0)
+    s = _base_store()
+    seq = run_rulesets(s, "d", incremental=False, rules=rules, max_workers=1)
+    par = run_rulesets(s, "d", incremental=False, rules=rules, max_workers=4)
+    assert par["checks_run"] == list(rules) == seq["checks_run"]
+    assert par["violations"] == seq["violations"]
+    assert set(par["timings_ms"]) == set(rules)
+
+
+def test_registered_rules_join_the_base_ruleset():
+    from apps.backend.graph.rulesets import declare_rule, unregister_rule
+
+    @declare_rule("Test:NoPins", "ComponentInstance", edge_types={"pinOf"}, cost=0.5)
+    def _no_pins(store, cid, ctx):
+        return [] if any(True for _ in store.adjacent(cid, {"pinOf"})) else [{"id": cid, "rule": "Test:NoPins"}]
+
+    try:
+        s = _base_store()
+        s.add_node("urn:cig:cmp:X1", "ComponentInstance", {"class": "IC"})
+        res = run_rulesets(s, "d", incremental=False)
+        assert res["checks_run"][-1] == "Test:NoPins"
+        assert [v["id"] for v in res["violations"] if v["rule"] == "Test:NoPins"] == ["urn:cig:cmp:X1"]
+    finally:
+        unregister_rule("Test:NoPins")
+
+
+@pytest.mark.parametrize("value, expected", [("3", 3), ("0", 1), ("auto", None), ("", None)])
+def test_rule_workers_env_falls_back_to_default_on_bad_values(monkeypatch, caplog, value, expected):
+    monkeypatch.setenv("KORELIA_RULE_WORKERS", value)
+    monkeypatch.setattr(engine.os, "cpu_count", lambda: 2)
+    assert engine._default_workers() == (expected or 2)
+    assert ("KORELIA_RULE_WORKERS" in caplog.text) == (value == "auto")
@@ -0,0 +1,105 @@
+"""Tests de GraphStore: índices de edges y de tipos."""
+from apps.backend.graph.store import GraphStore
+
+
+def _small_store() -> GraphStore:
+    s = GraphStore()
+    s.add_node("net:A", "Net")
+    s.add_node("cmp:R1", "ComponentInstance", {"class": "Resistor"})
+    s.add_node("cmp:R1#pin:1", "Pin", {"name": "1"})
+    s.add_edge("cmp:R1#pin:1__of", "pinOf", "cmp:R1#pin:1", "cmp:R1")
+    s.add_edge("cmp:R1#pin:1__on__net:A", "onNet", "cmp:R1#pin:1", "net:A")
+    return s
+
+
+def test_nodes_by_type_follows_mutations():
+    s = _small_store()
+    assert s.nodes_by_type("Net") == ["net:A"]
+    s.add_node("net:B", "Net")
+    assert s.nodes_by_type("Net") == ["net:A", "net:B"]
+    # re-tipar un nodo lo mueve de índice
+    s.add_node("net:B", "Signal")
+    assert s.nodes_by_type("Net") == ["net:A"]
+    assert s.nodes_by_type("Signal") == ["net:B"]
+    s.remove_node("net:A")
+    assert s.nodes_by_type("Net") == []
+
+
+def test_update_and_remove_edge_by_id():
+    s = _small_store()
+    eid = "cmp:R1#pin:1__on__net:A"
+    assert s.edge_endpoints(eid) == ("cmp:R1#pin:1", "net:A")
+    s.update_edge(eid, {"w": 1})
+    assert s.g.edges["cmp:R1#pin:1", "net:A", eid]["props"] == {"w": 1}
+    s.remove_edge(eid)
+    assert s.edge_endpoints(eid) is None
+    assert not s.g.has_edge("cmp:R1#pin:1", "net:A", eid)
+    # ids desconocidos son no-op
+    s.update_edge("nope", {"x": 1})
+    s.remove_edge("nope")
+
+
+def test_remove_node_drops_incident_edges_from_index():
+    s = _small_store()
+    s.remove_node("cmp:R1#pin:1")
+    assert s.edge_endpoints("cmp:R1#pin:1__of") is None
+    assert s.edge_endpoints("cmp:R1#pin:1__on__net:A") is None
+    assert s.g.number_of_edges() == 0
+
+
+def test_readding_edge_id_with_new_endpoints_replaces_it():
+    s = _small_store()
+    s.add_node("net:B", "Net")
+    s.add_edge("cmp:R1#pin:1__on__net:A", "onNet", "cmp:R1#pin:1", "net:B")
+    assert s.edge_endpoints("cmp:R1#pin:1__on__net:A") == ("cmp:R1#pin:1", "net:B")
+    assert s.g.number_of_edges() == 2
+
+
+def _scan_connectivity(s: GraphStore):
+    """Conectividad reconstruida recorriendo edges (referencia para el índice)."""
+    net_terms, term_net, cmp_pins = {}, {}, {}
+    for u, v, _, d in s.g.edges(keys=True, data=True):
+        if d.get("type") == "onNet":
+            net_terms.setdefault(v, set()).add(u)
+            term_net.setdefault(u, v)
+        elif d.get("type") == "pinOf":
+            cmp_pins.setdefault(v, set()).add(u)
+    return net_terms, term_net, cmp_pins
+
+
+def _assert_connectivity_consistent(s: GraphStore):
+    net_terms, term_net, cmp_pins = _scan_connectivity(s)
+    c = s.connectivity
+    for net in s.nodes_by_type("Net"):
+        assert set(c.terminals_of_net(net)) == net_terms.get(net, set())
+    for cmp in s.nodes_by_type("ComponentInstance"):
+        assert set(c.pins_of_component(cmp)) == cmp_pins.get(cmp, set())
+    for pin in s.nodes_by_type("Pin"):
+        assert c.net_of_terminal(pin) == term_net.get(pin)
+        assert c.component_of_pin(pin) == next((v for v, ps in cmp_pins.items() if pin in ps), None)
+
+
+def test_connectivity_index_follows_edge_mutations():
+    s = _small_store()
+    s.add_node("net:B", "Net")
+    s.add_node("cmp:R1#pin:2", "Pin", {"name": "2"})
+    s.add_edges_from([
+        ("cmp:R1#pin:2__of", "pinOf", "cmp:R1#pin:2", "cmp:R1", None),
+        ("cmp:R1#pin:2__on__net:B", "onNet", "cmp:R1#pin:2", "net:B", None),
+    ])
+    _assert_connectivity_consistent(s)
+    assert s.connectivity.terminals_of_net("net:A") == ["cmp:R1#pin:1"]
+
+    # re-alta con otros extremos, cambio de tipo, borrado de edge y de nodo
+    s.add_edge("cmp:R1#pin:1__on__net:A", "onNet", "cmp:R1#pin:1", "net:B")
+    _assert_connectivity_consistent(s)
+    s.add_edge("cmp:R1#pin:2__of", "connects", "cmp:R1#pin:2", "cmp:R1")
+    _assert_connectivity_consistent(s)
+    s.remove_edge("cmp:R1#pin:2__on__net:B")
+    _assert_connectivity_consistent(s)
+    s.remove_node("net:B")
+    _assert_connectivity_consistent(s)
+    assert s.connectivity.net_of_terminal("cmp:R1#pin:1") is None
+    s.remove_node("cmp:R1")
+    assert s.connectivity.pins_of_component("cmp:R1") == []
+    assert s.connectivity.component_of_pin("cmp:R1#pin:1") is None
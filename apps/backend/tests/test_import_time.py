@@ -0,0 +1,66 @@
+"""
+Tiempo de arranque en frío de ``main``, ``toolkit`` y ``run_tools`` (cada uno en un intérprete nuevo).
+
+Presupuesto por módulo (segundos, mejor de 2 intentos) escalable con KORELIA_IMPORT_BUDGET_SCALE para
+máquinas lentas; además, ningún módulo pesado que debe cargarse en el primer uso aparece al importar.
+
+    PYTHONPATH=. python apps/backend/tests/test_import_time.py   # tabla de tiempos
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+# referencia en un worker de 1 vCPU: main ~1.5s, toolkit ~0.25s, run_tools ~0.9s
+BUDGETS = {
+    "apps.backend.main": 3.0,
+    "apps.backend.toolkit.toolkit": 0.6,
+    "apps.backend.tools.run_tools": 2.0,
+}
+# se cargan al construir el agente / emitir SPICE, no al importar
+LAZY = {
+    "apps.backend.main": ["langchain_openai", "openai", "langchain.agents", "langgraph", "httpx"],
+    "apps.backend.toolkit.toolkit": ["numpy", "apps.backend.schema.netlist_schema",
+                                     "apps.backend.tools.spice_emitter"],
+    "apps.backend.tools.run_tools": ["langchain_openai", "langgraph"],
+}
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+dt = time.perf_counter() - t0
+print(json.dumps({{"s": dt, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def cold_import(module: str, runs: int = 2) -> dict:
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}  # importar no necesita credenciales
+    env["PYTHONPATH"] = ROOT
+    best = None
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, lazy=LAZY[module])],
+                             cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+        assert out.returncode == 0, out.stderr[-2000:]
+        res = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or res["s"] < best["s"]:
+            best = res
+    return best
+
+
+@pytest.mark.parametrize("module", sorted(BUDGETS))
+def test_cold_import_within_budget(module):
+    res = cold_import(module)
+    assert res["loaded"] == [], f"{module} carga al importar: {res['loaded']}"
+    budget = BUDGETS[module] * float(os.getenv("KORELIA_IMPORT_BUDGET_SCALE", "1"))
+    assert res["s"] <= budget, f"{module}: {res['s']:.2f}s > presupuesto {budget:.2f}s"
+
+
+if __name__ == "__main__":
+    for mod in sorted(BUDGETS):
+        r = cold_import(mod, runs=3)
+        print(f"{mod:32s} {r['s'] * 1e3:8.1f}ms  (presupuesto {BUDGETS[mod] * 1e3:.0f}ms)")
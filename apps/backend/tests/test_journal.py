@@ -0,0 +1,167 @@
+"""Tests del journal persistente: replay (con y sin compactación) reconstruye el mismo store."""
+import copy
+import os
+import random
+import shutil
+
+import pytest
+
+from apps.backend.graph.store import GraphStore
+from apps.backend.graph.compact_store import CompactGraphStore
+from apps.backend.graph.patcher import apply_patch, apply_patch_batch
+from apps.backend.graph.journal import PatchJournal, dump_store, journal_for_thread
+
+
+def _node(id, type, props=None):
+    return {"op": "add_node", "node": {"id": id, "type": type, "props": props, "labels": ["CIG"]}}
+
+
+def _edge(id, type, frm, to, props=None):
+    return {"op": "add_edge", "edge": {"id": id, "type": type, "from": frm, "to": to, "props": props}}
+
+
+PATCHES = [
+    {"namespace": "CIG", "ops": [
+        _node("net:A", "Net"), _node("net:B", "Net", {"domain": "primary"}),
+        _node("cmp:R1", "ComponentInstance", {"class": "Resistor"}),
+        {"op": "update_node", "node": {"id": "cmp:R1", "props": {"R": {"value": 10, "unit": "ohm"}}}},
+        _node("cmp:R1#1", "Pin", {"name": "1"}), _node("cmp:R1#2", "Pin", {"name": "2"}),
+        _edge("cmp:R1#1__of", "pinOf", "cmp:R1#1", "cmp:R1"), _edge("cmp:R1#2__of", "pinOf", "cmp:R1#2", "cmp:R1"),
+        _edge("cmp:R1#1__on", "onNet", "cmp:R1#1", "net:A"), _edge("cmp:R1#2__on", "onNet", "cmp:R1#2", "net:B"),
+    ]},
+    {"namespace": "CIG", "ops": [
+        # nodo implícito tipado más tarde y re-tipado: orden de tipos != orden de nodos
+        _edge("x__on", "onNet", "x:P1", "net:A"),
+        _node("net:C", "Net"),
+        _node("x:P1", "Port", {"name": "P1"}),
+        _node("net:A", "Signal"),
+        _node("net:A", "Net"),
+        {"op": "remove_node", "id": "net:B"},
+        {"op": "update_edge", "edge": {"id": "cmp:R1#1__on", "props": {"w": 1}}},
+    ]},
+    {"namespace": "DIG", "ops": [_node("env", "Environment", {"Vbus_peak": 400})]},
+]
+
+
+def _state(s):
+    types = ("Net", "Pin", "ComponentInstance", "Port", "Signal", "Environment")
+    c = s.connectivity
+    return (
+        [(n, t, dict(p), list(l)) for n, t, p, l in s.nodes_iter()],
+        {t: s.nodes_by_type(t) for t in types},
+        sorted((u, v, k, d["type"], repr(dict(d["props"]))) for u, v, k, d in s.edges_iter()),
+        {n: sorted(c.terminals_of_net(n)) for n in s.nodes_by_type("Net")},
+        {n: sorted(c.pins_of_component(n)) for n in s.nodes_by_type("ComponentInstance")},
+    )
+
+
+def _write(journal: PatchJournal, store, patches):
+    for p in patches:
+        apply_patch(store, copy.deepcopy(p))
+        journal.append(p)
+
+
+@pytest.mark.parametrize("backend", [GraphStore, CompactGraphStore], ids=["networkx", "compact"])
+def test_replay_rebuilds_identical_store(tmp_path, backend):
+    path = str(tmp_path / "g.jsonl")
+    live = backend()
+    journal = PatchJournal(path, fsync=False)
+    journal.replay(live)
+    _write(journal, live, PATCHES[:2])
+
+    # rollback también queda en el journal
+    sid = live.snapshot()
+    _write(journal, live, PATCHES[2:])
+    journal.append(live.restore(sid))
+    journal.close()
+
+    rebuilt = backend()
+    n_ops = PatchJournal(path).replay(rebuilt)
+    assert n_ops == sum(len(p["ops"]) for p in PATCHES) + 1
+    assert _state(rebuilt) == _state(live)
+
+
+@pytest.mark.parametrize("backend", [GraphStore, CompactGraphStore], ids=["networkx", "compact"])
+def test_compaction_then_replay_matches(tmp_path, backend):
+    path = str(tmp_path / "g.jsonl")
+    live = backend()
+    journal = PatchJournal(path, compact_every=15, fsync=False)
+    journal.replay(live)
+    _write(journal, live, PATCHES[:2])  # 17 ops: compacta tras el segundo patch
+    assert journal.pending_ops == 0
+    _write(journal, live, PATCHES[2:])
+    journal.close()
+
+    rebuilt = backend()
+    assert PatchJournal(path).replay(rebuilt) == len(PATCHES[2]["ops"])
+    assert _state(rebuilt) == _state(live)
+
+
+def _random_patch(rng):
+    ids, eids = [f"n:{i}" for i in range(5)], [f"e:{i}" for i in range(4)]
+    ops = []
+    for _ in range(rng.randint(1, 8)):
+        kind = rng.choice(["add_node", "update_node", "remove_node", "add_edge", "add_edge", "remove_edge"])
+        if kind == "add_node":
+            ops.append(_node(rng.choice(ids), rng.choice(["Net", "Pin"]), {"x": rng.randint(0, 3)}))
+        elif kind == "update_node":
+            ops.append({"op": kind, "node": {"id": rng.choice(ids), "props": {"y": rng.randint(0, 3)}}})
+        elif kind == "add_edge":
+            ops.append(_edge(rng.choice(eids), rng.choice(["onNet", "pinOf"]), rng.choice(ids), rng.choice(ids)))
+        else:
+            ops.append({"op": kind, "id": rng.choice(ids if kind == "remove_node" else eids)})
+    return {"namespace": "CIG", "ops": ops}
+
+
+def test_replay_matches_live_store_on_random_patches(tmp_path):
+    for seed in range(200):
+        rng = random.Random(seed)
+        path = str(tmp_path / f"g{seed}.jsonl")
+        live = GraphStore()
+        journal = PatchJournal(path, fsync=False)
+        journal.replay(live)
+        # como el Toolkit: cada patch con su propio apply_patch_batch
+        for _ in range(rng.randint(1, 4)):
+            patch = _random_patch(rng)
+            apply_patch_batch(live, copy.deepcopy(patch))
+            journal.append(patch)
+        journal.close()
+
+        rebuilt = GraphStore()
+        PatchJournal(path).replay(rebuilt)
+        assert dump_store(rebuilt) == dump_store(live), seed
+
+
+def test_replay_skips_entries_covered_by_snapshot_and_torn_tail(tmp_path):
+    path = str(tmp_path / "g.jsonl")
+    live = GraphStore()
+    journal = PatchJournal(path, compact_every=0, fsync=False)
+    journal.replay(live)
+    _write(journal, live, PATCHES)
+    journal.close()
+    shutil.copy(path, path + ".bak")
+    journal.compact()
+    # caída entre snapshot y vaciado del JSONL + línea a medio escribir
+    shutil.copy(path + ".bak", path)
+    with open(path, "ab") as f:
+        f.write(b'{"seq": 99, "patch": {"ops": [')
+
+    rebuilt = GraphStore()
+    reopened = PatchJournal(path, fsync=False)
+    assert reopened.replay(rebuilt) == 0
+    assert _state(rebuilt) == _state(live)
+    # la cola truncada se recorta y los appends siguientes son legibles
+    reopened.append({"ops": [_node("net:Z", "Net")]})
+    reopened.close()
+    again = GraphStore()
+    PatchJournal(path).replay(again)
+    assert again.has_node("net:Z")
+
+
+def test_thread_journals_never_share_a_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("KORELIA_GRAPH_JOURNAL_DIR", str(tmp_path))
+    ids = ["a/b", "a_b", "a b", "", "default"]
+    paths = [journal_for_thread(t).path for t in ids]
+    assert len(set(paths)) == len(ids)
+    assert all(os.path.dirname(p) == str(tmp_path) for p in paths)
+    assert os.path.basename(paths[0]).startswith("a_b-")
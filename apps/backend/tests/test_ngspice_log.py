@@ -0,0 +1,107 @@
+"""Tests del consumo incremental del log de ngspice y del aborto temprano en errores fatales."""
+import asyncio
+import json
+import time
+
+import pytest
+
+from apps.backend.tools.ngspice_log import LogFollower, NgspiceLog
+from apps.backend.tools.run_tools import spice_autorun
+from apps.backend.schema.spice_schema import SpiceAutorunInput
+from apps.backend.tests.test_sim_cache import NETLIST
+
+
+LOG = """Circuit: * rc
+Doing analysis at TEMP = 27.000000 and TNOM = 27.000000
+Warning: singular matrix:  check nodes out and in
+Initial Transient Solution
+vmax                =  9.000000e+00
+tdelay = -1.5e-06
+Warning: singular matrix:  check nodes n2 and n3
+vavg = 4.5 at= 1e-3
+No. of Data Rows : 1234
+"""
+
+
+def test_chunked_feed_matches_whole_log_regardless_of_split():
+    whole = NgspiceLog()
+    whole.feed(LOG)
+    whole.close()
+    assert whole.measures == {"vmax": 9.0, "tdelay": -1.5e-06}
+    assert whole.warnings == {"singular matrix": 2}
+    assert whole.progress == "No. of Data Rows : 1234"
+    assert whole.fatal is None
+    for size in (1, 7, 64):
+        log = NgspiceLog()
+        for i in range(0, len(LOG), size):
+            log.feed(LOG[i:i + size])
+        log.close()
+        assert (log.measures, log.warnings, log.progress) == (whole.measures, whole.warnings, whole.progress)
+        assert log.tail() == whole.tail()
+
+
+def test_memory_is_bounded_for_huge_logs():
+    log = NgspiceLog(tail_lines=50, tail_chars=2000, max_warnings=5)
+    line = "Reference value :  1.00000e-04 some verbose transient chatter\n"
+    for i in range(2000):
+        log.feed(line * 200 + f"Warning: odd thing number {i} at node n{i}x\n")
+    log.feed("vout_final = 12.5\n")
+    log.close()
+    assert log.bytes > 20_000_000
+    assert len(log.tail()) <= 2000 and log.tail().endswith("vout_final = 12.5")
+    assert len(log._tail) == 50
+    # los avisos se agrupan por texto sin números y el número de claves está acotado
+    assert len(log.warnings) <= 5 and sum(log.warnings.values()) == 2000
+    assert log.measures == {"vout_final": 12.5}
+
+
+def test_fatal_error_is_detected_once():
+    log = NgspiceLog()
+    log.feed("doAnalyses: TRAN:  Timestep too small; time = 1.2e-05, timestep = 1.25e-18\n")
+    log.feed("run simulation(s) aborted\n")
+    assert log.fatal.startswith("doAnalyses: TRAN:  Timestep too small")
+    assert log.warnings == {"timestep too small": 1}
+
+
+def test_follower_reads_only_new_data_and_partial_utf8(tmp_path):
+    path = tmp_path / "ngspice.log"
+    follower = LogFollower(str(path), NgspiceLog())
+    assert follower.poll() is False  # el log aún no existe
+    raw = "título = 1\n".encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(raw[:2])
+        f.flush()
+        assert follower.poll() is False
+        f.write(raw[2:] + b"a = 2\n")
+    log = follower.finish()
+    assert log.measures == {"título": 1.0, "a": 2.0} and "título = 1" in log.tail()
+
+
+# ngspice falso que escribe un error de convergencia y se queda colgado
+_STUCK_NGSPICE = (
+    "import sys, time\n"
+    "if sys.argv[1:] == ['-v']: sys.exit(0)\n"
+    "log = open(sys.argv[sys.argv.index('-o') + 1], 'w')\n"
+    "log.write('Initial Transient Solution\\nWarning: singular matrix\\n')\n"
+    "log.write('doAnalyses: TRAN:  Timestep too small; time = 1e-05\\n')\n"
+    "log.flush()\n"
+    "time.sleep(30)\n"
+)
+
+
+@pytest.fixture
+def stuck_ngspice(install_ngspice):
+    install_ngspice(_STUCK_NGSPICE)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_fatal_log_line_aborts_batch_run_before_timeout(stuck_ngspice, use_async):
+    inp = {"input_data": SpiceAutorunInput(input_text=NETLIST, probes=["v(out)"], use_cache=False, timeout_s=60)}
+    t0 = time.perf_counter()
+    out = asyncio.run(spice_autorun.ainvoke(inp)) if use_async else spice_autorun.invoke(inp)
+    res = json.loads(out)
+    assert time.perf_counter() - t0 < 10
+    assert res["returncode"] != 0
+    assert res["fatal"].startswith("doAnalyses: TRAN:  Timestep too small")
+    assert res["warnings"] == {"singular matrix": 1, "timestep too small": 1}
+    assert "Initial Transient Solution" in res["log_tail"]
@@ -0,0 +1,93 @@
+"""Tests del backend compartido de ngspice (pool libngspice) y su fallback a batch."""
+import json
+
+import pytest
+
+from apps.backend.tools import ngspice_shared as ns
+from apps.backend.tools.run_tools import spice_autorun
+from apps.backend.schema.spice_schema import SpiceAutorunInput
+from apps.backend.tests.test_sim_cache import NETLIST
+
+
+def _run(**kw):
+    return json.loads(spice_autorun.invoke({"input_data": SpiceAutorunInput(input_text=NETLIST, probes=["v(out)"], **kw)}))
+
+
+def test_split_circuit_moves_control_to_commands():
+    net = "* t\nR1 a 0 1\n.control\n  set wr_singlescale\n* nota\nmeas tran x max v(a)\nquit\n.endc\n.tran 1u 1m\n.end"
+    circuit, commands = ns.split_circuit(net)
+    assert circuit == ["* t", "R1 a 0 1", ".tran 1u 1m", ".end"]
+    # sin comando de análisis: se antepone run; quit nunca llega a la librería
+    assert commands == ["run", "set wr_singlescale", "meas tran x max v(a)"]
+    _, commands = ns.split_circuit(net.replace("quit", "tran 1u 2m"))
+    assert commands[0] == "set wr_singlescale" and "run" not in commands
+
+
+def test_missing_library_falls_back_to_batch(batch_only, monkeypatch):
+    monkeypatch.setenv("NGSPICE_LIBRARY", str(batch_only / "no_such_lib.so"))
+    assert ns.find_libngspice() is None
+    res = _run(backend="shared")
+    assert res["method"] == "ngspice_wrdata"
+    assert res["returncode"] == 0 and res["probes"][0]["metrics"]["samples"] == 10
+
+
+def test_unloadable_library_marks_pool_broken_and_uses_batch(batch_only, monkeypatch):
+    bogus = batch_only / "libngspice.so"
+    bogus.write_text("not a shared object")
+    monkeypatch.setenv("NGSPICE_LIBRARY", str(bogus))
+    res = _run(backend="shared")
+    assert res["method"] == "ngspice_wrdata" and res["returncode"] == 0
+    assert ns.ngspice_stats()["broken"]
+    # el pool roto ya no se ofrece: las siguientes ejecuciones van directas a batch
+    assert ns.get_ngspice_pool("shared") is None
+
+
+def test_transient_start_failure_backs_off_instead_of_breaking_the_pool(monkeypatch):
+    now = [0.0]
+    attempts = []
+
+    class FlakySession:
+        runs = 0
+
+        def __init__(self, ctx, lib_path, start_timeout_s):
+            attempts.append(lib_path)
+            if len(attempts) <= 2:
+                raise ns.NgspiceSessionError("libngspice no respondió al arrancar")
+
+        def kill(self):
+            pass
+
+    monkeypatch.setattr(ns, "_Session", FlakySession)
+    pool = ns.NgspicePool("libfake.so", size=1, clock=lambda: now[0])
+    with pytest.raises(ns.NgspiceSessionError):
+        pool.warm()
+    assert not pool.broken and not pool.available()
+    # dentro del backoff ni se intenta arrancar
+    with pytest.raises(ns.NgspiceSessionError):
+        pool.warm()
+    assert len(attempts) == 1
+    now[0] = 1.0
+    with pytest.raises(ns.NgspiceSessionError):
+        pool.warm()
+    assert pool.stats()["retry_in"] == 2.0  # backoff exponencial: 1s, 2s, ...
+    now[0] = 3.0
+    pool.warm()
+    st = pool.stats()
+    assert pool.available() and (st["spawns"], st["spawn_failures"], st["broken"], st["retry_in"]) == (1, 2, None, None)
+
+
+def test_batch_backend_never_creates_a_pool(batch_only, monkeypatch):
+    monkeypatch.setenv("KORELIA_SPICE_BACKEND", "batch")
+    assert _run()["method"] == "ngspice_wrdata"
+    assert ns._POOL is None
+
+
+@pytest.mark.skipif(ns.find_libngspice() is None, reason="libngspice no instalada")
+def test_shared_session_is_reused_between_runs(batch_only):
+    first = _run(backend="shared")
+    second = _run(backend="shared")
+    assert first["method"] == second["method"] == "ngspice_shared"
+    assert first["returncode"] == 0
+    assert first["probes"][0]["metrics"] == second["probes"][0]["metrics"]
+    st = ns.ngspice_stats()
+    assert st["runs"] == 2 and st["spawns"] == 1
@@ -0,0 +1,165 @@
+"""Tests del patcher: la aplicación masiva debe coincidir con la secuencial."""
+import copy
+import gc
+import random
+import threading
+
+from apps.backend.graph.store import GraphStore
+from apps.backend.graph.patcher import apply_patch, apply_patch_batch, gc_paused
+
+
+def _node(id, type, props=None):
+    return {"op": "add_node", "node": {"id": id, "type": type, "props": props, "labels": ["CIG"]}}
+
+
+def _edge(id, type, frm, to, props=None):
+    return {"op": "add_edge", "edge": {"id": id, "type": type, "from": frm, "to": to, "props": props}}
+
+
+def _state(s: GraphStore):
+    return (
+        list(s.g.nodes(data=True)),
+        sorted((u, v, k, repr(d)) for u, v, k, d in s.g.edges(keys=True, data=True)),
+        {t: s.nodes_by_type(t) for t in ("Net", "Pin", "ComponentInstance", "Port")},
+        dict(s._edge_index),
+    )
+
+
+PATCH = {"namespace": "CIG", "ops": [
+    _node("n:A", "Net"),
+    _node("c:R1", "ComponentInstance", {"class": "Resistor"}),
+    {"op": "update_node", "node": {"id": "c:R1", "props": {"R": {"value": 10, "unit": "ohm"}}}},
+    {"op": "update_node", "node": {"id": "c:R1", "props": {"P": 0.25}}},
+    _node("c:R1#p1", "Pin", {"name": "1"}),
+    _edge("c:R1#p1__of", "pinOf", "c:R1#p1", "c:R1"),
+    _edge("c:R1#p1__on", "onNet", "c:R1#p1", "n:A"),
+    # edge hacia un nodo aún inexistente (networkx lo crea) y alta posterior del nodo
+    _edge("c:R1#p2__on", "onNet", "c:R1#p2", "n:B"),
+    _node("n:B", "Net", {"domain": "primary"}),
+    # nodo implícito seguido del alta de otro nodo nuevo: el orden debe ser el secuencial
+    _edge("x:P2__on", "onNet", "x:P2", "n:A"),
+    _node("n:C", "Net"),
+    {"op": "update_edge", "edge": {"id": "c:R1#p1__on", "type": "onNet", "from": "c:R1#p1", "to": "n:A", "props": {"w": 1}}},
+    {"op": "remove_node", "id": "n:A"},
+    _node("n:A", "Net"),
+    _edge("c:R1#p1__on", "onNet", "c:R1#p1", "n:B"),
+    {"op": "remove_edge", "id": "c:R1#p2__on"},
+    {"op": "update_node", "node": {"id": "n:missing", "props": {"x": 1}}},
+    _node("x:P1", "Pin"),
+    _node("x:P1", "Port", {"name": "P1"}),
+    {"op": "update_node", "node": {"id": "c:R1#p2", "props": {"name": "2"}}},
+]}
+
+
+def test_batch_matches_sequential():
+    seq, bulk = GraphStore(), GraphStore()
+    apply_patch(seq, copy.deepcopy(PATCH))
+    apply_patch_batch(bulk, copy.deepcopy(PATCH))
+    assert _state(seq) == _state(bulk)
+
+
+def test_batch_matches_sequential_on_existing_graph():
+    seq, bulk = GraphStore(), GraphStore()
+    for s in (seq, bulk):
+        apply_patch(s, copy.deepcopy(PATCH))
+    follow_up = {"namespace": "CIG", "ops": [
+        {"op": "update_node", "node": {"id": "c:R1", "props": {"R": 22}}},
+        _node("c:R1", "ComponentInstance", {"class": "Resistor"}),
+        {"op": "update_node", "node": {"id": "c:R1", "props": {"R": 33}}},
+        {"op": "update_edge", "edge": {"id": "c:R1#p1__of", "type": "pinOf", "from": "c:R1#p1", "to": "c:R1", "props": {"a": 1}}},
+        _edge("c:R1#p1__of", "pinOf", "c:R1#p1", "c:R1", {"b": 2}),
+    ]}
+    apply_patch(seq, copy.deepcopy(follow_up))
+    apply_patch_batch(bulk, copy.deepcopy(follow_up))
+    assert _state(seq) == _state(bulk)
+
+
+def test_batch_matches_sequential_when_edges_are_readded_with_other_endpoints():
+    base = {"ops": [_edge("e:moved", "onNet", "n:3", "n:3"), _edge("e:kept", "onNet", "n:3", "n:1")]}
+    patch = {"ops": [
+        # edge pendiente re-dado de alta: sus nodos implícitos (n:a, n:b) se conservan y en su orden
+        _edge("e:new", "onNet", "n:a", "n:b"),
+        _edge("e:new", "onNet", "n:c", "n:d"),
+        # edge del store movido detrás de otro pendiente con sus mismos extremos antiguos
+        _edge("e:same", "onNet", "n:3", "n:3"),
+        _edge("e:moved", "onNet", "n:2", "n:0"),
+    ]}
+    seq, bulk = GraphStore(), GraphStore()
+    for s in (seq, bulk):
+        apply_patch(s, copy.deepcopy(base))
+    apply_patch(seq, copy.deepcopy(patch))
+    apply_patch_batch(bulk, copy.deepcopy(patch))
+    assert _state(seq) == _state(bulk)
+    assert list(seq.g.edges(keys=True)) == list(bulk.g.edges(keys=True))
+
+
+def _random_ops(rng, n):
+    ids, eids = [f"n:{i}" for i in range(6)], [f"e:{i}" for i in range(4)]
+    ops = []
+    for _ in range(n):
+        kind = rng.choice(["add_node", "update_node", "remove_node", "add_edge", "add_edge", "update_edge", "remove_edge"])
+        if kind == "add_node":
+            ops.append(_node(rng.choice(ids), rng.choice(["Net", "Pin", "Port"]), {"x": rng.randint(0, 3)}))
+        elif kind == "update_node":
+            ops.append({"op": kind, "node": {"id": rng.choice(ids), "props": {"y": rng.randint(0, 3)}}})
+        elif kind == "add_edge":
+            ops.append(_edge(rng.choice(eids), rng.choice(["onNet", "pinOf"]), rng.choice(ids), rng.choice(ids),
+                             {"z": rng.randint(0, 3)}))
+        elif kind == "update_edge":
+            ops.append({"op": kind, "edge": {"id": rng.choice(eids), "props": {"w": rng.randint(0, 3)}}})
+        else:
+            ops.append({"op": kind, "id": rng.choice(ids if kind == "remove_node" else eids)})
+    return ops
+
+
+def test_batch_matches_sequential_on_random_patches():
+    for seed in range(500):
+        rng = random.Random(seed)
+        base, patch = _random_ops(rng, rng.randint(0, 8)), _random_ops(rng, rng.randint(1, 12))
+        seq, bulk = GraphStore(), GraphStore()
+        for s in (seq, bulk):
+            apply_patch(s, {"ops": copy.deepcopy(base)})
+        apply_patch(seq, {"ops": copy.deepcopy(patch)})
+        apply_patch_batch(bulk, {"ops": copy.deepcopy(patch)})
+        assert _state(seq) == _state(bulk), seed
+        assert list(seq.g.edges(keys=True)) == list(bulk.g.edges(keys=True)), seed
+
+
+def test_batch_raises_after_applying_previous_ops():
+    s = GraphStore()
+    bad = {"ops": [_node("n:A", "Net"), {"op": "explode"}]}
+    try:
+        apply_patch_batch(s, bad)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+    assert s.nodes_by_type("Net") == ["n:A"]
+
+
+def test_gc_pause_is_restored_after_overlapping_threads():
+    assert gc.isenabled()
+    a_in, b_in, a_out = threading.Event(), threading.Event(), threading.Event()
+    seen = {}
+
+    def a():
+        with gc_paused():
+            a_in.set()
+            b_in.wait()
+        a_out.set()
+
+    def b():
+        a_in.wait()
+        with gc_paused():
+            b_in.set()
+            a_out.wait()
+            # A ya salió: B sigue en su bloque y el GC debe seguir parado
+            seen["during_b"] = gc.isenabled()
+
+    threads = [threading.Thread(target=a), threading.Thread(target=b)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert seen["during_b"] is False
+    assert gc.isenabled()
@@ -0,0 +1,136 @@
+"""Tests de la caché de simulación y su uso desde spice_autorun (con un ngspice falso)."""
+import json
+import os
+
+import pytest
+
+from apps.backend.tools.sim_cache import SimCache, _dir_size
+from apps.backend.tools.run_tools import spice_autorun
+from apps.backend.schema.spice_schema import SpiceAutorunInput
+
+
+NETLIST = """* RC
+V1 in 0 DC 1
+R1 in out 1k
+C1 out 0 1u
+.tran 1u 1m
+.end
+"""
+
+
+def _run(**kw):
+    return json.loads(spice_autorun.invoke({"input_data": SpiceAutorunInput(input_text=NETLIST, probes=["v(out)"], **kw)}))
+
+
+def test_identical_run_is_served_from_cache(fake_ngspice):
+    first = _run()
+    assert first["cache"]["hit"] is False
+    assert first["returncode"] == 0
+    second = _run()
+    assert second["cache"] == {"hit": True, "key": first["cache"]["key"]}
+    assert second["probes"] == first["probes"]
+    assert second["measures"] == {"vmax": 9.0}
+    # los artefactos viven en la entrada de la caché
+    assert os.path.exists(second["probes"][0]["csv"])
+    assert second["workdir"].startswith(fake_ngspice.root)
+    st = fake_ngspice.stats()
+    assert (st["hits"], st["misses"], st["stores"]) == (1, 1, 1)
+
+
+def test_key_depends_on_probes_fraction_and_bypass(fake_ngspice):
+    base = _run()["cache"]["key"]
+    assert _run(from_fraction=0.2)["cache"]["key"] != base
+    other = json.loads(spice_autorun.invoke({"input_data": SpiceAutorunInput(
+        input_text=NETLIST, probes=["v(in)", "v(out)"])}))
+    assert other["cache"]["key"] != base
+
+    bypass = _run(use_cache=False)
+    assert "cache" not in bypass
+    assert fake_ngspice.stats()["bypass"] == 1
+
+
+def test_raw_output_writes_one_rawfile_and_matches_csv_metrics(fake_ngspice):
+    csv = _run()
+    raw = json.loads(spice_autorun.invoke({"input_data": SpiceAutorunInput(
+        input_text=NETLIST, probes=["v(out)", "v(in)"], output="raw")}))
+    assert raw["method"] == "ngspice_rawfile" and raw["cache"]["key"] != csv["cache"]["key"]
+    rawfiles = {p["raw"] for p in raw["probes"]}
+    assert len(rawfiles) == 1 and os.path.exists(rawfiles.pop())
+    assert [p["var"] for p in raw["probes"]] == ["v(out)", "v(in)"]
+    assert raw["probes"][0]["metrics"] == csv["probes"][0]["metrics"]
+    assert "set filetype=binary" in open(raw["netlist_path"]).read()
+
+
+def test_key_ignores_whitespace_and_tracks_include_files(tmp_path):
+    lib = tmp_path / "models.lib"
+    lib.write_text(".model D1 D\n")
+    net = f'.include "{lib}"\nR1 a 0 1\n.op\n.end'
+    k1 = SimCache.key(net, ["v(a)"], 0.5, "ngspice-42")
+    assert SimCache.key(net.replace("\n", "  \r\n"), ["v(a)"], 0.5, "ngspice-42") == k1
+    assert SimCache.key(net, ["v(a)"], 0.5, "ngspice-43") != k1
+    lib.write_text(".model D1 D(IS=1e-14)\n")
+    assert SimCache.key(net, ["v(a)"], 0.5, "ngspice-42") != k1
+
+
+def test_size_based_eviction_drops_least_recently_used(tmp_path):
+    cache = SimCache(str(tmp_path / "c"), max_bytes=2500)
+    keys = []
+    for i in range(3):
+        wd = cache.staging_dir()
+        with open(os.path.join(wd, "out.csv"), "w") as f:
+            f.write("x" * 1000)
+        key = f"{i:02d}" + "a" * 62
+        cache.put(key, wd, {"workdir": wd})
+        keys.append(key)
+        os.utime(os.path.join(cache._entry_dir(key), SimCache.RESULT_FILE), (i, i))
+    # el tercer put supera el límite: sale la entrada menos usada
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[2]) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_eviction_keeps_a_running_index_and_scans_disk_only_at_startup(tmp_path, monkeypatch):
+    root = str(tmp_path / "c")
+
+    def store(cache, i):
+        wd = cache.staging_dir()
+        with open(os.path.join(wd, "out.csv"), "w") as f:
+            f.write("x" * 1000)
+        key = f"{i:02d}" + "b" * 62
+        cache.put(key, wd, {"workdir": wd})
+        return key
+
+    first = SimCache(root, max_bytes=2500)
+    keys = [store(first, i) for i in range(2)]
+    # el orden de uso en disco (mtime de result.json) es lo único que sobrevive al reinicio
+    for i, key in enumerate(keys):
+        os.utime(os.path.join(first._entry_dir(key), SimCache.RESULT_FILE), (i, i))
+
+    cache = SimCache(root, max_bytes=2500)
+    assert cache.get(keys[0]) is not None  # primer acceso: un único escaneo del disco
+    assert cache.stats()["entries"] == 2
+    monkeypatch.setattr(cache, "_entries", lambda: pytest.fail("put no debe recorrer la caché"))
+    keys.append(store(cache, 2))
+    # keys[0] era el más antiguo en disco, pero el get lo refrescó: sale keys[1]
+    assert [cache.get(k) is not None for k in keys] == [True, False, True]
+    st = cache.stats()
+    assert st["evictions"] == 1 and st["entries"] == 2
+    assert st["bytes"] == sum(_dir_size(cache._entry_dir(k)) for k in (keys[0], keys[2]))
+
+
+def test_abandoned_staging_dirs_are_swept_after_ttl(tmp_path):
+    cache = SimCache(str(tmp_path / "c"), staging_ttl_s=60)
+    # workdirs de ejecuciones fallidas: nunca pasan por put
+    old, fresh = cache.staging_dir(), cache.staging_dir()
+    os.utime(old, (0, 0))
+    wd = cache.staging_dir()
+    cache.put("ab" * 32, wd, {"workdir": wd})
+    assert not os.path.exists(old) and os.path.isdir(fresh)
+    assert cache.stats()["staging_swept"] == 1
+
+    # sin ningún put, la creación de un staging nuevo también barre (como mucho cada ttl/2)
+    os.utime(fresh, (0, 0))
+    cache._staging_swept = 0.0
+    cache.staging_dir()
+    assert not os.path.exists(fresh)
+    assert cache.stats()["staging_swept"] == 2
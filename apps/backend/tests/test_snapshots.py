@@ -0,0 +1,104 @@
+"""Tests de snapshot/restore (diario de deshacer) en ambos backends del grafo."""
+import copy
+
+import pytest
+
+from apps.backend.graph.store import GraphStore
+from apps.backend.graph.compact_store import CompactGraphStore
+from apps.backend.graph.patcher import apply_patch, apply_patch_batch
+from apps.backend.graph.engine import run_rulesets
+from apps.backend.graph.context import get_context_values
+
+
+def _node(id, type, props=None):
+    return {"op": "add_node", "node": {"id": id, "type": type, "props": props, "labels": ["CIG"]}}
+
+
+def _edge(id, type, frm, to, props=None):
+    return {"op": "add_edge", "edge": {"id": id, "type": type, "from": frm, "to": to, "props": props}}
+
+
+BASE = {"namespace": "CIG", "ops": [
+    _node("net:A", "Net"), _node("net:B", "Net"),
+    _node("env", "Environment", {"Vbus_peak": 380}),
+    _node("cmp:Q1", "ComponentInstance", {"class": "MOSFET", "Vds_max": {"value": 400, "unit": "V"}}),
+    _node("cmp:Q1#d", "Pin", {"name": "d"}), _node("cmp:Q1#s", "Pin", {"name": "s"}),
+    _edge("cmp:Q1#d__of", "pinOf", "cmp:Q1#d", "cmp:Q1"), _edge("cmp:Q1#s__of", "pinOf", "cmp:Q1#s", "cmp:Q1"),
+    _edge("cmp:Q1#d__on", "onNet", "cmp:Q1#d", "net:A", {"w": 1}), _edge("cmp:Q1#s__on", "onNet", "cmp:Q1#s", "net:B"),
+]}
+
+ATTEMPT = {"namespace": "CIG", "ops": [
+    _node("net:C", "Net"),
+    _node("cmp:Q1", "ComponentInstance", {"class": "MOSFET"}),
+    {"op": "update_node", "node": {"id": "env", "props": {"Vbus_peak": 500}}},
+    {"op": "update_edge", "edge": {"id": "cmp:Q1#d__on", "props": {"w": 2}}},
+    _edge("cmp:Q1#d__on", "onNet", "cmp:Q1#d", "net:C"),
+    _edge("x__on", "onNet", "x:P1", "net:ghost"),
+    {"op": "remove_node", "id": "net:B"},
+    {"op": "remove_edge", "id": "cmp:Q1#s__of"},
+    _node("net:A", "Signal"),
+]}
+
+
+def _content(s):
+    """Estado observable por la API pública, sin depender del orden de nodos."""
+    c = s.connectivity
+    return (
+        sorted((n, s.node_type(n), repr(dict(s.node_props(n)))) for n in s.node_ids()),
+        sorted((u, v, k, d["type"], repr(dict(d["props"]))) for u, v, k, d in s.edges_iter()),
+        {t: sorted(s.nodes_by_type(t)) for t in ("Net", "Pin", "ComponentInstance", "Signal")},
+        {n: sorted(c.terminals_of_net(n)) for n in s.nodes_by_type("Net")},
+        {n: sorted(c.pins_of_component(n)) for n in s.nodes_by_type("ComponentInstance")},
+    )
+
+
+@pytest.fixture(params=[GraphStore, CompactGraphStore], ids=["networkx", "compact"])
+def store(request):
+    s = request.param()
+    apply_patch(s, copy.deepcopy(BASE))
+    return s
+
+
+@pytest.mark.parametrize("apply", [apply_patch, apply_patch_batch])
+def test_restore_undoes_a_failed_attempt(store, apply):
+    before = _content(store)
+    first = run_rulesets(store, "d")
+    ctx = get_context_values(store)
+
+    sid = store.snapshot()
+    apply(store, copy.deepcopy(ATTEMPT))
+    assert _content(store) != before
+    run_rulesets(store, "d")
+
+    assert store.restore(sid)
+    assert _content(store) == before
+    assert get_context_values(store) == ctx
+    # el motor incremental ve la restauración como un cambio más
+    assert run_rulesets(store, "d")["violations"] == first["violations"]
+
+    # el snapshot sigue valiendo para un segundo intento
+    apply(store, copy.deepcopy(ATTEMPT))
+    assert store.restore(sid)
+    assert _content(store) == before
+
+
+def test_restore_drops_later_snapshots_and_release_stops_journaling(store):
+    s1 = store.snapshot()
+    store.add_node("net:X", "Net")
+    s2 = store.snapshot()
+    store.add_node("net:Y", "Net")
+    assert store.restore(s1)
+    assert store.snapshot_ids() == [s1]
+    assert not store.restore(s2)
+    assert not store.has_node("net:X")
+
+    store.release_snapshot(s1)
+    assert store.snapshot_ids() == []
+    store.add_node("net:Z", "Net")
+    assert store._undo is None
+
+
+def test_oldest_snapshot_is_released_past_the_limit(store):
+    ids = [store.snapshot() for _ in range(store.MAX_SNAPSHOTS + 2)]
+    assert store.snapshot_ids() == ids[2:]
+    assert not store.restore(ids[0])
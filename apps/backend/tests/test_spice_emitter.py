@@ -0,0 +1,174 @@
+"""Tests del netlist SPICE determinista desde el CIG (modelos, trafos, probes y caché por versión)."""
+import pytest
+
+from apps.backend.toolkit.toolkit import Toolkit
+from apps.backend.tools import spice_emitter as emitter_mod
+from apps.backend.tools.spice_emitter import emit_spice, spice_value
+from apps.backend.schema.spice_schema import SpiceEmitInput
+
+
+def _pins(*names):
+    return [{"name": n, "pin_id": str(i + 1)} for i, n in enumerate(names)]
+
+
+def _flyback() -> dict:
+    return {
+        "design_id": "urn:design:fly", "title": "flyback",
+        "nets": [{"id": "VIN"}, {"id": "SW"}, {"id": "SEC"}, {"id": "VOUT"},
+                 {"id": "PGND", "type": "GROUND", "is_reference_ground": True}, {"id": "SGND", "type": "GROUND"}],
+        "components": [
+            {"ref": "V1", "class": "Source", "pins": _pins("+", "-"),
+             "params": [{"name": "V", "quantity": {"value": 48, "unit": "V"}}]},
+            {"ref": "T1", "class": "Transformer", "pins": _pins("P1", "P2", "S1", "S2"),
+             "params": [{"name": "Lp", "quantity": {"value": 400, "unit": "uH"}}, {"name": "ratio", "value": 2}]},
+            {"ref": "Q1", "class": "MOSFET", "pins": _pins("D", "G", "S")},
+            {"ref": "D1", "class": "Diode", "pins": _pins("K", "A")},
+            {"ref": "C1", "class": "Capacitor", "pins": _pins("1", "2"),
+             "params": [{"name": "C", "quantity": {"value": 470, "unit": "uF"}}]},
+            {"ref": "LOAD", "class": "Resistor", "pins": _pins("1", "2"),
+             "params": [{"name": "R", "quantity": {"value": 8, "unit": "Ohm"}}]},
+        ],
+        "connections": [
+            {"component_ref": "V1", "pin_id": "1", "net": "VIN"}, {"component_ref": "V1", "pin_id": "2", "net": "PGND"},
+            {"component_ref": "T1", "pin_id": "1", "net": "VIN"}, {"component_ref": "T1", "pin_id": "2", "net": "SW"},
+            {"component_ref": "T1", "pin_id": "3", "net": "SEC"}, {"component_ref": "T1", "pin_id": "4", "net": "SGND"},
+            {"component_ref": "Q1", "pin_id": "1", "net": "SW"}, {"component_ref": "Q1", "pin_id": "2", "net": "VIN"},
+            {"component_ref": "Q1", "pin_id": "3", "net": "PGND"},
+            {"component_ref": "D1", "pin_id": "1", "net": "VOUT"}, {"component_ref": "D1", "pin_id": "2", "net": "SEC"},
+            {"component_ref": "C1", "pin_id": "1", "net": "VOUT"}, {"component_ref": "C1", "pin_id": "2", "net": "SGND"},
+            {"component_ref": "LOAD", "pin_id": "1", "net": "VOUT"}, {"component_ref": "LOAD", "pin_id": "2", "net": "SGND"},
+        ],
+    }
+
+
+@pytest.fixture
+def tk():
+    tk = Toolkit()
+    tk.apply_netlist_json(_flyback())
+    return tk
+
+
+def _lines(res):
+    return res["netlist"].splitlines()
+
+
+def test_spice_values_from_quantities_and_strings():
+    assert spice_value(10, "kOhm") == "10k"
+    assert spice_value(1, "MOhm") == "1meg"
+    assert spice_value(470, "uF") == "470u"
+    assert spice_value(4.7, "µH") == "4.7u"
+    assert spice_value(48, "V") == "48"
+    assert spice_value("100 nF") == "100n"
+    assert spice_value("2.2Meg") == "2.2Meg"
+    assert spice_value("1M") == "1M"  # sufijo SPICE: mili
+    assert spice_value("PULSE(0 12 0 10n 10n 5u 10u)") == "PULSE(0 12 0 10n 10n 5u 10u)"
+
+
+def test_connections_of_a_fresh_netlist_reach_the_graph(tk):
+    conn = tk.store.connectivity
+    assert conn.net_of_terminal("urn:cig:cmp:D1#pin:2") == "urn:cig:net:SEC"
+    assert conn.degree_of_net("urn:cig:net:VOUT") == 3
+
+
+def test_emits_complete_netlist_with_roles_ground_and_k_coupled_transformer(tk):
+    res = tk.emit_spice({"analyses": [{"kind": "tran", "params": {"tstop": "20m", "tstep": "1u"}}]})
+    lines = _lines(res)
+    assert lines[0].startswith("* ") and lines[-1] == ".end"
+    assert res["ground"] == "PGND"
+    assert "V1 VIN 0 DC 48" in lines
+    assert "D1 SEC VOUT 1N4148" in lines          # ánodo, cátodo (orden por rol, no por pin)
+    assert "MQ1 SW VIN 0 0 MOSFET_GENERIC" in lines  # letra del elemento por clase; bulk a source
+    assert "RLOAD VOUT SGND 8" in lines and "C1 VOUT SGND 470u" in lines
+    # Ls = Lp / ratio^2; el secundario aislado lleva referencia DC
+    assert {"LT1_P VIN SW 400u", "LT1_S SEC SGND 0.0001", "KT1 LT1_P LT1_S 0.999", "RT1_ISO SGND 0 1G"} <= set(lines)
+    assert ".tran 1u 20m" in lines
+    assert res["models"] == {"1N4148": "generic", "MOSFET_GENERIC": "generic"}
+    assert any("genéricos" in w for w in res["warnings"])
+
+
+def test_transformer_strategy_precedence(tk):
+    ideal = {"build_policy": {"transformer_strategy": "ideal_FCE"}}
+    lines = _lines(tk.emit_spice(ideal))
+    assert "ET1 SEC T1_sx VIN SW 0.5" in lines and "FT1 VIN SW VT1_SENSE -0.5" in lines
+    assert "LT1_M VIN SW 400u" in lines
+    # device_map explícito gana a build_policy; el hint del componente gana a ambos
+    assert "KT1 LT1_P LT1_S 0.999" in _lines(tk.emit_spice({**ideal, "device_map": {"transformer_strategy": "K_coupled"}}))
+    hinted = tk.emit_spice({**ideal, "device_map": {"transformer_strategy": "K_coupled"},
+                            "component_hints": [{"ref": "T1", "transformer": {"strategy": "ideal_FCE", "ratio": 4}}]})
+    assert "ET1 SEC T1_sx VIN SW 0.25" in _lines(hinted)
+
+
+def test_preferred_and_fallback_models(tk):
+    lib = {"name": "diodes", "models": {"1N4148": ".model D1N4148 D(Is=2.5n Rs=0.6)"}}
+    policy = {"preferred_models": {"Diode": "1N5819"}, "fallback_models": {"Diode": "1N4148"}}
+    res = tk.emit_spice({"build_policy": policy, "libraries": [lib]})
+    # el preferido no está definido en libraries: se usa el fallback con su .model inline
+    assert "D1 SEC VOUT D1N4148" in _lines(res) and ".model D1N4148 D(Is=2.5n Rs=0.6)" in _lines(res)
+    assert res["models"]["D1N4148"] == "inline"
+    # con un .include el preferido se da por resuelto en la librería
+    inc = tk.emit_spice({"build_policy": policy, "libraries": [lib, {"name": "vendor", "include": "/libs/vendor.lib"}]})
+    assert ".model D1N4148 D(Is=2.5n Rs=0.6)" in _lines(inc)  # inline sigue teniendo prioridad
+    hinted = tk.emit_spice({"build_policy": policy, "component_hints": [{"ref": "D1", "spice_model_name": "1N5819"}],
+                            "libraries": [{"name": "vendor", "include": "/libs/vendor.lib"}]})
+    assert '.include "/libs/vendor.lib"' in _lines(hinted) and "D1 SEC VOUT 1N5819" in _lines(hinted)
+    assert hinted["models"]["1N5819"] == "include"
+    strict = tk.emit_spice({"library_resolution": {"require_models_for": ["MOSFET"]}})
+    assert not strict["ok"] and any("MOSFET" in e for e in strict["errors"])
+
+
+def test_probes_follow_probe_contract(tk):
+    res = tk.emit_spice({
+        "probes": ["iLOAD", "v(V1)", "v(output_dc)", "@alias:vsec", "v(VOUT,PGND)", "i(T9)"],
+        "aliases": [{"name": "vsec", "value": "SEC"}],
+        "net_name_map": {"output_dc": "VOUT"},
+        "probe_contract": {"required_nodes_exist": ["VOUT", "VAUX"]},
+        "build_policy": {"strictness": "lenient"},
+    })
+    assert res["probes"] == ["i(RLOAD)", "v(VIN)", "v(VOUT)", "v(SEC)", "v(VOUT)", "i(T9)"]
+    assert res["ok"] and any("T9" in w for w in res["warnings"]) and any("VAUX" in w for w in res["warnings"])
+    strict = tk.emit_spice({"probes": ["i(T9)"], "build_policy": {"strictness": "strict"}})
+    assert not strict["ok"] and any("T9" in e for e in strict["errors"])
+
+
+def test_controls_and_default_analyses_from_build_policy(tk):
+    res = tk.emit_spice({"build_policy": {"analyses_default": [{"kind": "tran", "tstop": "5m"}],
+                                          "options_default": {"reltol": "1e-4"},
+                                          "controls_default": ["run"]}})
+    lines = _lines(res)
+    assert ".options reltol=1e-4" in lines and ".tran 5e-06 5m" in lines
+    assert lines[lines.index(".control"):] == [".control", "set noaskquit", "set filetype=ascii",
+                                              "set wr_singlescale", "run", ".endc", ".end"]
+    assert ".control" not in tk.emit_spice({"build_policy": {"controls_default": ["run"]},
+                                            "control_contract": {"ownership": "user_provided"}})["netlist"]
+
+
+def test_output_is_cached_per_version_and_regenerated_per_touched_device(tk, monkeypatch):
+    spec = SpiceEmitInput(probes=["v(VOUT)"])
+    first = emit_spice(tk.store, spec)
+    again = emit_spice(tk.store, spec)
+    assert again["cache"]["hit"] and again["netlist"] == first["netlist"]
+
+    built = []
+    real = emitter_mod._device
+
+    def _counting(store, ctx, urn):
+        built.append(urn)
+        return real(store, ctx, urn)
+
+    monkeypatch.setattr(emitter_mod, "_device", _counting)
+    tk.store.update_node("urn:cig:cmp:LOAD", {"R": {"value": 12, "unit": "Ohm"}})
+    res = emit_spice(tk.store, spec)
+    assert built == ["urn:cig:cmp:LOAD"] and not res["cache"]["hit"]
+    assert "RLOAD VOUT SGND 12" in _lines(res) and res["version"] == tk.store.version
+
+    # el resultado incremental coincide con una emisión desde cero
+    fresh = Toolkit()
+    fresh.apply_netlist_json(_flyback())
+    fresh.store.update_node("urn:cig:cmp:LOAD", {"R": {"value": 12, "unit": "Ohm"}})
+    assert emit_spice(fresh.store, spec)["netlist"] == res["netlist"]
+
+    # una net nueva puede cambiar la tierra: se rehace todo
+    built.clear()
+    tk.store.add_node("urn:cig:net:AUX", "Net", {"type": "SIGNAL"})
+    emit_spice(tk.store, spec)
+    assert len(built) == 6
@@ -0,0 +1,169 @@
+"""Tests de la detección de régimen permanente ciclo a ciclo y de stop_at_steady_state en spice_autorun."""
+import json
+import textwrap
+
+import numpy as np
+import pytest
+
+from apps.backend.tools import ngspice_shared as ns
+from apps.backend.tools import sim_cache as sim_cache_mod
+from apps.backend.tools.steady_state import (cycle_convergence, match_kpi_targets, spice_number, steady_posthoc,
+                                             steady_spec, tran_stop)
+from apps.backend.tools.run_tools import spice_autorun
+from apps.backend.schema.spice_schema import KPIContract, SpiceAlias, SpiceAutorunInput
+
+TAU = 0.5e-3
+F_SW = 100e3
+
+
+def _time(duration: float = 10e-3, n: int = 100_000) -> np.ndarray:
+    # paso variable, como ngspice
+    dt = np.random.default_rng(0).uniform(0.2, 1.8, n)
+    t = np.concatenate(([0.0], np.cumsum(dt)))
+    return t * duration / t[-1]
+
+
+def _buck(t: np.ndarray, delay: float = 0.0) -> np.ndarray:
+    tt = np.clip(t - delay, 0.0, None)
+    return 24.0 * (1.0 - np.exp(-tt / TAU)) + 0.05 * np.sin(2 * np.pi * F_SW * t)
+
+
+def test_spice_numbers_and_tstop():
+    assert spice_number("10m") == pytest.approx(0.01)
+    assert spice_number("2.2Meg") == pytest.approx(2.2e6)
+    assert spice_number("5us") == pytest.approx(5e-6)
+    assert spice_number("abc") is None
+    assert tran_stop("* t\nR1 a 0 1\n.tran 10n 20m 0 50n\n.end") == pytest.approx(0.02)
+    assert tran_stop(".control\ntran 1u 3m\n.endc") == pytest.approx(3e-3)
+    assert tran_stop(".op\n.end") is None
+
+
+def test_settling_converter_converges_once_remaining_error_is_within_tolerance():
+    t = _time()
+    y = _buck(t)
+    spec = steady_spec(["v(out)"], {}, 0.005, float(t[-1]))
+    verdict = steady_posthoc(t, {"v(out)": y}, spec)
+    assert verdict["converged"]
+    res = verdict["probes"]["v(out)"]
+    assert res["period"] == pytest.approx(1 / F_SW, rel=0.01)
+    # se para mucho antes de tstop, con el error restante por debajo de la tolerancia
+    assert verdict["t"] < 0.5 * t[-1]
+    assert 24.0 * np.exp(-verdict["t"] / TAU) <= res["tol"]
+    assert abs(res["value"] - 24.0) <= res["tol"]
+
+
+def test_kpi_band_tightens_tolerance():
+    t = _time()
+    y = _buck(t)
+    loose = steady_posthoc(t, {"v(out)": y}, steady_spec(["v(out)"], {}, 0.005, None))
+    kpi = {"v(out)": {"min": 23.9, "max": 24.1}}
+    tight = steady_posthoc(t, {"v(out)": y}, steady_spec(["v(out)"], kpi, 0.005, None))
+    assert tight["probes"]["v(out)"]["tol"] == pytest.approx(0.02)
+    assert tight["t"] > loose["t"]
+
+
+def test_no_false_convergence_before_soft_start_or_on_ramps():
+    t = _time()
+    # la salida no arranca hasta 3 ms: el tramo plano (con rizado) no cuenta como régimen permanente
+    verdict = steady_posthoc(t, {"v(out)": _buck(t, delay=3e-3)}, steady_spec(["v(out)"], {}, 0.005, None))
+    assert verdict["converged"] and verdict["t"] > 3e-3 + 3 * TAU
+    # una rampa nunca converge; una señal que nunca se mueve tampoco
+    assert not steady_posthoc(t, {"v(out)": 24.0 * t / t[-1]}, steady_spec(["v(out)"], {}, 0.005, None))["converged"]
+    assert not steady_posthoc(t, {"v(out)": np.zeros_like(t)}, steady_spec(["v(out)"], {}, 0.005, None))["converged"]
+
+
+def test_underdamped_peak_is_not_taken_as_steady_state():
+    t = _time()
+    y = 24.0 * (1.0 - np.exp(-t / (2 * TAU)) * np.cos(2 * np.pi * 1e3 * t))
+    # en el primer pico la pendiente pasa por cero pero las ventanas anteriores están lejos
+    res = cycle_convergence(t[t <= 0.5e-3], y[t <= 0.5e-3])
+    assert not res["converged"]
+    verdict = steady_posthoc(t, {"v(out)": y}, steady_spec(["v(out)"], {}, 0.005, None))
+    assert verdict["converged"] and abs(verdict["probes"]["v(out)"]["value"] - 24.0) <= 0.12
+
+
+def test_kpis_are_matched_to_probes_by_expression_alias_or_net_name():
+    targets = {"v_out": {"min": 23.9, "max": 24.1}, "i_out": {"min": 2.9, "max": 3.1},
+               "v(aux)": {"min": 11, "max": 13}, "eff": {"min": 0.9}}
+    probes = ["v(VOUT)", "i(RLOAD)", "V(aux)"]
+    matched, unmatched = match_kpi_targets(targets, probes, [("i_out", "RLOAD", "branch")], {"v_out": "VOUT"})
+    assert matched == {"v(VOUT)": targets["v_out"], "i(RLOAD)": targets["i_out"], "V(aux)": targets["v(aux)"]}
+    assert unmatched == ["eff"]
+
+
+# ngspice batch falso: un buck que arranca con tau = 0.5 ms y rizado a 100 kHz, hasta tstop
+_BUCK_NGSPICE = textwrap.dedent("""\
+    import math, re, sys
+    if sys.argv[1:] == ["-v"]:
+        print("** ngspice-42 : fake"); sys.exit(0)
+    log, net = sys.argv[sys.argv.index("-o") + 1], sys.argv[-1]
+    text = open(net).read()
+    n = 50000
+    for path in re.findall(r'wrdata "([^"]+)"', text):
+        with open(path, "w") as f:
+            for i in range(n + 1):
+                t = 10e-3 * i / n
+                v = 24 * (1 - math.exp(-t / 0.5e-3)) + 0.05 * math.sin(2 * math.pi * 100e3 * t)
+                f.write(f" {t:.15e}  {v:.15e}\\n")
+    open(log, "w").write("")
+""")
+
+BUCK = """* buck
+V1 in 0 DC 48
+R1 in out 1
+C1 out 0 1u
+.tran 10n 10m
+.end
+"""
+
+
+@pytest.fixture
+def buck_ngspice(install_ngspice, sim_cache):
+    install_ngspice(_BUCK_NGSPICE)
+    return sim_cache
+
+
+def _autorun(**kw):
+    inp = SpiceAutorunInput(**{"input_text": BUCK, "probes": ["v(out)"], **kw})
+    return json.loads(spice_autorun.invoke({"input_data": inp}))
+
+
+def test_batch_reports_convergence_point_after_the_fact(buck_ngspice):
+    kpi = KPIContract(targets={"v_out": {"min": 23.9, "max": 24.1}, "p_loss": {"max": 2.0}})
+    res = _autorun(stop_at_steady_state=True, kpi_contract=kpi,
+                   aliases=[SpiceAlias(name="v_out", value="out")])
+    steady = res["steady"]
+    assert steady["mode"] == "posthoc" and steady["stopped_early"] is False
+    assert steady["converged"] and 2e-3 < steady["converged_at"] < 6e-3
+    assert steady["tstop"] == pytest.approx(10e-3) and steady["sim_time"] == pytest.approx(10e-3)
+    probe = steady["probes"]["v(out)"]
+    assert probe["in_range"] is True and probe["tol"] == pytest.approx(0.02)
+    assert steady["unmatched_kpis"] == ["p_loss"]
+    # la simulación detenida no comparte entrada de caché con la completa
+    plain = _autorun()
+    assert "steady" not in plain and plain["cache"]["key"] != res["cache"]["key"]
+    again = _autorun(stop_at_steady_state=True, kpi_contract=kpi, aliases=[SpiceAlias(name="v_out", value="out")])
+    assert again["cache"]["hit"] and again["steady"] == steady
+
+
+def test_steady_mode_is_ignored_without_transient(buck_ngspice):
+    res = _autorun(stop_at_steady_state=True, input_text=BUCK.replace(".tran 10n 10m", ".op"))
+    assert "steady" not in res
+
+
+@pytest.mark.skipif(ns.find_libngspice() is None, reason="libngspice no instalada")
+def test_shared_backend_stops_transient_at_steady_state(monkeypatch):
+    monkeypatch.setattr(sim_cache_mod, "_CACHE", None)
+    monkeypatch.setenv("KORELIA_SIM_CACHE", "0")
+    monkeypatch.setattr(ns, "_POOL", None)
+    net = "* rc lento\nV1 in 0 DC 10\nR1 in out 1k\nC1 out 0 1u\n.tran 1u 2 0 1u\n.end\n"
+    try:
+        res = json.loads(spice_autorun.invoke({"input_data": SpiceAutorunInput(
+            input_text=net, probes=["v(out)"], backend="shared", stop_at_steady_state=True, timeout_s=60)}))
+    finally:
+        if ns._POOL is not None:
+            ns._POOL.close()
+    steady = res["steady"]
+    assert res["method"] == "ngspice_shared" and res["returncode"] == 0
+    assert steady["stopped_early"] and steady["converged_at"] < 0.5
+    assert res["probes"][0]["metrics"]["avg"] == pytest.approx(10.0, rel=0.01)
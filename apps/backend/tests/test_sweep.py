@@ -0,0 +1,126 @@
+"""Tests de spice_sweep: sustitución de parámetros, puntos del barrido y ejecución en el pool."""
+import json
+import os
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from apps.backend.tools import sweep
+from apps.backend.tools.sweep import apply_params, close_sweep_pool, run_sweep, spice_sweep, sweep_points
+from apps.backend.schema.spice_schema import SpiceSweepInput
+
+
+NETLIST = """* RC param
+.param rload=1k
+V1 in 0 DC 1
+R1 in out {rload}
+C1 out 0 1u
+.tran 1u 1m
+.end
+"""
+
+# ngspice falso: devuelve como medida el valor de rload y de C1 del netlist recibido
+_FAKE_NGSPICE = textwrap.dedent("""\
+    import re, sys
+    if sys.argv[1:] == ["-v"]:
+        print("** ngspice-42 : fake")
+        sys.exit(0)
+    log, net = sys.argv[sys.argv.index("-o") + 1], sys.argv[-1]
+    text = open(net).read()
+    for path in re.findall(r'wrdata "([^"]+)"', text):
+        with open(path, "w") as f:
+            f.write("".join(f"{i * 1e-4} {i}\\n" for i in range(10)))
+    rload = re.search(r"rload=(\\S+)", text).group(1)
+    c1 = re.search(r"^C1 out 0 (\\S+)", text, re.M).group(1)
+    with open(log, "w") as f:
+        f.write(f"rload = {rload}\\nc1 = {c1}\\n")
+    sys.exit(3 if rload == "13" else 0)
+""")
+
+
+@pytest.fixture
+def sweep_ngspice(install_ngspice, monkeypatch):
+    install_ngspice(_FAKE_NGSPICE)
+    monkeypatch.setenv("KORELIA_SWEEP_WORKERS", "2")
+    close_sweep_pool()
+    yield
+    close_sweep_pool()
+
+
+def test_apply_params_rewrites_param_and_element_values_and_adds_missing():
+    out = apply_params(NETLIST, {"RLOAD": 2200.0, "c1": "2.2u", "fsw": 1e5})
+    lines = out.splitlines()
+    assert lines[1] == ".param fsw=100000"
+    assert ".param rload=2200" in lines
+    assert "C1 out 0 2.2u" in lines
+    # las referencias {rload} no se tocan
+    assert "R1 in out {rload}" in lines
+    assert apply_params(".param a={b*2} b=1", {"a": 3}) == ".param a=3 b=1"
+
+
+def test_grid_times_monte_carlo_samples_is_reproducible_and_within_tolerance():
+    spec = SpiceSweepInput(
+        input_text=NETLIST, grid={"rload": [1e3, 2e3]},
+        tolerances={"c1": {"value": 1e-6, "tol": {"value": 10, "unit": "%"}}},
+        samples=50, distribution="uniform", seed=7,
+    )
+    points = sweep_points(spec)
+    assert len(points) == 100
+    assert [p["rload"] for p in points[:2]] == [1e3, 1e3] and points[50]["rload"] == 2e3
+    c = np.array([p["c1"] for p in points])
+    assert c.min() >= 0.9e-6 and c.max() <= 1.1e-6 and c.std() > 0
+    assert points == sweep_points(spec)
+    # tolerancia absoluta
+    abs_spec = SpiceSweepInput(input_text=NETLIST, tolerances={"vin": {"value": 12, "tol": {"value": 0.5, "unit": "V"}}},
+                               samples=200, distribution="uniform")
+    v = np.array([p["vin"] for p in sweep_points(abs_spec)])
+    assert v.min() >= 11.5 and v.max() <= 12.5
+
+
+def test_sweep_runs_points_in_pool_and_returns_compact_table(sweep_ngspice):
+    events = []
+    spec = SpiceSweepInput(input_text=NETLIST, grid={"rload": [10, 13, 22], "C1": [1e-6, 2e-6]},
+                           probes=["v(out)"], use_cache=False, output="csv", backend="batch")
+    res = run_sweep(spec, on_progress=events.append)
+
+    assert (res["points"], res["ok"], res["workers"]) == (6, 4, 2)
+    assert res["columns"] == ["point", "rload", "C1", "v(out).avg", "v(out).rms", "v(out).p2p", "meas.c1", "meas.rload"]
+    by_point = {row[0]: row for row in res["rows"]}
+    # cada fila lleva las medidas del netlist de su punto
+    assert by_point[0][-2:] == [1e-6, 10.0] and by_point[5][-2:] == [2e-6, 22.0]
+    assert [f["params"]["rload"] for f in res["failed"]] == [13, 13]
+    assert res["stats"]["meas.rload"] == {"min": 10.0, "max": 22.0, "mean": 16.0, "std": 6.0}
+    assert sorted(e["done"] for e in events) == list(range(1, 7))
+    assert all(e["total"] == 6 for e in events)
+
+
+def test_sweep_rejects_too_many_points_without_running():
+    spec = SpiceSweepInput(input_text=NETLIST, grid={"rload": list(range(30))},
+                           tolerances={"c1": {"value": 1e-6, "tol": {"value": 5, "unit": "%"}}}, max_points=100)
+    res = json.loads(spice_sweep.invoke({"input_data": spec}))
+    assert res["points"] == 30 * 32 and "max_points" in res["error"]
+
+
+def _crashing_point(payload):
+    # mata el worker entero (no sólo ngspice) en el punto rload=13
+    if "rload=13" in payload["input_text"]:
+        os._exit(1)
+    return sweep._run_point(payload)
+
+
+def test_worker_crash_only_fails_the_crashing_point_of_concurrent_sweeps(sweep_ngspice, monkeypatch):
+    monkeypatch.setenv("KORELIA_SWEEP_WORKERS", "4")
+    monkeypatch.setattr(sweep, "_run_point", _crashing_point)
+    close_sweep_pool()
+    common = dict(input_text=NETLIST, probes=["v(out)"], use_cache=False, output="csv", backend="batch")
+    specs = [SpiceSweepInput(grid={"rload": [10, 22, 33, 47, 13, 56, 68, 82]}, **common),
+             SpiceSweepInput(grid={"rload": [11, 23, 34, 48, 57, 69, 83, 91]}, **common)]
+    with ThreadPoolExecutor(2) as ex:
+        crashed, clean = ex.map(run_sweep, specs)
+
+    assert crashed["ok"] == 7
+    assert [f["params"]["rload"] for f in crashed["failed"]] == [13]
+    assert "worker caído" in crashed["failed"][0]["error"]
+    assert clean["ok"] == 8 and clean["failed"] == []
@@ -0,0 +1,152 @@
+"""Tests del memo de tools de grafo: llamadas repetidas sin cambios en el grafo, invalidación por versión y métricas."""
+import json
+import os
+import uuid
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from apps.backend import agent as agent_mod  # noqa: E402
+from apps.backend.toolkit.memo import ToolMemo, payload_key  # noqa: E402
+from apps.backend.toolkit.toolkit import Toolkit  # noqa: E402
+
+
+def _pins(*names):
+    return [{"name": n, "pin_id": str(i + 1)} for i, n in enumerate(names)]
+
+
+def _divider(r2: float = 10) -> dict:
+    return {
+        "design_id": "urn:design:div", "title": "divisor",
+        "nets": [{"id": "VIN"}, {"id": "OUT"}, {"id": "GND", "type": "GROUND", "is_reference_ground": True}],
+        "components": [
+            {"ref": "V1", "class": "Source", "pins": _pins("+", "-"),
+             "params": [{"name": "V", "quantity": {"value": 12, "unit": "V"}}]},
+            {"ref": "R1", "class": "Resistor", "pins": _pins("1", "2"),
+             "params": [{"name": "R", "quantity": {"value": 10, "unit": "kOhm"}}]},
+            {"ref": "R2", "class": "Resistor", "pins": _pins("1", "2"),
+             "params": [{"name": "R", "quantity": {"value": r2, "unit": "kOhm"}}]},
+        ],
+        "connections": [
+            {"component_ref": "V1", "pin_id": "1", "net": "VIN"}, {"component_ref": "V1", "pin_id": "2", "net": "GND"},
+            {"component_ref": "R1", "pin_id": "1", "net": "VIN"}, {"component_ref": "R1", "pin_id": "2", "net": "OUT"},
+            {"component_ref": "R2", "pin_id": "1", "net": "OUT"}, {"component_ref": "R2", "pin_id": "2", "net": "GND"},
+        ],
+    }
+
+
+SPEC = {"design_id": "urn:design:div", "metrics": [
+    {"id": "urn:dig:req:vout", "name": "Vout", "target": {"value": 6, "unit": "V"}}]}
+
+
+@pytest.fixture
+def memo(monkeypatch):
+    memo = ToolMemo()
+    monkeypatch.setattr(agent_mod, "_TOOL_MEMO", memo)
+    return memo
+
+
+@pytest.fixture
+def thread():
+    return f"memo-{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture
+def applies(monkeypatch):
+    counts = {"spec": 0, "netlist": 0, "emit": 0}
+    for name, method in (("spec", "apply_spec_json"), ("netlist", "apply_netlist_json"), ("emit", "emit_spice")):
+        real = getattr(Toolkit, method)
+
+        def counting(self, *a, _real=real, _name=name, **kw):
+            counts[_name] += 1
+            return _real(self, *a, **kw)
+
+        monkeypatch.setattr(Toolkit, method, counting)
+    return counts
+
+
+def _spec(thread, spec=SPEC):
+    return agent_mod.spec_schema_validator.invoke({"spec_json": spec, "thread_id": thread})
+
+
+def _netlist(thread, netlist):
+    return agent_mod.graph_apply_netlist_json.invoke({"netlist_json": netlist, "thread_id": thread})
+
+
+def test_payload_key_is_canonical():
+    assert payload_key("t", {"a": 1, "b": [1, 2]}) == payload_key("t", {"b": [1, 2], "a": 1})
+    assert payload_key("t", {"a": 1}) != payload_key("u", {"a": 1})
+    assert payload_key("t", {"a": 1}, "true") != payload_key("t", {"a": 1}, "false")
+
+
+def test_repeated_call_on_unchanged_graph_is_served_from_memo(memo, thread, applies):
+    first = _spec(thread)
+    version = agent_mod._GRAPH_THREADS.get(thread).store.version
+    # mismo JSON con otro orden de claves: no se vuelve a aplicar y el grafo no cambia
+    again = _spec(thread, {"metrics": SPEC["metrics"], "design_id": SPEC["design_id"]})
+    assert again == first and applies["spec"] == 1
+    assert agent_mod._GRAPH_THREADS.get(thread).store.version == version
+    # el snapshot devuelto sigue deshaciendo la aplicación original
+    snap = json.loads(first)["snapshot_id"]
+    assert json.loads(agent_mod.graph_rollback.invoke({"snapshot_id": snap, "thread_id": thread}))["ok"]
+
+
+def test_graph_change_invalidates_and_threads_do_not_share(memo, thread, applies):
+    res = json.loads(_netlist(thread, _divider()))
+    assert res["ok"], res
+    _netlist(thread, _divider())
+    assert applies["netlist"] == 1
+
+    # otro paso cambia el grafo: repetir la netlist ya no es un no-op
+    _spec(thread)
+    _netlist(thread, _divider())
+    assert applies["netlist"] == 2
+    # otra netlist y vuelta a la anterior: se aplica de nuevo
+    _netlist(thread, _divider(r2=22))
+    _netlist(thread, _divider())
+    assert applies["netlist"] == 4
+
+    _netlist(thread + "-b", _divider())
+    assert applies["netlist"] == 5
+
+
+def test_emit_is_memoized_per_graph_version(memo, thread, applies):
+    _netlist(thread, _divider())
+    spec = {"emit_json": {"probes": ["v(OUT)"]}, "thread_id": thread}
+    first = json.loads(agent_mod.graph_emit_spice.invoke(spec))
+    assert "R2 OUT 0 10k" in first["netlist"]
+    agent_mod.graph_emit_spice.invoke(spec)
+    assert applies["emit"] == 1
+    _netlist(thread, _divider(r2=22))
+    assert "R2 OUT 0 22k" in json.loads(agent_mod.graph_emit_spice.invoke(spec))["netlist"]
+    assert applies["emit"] == 2
+
+
+def test_metrics_report_hit_rate_and_saved_latency(memo, thread):
+    for _ in range(3):
+        _netlist(thread, _divider())
+    _spec(thread)
+    stats = memo.stats()
+    net = stats["tools"]["graph_apply_netlist_json"]
+    assert net["calls"] == 3 and net["hits"] == 2 and net["hit_rate"] == pytest.approx(0.6667, abs=1e-4)
+    assert net["saved_ms"] > 0 and net["run_ms"] > 0
+    assert stats["tools"]["spec_schema_validator"]["hits"] == 0
+    assert stats["calls"] == 4 and stats["hits"] == 2 and stats["hit_rate"] == 0.5
+
+
+def test_disabled_memo_always_runs(monkeypatch, thread, applies):
+    monkeypatch.setenv("KORELIA_TOOL_MEMO", "0")
+    monkeypatch.setattr(agent_mod, "_TOOL_MEMO", ToolMemo.from_env())
+    _spec(thread)
+    _spec(thread)
+    assert applies["spec"] == 2 and agent_mod._TOOL_MEMO.stats()["calls"] == 0
+
+
+def test_lru_is_bounded_per_store():
+    memo = ToolMemo(max_entries=2)
+    tk = Toolkit()
+    for i in range(3):
+        memo.call(tk.store, "t", {"i": i}, lambda i=i: str(i))
+    assert memo.call(tk.store, "t", {"i": 0}, lambda: "recomputed") == "recomputed"
+    assert memo.call(tk.store, "t", {"i": 2}, lambda: "recomputed") == "2"
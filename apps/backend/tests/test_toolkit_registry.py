@@ -0,0 +1,129 @@
+"""Tests del registro acotado de Toolkits por hilo (LRU/TTL, spill y contadores)."""
+import threading
+
+from apps.backend.graph.journal import PatchJournal
+from apps.backend.toolkit.toolkit import Toolkit
+from apps.backend.toolkit.registry import ToolkitRegistry
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.t = 0.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def _grow(tk: Toolkit, n: int, prefix: str = "net") -> None:
+    tk.store.add_nodes_from((f"{prefix}:{i}", "Net", None, ["CIG"]) for i in range(n))
+
+
+def test_lru_by_thread_count_and_counters():
+    reg = ToolkitRegistry(max_threads=2, ttl_s=0)
+    a = reg.get("a")
+    reg.get("b")
+    assert reg.get("a") is a  # "a" pasa a ser el más reciente
+    reg.get("c")  # expulsa "b"
+    assert "b" not in reg and "a" in reg and "c" in reg
+    st = reg.stats()
+    assert (st["hits"], st["misses"], st["evictions"], st["threads"]) == (1, 3, 1, 2)
+    assert st["hit_rate"] == 0.25
+
+
+def test_size_limit_evicts_least_recent_but_never_the_requested_thread():
+    reg = ToolkitRegistry(max_threads=10, max_size=100, ttl_s=0)
+    _grow(reg.get("a"), 60)
+    _grow(reg.get("b"), 30)
+    big = reg.get("c")
+    _grow(big, 150)
+    reg.get("c")  # 240 > 100: salen "a" y "b"; "c" se queda aunque sólo él ya exceda
+    assert len(reg) == 1 and "c" in reg
+    assert reg.stats()["evictions"] == 2
+
+
+def test_idle_ttl_expires_threads():
+    clock = _Clock()
+    reg = ToolkitRegistry(ttl_s=10, clock=clock)
+    reg.get("a")
+    clock.t = 5
+    reg.get("b")
+    clock.t = 12
+    reg.get("b")
+    assert "a" not in reg and "b" in reg
+    assert reg.stats()["expired"] == 1
+
+
+def test_spill_and_reload_restores_graph(tmp_path):
+    reg = ToolkitRegistry(max_threads=1, ttl_s=0, spill_dir=str(tmp_path))
+    tk = reg.get("conv/1")
+    _grow(tk, 5)
+    tk.store.add_edge("e1", "connects", "net:0", "net:1", {"w": 1})
+    reg.get("other")  # expulsa y vuelca "conv/1"
+    assert reg.stats()["spills"] == 1
+
+    back = reg.get("conv/1")
+    assert back is not tk
+    assert list(back.store.node_ids()) == list(tk.store.node_ids())
+    assert back.store.edge_endpoints("e1") == ("net:0", "net:1")
+    assert reg.stats()["reloads"] == 1
+    assert not any(p.name.startswith("conv_1") for p in tmp_path.iterdir())
+
+
+def test_journaled_toolkits_reload_from_their_journal(tmp_path):
+    def factory(tid):
+        return Toolkit(journal=PatchJournal(str(tmp_path / f"{tid}.jsonl"), fsync=False))
+
+    reg = ToolkitRegistry(factory, max_threads=1, ttl_s=0, spill_dir=str(tmp_path / "spill"))
+    first = reg.get("a")
+    first.apply_spec_json({"design_id": "urn:dig:design:a",
+                           "metrics": [{"id": "urn:dig:metric:eff", "name": "efficiency"}]})
+    reg.get("b")
+    assert reg.stats()["spills"] == 0
+    back = reg.get("a")
+    assert back is not first
+    assert back.store.node_type("urn:dig:metric:eff") == "Requirement"
+
+
+def test_concurrent_gets_share_one_toolkit():
+    reg = ToolkitRegistry()
+    seen = []
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        seen.append(reg.get("shared"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(tk) for tk in seen}) == 1
+    assert reg.stats()["misses"] == 1
+
+
+def test_spill_files_of_similar_thread_ids_do_not_collide(tmp_path):
+    reg = ToolkitRegistry(max_threads=1, ttl_s=0, spill_dir=str(tmp_path))
+    _grow(reg.get("a/b"), 3, "slash")
+    _grow(reg.get("a_b"), 2, "under")  # expulsa y vuelca "a/b"
+    reg.get("x")  # expulsa y vuelca "a_b"
+    assert reg.stats()["spills"] == 2
+    assert sorted(reg.get("a/b").store.node_ids()) == ["slash:0", "slash:1", "slash:2"]
+    assert sorted(reg.get("a_b").store.node_ids()) == ["under:0", "under:1"]
+
+
+def test_threads_in_use_are_never_evicted(tmp_path):
+    clock = _Clock()
+    reg = ToolkitRegistry(max_threads=1, ttl_s=10, spill_dir=str(tmp_path), clock=clock)
+    with reg.use("busy") as tk:
+        _grow(tk, 3)
+        reg.get("other")  # excede max_threads, pero "busy" está en uso
+        clock.t = 30
+        reg.get("other")  # y ha superado el TTL
+        assert "busy" in reg and reg.evict("busy") is False
+        _grow(tk, 2, "late")  # el cambio tras el intento de expulsión no se pierde
+        assert reg.stats()["pinned"] == 1
+    # ocioso otra vez: el siguiente acceso a otro hilo lo vuelca con todos sus cambios
+    reg.get("third")
+    assert "busy" not in reg and reg.stats()["spills"] == 1
+    assert reg.get("busy").store.size() == 5
@@ -0,0 +1,198 @@
+"""Tests de la carga vectorizada de WRDATA/rawfile, las métricas ponderadas por tiempo y los resúmenes."""
+import json
+import math
+
+import numpy as np
+import pytest
+
+from apps.backend.tools.waveform import (
+    RawFile, Waveform, envelope, load_wrdata, summarize, window_metrics, write_rawfile, _parse_fixed_width,
+)
+from apps.backend.tools.run_tools import spice_autorun
+from apps.backend.schema.spice_schema import SpiceAutorunInput
+from apps.backend.tests.test_sim_cache import NETLIST
+
+
+def _write(path, rows):
+    path.write_text("".join(" ".join(f"{v:.12e}" for v in r) + "\n" for r in rows))
+    return str(path)
+
+
+def test_nonuniform_step_is_time_weighted():
+    # 1 V durante 0..1 con 1000 muestras, 0 V durante 1..2 con sólo 2 muestras
+    x = np.concatenate((np.linspace(0.0, 1.0, 1000), [1.0 + 1e-9, 2.0]))
+    y = np.concatenate((np.ones(1000), [0.0, 0.0]))
+    m = window_metrics(x, y, 0.0)
+    assert m["weighted"] is True
+    assert m["avg"] == pytest.approx(0.5, abs=1e-6)
+    assert m["rms"] == pytest.approx(math.sqrt(0.5), abs=1e-6)
+    # la media de las muestras daría ~0.998
+    assert float(y.mean()) > 0.99
+
+
+def test_window_starts_at_fraction_of_time_with_interpolated_edge():
+    x = np.array([0.0, 1.0, 4.0])
+    y = np.array([0.0, 1.0, 4.0])  # rampa y = x
+    m = window_metrics(x, y, 0.5)  # ventana [2, 4]
+    assert m["avg"] == pytest.approx(3.0)
+    assert m["rms"] == pytest.approx(math.sqrt(28.0 / 3.0))  # ∫x² de 2 a 4 / 2
+    assert m["p2p"] == pytest.approx(2.0)
+    assert (m["samples"], m["window_samples"]) == (3, 1)
+
+
+def test_sine_rms_and_no_scale_fallback():
+    x = np.linspace(0.0, 1e-3, 20001)
+    y = 2.0 * np.sin(2 * np.pi * 5e3 * x)
+    m = window_metrics(x, y, 0.0)
+    assert m["rms"] == pytest.approx(math.sqrt(2.0), rel=1e-4)
+    assert m["avg"] == pytest.approx(0.0, abs=1e-6)
+
+    op = window_metrics([0.0], [3.3], 0.5)
+    assert op["weighted"] is False and op["avg"] == 3.3 and op["p2p"] == 0.0
+
+
+def test_load_wrdata_fast_path_and_complex_columns(tmp_path):
+    path = _write(tmp_path / "v.csv", [(i * 1e-6, i * 0.5) for i in range(100)])
+    x, y = load_wrdata(path)
+    assert x.shape == y.shape == (100,)
+    assert y[-1] == pytest.approx(49.5)
+    # AC: escala, parte real, parte imaginaria
+    x, y = load_wrdata(_write(tmp_path / "ac.csv", [(10.0, 1.0, -2.0), (100.0, 0.5, -1.0)]))
+    assert list(y) == [1.0, 0.5]
+
+
+def test_load_wrdata_skips_malformed_lines(tmp_path):
+    path = tmp_path / "bad.csv"
+    path.write_text(" 0.0 1.0\n 1.0 2.0\nwarning: timestep too small\n 2.0 3.0\n 3.0\n")
+    x, y = load_wrdata(str(path))
+    assert list(x) == [0.0, 1.0, 2.0] and list(y) == [1.0, 2.0, 3.0]
+    assert load_wrdata(str(tmp_path / "missing.csv")) is None
+    (tmp_path / "empty.csv").write_text("")
+    assert load_wrdata(str(tmp_path / "empty.csv")) is None
+
+
+def test_load_wrdata_single_column_lines_do_not_shift_columns(tmp_path):
+    # dos líneas de una columna suman un número par de valores: el recuento por líneas lo detecta
+    path = tmp_path / "odd.csv"
+    path.write_text(" 0.0 1.0\n 5.0\n 6.0\n 1.0 2.0\n")
+    x, y = load_wrdata(str(path))
+    assert list(x) == [0.0, 1.0] and list(y) == [1.0, 2.0]
+
+
+def test_fixed_width_parser_matches_text_parser(tmp_path):
+    rng = np.random.default_rng(3)
+    x = np.cumsum(rng.random(5000) * 1e-7)
+    y = (rng.random(5000) - 0.5) * 10.0 ** rng.integers(-12, 12, 5000)
+    path = tmp_path / "v_vout.csv"
+    # formato de WRDATA: "% e" con espacio en lugar del signo +
+    path.write_text("".join(f" {a: .8e}  {b: .8e} \n" for a, b in zip(x, y)))
+    fast = _parse_fixed_width(np.memmap(str(path), dtype=np.uint8, mode="r"))
+    assert fast is not None
+    ref = np.loadtxt(str(path))
+    np.testing.assert_array_equal(fast[0], ref[:, 0])
+    np.testing.assert_allclose(fast[1], ref[:, 1], rtol=1e-15)
+    assert np.signbit(fast[1]).sum() == np.signbit(ref[:, 1]).sum()
+
+
+# ---------- Rawfile ----------
+
+def _raw_plot(plotname, names, data, flags="real"):
+    head = [f"Title: test", f"Plotname: {plotname}", f"Flags: {flags}",
+            f"No. Variables: {len(names)}", f"No. Points: {data.shape[0]}", "Variables:"]
+    head += [f"\t{i}\t{n}\tvoltage" for i, n in enumerate(names)]
+    return ("\n".join(head) + "\nBinary:\n").encode() + data.astype("<c16" if flags == "complex" else "<f8").tobytes()
+
+
+def test_rawfile_multiple_plots_are_memory_mapped(tmp_path):
+    t = np.linspace(0.0, 1e-3, 11)
+    op = _raw_plot("Operating Point", ["v(out)", "i(v1)"], np.array([[5.0, -1e-3]]))
+    tran = _raw_plot("Transient Analysis", ["time", "out", "v1#branch"], np.column_stack((t, 2 * t, -t)))
+    path = tmp_path / "probes.raw"
+    path.write_bytes(op + tran)
+
+    raw = RawFile(str(path))
+    assert [p.name for p in raw.plots] == ["Operating Point", "Transient Analysis"]
+    plot = raw.plot()
+    assert plot.index("v(out)") == 1 and plot.index("i(V1)") == 2
+    assert isinstance(plot.data, np.memmap)
+    w = Waveform("v(out)", str(path), raw)
+    np.testing.assert_array_equal(w.x, t)
+    np.testing.assert_array_equal(w.y, 2 * t)
+    assert w.ref() == {"raw": str(path), "var": "out"}
+    assert raw.plot("operating").vector(0)[0] == 5.0
+
+
+def test_rawfile_complex_and_roundtrip(tmp_path):
+    f = np.array([10.0, 100.0, 1000.0])
+    h = np.array([1 + 1j, 0.5 - 0.5j, 0.1j])
+    ac = tmp_path / "ac.raw"
+    ac.write_bytes(_raw_plot("AC Analysis", ["frequency", "v(out)"], np.column_stack((f, h)), flags="complex"))
+    plot = RawFile(str(ac)).plot()
+    np.testing.assert_array_equal(plot.vector(0), f)
+    np.testing.assert_array_equal(plot.vector(1), h.real)
+
+    out = tmp_path / "w.raw"
+    write_rawfile(str(out), "tran", "time", f, [("v(a)", [1.0, 2.0, 3.0]), ("i(r1)", [0.0, 0.1, 0.2])])
+    w = Waveform("i(r1)", str(out), RawFile(str(out)))
+    assert list(w.y) == [0.0, 0.1, 0.2]
+    assert Waveform("v(zz)", str(out), RawFile(str(out))).metrics(0.0) is None
+
+
+# ---------- Resúmenes ----------
+
+def test_envelope_is_fixed_size_and_keeps_spikes():
+    x = np.linspace(0.0, 1.0, 1_000_001)
+    y = np.zeros_like(x)
+    y[123_457] = 5.0  # un único pico de una muestra
+    env = envelope(x, y, 16)
+    assert len(env["t"]) == len(env["min"]) == len(env["max"]) == 16
+    assert max(env["max"]) == 5.0 and min(env["min"]) == 0.0
+    assert env["max"].index(5.0) == 1  # cubeta [1/16, 2/16)
+    f = np.logspace(1, 6, 501)
+    assert envelope(f, f, 5, log_x=True)["t"] == pytest.approx([31.623, 316.23, 3162.3, 31623.0, 316230.0])
+
+
+def test_second_order_step_overshoot_and_settling():
+    zeta, wn = 0.5, 2 * np.pi * 1e3
+    t = np.linspace(0.0, 10e-3, 20001)
+    wd = wn * np.sqrt(1 - zeta ** 2)
+    y = 1 - np.exp(-zeta * wn * t) * (np.cos(wd * t) + zeta / np.sqrt(1 - zeta ** 2) * np.sin(wd * t))
+    s = summarize(t, y, 0.5, points=8)
+    assert s["steady_state"] is True and s["final"] == pytest.approx(1.0)
+    assert s["overshoot_pct"] == pytest.approx(100 * math.exp(-zeta * math.pi / math.sqrt(1 - zeta ** 2)), abs=0.01)
+    # banda del 2 %: ~4/(zeta·wn) = 1.27 ms
+    assert 1.1e-3 < s["settling_time"] < 1.5e-3
+    assert s["ripple_hz"] is None  # el residuo numérico no cuenta como rizado
+    assert len(s["envelope"]["t"]) == 8
+
+
+def test_switching_ripple_frequency_and_steady_state_with_variable_step():
+    rng = np.random.default_rng(0)
+    t = np.cumsum(np.where(rng.random(400_000) < 0.3, 1e-9, 5e-9))
+    y = 12 * (1 - np.exp(-t / 100e-6)) + 0.05 * np.sign(np.sin(2 * np.pi * 1e5 * t))
+    s = summarize(t, y, 0.5)
+    assert s["ripple_hz"] == pytest.approx(1e5, rel=1e-3)
+    assert s["steady_state"] is True and s["final"] == pytest.approx(12.0, abs=0.01)
+    assert s["t_steady"] < 0.7e-3 and s["overshoot_pct"] == 0.0
+
+    ramp = summarize(t, t * 1e3, 0.5)
+    assert ramp["steady_state"] is False and ramp["settling_time"] is None
+    assert set(summarize(np.logspace(1, 6, 50), np.ones(50), time_domain=False)) == {"envelope"}
+    assert summarize([0.0], [3.3]) is None
+
+
+def test_spice_autorun_returns_bounded_summaries(fake_ngspice):
+    def run(**kw):
+        inp = SpiceAutorunInput(input_text=NETLIST, probes=["v(out)"], **kw)
+        return json.loads(spice_autorun.invoke({"input_data": inp}))
+
+    first = run(summary_points=4)
+    summary = first["probes"][0]["summary"]
+    assert len(summary["envelope"]["max"]) == 4 and summary["envelope"]["max"][-1] == 9.0
+    assert "steady_state" in summary
+    # el resumen no forma parte de la entrada de caché: se recalcula con el tamaño pedido
+    hit = run(summary_points=2)
+    assert hit["cache"]["hit"] is True and len(hit["probes"][0]["summary"]["envelope"]["t"]) == 2
+    assert "summary" not in run(summary_points=0)["probes"][0]
+    raw = run(summary_points=4, output="raw")["probes"][0]
+    assert raw["var"] and raw["summary"]["envelope"] == summary["envelope"]
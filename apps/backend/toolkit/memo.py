@@ -0,0 +1,105 @@
+"""
+Memo de resultados de las tools de grafo (spec/topology/netlist/emit) para llamadas repetidas del LLM.
+
+Clave: tool + sha256 del payload canónico (el ``model_dump`` que la tool aplica, JSON con claves
+ordenadas) + argumentos extra. Cada entrada guarda la ``version`` del grafo tras la llamada; sólo se
+devuelve mientras el grafo del hilo siga en esa versión, es decir, cuando repetir la llamada sería un
+no-op (mismo payload sobre el estado que ese mismo payload dejó). El ``snapshot_id`` devuelto sigue
+siendo válido: deshace la aplicación original.
+
+Un memo por store (WeakKeyDictionary, como las cachés de ``graph.context``): un Toolkit expulsado y
+recargado por el registro empieza vacío. LRU acotado por store (KORELIA_TOOL_MEMO_SIZE);
+KORELIA_TOOL_MEMO=0 lo desactiva.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+
+def payload_key(tool: str, payload: Any, *extra: Any) -> str:
+    """Hash canónico de (tool, payload, extra): independiente del orden de claves del JSON del LLM."""
+    canon = json.dumps([tool, payload, list(extra)], sort_keys=True, separators=(",", ":"),
+                       ensure_ascii=False, default=str)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+
+class ToolMemo:
+    """Resultados (JSON str) de tools deterministas sobre el grafo, válidos por versión del store."""
+    def __init__(self, max_entries: int = 256, enabled: bool = True) -> None:
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # store -> OrderedDict[key -> (version tras la llamada, resultado, segundos que costó)]
+        self._by_store: "weakref.WeakKeyDictionary[Any, OrderedDict[str, Tuple[int, str, float]]]" = \
+            weakref.WeakKeyDictionary()
+        self._tools: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def from_env(cls) -> "ToolMemo":
+        size = os.getenv("KORELIA_TOOL_MEMO_SIZE")
+        enabled = os.getenv("KORELIA_TOOL_MEMO", "1").lower() not in ("0", "false", "no", "off")
+        return cls(max_entries=int(size) if size else 256, enabled=enabled)
+
+    def _counters(self, tool: str) -> Dict[str, float]:
+        c = self._tools.get(tool)
+        if c is None:
+            c = self._tools[tool] = {"calls": 0, "hits": 0, "saved_s": 0.0, "run_s": 0.0}
+        return c
+
+    def call(self, store: Any, tool: str, payload: Any, compute: Callable[[], str], *extra: Any) -> str:
+        """Resultado memoizado de ``compute()`` (que aplica ``payload`` sobre ``store``)."""
+        if not self.enabled:
+            return compute()
+        t0 = time.perf_counter()
+        key = payload_key(tool, payload, *extra)
+        with self._lock:
+            c = self._counters(tool)
+            c["calls"] += 1
+            entries = self._by_store.get(store)
+            hit = entries.get(key) if entries is not None else None
+            if hit is not None and hit[0] == store.version:
+                entries.move_to_end(key)
+                c["hits"] += 1
+                # lo que habría costado repetir la llamada menos lo que cuesta el hash + lookup
+                c["saved_s"] += max(hit[2] - (time.perf_counter() - t0), 0.0)
+                return hit[1]
+        result = compute()
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self._counters(tool)["run_s"] += elapsed
+            entries = self._by_store.get(store)
+            if entries is None:
+                entries = self._by_store[store] = OrderedDict()
+            entries[key] = (store.version, result, elapsed)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tools = {}
+            for tool, c in self._tools.items():
+                tools[tool] = {
+                    "calls": int(c["calls"]),
+                    "hits": int(c["hits"]),
+                    "hit_rate": round(c["hits"] / c["calls"], 4) if c["calls"] else 0.0,
+                    "saved_ms": round(c["saved_s"] * 1e3, 3),
+                    "run_ms": round(c["run_s"] * 1e3, 3),
+                }
+            calls = sum(t["calls"] for t in tools.values())
+            hits = sum(t["hits"] for t in tools.values())
+            return {
+                "enabled": self.enabled,
+                "stores": len(self._by_store),
+                "calls": calls,
+                "hits": hits,
+                "hit_rate": round(hits / calls, 4) if calls else 0.0,
+                "saved_ms": round(sum(t["saved_ms"] for t in tools.values()), 3),
+                "tools": tools,
+            }
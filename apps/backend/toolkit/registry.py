@@ -0,0 +1,260 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
+from apps.backend.graph.journal import dump_store, load_store, thread_file_stem
+from apps.backend.toolkit.toolkit import Toolkit
+
+
+def _env_int(name: str, default: int) -> int:
+    v = os.getenv(name)
+    return int(v) if v else default
+
+
+class _Entry:
+    """Toolkit en memoria, último acceso, peticiones en curso (``pins``) y si ya terminó de recargarse."""
+    __slots__ = ("tk", "last", "pins", "ready")
+
+    def __init__(self, tk: Toolkit, last: float) -> None:
+        self.tk = tk
+        self.last = last
+        self.pins = 0
+        self.ready = threading.Event()
+        self.ready.set()
+
+
+# (thread_id, toolkit, generación del spill o None) de un hilo expulsado, pendiente de cerrar/volcar
+_Victim = Tuple[str, Toolkit, Optional[int]]
+
+
+class ToolkitRegistry:
+    """
+    Registro acotado de Toolkits por ``thread_id`` (uno por conversación del agente).
+
+    - LRU por número de hilos (``max_threads``) y por tamaño total de los grafos
+      (``max_size``, nodos + edges según ``store.size()``).
+    - TTL de inactividad (``ttl_s``): los hilos sin uso se expulsan en el siguiente acceso.
+    - Sólo se expulsan hilos ociosos: ``use`` fija el Toolkit mientras dura la petición, así que
+      un cambio en curso nunca se pierde por un spill a mitad. Los límites pueden superarse
+      temporalmente mientras haya hilos fijados.
+    - Spill opcional a ``spill_dir``: el grafo expulsado se vuelca a disco y se recarga si el
+      hilo vuelve. Los Toolkits con journal persistente no necesitan spill (se recargan del journal).
+      Los snapshots de deshacer no sobreviven a la expulsión.
+    - Contadores de hits/misses/evictions en ``stats()``.
+
+    Thread-safe: FastAPI ejecuta el handler síncrono de /chat en un threadpool. El estado del
+    registro se protege con un lock; la escritura y lectura de los ficheros de spill se hacen
+    fuera de él (un hilo que vuelve mientras se vuelca recupera el Toolkit aún en memoria).
+    """
+    def __init__(self, factory: Callable[[str], Toolkit] = lambda thread_id: Toolkit(),
+                 max_threads: int = 64, max_size: int = 2_000_000, ttl_s: float = 3600.0,
+                 spill_dir: Optional[str] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        self.factory = factory
+        self.max_threads = max_threads
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.spill_dir = spill_dir
+        self._clock = clock
+        self._lock = threading.RLock()
+        # orden = LRU (más antiguo primero)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        # hilos expulsados cuyo volcado está en curso: thread_id -> (toolkit, generación)
+        self._spilling: Dict[str, Tuple[Toolkit, int]] = {}
+        self._spill_gen = 0
+        self._counters: Dict[str, int] = {
+            "hits": 0, "misses": 0, "evictions": 0, "expired": 0, "spills": 0, "reloads": 0,
+        }
+
+    @classmethod
+    def from_env(cls, factory: Callable[[str], Toolkit]) -> "ToolkitRegistry":
+        ttl = os.getenv("KORELIA_TOOLKIT_TTL_S")
+        return cls(
+            factory,
+            max_threads=_env_int("KORELIA_TOOLKIT_MAX_THREADS", 64),
+            max_size=_env_int("KORELIA_TOOLKIT_MAX_SIZE", 2_000_000),
+            ttl_s=float(ttl) if ttl else 3600.0,
+            spill_dir=os.getenv("KORELIA_TOOLKIT_SPILL_DIR") or None,
+        )
+
+    # ---------- Acceso ----------
+
+    @contextmanager
+    def use(self, thread_id: str) -> Iterator[Toolkit]:
+        """Toolkit del hilo, fijado (no expulsable) hasta salir del bloque."""
+        entry = self._acquire(thread_id)
+        try:
+            yield entry.tk
+        finally:
+            self._unpin(thread_id, entry)
+
+    def get(self, thread_id: str) -> Toolkit:
+        """Toolkit del hilo; lo crea (o lo recarga del spill) si no está en memoria. No queda fijado."""
+        entry = self._acquire(thread_id)
+        self._unpin(thread_id, entry)
+        return entry.tk
+
+    def _acquire(self, thread_id: str) -> _Entry:
+        load = False
+        with self._lock:
+            now = self._clock()
+            victims = self._expire(now)
+            entry = self._entries.get(thread_id)
+            if entry is not None:
+                self._counters["hits"] += 1
+            else:
+                spilling = self._spilling.pop(thread_id, None)
+                if spilling is not None:
+                    # sigue en memoria: su volcado en curso se descarta
+                    self._counters["hits"] += 1
+                    tk = spilling[0]
+                else:
+                    self._counters["misses"] += 1
+                    tk = self.factory(thread_id)
+                    load = tk.journal is None and self._spill_path(thread_id) is not None
+                entry = self._entries[thread_id] = _Entry(tk, now)
+                if load:
+                    entry.ready.clear()
+            entry.last = now
+            entry.pins += 1
+            self._entries.move_to_end(thread_id)
+            victims += self._enforce_limits(keep=thread_id)
+        self._retire(victims)
+        if load:
+            try:
+                if self._reload(thread_id, entry.tk):
+                    with self._lock:
+                        self._counters["reloads"] += 1
+            finally:
+                entry.ready.set()
+        else:
+            entry.ready.wait()
+        return entry
+
+    def _unpin(self, thread_id: str, entry: _Entry) -> None:
+        with self._lock:
+            entry.pins -= 1
+            entry.last = self._clock()
+            if self._entries.get(thread_id) is entry:
+                self._entries.move_to_end(thread_id)
+            victims = self._enforce_limits(keep=thread_id)
+        self._retire(victims)
+
+    def __contains__(self, thread_id: str) -> bool:
+        with self._lock:
+            return thread_id in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def evict(self, thread_id: str) -> bool:
+        """Expulsa el hilo si está ocioso; False si no está en memoria o tiene peticiones en curso."""
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None or entry.pins:
+                return False
+            victims = [self._pop(thread_id)]
+            self._counters["evictions"] += 1
+        self._retire(victims)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counters)
+            lookups = out["hits"] + out["misses"]
+            out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else None
+            out["threads"] = len(self._entries)
+            out["pinned"] = sum(1 for e in self._entries.values() if e.pins)
+            out["size"] = sum(e.tk.store.size() for e in self._entries.values())
+            out["max_threads"] = self.max_threads
+            out["max_size"] = self.max_size
+            return out
+
+    # ---------- Expulsión (con el lock; el cierre/volcado lo hace _retire fuera de él) ----------
+
+    def _pop(self, thread_id: str) -> _Victim:
+        tk = self._entries.pop(thread_id).tk
+        gen = None
+        if tk.journal is None and self.spill_dir and tk.store.size():
+            self._spill_gen += 1
+            gen = self._spill_gen
+            self._spilling[thread_id] = (tk, gen)
+        return thread_id, tk, gen
+
+    def _expire(self, now: float) -> List[_Victim]:
+        victims: List[_Victim] = []
+        if not self.ttl_s:
+            return victims
+        for tid, entry in list(self._entries.items()):
+            if now - entry.last < self.ttl_s:
+                break  # orden LRU: el resto es más reciente
+            if entry.pins:
+                continue
+            victims.append(self._pop(tid))
+            self._counters["expired"] += 1
+        return victims
+
+    def _enforce_limits(self, keep: str) -> List[_Victim]:
+        victims: List[_Victim] = []
+        total = sum(e.tk.store.size() for e in self._entries.values())
+        for tid in list(self._entries):
+            if len(self._entries) <= self.max_threads and total <= self.max_size:
+                break
+            entry = self._entries[tid]
+            if tid == keep or entry.pins:
+                continue  # nunca se expulsa el hilo que se acaba de pedir ni uno en uso
+            total -= entry.tk.store.size()
+            victims.append(self._pop(tid))
+            self._counters["evictions"] += 1
+        return victims
+
+    # ---------- Spill ----------
+
+    def _spill_path(self, thread_id: str) -> Optional[str]:
+        if not self.spill_dir:
+            return None
+        return os.path.join(self.spill_dir, f"{thread_file_stem(thread_id)}.graph.json")
+
+    def _retire(self, victims: List[_Victim]) -> None:
+        """Cierra el journal o vuelca a disco los Toolkits expulsados (fuera del lock)."""
+        for thread_id, tk, gen in victims:
+            if tk.journal is not None:
+                tk.journal.close()
+            elif gen is not None:
+                self._spill(thread_id, tk, gen)
+
+    def _spill(self, thread_id: str, tk: Toolkit, gen: int) -> None:
+        path = self._spill_path(thread_id)
+        os.makedirs(self.spill_dir, exist_ok=True)
+        tmp = f"{path}.{gen}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(dump_store(tk.store), f, ensure_ascii=False, separators=(",", ":"))
+        except BaseException:
+            # el Toolkit sigue en _spilling: el hilo lo recupera de memoria si vuelve
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            current = self._spilling.get(thread_id)
+            if current is not None and current[1] == gen:
+                # el rename va bajo el lock: un volcado más antiguo nunca pisa a uno más nuevo
+                os.replace(tmp, path)
+                del self._spilling[thread_id]
+                self._counters["spills"] += 1
+                return
+        # el hilo volvió (o se expulsó de nuevo) mientras se volcaba: esta copia ya no vale
+        os.remove(tmp)
+
+    def _reload(self, thread_id: str, tk: Toolkit) -> bool:
+        path = self._spill_path(thread_id)
+        if path is None or tk.journal is not None or not os.path.exists(path):
+            return False
+        with open(path, "r", encoding="utf-8") as f:
+            load_store(tk.store, json.load(f))
+        os.remove(path)
+        return True
@@ -1,13 +1,15 @@
 import json
-from typing import Dict, Any, List, Tuple
+import os
+from typing import Dict, Any, List, Optional, Tuple
 from pydantic import ValidationError
 
 from apps.backend.graph.store import GraphStore
-from apps.backend.graph.patcher import apply_patch
+from apps.backend.graph.compact_store import CompactGraphStore
+from apps.backend.graph.patcher import apply_patch_batch
+from apps.backend.graph.journal import PatchJournal
 from apps.backend.graph.engine import run_rulesets
-from apps.backend.schema.spec_schema import SpecModel
-from apps.backend.schema.topology_schema import TopologyModel
-from apps.backend.schema.netlist_schema import NetlistModel  # ← nuevo schema
+# Los schemas (pydantic) y el emisor SPICE (numpy) se importan en el primer apply_*/emit_spice:
+# el Toolkit se puede crear/restaurar (registro por hilo, journal) sin pagar esa carga.
 
 
 # ------------------------
@@ -61,11 +63,43 @@ def _is_ground_like(net_obj) -> bool:
         return False
 
 
+def _new_store():
+    """Backend del grafo según KORELIA_GRAPH_BACKEND: "networkx" (por defecto) o "compact"."""
+    backend = (os.getenv("KORELIA_GRAPH_BACKEND") or "networkx").lower()
+    if backend == "compact":
+        return CompactGraphStore()
+    return GraphStore()
+
+
 class Toolkit:
-    def __init__(self) -> None:
-        self.store = GraphStore()
+    def __init__(self, store=None, journal: Optional[PatchJournal] = None) -> None:
+        self.store = store if store is not None else _new_store()
+        # journal persistente opcional: al crear el Toolkit se reconstruye el grafo desde disco
+        self.journal = journal
+        if journal is not None:
+            journal.replay(self.store)
+
+    def _apply(self, patch: Dict[str, Any]) -> None:
+        apply_patch_batch(self.store, patch)
+        if self.journal is not None:
+            self.journal.append(patch)
+
+    # ============================
+    # SNAPSHOTS (reintentos del agente)
+    # ============================
+    def rollback(self, snapshot_id: str) -> Dict[str, Any]:
+        """Devuelve el grafo al estado previo al paso que generó ``snapshot_id``."""
+        undo_patch = self.store.restore(snapshot_id)
+        if undo_patch is None:
+            return {"ok": False, "errors": [f"Snapshot desconocido o caducado: {snapshot_id}"],
+                    "snapshot_id": snapshot_id, "available": self.store.snapshot_ids()}
+        if self.journal is not None:
+            self.journal.append(undo_patch)
+        return {"ok": True, "errors": [], "snapshot_id": snapshot_id, "version": self.store.version}
 
     def apply_spec_json(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        from apps.backend.schema.spec_schema import SpecModel
+
         try:
             model = SpecModel(**spec)
         except ValidationError as e:
@@ -82,13 +116,16 @@ class Toolkit:
             ops.append({"op":"add_node","node":{"id": env_id, "type":"Environment",
                                                 "props": model.environment.dict(), "labels":["DIG"]}})
         patch = {"namespace":"DIG","ops":ops}
-        apply_patch(self.store, patch)
-        return {"ok": True, "errors": [], "graph_patch": patch}
+        snapshot_id = self.store.snapshot()
+        self._apply(patch)
+        return {"ok": True, "errors": [], "graph_patch": patch, "snapshot_id": snapshot_id}
 
     # ============================
     # TOPOLOGY (nuevo TopologyModel)
     # ============================
     def apply_topology_json(self, topo: Dict[str, Any]) -> Dict[str, Any]:
+        from apps.backend.schema.topology_schema import TopologyModel
+
         try:
             model = TopologyModel(**topo)
         except ValidationError as e:
@@ -133,13 +170,16 @@ class Toolkit:
             })
 
         patch = {"namespace":"FTG","ops":ops}
-        apply_patch(self.store, patch)
-        return {"ok": True, "errors": [], "graph_patch": patch}
+        snapshot_id = self.store.snapshot()
+        self._apply(patch)
+        return {"ok": True, "errors": [], "graph_patch": patch, "snapshot_id": snapshot_id}
 
     # ============================
     # NETLIST (nuevo NetlistModel)
     # ============================
     def apply_netlist_json(self, netlist: Dict[str, Any]) -> Dict[str, Any]:
+        from apps.backend.schema.netlist_schema import NetlistModel
+
         try:
             model = NetlistModel(**netlist)
         except ValidationError as e:
@@ -167,7 +207,7 @@ class Toolkit:
                 "node":{
                     "id": s_urn,
                     "type":"SubcircuitDef",
-                    "props": {"name": s.name},
+                    "props": {"name": s.name, "ports": [pt.pin_id for pt in s.ports]},
                     "labels":["CIG"]
                 }
             })
@@ -235,7 +275,13 @@ class Toolkit:
                 })
 
         # ---- Connections (component_ref + pin_id → net)
-        # Puede referenciar ComponentInstance o SubcircuitInstance.
+        # Puede referenciar ComponentInstance o SubcircuitInstance, del propio modelo (aún no
+        # aplicado al store) o de un parche anterior.
+        cmp_refs = {c.ref for c in model.components}
+        inst_refs = {i.ref for i in getattr(model, "instances", []) or []}
+        new_terms = {_urn_pin_of_cmp(_urn_cmp(c.ref), p.pin_id) for c in model.components for p in c.pins}
+        new_terms.update(_urn_port_of_inst(_urn_inst(i.ref), port_id)
+                         for i in getattr(model, "instances", []) or [] for port_id in (i.port_map or {}))
         for con in model.connections:
             ref = con.component_ref
             net_urn = _urn_net(con.net)
@@ -244,10 +290,11 @@ class Toolkit:
             cmp_urn = _urn_cmp(ref)
             inst_urn = _urn_inst(ref)
 
-            if self.store.exists_node(cmp_urn):
+            if ref in cmp_refs or self.store.exists_node(cmp_urn):
                 pin_urn = _urn_pin_of_cmp(cmp_urn, con.pin_id)
                 # Asegura existencia del pin si por cualquier motivo no se creó (robustez)
-                if not self.store.exists_node(pin_urn):
+                if pin_urn not in new_terms and not self.store.exists_node(pin_urn):
+                    new_terms.add(pin_urn)
                     ops.append({
                         "op":"add_node",
                         "node":{"id": pin_urn, "type":"Pin", "props":{"name": con.pin_id}, "labels":["CIG"]}
@@ -262,10 +309,11 @@ class Toolkit:
                 })
 
             # ¿Es instancia?
-            elif self.store.exists_node(inst_urn):
+            elif ref in inst_refs or self.store.exists_node(inst_urn):
                 # Para conexiones explícitas a una instancia, modelamos el "pin" como un puerto adicional
                 port_urn = _urn_port_of_inst(inst_urn, con.pin_id)
-                if not self.store.exists_node(port_urn):
+                if port_urn not in new_terms and not self.store.exists_node(port_urn):
+                    new_terms.add(port_urn)
                     ops.append({
                         "op":"add_node",
                         "node":{"id": port_urn, "type":"Port", "props":{"name": con.pin_id}, "labels":["CIG"]}
@@ -285,7 +333,8 @@ class Toolkit:
                 pass
 
         patch = {"namespace":"CIG","ops":ops}
-        apply_patch(self.store, patch)
+        snapshot_id = self.store.snapshot()
+        self._apply(patch)
 
         # -----------------
         # Warnings/violations
@@ -312,4 +361,18 @@ class Toolkit:
         ok = len(high) == 0 and len(errors) == 0
 
         return {"ok": ok, "warnings": warnings, "errors": errors,
-                "applied_patch": patch, "violations": viols}
+                "applied_patch": patch, "violations": viols, "snapshot_id": snapshot_id}
+
+    # ============================
+    # SPICE (netlist determinista desde el CIG)
+    # ============================
+    def emit_spice(self, spec: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Netlist ngspice del CIG actual (cacheado por versión del grafo); ver ``emit_spice``."""
+        from apps.backend.schema.spice_schema import SpiceEmitInput
+        from apps.backend.tools.spice_emitter import emit_spice
+
+        try:
+            model = SpiceEmitInput(**(spec or {}))
+        except ValidationError as e:
+            return {"ok": False, "errors": json.loads(e.json()), "netlist": None}
+        return emit_spice(self.store, model)
@@ -0,0 +1,148 @@
+"""
+Ejecución de subprocesos EDA (ngspice, kicad-cli, snippets Python) sin bloquear el event loop.
+
+``run_async`` usa ``asyncio.create_subprocess_exec`` con timeout obligatorio; el proceso arranca
+en su propia sesión/grupo para que un timeout o la cancelación de la tarea maten también a sus
+hijos (ngspice lanzado desde un snippet, procesos auxiliares de kicad-cli). Cada tipo de tool
+tiene un semáforo global (por event loop) que limita los procesos simultáneos:
+
+    KORELIA_SPICE_CONCURRENCY  (por defecto, nº de CPUs)
+    KORELIA_KICAD_CONCURRENCY  (por defecto, 2)
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import weakref
+from typing import Callable, Dict, List, Optional
+
+
+_DEFAULT_LIMITS = {"spice": os.cpu_count() or 1, "kicad": 2}
+
+_SEMAPHORES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+_LOCK = threading.Lock()
+_STATS: Dict[str, Dict[str, int]] = {}
+
+
+def concurrency_limit(kind: str) -> int:
+    env = os.getenv(f"KORELIA_{kind.upper()}_CONCURRENCY")
+    return max(1, int(env)) if env else _DEFAULT_LIMITS.get(kind, 1)
+
+
+def _semaphore(kind: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    with _LOCK:
+        per_loop = _SEMAPHORES.setdefault(loop, {})
+        sem = per_loop.get(kind)
+        if sem is None:
+            sem = per_loop[kind] = asyncio.Semaphore(concurrency_limit(kind))
+        return sem
+
+
+def _count(kind: str, field: str, delta: int = 1) -> None:
+    with _LOCK:
+        st = _STATS.setdefault(kind, {"running": 0, "waiting": 0, "runs": 0, "timeouts": 0, "cancelled": 0})
+        st[field] += delta
+
+
+def proc_stats() -> Dict[str, Dict[str, int]]:
+    """Procesos en curso / en espera y contadores por tipo de tool."""
+    with _LOCK:
+        return {k: dict(v, limit=concurrency_limit(k)) for k, v in _STATS.items()}
+
+
+def popen_group_kwargs() -> Dict[str, object]:
+    """Arranca el proceso en su propia sesión/grupo (para poder matar también a sus hijos)."""
+    return {"start_new_session": True} if os.name == "posix" else \
+        {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+
+def kill_process_group(proc) -> None:
+    """Mata el grupo de ``proc`` (``subprocess.Popen`` o ``asyncio.subprocess.Process``)."""
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _wait_followed(proc: asyncio.subprocess.Process, timeout_s: float, follow: Callable[[], bool],
+                         interval: float = 0.05) -> None:
+    """Espera a ``proc`` llamando a ``follow`` cada ``interval``; si devuelve True, lo mata."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_s
+    waiter = asyncio.ensure_future(proc.wait())
+    try:
+        while True:
+            done, _ = await asyncio.wait({waiter}, timeout=interval)
+            if done:
+                return
+            if follow():
+                kill_process_group(proc)
+                await waiter
+                return
+            if loop.time() > deadline:
+                raise asyncio.TimeoutError()
+    finally:
+        if not waiter.done():
+            waiter.cancel()
+
+
+async def run_async(cmd: List[str], kind: str, timeout_s: float, env: Optional[dict] = None,
+                    cwd: Optional[str] = None, follow: Optional[Callable[[], bool]] = None,
+                    output_path: Optional[str] = None) -> subprocess.CompletedProcess:
+    """
+    Equivalente asíncrono de ``subprocess.run(cmd, stdout=PIPE, stderr=PIPE, text=True, timeout=...)``.
+    Lanza ``subprocess.TimeoutExpired`` al agotar el tiempo (el grupo de procesos ya está muerto).
+    Con ``follow`` (p.ej. ``LogFollower.poll``) la salida va a ``output_path`` en vez de a pipes y se
+    llama a ``follow`` periódicamente; si devuelve True el proceso se mata (aborto temprano).
+    """
+    sem = _semaphore(kind)
+    _count(kind, "waiting")
+    try:
+        await sem.acquire()
+    finally:
+        _count(kind, "waiting", -1)
+    _count(kind, "running")
+    try:
+        out_file = open(output_path, "wb") if follow is not None else None
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, env=env, cwd=cwd, **popen_group_kwargs(),
+                stdout=out_file or asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT if out_file else asyncio.subprocess.PIPE)
+        finally:
+            if out_file is not None:
+                out_file.close()  # el hijo tiene su propia copia del descriptor
+        try:
+            if follow is not None:
+                await _wait_followed(proc, timeout_s, follow)
+                out, err = b"", b""
+            else:
+                out, err = await asyncio.wait_for(proc.communicate(), timeout=timeout_s)
+        except asyncio.TimeoutError:
+            kill_process_group(proc)
+            await proc.wait()
+            _count(kind, "timeouts")
+            raise subprocess.TimeoutExpired(cmd, timeout_s)
+        except asyncio.CancelledError:
+            # la sesión del agente se canceló (cliente desconectado): no dejar huérfanos
+            kill_process_group(proc)
+            await asyncio.shield(proc.wait())
+            _count(kind, "cancelled")
+            raise
+        _count(kind, "runs")
+        return subprocess.CompletedProcess(cmd, proc.returncode,
+                                           out.decode("utf-8", errors="replace"),
+                                           err.decode("utf-8", errors="replace"))
+    finally:
+        _count(kind, "running", -1)
+        sem.release()
+
+
+__all__ = ["run_async", "proc_stats", "concurrency_limit", "kill_process_group", "popen_group_kwargs"]
@@ -0,0 +1,200 @@
+"""
+Lectura incremental del log de ngspice.
+
+``NgspiceLog`` consume el log por trozos (mientras ngspice escribe) y se queda sólo con lo útil:
+medidas ``.meas``, avisos agrupados (``timestep too small``, ``singular matrix``...), la última
+línea de progreso y un buffer circular acotado con la cola del log. Si aparece un error fatal
+de convergencia marca ``fatal`` para que el runner aborte la simulación sin esperar al timeout.
+
+``LogFollower`` lee lo nuevo de un fichero en cada ``poll()`` y ``run_followed`` ejecuta un
+proceso llamándolo periódicamente (la variante async está en ``async_exec.run_async``).
+"""
+import codecs
+import os
+import re
+import subprocess
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from .async_exec import kill_process_group, popen_group_kwargs
+
+
+_FLOAT = r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?"
+# empieza por un literal ("\n") para que ``re`` salte rápido entre líneas (~3x frente a (?m)^)
+_MEAS_RE = re.compile(r"\n[ \t]*([A-Za-z_]\w*)[ \t]*=[ \t]*({})[ \t]*\r?(?=\n)".format(_FLOAT))
+# palabras clave (en minúsculas) que se buscan con str.find sobre el trozo en minúsculas
+_FATAL_KEYS = ("timestep too small", "simulation(s) aborted", "doanalyses:")  # ngspice ya no dará resultados
+_WARN_KEYS = ("warning", "singular matrix", "gmin stepping", "source stepping", "iteration limit",
+              "timestep too small", "no such vector")
+_PROGRESS_KEYS = ("reference value", "initial transient solution", "no. of data rows", "doing analysis at")
+_KNOWN_WARNINGS = ("timestep too small", "singular matrix", "gmin stepping failed", "source stepping failed",
+                   "iteration limit reached", "no such vector")
+_DIGITS_RE = re.compile(r"[-+]?\d[\d.eE+-]*")
+
+
+def _warning_key(line: str) -> str:
+    low = line.lower()
+    for known in _KNOWN_WARNINGS:
+        if known in low:
+            return known
+    return _DIGITS_RE.sub("#", line.strip())[:80]
+
+
+def _line_bounds(text: str, pos: int):
+    """(inicio, fin) de la línea que contiene ``pos`` (``text`` termina en salto de línea)."""
+    return text.rfind("\n", 0, pos) + 1, text.find("\n", pos)
+
+
+class NgspiceLog:
+    """Consumidor incremental del log de ngspice con memoria acotada."""
+
+    def __init__(self, tail_lines: int = 200, tail_chars: int = 10000, max_warnings: int = 50):
+        self.measures: Dict[str, float] = {}
+        self.warnings: Dict[str, int] = {}
+        self.fatal: Optional[str] = None
+        self.progress: Optional[str] = None
+        self.bytes = 0
+        self._tail: deque = deque(maxlen=tail_lines)
+        self._tail_chars = tail_chars
+        self._max_warnings = max_warnings
+        self._partial = ""
+
+    def feed(self, text: str) -> None:
+        """Procesa ``text``; la última línea incompleta se guarda hasta el siguiente trozo."""
+        if not text:
+            return
+        self.bytes += len(text)
+        text = self._partial + text
+        cut = text.rfind("\n") + 1
+        # una línea sin fin gigante no debe crecer sin límite
+        self._partial = text[cut:][-self._tail_chars:]
+        self._scan(text[:cut])
+
+    def close(self) -> None:
+        """Procesa la línea parcial pendiente (fin del log)."""
+        if self._partial:
+            text, self._partial = self._partial, ""
+            self._scan(text + "\n")
+
+    def _scan(self, text: str) -> None:
+        """Analiza líneas completas (``text`` termina en salto de línea)."""
+        if not text:
+            return
+        for m in _MEAS_RE.finditer("\n" + text):
+            self.measures[m.group(1)] = float(m.group(2))
+        low = text.lower()
+        src = text if len(low) == len(text) else low  # p.ej. "İ".lower() cambia la longitud
+        warn_lines = set()
+        for kw in _WARN_KEYS:
+            pos = low.find(kw)
+            while pos >= 0:
+                start, end = _line_bounds(low, pos)
+                warn_lines.add((start, end))
+                pos = low.find(kw, end)
+        for start, end in sorted(warn_lines):
+            key = _warning_key(src[start:end])
+            if key in self.warnings or len(self.warnings) < self._max_warnings:
+                self.warnings[key] = self.warnings.get(key, 0) + 1
+        if self.fatal is None:
+            hits = [p for p in (low.find(kw) for kw in _FATAL_KEYS) if p >= 0]
+            if hits:
+                start, end = _line_bounds(low, min(hits))
+                self.fatal = src[start:end].strip()[:300]
+        last = max(low.rfind(kw) for kw in _PROGRESS_KEYS)
+        if last >= 0:
+            start, end = _line_bounds(low, last)
+            self.progress = src[start:end].strip()[:200]
+        lines = text.rstrip("\n").rsplit("\n", self._tail.maxlen)
+        self._tail.extend(lines[-self._tail.maxlen:])
+
+    def tail(self) -> str:
+        """Últimas líneas del log (como el antiguo ``log_tail``: como mucho ``tail_chars``)."""
+        lines = list(self._tail)
+        if self._partial:
+            lines.append(self._partial)
+        return "\n".join(lines)[-self._tail_chars:]
+
+    def summary(self) -> Dict[str, object]:
+        out: Dict[str, object] = {"warnings": dict(self.warnings), "log_bytes": self.bytes}
+        if self.progress:
+            out["progress"] = self.progress
+        if self.fatal:
+            out["fatal"] = self.fatal
+        return out
+
+
+class LogFollower:
+    """Lee incrementalmente un fichero de log (aún en escritura) hacia un ``NgspiceLog``."""
+
+    def __init__(self, path: str, log: NgspiceLog, chunk: int = 1 << 20, abort_on_fatal: bool = True):
+        self.path = path
+        self.log = log
+        self.chunk = chunk
+        self.abort_on_fatal = abort_on_fatal
+        self._f = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def poll(self) -> bool:
+        """Consume lo escrito desde la última llamada; True si hay que abortar la simulación."""
+        if self._f is None:
+            try:
+                self._f = open(self.path, "rb")
+            except OSError:
+                return False
+        while True:
+            data = self._f.read(self.chunk)
+            if not data:
+                break
+            self.log.feed(self._decoder.decode(data))
+        return self.abort_on_fatal and self.log.fatal is not None
+
+    def finish(self) -> NgspiceLog:
+        """Último ``poll`` tras la salida del proceso; cierra el fichero y la línea parcial."""
+        self.poll()
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        self.log.feed(self._decoder.decode(b"", final=True))
+        self.log.close()
+        return self.log
+
+
+def run_followed(cmd: List[str], timeout_s: float, follow: Callable[[], bool], output_path: str,
+                 env: Optional[dict] = None, interval: float = 0.05) -> subprocess.CompletedProcess:
+    """
+    Ejecuta ``cmd`` (stdout+stderr a ``output_path``) llamando a ``follow`` cada ``interval``;
+    si devuelve True mata el grupo de procesos. ``subprocess.TimeoutExpired`` al agotar el tiempo.
+    """
+    deadline = time.monotonic() + timeout_s
+    with open(output_path, "wb") as out:
+        proc = subprocess.Popen(cmd, stdout=out, stderr=subprocess.STDOUT, env=env, **popen_group_kwargs())
+        while True:
+            try:
+                proc.wait(timeout=interval)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if follow():
+                kill_process_group(proc)
+                proc.wait()
+                break
+            if time.monotonic() > deadline:
+                kill_process_group(proc)
+                proc.wait()
+                raise subprocess.TimeoutExpired(cmd, timeout_s)
+    return subprocess.CompletedProcess(cmd, proc.returncode, "", "")
+
+
+def read_tail(path: str, nbytes: int = 10000) -> str:
+    """Últimos ``nbytes`` de un fichero, sin leerlo entero."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - nbytes))
+            return f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return ""
+
+
+__all__ = ["NgspiceLog", "LogFollower", "run_followed", "read_tail"]
@@ -0,0 +1,534 @@
+"""
+Backend compartido de ngspice: pool de sesiones calientes de libngspice (ctypes).
+
+Cada sesión es un proceso hijo (``spawn``) con su propia copia de libngspice: la librería
+tiene estado global y no es reentrante, y un fallo fatal o un ``quit`` dentro de ngspice
+sólo tumba ese proceso, no el servidor. El circuito se envía en memoria con
+``ngSpice_Circ`` y los vectores de las probes se leen directamente con ``ngGet_Vec_Info``
+(sin netlist en disco ni WRDATA). El log llega por el callback ``SendChar``: se escribe a disco
+según llega y en memoria sólo queda un ``NgspiceLog`` acotado (medidas, avisos, cola).
+
+Con ``steady`` (ver ``steady_state``) el análisis corre en el hilo de fondo de ngspice
+(``bg_run``); la sesión lo detiene periódicamente (``bg_halt``), lee las probes vigiladas y, si
+han llegado al régimen permanente, no lo reanuda: los vectores parciales se leen igual que al
+terminar y las ``.meas`` del netlist se reevalúan sobre ellos.
+
+``get_ngspice_pool()`` devuelve None si no hay libngspice o si ``KORELIA_SPICE_BACKEND=batch``;
+``spice_autorun`` usa entonces el camino batch (``ngspice -b``) de siempre.
+"""
+import ctypes
+import ctypes.util
+import multiprocessing
+import os
+import threading
+import time
+from array import array
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from .ngspice_log import NgspiceLog
+from .steady_state import SteadyMonitor
+
+
+class NgspiceSessionError(RuntimeError):
+    """La sesión no arrancó o murió durante la simulación (se puede reintentar en batch)."""
+
+
+class NgspiceSessionTimeout(NgspiceSessionError):
+    """La simulación superó el timeout; la sesión se mata y se sustituye."""
+
+
+class NgspiceLibraryError(NgspiceSessionError):
+    """libngspice no se pudo cargar o inicializar (ruta inválida, ABI incompatible): no tiene arreglo."""
+
+
+# ---------- Localización de la librería ----------
+
+_LIB_CANDIDATES = [
+    "/usr/local/lib/libngspice.so",
+    "/usr/local/lib/libngspice.so.0",
+    "/usr/lib/x86_64-linux-gnu/libngspice.so.0",
+    "/usr/lib/libngspice.so.0",
+    "/opt/homebrew/lib/libngspice.dylib",
+    r"C:\Program Files\Spice64_dll\dll-vs\ngspice.dll",
+]
+
+
+def find_libngspice() -> Optional[str]:
+    """Ruta de libngspice: ``NGSPICE_LIBRARY``, ``find_library`` o rutas habituales."""
+    env_path = os.getenv("NGSPICE_LIBRARY")
+    if env_path:
+        return env_path if os.path.exists(env_path) else None
+    found = ctypes.util.find_library("ngspice")
+    if found:
+        return found
+    return next((p for p in _LIB_CANDIDATES if os.path.exists(p)), None)
+
+
+# ---------- Netlist -> circuito + comandos ----------
+
+_RUN_COMMANDS = {"run", "op", "tran", "ac", "dc", "noise", "tf", "pz", "sens", "disto", "pss", "sp"}
+_SKIP_COMMANDS = {"quit", "exit"}
+
+
+def split_circuit(netlist: str) -> Tuple[List[str], List[str]]:
+    """
+    Separa el netlist en líneas de circuito y comandos del bloque ``.control``.
+    Los comandos se ejecutan uno a uno con ``ngSpice_Command`` tras cargar el circuito;
+    si ninguno lanza un análisis se antepone ``run``. ``quit``/``exit`` se descartan.
+    """
+    circuit, commands = [], []
+    in_control = False
+    for ln in netlist.splitlines():
+        low = ln.strip().lower()
+        if low.startswith(".control"):
+            in_control = True
+            continue
+        if in_control and low.startswith(".endc"):
+            in_control = False
+            continue
+        if not in_control:
+            circuit.append(ln)
+        elif low and not low.startswith(("*", "#")) and low.split()[0] not in _SKIP_COMMANDS:
+            commands.append(ln.strip())
+    if not any(c.split()[0].lower() in _RUN_COMMANDS for c in commands):
+        commands.insert(0, "run")
+    return circuit, commands
+
+
+# ---------- Lado hijo: libngspice vía ctypes ----------
+
+class _NgComplex(ctypes.Structure):
+    _fields_ = [("cx_real", ctypes.c_double), ("cx_imag", ctypes.c_double)]
+
+
+class _VectorInfo(ctypes.Structure):
+    _fields_ = [
+        ("v_name", ctypes.c_char_p),
+        ("v_type", ctypes.c_int),
+        ("v_flags", ctypes.c_short),
+        ("v_realdata", ctypes.POINTER(ctypes.c_double)),
+        ("v_compdata", ctypes.POINTER(_NgComplex)),
+        ("v_length", ctypes.c_int),
+    ]
+
+
+_SendChar = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p)
+_SendStat = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p)
+_ControlledExit = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_int, ctypes.c_bool, ctypes.c_bool,
+                                   ctypes.c_int, ctypes.c_void_p)
+_SendData = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_void_p)
+_SendInitData = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p)
+_BGThreadRunning = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_bool, ctypes.c_int, ctypes.c_void_p)
+
+# Vectores de escala por tipo de análisis (columna x de WRDATA)
+_SCALE_NAMES = ("time", "frequency", "v-sweep", "i-sweep", "temp-sweep", "res-sweep")
+
+
+class _NgSpice:
+    """Una instancia de libngspice (una por proceso)."""
+
+    def __init__(self, lib_path: str) -> None:
+        self.lib = ctypes.CDLL(lib_path)
+        self.log = NgspiceLog()
+        self._log_file = None
+        self.exit_status: Optional[int] = None
+        # las referencias a los callbacks deben vivir tanto como la librería
+        self._callbacks = (
+            _SendChar(self._on_char), _SendStat(lambda *_: 0), _ControlledExit(self._on_exit),
+            _BGThreadRunning(lambda *_: 0),
+        )
+        lib = self.lib
+        lib.ngSpice_Init.argtypes = [_SendChar, _SendStat, _ControlledExit, _SendData,
+                                     _SendInitData, _BGThreadRunning, ctypes.c_void_p]
+        lib.ngSpice_Command.argtypes = [ctypes.c_char_p]
+        lib.ngSpice_Circ.argtypes = [ctypes.POINTER(ctypes.c_char_p)]
+        lib.ngGet_Vec_Info.argtypes = [ctypes.c_char_p]
+        lib.ngGet_Vec_Info.restype = ctypes.POINTER(_VectorInfo)
+        lib.ngSpice_CurPlot.restype = ctypes.c_char_p
+        lib.ngSpice_AllVecs.argtypes = [ctypes.c_char_p]
+        lib.ngSpice_AllVecs.restype = ctypes.POINTER(ctypes.c_char_p)
+        lib.ngSpice_running.restype = ctypes.c_bool
+        send_char, send_stat, controlled_exit, bg_running = self._callbacks
+        # SendData/SendInitData nulos: los vectores se leen al terminar con ngGet_Vec_Info
+        lib.ngSpice_Init(send_char, send_stat, controlled_exit, _SendData(), _SendInitData(), bg_running, None)
+
+    def _on_char(self, text: bytes, ident: int, user: Any) -> int:
+        line = text.decode("utf-8", "replace")
+        # ngspice antepone "stdout " / "stderr " a cada línea
+        line = (line.split(" ", 1)[1] if line.startswith(("stdout ", "stderr ")) else line) + "\n"
+        self.log.feed(line)
+        if self._log_file is not None:
+            self._log_file.write(line)
+        return 0
+
+    def _on_exit(self, status: int, unload: bool, on_quit: bool, ident: int, user: Any) -> int:
+        self.exit_status = status
+        return 0
+
+    def command(self, cmd: str) -> int:
+        return self.lib.ngSpice_Command(cmd.encode("utf-8"))
+
+    def running(self) -> bool:
+        """El hilo de fondo (``bg_*``) sigue simulando."""
+        return bool(self.lib.ngSpice_running())
+
+    def _wait_stopped(self, timeout_s: float, step_s: float = 0.005) -> bool:
+        end = time.monotonic() + timeout_s
+        while self.running():
+            if time.monotonic() > end:
+                return False
+            time.sleep(step_s)
+        return True
+
+    def load(self, lines: List[str]) -> int:
+        arr = (ctypes.c_char_p * (len(lines) + 1))(*[ln.encode("utf-8") for ln in lines], None)
+        return self.lib.ngSpice_Circ(arr)
+
+    def vector(self, name: str) -> Optional[array]:
+        ptr = self.lib.ngGet_Vec_Info(name.encode("utf-8"))
+        if not ptr:
+            return None
+        info = ptr.contents
+        n = info.v_length
+        if info.v_realdata:
+            return array("d", ctypes.string_at(info.v_realdata, n * 8))
+        if info.v_compdata:
+            # igual que WRDATA: la primera columna de datos es la parte real
+            return array("d", (info.v_compdata[i].cx_real for i in range(n)))
+        return None
+
+    def plot_vectors(self) -> List[str]:
+        plot = self.lib.ngSpice_CurPlot()
+        names = self.lib.ngSpice_AllVecs(plot) if plot else None
+        out = []
+        i = 0
+        while names and names[i]:
+            out.append(names[i].decode("utf-8", "replace"))
+            i += 1
+        return out
+
+    def simulate(self, netlist: str, probes: List[str], log_path: Optional[str] = None,
+                 steady: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.log = NgspiceLog()
+        self._log_file = open(log_path, "w", encoding="utf-8") if log_path else None
+        try:
+            return self._simulate(netlist, probes, steady)
+        finally:
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+            self.log.close()
+
+    def _sample(self, exprs: List[str]) -> Tuple[Optional[array], Dict[str, Optional[array]]]:
+        """Escala ``time`` y vectores de ``exprs`` del plot en curso (con el análisis detenido)."""
+        ys: Dict[str, Optional[array]] = {}
+        for i, expr in enumerate(exprs):
+            tmp = f"korelia_steady_{i}"
+            self.command(f"let {tmp} = {expr}")
+            ys[expr] = self.vector(tmp)
+            self.command(f"unlet {tmp}")
+        return self.vector("time"), ys
+
+    def _run_monitored(self, cmd: str, monitor: SteadyMonitor) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Lanza ``cmd`` en el hilo de fondo y lo vigila cada ``monitor.interval_s``: se detiene,
+        se comprueban las probes y se reanuda hasta que convergen o el análisis termina.
+        Devuelve (detenido antes de terminar, último veredicto).
+        """
+        if self.command(f"bg_{cmd}") != 0:
+            return False, None
+        verdict = None
+        while True:
+            end = time.monotonic() + monitor.interval_s
+            while self.running() and time.monotonic() < end:
+                time.sleep(0.01)
+            if not self.running():
+                break
+            self.command("bg_halt")
+            if not self._wait_stopped(10.0):
+                raise RuntimeError("ngspice no se detuvo tras bg_halt")
+            x, ys = self._sample(monitor.probes)
+            if x is not None:
+                verdict = monitor.check(x, ys)
+                if verdict["converged"]:
+                    return True, verdict
+            self.command("bg_resume")
+        # terminó solo: veredicto sobre el resultado completo (informativo)
+        x, ys = self._sample(monitor.probes)
+        if x is not None:
+            verdict = monitor.check(x, ys)
+        return False, verdict
+
+    def _simulate(self, netlist: str, probes: List[str], steady: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # limpia circuitos y plots de la simulación anterior
+        self.command("destroy all")
+        self.command("remcirc")
+        circuit, commands = split_circuit(netlist)
+        failed = self.load(circuit) != 0
+        halted, verdict = False, None
+        monitor = SteadyMonitor(steady) if steady else None
+        for cmd in commands:
+            if failed or self.exit_status is not None:
+                break
+            if monitor is not None and cmd.split()[0].lower() in ("run", "tran"):
+                halted, verdict = self._run_monitored(cmd, monitor)
+                monitor = None  # sólo se vigila el primer análisis
+                failed = self.log.fatal is not None
+                if halted:
+                    # las .meas del netlist se evalúan al terminar el análisis: se repiten como comandos
+                    for ln in circuit:
+                        if ln.strip().lower().startswith((".meas", ".measure")):
+                            self.command(ln.strip()[1:])
+                continue
+            failed = self.command(cmd) != 0
+
+        vectors: Dict[str, Optional[Tuple[array, array]]] = {}
+        scale_name = None
+        if not failed and self.exit_status is None:
+            names = {n.lower() for n in self.plot_vectors()}
+            scale_name = next((s for s in _SCALE_NAMES if s in names), None)
+            scale = self.vector(scale_name) if scale_name else None
+            for i, expr in enumerate(probes):
+                tmp = f"korelia_probe_{i}"
+                self.command(f"let {tmp} = {expr}")
+                ys = self.vector(tmp)
+                if ys is None:
+                    vectors[expr] = None
+                    continue
+                xs = scale if scale is not None and len(scale) == len(ys) else array("d", range(len(ys)))
+                vectors[expr] = (xs, ys)
+        return {
+            "returncode": 1 if failed or self.exit_status else 0,
+            "log": self.log,
+            "vectors": vectors,
+            "scale": scale_name,
+            "exited": self.exit_status is not None,
+            "steady": {"halted": halted, "verdict": verdict} if steady else None,
+            # un análisis detenido con bg_halt deja la librería a medias: la sesión no se reutiliza
+            "recycle": halted,
+        }
+
+
+def _worker_main(lib_path: str, conn) -> None:
+    """Bucle del proceso hijo: carga libngspice y atiende simulaciones hasta EOF."""
+    try:
+        ng = _NgSpice(lib_path)
+    except Exception as e:
+        conn.send({"error": f"libngspice no disponible ({lib_path}): {e!r}"})
+        return
+    conn.send({"ready": True})
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        try:
+            res = ng.simulate(job["netlist"], job["probes"], job.get("log_path"), job.get("steady"))
+        except Exception as e:
+            ng.log.feed(f"{e!r}\n")
+            res = {"returncode": 1, "log": ng.log, "vectors": {}, "exited": True}
+        conn.send(res)
+        if res["exited"]:
+            return  # tras un quit/error fatal la librería no es reutilizable
+
+
+# ---------- Lado padre: sesiones y pool ----------
+
+class _Session:
+    def __init__(self, ctx, lib_path: str, start_timeout_s: float) -> None:
+        self._conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(lib_path, child), daemon=True)
+        self.proc.start()
+        child.close()
+        self.runs = 0
+        if not self._conn.poll(start_timeout_s):
+            self.kill()
+            raise NgspiceSessionError("libngspice no respondió al arrancar")
+        try:
+            hello = self._conn.recv()
+        except EOFError:
+            self.kill()
+            raise NgspiceSessionError("la sesión de ngspice terminó al arrancar")
+        if "error" in hello:
+            self.kill()
+            raise NgspiceLibraryError(hello["error"])
+
+    def request(self, job: Dict[str, Any], timeout_s: float) -> Dict[str, Any]:
+        self.runs += 1
+        try:
+            self._conn.send(job)
+            if not self._conn.poll(timeout_s):
+                self.kill()
+                raise NgspiceSessionTimeout(f"Timeout after {timeout_s}s")
+            return self._conn.recv()
+        except (EOFError, OSError):
+            code = self.proc.exitcode
+            self.kill()
+            raise NgspiceSessionError(f"la sesión de ngspice murió (exitcode={code})")
+
+    def kill(self) -> None:
+        if self.proc.is_alive():
+            self.proc.kill()
+        self.proc.join(timeout=5)
+        self._conn.close()
+
+
+class NgspicePool:
+    """
+    Pool de hasta ``size`` sesiones calientes de libngspice.
+
+    - Las sesiones se crean bajo demanda (o con ``warm()``) y se reutilizan entre simulaciones.
+    - Timeout, caída del proceso o ``quit`` dentro de ngspice -> la sesión se descarta.
+    - Cada sesión se recicla tras ``max_runs`` simulaciones (acota fugas de memoria de la librería).
+    - Si la librería no carga (``NgspiceLibraryError``) el pool queda ``broken`` para siempre. Otros
+      fallos de arranque (timeout, caída) sólo lo pausan con backoff exponencial; mientras tanto
+      ``available()`` es False y las simulaciones van a batch.
+    Thread-safe: cada simulación ocupa una sesión en exclusiva.
+    """
+    BACKOFF_BASE_S = 1.0
+    BACKOFF_MAX_S = 300.0
+
+    def __init__(self, lib_path: str, size: int = 2, max_runs: int = 500, start_timeout_s: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.lib_path = lib_path
+        self.size = size
+        self.max_runs = max_runs
+        self.start_timeout_s = start_timeout_s
+        self._ctx = multiprocessing.get_context("spawn")
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: List[_Session] = []
+        self._clock = clock
+        self._counters: Dict[str, int] = {"runs": 0, "spawns": 0, "spawn_failures": 0, "crashes": 0,
+                                          "timeouts": 0, "recycled": 0}
+        self.broken: Optional[str] = None
+        # fallos de arranque seguidos y cuándo se vuelve a intentar (backoff)
+        self._spawn_failures = 0
+        self._retry_at = 0.0
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def available(self) -> bool:
+        """False si la librería está rota o si se espera el backoff tras un arranque fallido."""
+        with self._lock:
+            return not self.broken and self._clock() >= self._retry_at
+
+    def _check_available(self) -> None:
+        with self._lock:
+            if self.broken:
+                raise NgspiceSessionError(self.broken)
+            wait = self._retry_at - self._clock()
+        if wait > 0:
+            raise NgspiceSessionError(f"libngspice en backoff tras un arranque fallido (reintento en {wait:.1f}s)")
+
+    def _spawn(self) -> _Session:
+        self._check_available()
+        try:
+            s = _Session(self._ctx, self.lib_path, self.start_timeout_s)
+        except NgspiceLibraryError as e:
+            with self._lock:
+                self.broken = str(e)
+                self._counters["spawn_failures"] += 1
+            raise
+        except NgspiceSessionError:
+            with self._lock:
+                self._spawn_failures += 1
+                self._counters["spawn_failures"] += 1
+                delay = min(self.BACKOFF_MAX_S, self.BACKOFF_BASE_S * 2 ** (self._spawn_failures - 1))
+                self._retry_at = self._clock() + delay
+            raise
+        with self._lock:
+            self._spawn_failures = 0
+            self._retry_at = 0.0
+            self._counters["spawns"] += 1
+        return s
+
+    def warm(self, n: Optional[int] = None) -> None:
+        """Arranca sesiones hasta tener ``n`` (por defecto ``size``) ociosas."""
+        want = min(self.size, n or self.size)
+        with self._lock:
+            missing = want - len(self._idle)
+        fresh = [self._spawn() for _ in range(max(0, missing))]
+        with self._lock:
+            self._idle.extend(fresh)
+
+    def run(self, netlist: str, probes: List[str], timeout_s: float, log_path: Optional[str] = None,
+            steady: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Simula ``netlist`` y devuelve {returncode, log (NgspiceLog), scale, vectors: {expr: (xs, ys) | None}}.
+        Con ``log_path`` la sesión escribe ahí el log completo. Con ``steady`` (``steady_state.steady_spec``)
+        el ``.tran`` se detiene al llegar al régimen permanente y se añade {'halted', 'verdict'}.
+        """
+        self._check_available()
+        with self._slots:
+            with self._lock:
+                session = self._idle.pop() if self._idle else None
+            if session is None:
+                session = self._spawn()
+            try:
+                res = session.request({"netlist": netlist, "probes": list(probes), "log_path": log_path,
+                                       "steady": steady}, timeout_s)
+            except NgspiceSessionTimeout:
+                self._count("timeouts")
+                raise
+            except NgspiceSessionError:
+                self._count("crashes")
+                raise
+            self._count("runs")
+            if res["exited"] or res.get("recycle") or session.runs >= self.max_runs:
+                session.kill()
+                self._count("recycled")
+            else:
+                with self._lock:
+                    self._idle.append(session)
+            return res
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counters)
+            out["idle"] = len(self._idle)
+            out["retry_in"] = round(max(0.0, self._retry_at - self._clock()), 3) or None
+        out["size"] = self.size
+        out["library"] = self.lib_path
+        out["broken"] = self.broken
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for s in idle:
+            s.kill()
+
+
+_POOL: Optional[NgspicePool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def spice_backend(requested: str = "auto") -> str:
+    """'batch' | 'shared' | 'auto'; 'auto' en la entrada delega en ``KORELIA_SPICE_BACKEND``."""
+    if requested == "auto":
+        requested = os.getenv("KORELIA_SPICE_BACKEND", "auto").lower()
+    return requested if requested in ("batch", "shared") else "auto"
+
+
+def get_ngspice_pool(requested: str = "auto") -> Optional[NgspicePool]:
+    """Pool compartido del proceso; None si se pide batch, no hay libngspice, no carga o está en backoff."""
+    global _POOL
+    if spice_backend(requested) == "batch":
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            lib_path = find_libngspice()
+            if lib_path is None:
+                return None
+            size = os.getenv("KORELIA_NGSPICE_POOL_SIZE")
+            _POOL = NgspicePool(lib_path, size=int(size) if size else min(4, os.cpu_count() or 1))
+        return _POOL if _POOL.available() else None
+
+
+def ngspice_stats() -> Optional[Dict[str, Any]]:
+    """Contadores del pool (None si nunca se creó)."""
+    return _POOL.stats() if _POOL is not None else None
+
@@ -1,20 +1,26 @@
+import asyncio
+import functools
 import os
 import json
 import re
 import sys
 import tempfile
 from pathlib import Path
-from typing import Literal, Dict, Any, List, Optional
+from typing import Callable, Literal, Dict, Any, Generator, List, NamedTuple, Optional
 from subprocess import run, PIPE, TimeoutExpired
-from dotenv import load_dotenv
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool, tool
+from ..env import load_env
 from ..schema.spice_schema import SpiceAutorunInput
+from .sim_cache import WORKDIR_TOKEN, get_sim_cache, ngspice_version
+from .ngspice_shared import NgspiceSessionError, NgspiceSessionTimeout, get_ngspice_pool
+from .waveform import RawFile, Waveform, window_metrics, write_rawfile
+from .async_exec import run_async
+from .ngspice_log import LogFollower, NgspiceLog, run_followed
+from .steady_state import (match_kpi_targets, steady_fraction, steady_posthoc, steady_report, steady_spec,
+                           tran_stop)
 
-load_dotenv()
-
-# Environment variables setup
-os.environ.setdefault("NGSPICE", r"C:\Program Files\Spice64\bin\ngspice.exe")
-os.environ.setdefault("KICAD_CLI", r"C:\Program Files\KiCad\8.0\bin\kicad-cli.exe")
+# Environment variables setup (.env + rutas por defecto de ngspice/kicad-cli)
+load_env()
 
 
 # =========================
@@ -186,8 +192,80 @@ def _autopatch_minimal(netlist_text: str) -> str:
 # SPICE TOOLS
 # =========================
 
-@tool("spice_autorun")
-def spice_autorun(input_data: SpiceAutorunInput) -> str:
+# =========================
+# SYNC / ASYNC EXECUTION
+# =========================
+# Los cuerpos de las tools EDA son generadores que ceden los pasos bloqueantes y reciben su
+# resultado: ``_Exec`` (subproceso) o un callable (pool de libngspice, caché). ``_drive`` los
+# ejecuta en línea (invoke) y ``_adrive`` con ``run_async`` / ``asyncio.to_thread`` (ainvoke),
+# de modo que la versión síncrona y la asíncrona comparten el mismo código.
+
+class _Exec(NamedTuple):
+    kind: str            # limitador de concurrencia: 'spice' | 'kicad'
+    cmd: List[str]
+    timeout_s: float
+    env: Optional[dict] = None
+    follow: Optional[Callable[[], bool]] = None   # p.ej. LogFollower.poll: True aborta el proceso
+    output_path: Optional[str] = None             # stdout+stderr cuando hay ``follow``
+
+
+_Steps = Generator[Any, Any, str]
+
+
+def _drive(steps: _Steps) -> str:
+    result, exc = None, None
+    while True:
+        try:
+            op = steps.throw(exc) if exc is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+        result, exc = None, None
+        try:
+            if isinstance(op, _Exec) and op.follow is not None:
+                result = run_followed(op.cmd, op.timeout_s, op.follow, op.output_path, env=op.env)
+            elif isinstance(op, _Exec):
+                result = run(op.cmd, stdout=PIPE, stderr=PIPE, text=True, env=op.env, timeout=op.timeout_s)
+            else:
+                result = op()
+        except Exception as e:
+            exc = e
+
+
+async def _adrive(steps: _Steps) -> str:
+    result, exc = None, None
+    while True:
+        try:
+            op = steps.throw(exc) if exc is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+        result, exc = None, None
+        try:
+            if isinstance(op, _Exec):
+                result = await run_async(op.cmd, op.kind, op.timeout_s, env=op.env,
+                                         follow=op.follow, output_path=op.output_path)
+            else:
+                result = await asyncio.to_thread(op)
+        except Exception as e:
+            exc = e
+
+
+def _eda_tool(name: str):
+    """Como ``@tool(name)`` para un generador de pasos: la tool tiene ``func`` y ``coroutine``."""
+    def wrap(steps_fn):
+        @functools.wraps(steps_fn)
+        def func(*args, **kwargs) -> str:
+            return _drive(steps_fn(*args, **kwargs))
+
+        @functools.wraps(steps_fn)
+        async def coroutine(*args, **kwargs) -> str:
+            return await _adrive(steps_fn(*args, **kwargs))
+
+        return StructuredTool.from_function(func=func, coroutine=coroutine, name=name)
+    return wrap
+
+
+@_eda_tool("spice_autorun")
+def spice_autorun(input_data: SpiceAutorunInput) -> _Steps:
     """
     Ejecuta simulaciones SPICE (ngspice batch) o código Python (PySpice/pyngspice).
     **Contrato para el LLM (construcción, no saneado):**
@@ -217,14 +295,30 @@ def spice_autorun(input_data: SpiceAutorunInput) -> str:
       - probes: Lista de expresiones SPICE ['v(VOUT)', 'i(R1)']
       - from_fraction: Fracción 0.0-1.0 para métricas en CSVs.
       - timeout_s: Timeout (s).
-
-    Devuelve JSON con method, paths, probes, measures, y log.
+      - use_cache: False para ignorar la caché de resultados (p.ej. si el netlist lee ficheros externos).
+      - output: 'csv' (un CSV WRDATA por probe, por defecto) | 'raw' (un único rawfile binario con
+        todas las probes; se lee con memmap sin copia y cada probe indica {'raw': ruta, 'var': variable}).
+      - backend: 'auto' | 'batch' | 'shared'. 'shared' usa un pool de sesiones calientes de libngspice
+        (circuito en memoria, vectores leídos directamente); sin libngspice se usa batch.
+      - stop_at_steady_state / steady_rel_tol: en .tran, para ngspice cuando las probes de
+        kpi_contract (o todas) han llegado al régimen permanente (sólo backend shared; en batch se
+        simula hasta tstop y se informa de dónde habría convergido).
+
+    Devuelve JSON con method, paths, probes, measures, warnings ({aviso: n}) y log_tail.
+    Cada probe trae 'metrics' (avg/rms/p2p) y 'summary' de tamaño fijo (summary_points cubetas):
+    envelope {t,min,max}, ripple_hz, ripple_p2p, steady_state, t_steady, final, settling_time y
+    overshoot_pct (sólo envelope en .ac/.dc). Úsalo para ver la forma de onda sin leer los CSV.
+    El log se lee mientras ngspice corre: ante un error fatal de convergencia (timestep too small,
+    simulation(s) aborted) la simulación se corta sin esperar al timeout y se indica en 'fatal'.
+    Con stop_at_steady_state, 'steady' trae converged_at, stopped_early y valor/KPI de cada probe
+    vigilada; tras una parada temprana las métricas se calculan sobre el tramo ya estable.
     """
     input_text = input_data.input_text
     mode = input_data.mode
     probes = input_data.probes if input_data.probes else [input_data.node_expr or "v(VOUT)"]
     frac = input_data.from_fraction
     timeout_s = str(input_data.timeout_s)
+    output = input_data.output
 
     # --- PYTHON MODE ---
     if mode == "python" or (mode == "auto" and _guess_is_python(input_text)):
@@ -249,7 +343,7 @@ if "run" in globals() and callable(globals()["run"]):
 
         env = _augment_env_for_ngspice(os.environ.copy())
         try:
-            r = run([sys.executable, "-u", script_path], stdout=PIPE, stderr=PIPE, text=True, env=env, timeout=int(timeout_s))
+            r = yield _Exec("spice", [sys.executable, "-u", script_path], int(timeout_s), env)
             stdout, stderr = r.stdout or "", r.stderr or ""
         except TimeoutExpired:
             return json.dumps({"error": f"Timeout after {timeout_s}s", "workdir": workdir, "script_path": script_path}, ensure_ascii=False)
@@ -274,13 +368,10 @@ if "run" in globals() and callable(globals()["run"]):
 
     # --- NETLIST MODE ---
     cmd_ngspice = _resolve_ngspice()
-    if not cmd_ngspice:
+    pool = get_ngspice_pool(input_data.backend)
+    if not cmd_ngspice and pool is None:
         return json.dumps({"error": "ngspice no encontrado (define NGSPICE o añade a PATH)"}, ensure_ascii=False)
 
-    workdir = tempfile.mkdtemp(prefix="spice_")
-    netlist_path = os.path.join(workdir, "circuit.sp")
-    log_path = os.path.join(workdir, "ngspice.log")
-
     # Obtener netlist
     if _guess_is_file_path(input_text):
         with open(input_text, "r", encoding="utf-8", errors="ignore") as f:
@@ -290,8 +381,69 @@ if "run" in globals() and callable(globals()["run"]):
 
     # Ajuste mínimo (no intrusivo)
     base = _autopatch_minimal(net_txt)
-
-    # Preparar WRDATA para probes (no normalizamos: exigimos que el agente ya pase expresiones válidas)
+    steady = _steady_setup(input_data, probes, base)
+
+    # Caché por contenido: netlist final con el workdir sustituido por un token estable
+    cache = get_sim_cache()
+    key = None
+    if cache is not None and not input_data.use_cache:
+        cache.count("bypass")
+        cache = None
+    if cache is not None:
+        key_code = _ensure_one_control_with_wrdata(base, _output_lines(probes, WORKDIR_TOKEN, output)[0])
+        if steady is not None:
+            # una simulación detenida en el régimen permanente no es la misma que la completa
+            key_code += "\n* korelia steady " + json.dumps(steady["spec"], sort_keys=True)
+        version = (yield functools.partial(ngspice_version, cmd_ngspice)) if cmd_ngspice else os.path.basename(pool.lib_path)
+        key = cache.key(key_code, probes, frac, version)
+        hit = cache.get(key)
+        if hit is not None:
+            hit["cache"] = {"hit": True, "key": key}
+            if input_data.summary_points:
+                yield functools.partial(_attach_summaries, hit, _metrics_fraction(hit, frac), input_data.summary_points,
+                                        _is_time_domain(base))
+            return json.dumps(hit, ensure_ascii=False)
+
+    workdir = cache.staging_dir() if cache is not None else tempfile.mkdtemp(prefix="spice_")
+    code, artifacts = _prepare_netlist(base, probes, workdir, output)
+    result = None
+    if pool is not None:
+        result = yield functools.partial(_run_shared, pool, base, code, artifacts, workdir, frac, input_data.timeout_s,
+                                         steady["spec"] if steady else None)
+    if result is None:
+        if not cmd_ngspice:
+            return json.dumps({"error": "sesión de libngspice caída y ngspice batch no encontrado"}, ensure_ascii=False)
+        netlist_path, log_path = _write_netlist(code, workdir)
+        # el log se consume mientras ngspice escribe; un error fatal de convergencia aborta el run
+        follower = LogFollower(log_path, NgspiceLog())
+        try:
+            r = yield _Exec("spice", [cmd_ngspice, "-b", "-o", log_path, netlist_path], input_data.timeout_s,
+                            follow=follower.poll, output_path=os.path.join(workdir, "ngspice.out"))
+            result = _collect_ngspice_result(r, workdir, netlist_path, log_path, artifacts, frac, follower)
+        except TimeoutExpired:
+            log = follower.finish()
+            result = {"error": f"Timeout after {timeout_s}s", "method": "ngspice_batch", "workdir": workdir,
+                      "netlist_path": netlist_path, "log_path": log_path, "warnings": log.warnings,
+                      "log_tail": log.tail()}
+
+    if steady is not None and result.get("probes"):
+        yield functools.partial(_finish_steady, result, steady)
+
+    if cache is not None:
+        # sólo se guardan ejecuciones correctas; un fallo puede ser transitorio
+        if result.get("returncode") == 0:
+            result = yield functools.partial(cache.put, key, workdir, result)
+        result["cache"] = {"hit": False, "key": key}
+    # los resúmenes no se guardan en la caché: dependen de summary_points y se recalculan de los artefactos
+    if input_data.summary_points and result.get("probes"):
+        yield functools.partial(_attach_summaries, result, _metrics_fraction(result, frac), input_data.summary_points,
+                                _is_time_domain(base))
+    return json.dumps(result, ensure_ascii=False)
+
+
+def _wrdata_lines(probes: List[str], workdir: str):
+    """Líneas WRDATA (una por probe) y sus CSV dentro de ``workdir``."""
+    # no normalizamos: exigimos que el agente ya pase expresiones válidas
     wr_lines, csv_paths = [], []
     for expr in probes:
         expr = str(expr)
@@ -299,77 +451,237 @@ if "run" in globals() and callable(globals()["run"]):
         csv_path = os.path.join(workdir, f"{safe}.csv").replace("\\", "/")
         wr_lines.append(f'wrdata "{csv_path}" {expr}')
         csv_paths.append((expr, csv_path))
+    return wr_lines, csv_paths
 
-    # Un único .control .endc con wrdata (si existe, reusamos; si no, creamos)
-    code = _ensure_one_control_with_wrdata(base, wr_lines)
 
-    # Escribir netlist final
-    with open(netlist_path, "w", encoding="utf-8") as f:
-        f.write(code)
+def _rawfile_lines(probes: List[str], workdir: str):
+    """Un único ``write`` binario con todas las probes (la escala se escribe una sola vez)."""
+    raw_path = os.path.join(workdir, "probes.raw").replace("\\", "/")
+    return ["set filetype=binary", f'write "{raw_path}" ' + " ".join(str(p) for p in probes)], raw_path
 
-    # Ejecutar ngspice batch
-    r = run([cmd_ngspice, "-b", "-o", log_path, netlist_path], stdout=PIPE, stderr=PIPE, text=True)
-    try:
-        with open(log_path, "r", encoding="utf-8", errors="ignore") as lf:
-            log_txt = lf.read()
-    except Exception:
-        log_txt = (r.stdout or "") + "\n" + (r.stderr or "")
-
-    # Parseo de medidas por .meas (si existen)
-    FLOAT_RE = r"[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?"
-    meas_pairs = re.findall(r"(?mi)^\s*([A-Za-z_]\w*)\s*=\s*({})\s*$".format(FLOAT_RE), log_txt)
-    measures = {k: float(v) for k, v in meas_pairs}
-
-    # Métricas simples desde WRDATA
-    def _metrics_from_csv(path: str):
-        xs, ys = [], []
+
+def _output_lines(probes: List[str], workdir: str, output: str = "csv"):
+    """Líneas de .control y artefactos esperados: {'csv': [(expr, path)]} o {'raw': path}."""
+    if output == "raw":
+        lines, raw_path = _rawfile_lines(probes, workdir)
+        return lines, {"raw": raw_path, "probes": [str(p) for p in probes]}
+    lines, csv_paths = _wrdata_lines(probes, workdir)
+    return lines, {"csv": csv_paths}
+
+
+def _prepare_netlist(base: str, probes: List[str], workdir: str, output: str = "csv"):
+    """Netlist final (un único .control con WRDATA o ``write`` de las probes) y artefactos esperados."""
+    out_lines, artifacts = _output_lines(probes, workdir, output)
+    # Un único .control .endc con la salida (si existe, reusamos; si no, creamos)
+    return _ensure_one_control_with_wrdata(base, out_lines), artifacts
+
+
+def _probe_exprs(artifacts: Dict[str, Any]) -> List[str]:
+    if "raw" in artifacts:
+        return artifacts["probes"]
+    return [expr for expr, _ in artifacts["csv"]]
+
+
+def _probe_entries(artifacts: Dict[str, Any], frac: float) -> List[Dict[str, Any]]:
+    """Entradas ``probes`` del resultado: artefacto de cada probe y sus métricas."""
+    if "csv" in artifacts:
+        waves = [Waveform(expr, csv_path) for expr, csv_path in artifacts["csv"]]
+    else:
+        exprs, raw_path = artifacts["probes"], artifacts["raw"]
         try:
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                for line in f:
-                    parts = line.strip().split()
-                    if len(parts) >= 2:
-                        try:
-                            xs.append(float(parts[0]))
-                            ys.append(float(parts[1]))
-                        except Exception:
-                            continue
-        except Exception:
-            return None
-        if not ys:
-            return None
-        n0 = int(len(ys) * (frac if 0.0 <= frac < 1.0 else 0.0))
-        yw = ys[n0:] if n0 > 0 else ys
-        n = len(yw)
-        if n == 0:
+            raw = RawFile(raw_path)
+        except (OSError, ValueError, IndexError):
+            return [{"expr": expr, "raw": raw_path, "var": None, "metrics": None} for expr in exprs]
+        plot = raw.plot()
+        # si ngspice renombró las variables, se empareja por posición sólo si el número cuadra
+        positional = plot is not None and len(plot.variables) == len(exprs) + 1
+        waves = [Waveform(expr, raw_path, raw, i + 1 if positional else None) for i, expr in enumerate(exprs)]
+    return [{"expr": w.expr, **w.ref(), "metrics": w.metrics(frac)} for w in waves]
+
+
+_TRAN_RE = re.compile(r"^\s*\.?tran\b", re.I | re.M)
+
+
+def _is_time_domain(netlist: str) -> bool:
+    """Hay un análisis transitorio (``.tran`` o ``tran`` en el bloque .control)."""
+    return bool(_TRAN_RE.search(netlist))
+
+
+def _entry_wave(entry: Dict[str, Any], raws: Dict[str, RawFile]) -> Optional[Waveform]:
+    """``Waveform`` de una entrada de ``probes`` (CSV o variable de un rawfile compartido en ``raws``)."""
+    if entry.get("csv"):
+        return Waveform(entry["expr"], entry["csv"])
+    if entry.get("raw") and entry.get("var"):
+        try:
+            raw = raws.get(entry["raw"]) or raws.setdefault(entry["raw"], RawFile(entry["raw"]))
+        except (OSError, ValueError, IndexError):
             return None
-        avg = sum(yw) / n
-        rms = (sum(v*v for v in yw) / n) ** 0.5
-        p2p = (max(yw) - min(yw))
-        return {"avg": float(avg), "rms": float(rms), "p2p": float(p2p), "samples": len(ys), "window_samples": len(yw)}
+        return Waveform(entry["var"], entry["raw"], raw)
+    return None
+
+
+def _attach_summaries(result: Dict[str, Any], frac: float, points: int, time_domain: bool) -> Dict[str, Any]:
+    """Añade a cada probe su resumen de tamaño fijo (``waveform.summarize``) leído de su artefacto."""
+    raws: Dict[str, RawFile] = {}
+    for entry in result.get("probes", []):
+        wave = _entry_wave(entry, raws)
+        entry["summary"] = wave.summary(frac, points, time_domain) if wave is not None else None
+    return result
+
+
+# ---------- Régimen permanente (stop_at_steady_state) ----------
+
+def _steady_setup(input_data: SpiceAutorunInput, probes: List[str], netlist: str) -> Optional[Dict[str, Any]]:
+    """Monitor de régimen permanente: KPIs de kpi_contract asignados a probes y tstop del .tran."""
+    if not input_data.stop_at_steady_state or not _is_time_domain(netlist):
+        return None
+    kpis = input_data.kpi_contract.targets if input_data.kpi_contract else {}
+    aliases = [(a.name, a.value, a.kind.value) for a in input_data.aliases]
+    targets, unmatched = match_kpi_targets(kpis, probes, aliases, input_data.net_name_map)
+    tstop = tran_stop(netlist)
+    return {"spec": steady_spec(probes, targets, input_data.steady_rel_tol, tstop),
+            "targets": targets, "unmatched": unmatched, "tstop": tstop}
+
+
+def _finish_steady(result: Dict[str, Any], steady: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Sustituye el veredicto crudo de la sesión por el informe ``steady``; en batch (sin vigilancia
+    durante la simulación) aplica el mismo criterio a posteriori sobre las probes vigiladas.
+    """
+    raw = result.pop("steady", None)
+    from_fraction = None
+    if raw is not None:
+        verdict, mode = raw["verdict"], "stopped" if raw["halted"] else "monitored"
+        from_fraction = raw.get("from_fraction")
+        # la sesión comprueba también al terminar: su último instante es el final simulado
+        sim_time = verdict["t"] if verdict else None
+    else:
+        raws: Dict[str, RawFile] = {}
+        waves = {e["expr"]: _entry_wave(e, raws) for e in result["probes"] if e["expr"] in steady["spec"]["probes"]}
+        waves = {expr: w for expr, w in waves.items() if w is not None and w.available}
+        first = next(iter(waves.values()), None)
+        x = first.x if first is not None else None
+        # las probes de un mismo .tran comparten escala; una de otra longitud no se compara
+        ys = {expr: w.y for expr, w in waves.items() if x is not None and w.x.size == x.size}
+        verdict, mode = (steady_posthoc(x, ys, steady["spec"]) if ys else None), "posthoc"
+        sim_time = float(x[-1]) if ys else None
+    report = steady_report(verdict, steady["targets"], mode, sim_time, steady["tstop"])
+    report["stopped_early"] = mode == "stopped"
+    if report["stopped_early"]:
+        report["from_fraction"] = from_fraction
+    if steady["unmatched"]:
+        report["unmatched_kpis"] = steady["unmatched"]
+    result["steady"] = report
+    return result
+
+
+def _metrics_fraction(result: Dict[str, Any], frac: float) -> float:
+    """from_fraction con el que se calcularon las métricas (el tramo estable tras una parada temprana)."""
+    return (result.get("steady") or {}).get("from_fraction") or frac
+
+
+def _write_netlist(code: str, workdir: str):
+    """Escribe el netlist en ``workdir``; devuelve (netlist, log) para ngspice batch."""
+    netlist_path = os.path.join(workdir, "circuit.sp")
+    log_path = os.path.join(workdir, "ngspice.log")
+    with open(netlist_path, "w", encoding="utf-8") as f:
+        f.write(code)
+    return netlist_path, log_path
 
+
+def _run_shared(pool, base: str, code: str, artifacts: Dict[str, Any], workdir: str, frac: float,
+                timeout_s: int, steady: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Simula en una sesión caliente de libngspice. Escribe los mismos artefactos que batch
+    (netlist, log y un CSV por probe o un rawfile único) pero calcula las métricas sobre los
+    vectores en memoria. None si la sesión no está disponible o murió (se reintenta en batch).
+    Con ``steady`` el resultado trae el veredicto crudo de la sesión en 'steady'.
+    """
+    netlist_path, log_path = _write_netlist(code, workdir)
+    try:
+        res = pool.run(base, _probe_exprs(artifacts), timeout_s, log_path, steady)
+    except NgspiceSessionTimeout:
+        return {"error": f"Timeout after {timeout_s}s", "method": "ngspice_shared", "workdir": workdir,
+                "netlist_path": netlist_path}
+    except NgspiceSessionError:
+        return None
+    log = res["log"]
+
+    vectors = res["vectors"]
     probes_out = []
-    for expr, csv_path in csv_paths:
-        probes_out.append({"expr": expr, "csv": csv_path, "metrics": _metrics_from_csv(csv_path)})
+    steady_res = res.get("steady")
+    if steady_res and steady_res["halted"]:
+        first = next((vec for vec in vectors.values() if vec is not None and len(vec[0])), None)
+        frac = steady_fraction(steady_res["verdict"], first[0][0] if first else 0.0, frac)
+        steady_res["from_fraction"] = frac
+    if "csv" in artifacts:
+        for expr, csv_path in artifacts["csv"]:
+            vec = vectors.get(expr)
+            if vec is not None:
+                xs, ys = vec
+                with open(csv_path, "w", encoding="utf-8") as f:
+                    f.writelines(f" {x:.15e}  {y:.15e}\n" for x, y in zip(xs, ys))
+            probes_out.append({"expr": expr, "csv": csv_path,
+                               "metrics": window_metrics(*vec, frac) if vec is not None else None})
+    else:
+        found = [(expr, vectors[expr]) for expr in artifacts["probes"] if vectors.get(expr) is not None]
+        # un rawfile es un único plot: sólo vectores con la misma escala que el primero
+        found = [(expr, vec) for expr, vec in found if len(vec[0]) == len(found[0][1][0])]
+        if found:
+            write_rawfile(artifacts["raw"], "korelia shared", res.get("scale") or "index",
+                          found[0][1][0], [(expr, ys) for expr, (_, ys) in found])
+        written = {expr for expr, _ in found}
+        for expr in artifacts["probes"]:
+            vec = vectors.get(expr) if expr in written else None
+            probes_out.append({"expr": expr, "raw": artifacts["raw"], "var": expr if vec is not None else None,
+                               "metrics": window_metrics(*vec, frac) if vec is not None else None})
+
+    return {
+        "method": "ngspice_shared",
+        "returncode": res["returncode"],
+        "workdir": workdir,
+        "netlist_path": netlist_path,
+        "log_path": log_path,
+        "probes": probes_out,
+        **_log_fields(log),
+        **({"steady": steady_res} if steady_res is not None else {}),
+    }
 
-    return json.dumps({
-        "method": "ngspice_wrdata",
+
+def _log_fields(log: NgspiceLog) -> Dict[str, Any]:
+    """Medidas .meas, avisos agrupados y cola del log (más ``fatal`` si hubo error de convergencia)."""
+    out = {"measures": log.measures, "warnings": log.warnings, "log_tail": log.tail()}
+    if log.fatal:
+        out["fatal"] = log.fatal
+    return out
+
+
+def _collect_ngspice_result(r, workdir: str, netlist_path: str, log_path: str, artifacts: Dict[str, Any],
+                            frac: float, follower: LogFollower) -> Dict[str, Any]:
+    """Log (ya consumido en streaming), medidas .meas y métricas por probe de una ejecución batch."""
+    log = follower.finish()
+    if not os.path.exists(log_path):
+        # ngspice no llegó a abrir el log: lo que haya dicho está en stdout/stderr
+        log = LogFollower(os.path.join(workdir, "ngspice.out"), NgspiceLog()).finish()
+
+    return {
+        "method": "ngspice_rawfile" if "raw" in artifacts else "ngspice_wrdata",
         "returncode": r.returncode,
         "workdir": workdir,
         "netlist_path": netlist_path,
         "log_path": log_path,
-        "probes": probes_out,
-        "measures": measures,
-        "log_tail": log_txt[-10000:]
-    }, ensure_ascii=False)
+        "probes": _probe_entries(artifacts, frac),
+        **_log_fields(log),
+    }
 
 
 # =========================
 # KICAD TOOLS
 # =========================
 
-@tool("kicad_cli_exec")
-def kicad_cli_exec(args_json: str) -> str:
-    """Ejecuta kicad-cli con una lista de argumentos en JSON. Resuelve binario via KICAD_CLI o PATH."""
+@_eda_tool("kicad_cli_exec")
+def kicad_cli_exec(args_json: str, timeout_s: str = "300") -> _Steps:
+    """Ejecuta kicad-cli con una lista de argumentos en JSON (timeout en segundos). Resuelve binario via KICAD_CLI o PATH."""
     cmd_kicad = _resolve_kicad_cli()
     if not cmd_kicad:
         return json.dumps({"error": "kicad-cli no encontrado (define KICAD_CLI o añade a PATH)"}, ensure_ascii=False)
@@ -379,7 +691,12 @@ def kicad_cli_exec(args_json: str) -> str:
             return json.dumps({"error": "args_json debe ser una lista JSON"}, ensure_ascii=False)
     except Exception as e:
         return json.dumps({"error": f"JSON inválido: {e}"}, ensure_ascii=False)
-    res = run([cmd_kicad] + args, stdout=PIPE, stderr=PIPE, text=True)
+    try:
+        res = yield _Exec("kicad", [cmd_kicad] + args, int(timeout_s))
+    except FileNotFoundError:
+        return json.dumps({"error": f"kicad-cli no se puede ejecutar: {cmd_kicad}"}, ensure_ascii=False)
+    except TimeoutExpired:
+        return json.dumps({"error": f"kicad-cli timeout > {timeout_s}s", "cmd": [cmd_kicad] + args}, ensure_ascii=False)
     return json.dumps({
         "returncode": res.returncode,
         "stdout": (res.stdout or "")[-10000:],
@@ -484,8 +801,8 @@ def kicad_project_manager(action: str, project_name: str = "Switched_PSU_24V_3A"
         return json.dumps({"status": "error", "action": action, "error": str(e)}, ensure_ascii=False)
 
 
-@tool("kicad_erc")
-def kicad_erc(project_path: str, timeout_s: str = "120") -> str:
+@_eda_tool("kicad_erc")
+def kicad_erc(project_path: str, timeout_s: str = "120") -> _Steps:
     """Run KiCad ERC on a .kicad_pro/.kicad_sch project (resuelve kicad-cli por env/PATH)."""
     cmd_kicad = _resolve_kicad_cli()
     if not cmd_kicad:
@@ -509,7 +826,7 @@ def kicad_erc(project_path: str, timeout_s: str = "120") -> str:
             return json.dumps({"error": f"Project file not found: {project_path}"}, ensure_ascii=False)
 
     try:
-        res = run([cmd_kicad, "sch", "erc", "--project", resolved_path], stdout=PIPE, stderr=PIPE, text=True, timeout=int(timeout_s))
+        res = yield _Exec("kicad", [cmd_kicad, "sch", "erc", "--project", resolved_path], int(timeout_s))
         return json.dumps({
             "returncode": res.returncode,
             "stdout": (res.stdout or "")[-10000:],
@@ -523,8 +840,8 @@ def kicad_erc(project_path: str, timeout_s: str = "120") -> str:
         return json.dumps({"error": f"ERC timeout > {timeout_s}s"}, ensure_ascii=False)
 
 
-@tool("kicad_drc")
-def kicad_drc(board_path: str, timeout_s: str = "120") -> str:
+@_eda_tool("kicad_drc")
+def kicad_drc(board_path: str, timeout_s: str = "120") -> _Steps:
     """Run KiCad DRC list on a .kicad_pcb board (resuelve kicad-cli por env/PATH)."""
     cmd_kicad = _resolve_kicad_cli()
     if not cmd_kicad:
@@ -548,7 +865,7 @@ def kicad_drc(board_path: str, timeout_s: str = "120") -> str:
             return json.dumps({"error": f"Board file not found: {board_path}"}, ensure_ascii=False)
 
     try:
-        res = run([cmd_kicad, "pcb", "drclist", "--board", resolved_path], stdout=PIPE, stderr=PIPE, text=True, timeout=int(timeout_s))
+        res = yield _Exec("kicad", [cmd_kicad, "pcb", "drclist", "--board", resolved_path], int(timeout_s))
         return json.dumps({
             "returncode": res.returncode,
             "stdout": (res.stdout or "")[-10000:],
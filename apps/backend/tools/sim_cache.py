@@ -0,0 +1,269 @@
+"""
+Caché de resultados de simulación direccionada por contenido (para ``spice_autorun``).
+
+La clave es un sha256 de: netlist normalizado (tras ``_autopatch_minimal`` y
+``_ensure_one_control_with_wrdata``, con el directorio de trabajo sustituido por un token),
+probes, ``from_fraction``, versión de ngspice y huella (tamaño, mtime) de los ``.include``/``.lib``
+con ruta existente. Cada entrada es un directorio con el resultado parseado (``result.json``) y
+los artefactos (CSV, netlist, log). Se expulsan las entradas menos usadas al superar ``max_bytes``:
+el tamaño total y el orden LRU se llevan en memoria (el disco se recorre una sola vez, en el primer
+acceso, ordenando por el mtime de ``result.json``, que ``get`` sigue actualizando).
+Los workdirs de ``_staging`` que nunca se guardan (ejecuciones fallidas, cuyos artefactos se
+devuelven para diagnóstico) se borran al superar ``staging_ttl_s`` sin cambios.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from subprocess import run, PIPE
+from typing import Dict, Any, List, Optional, Tuple
+
+
+# Sustituye al directorio de trabajo en el netlist usado para la clave
+WORKDIR_TOKEN = "@SIM_WORKDIR@"
+
+_INCLUDE_RE = re.compile(r'^\s*\.(?:include|inc|lib)\s+["\']?([^"\'\s]+)', re.I | re.M)
+
+_NGSPICE_VERSIONS: Dict[Tuple[str, float], str] = {}
+
+
+def ngspice_version(cmd: str) -> str:
+    """Primera línea de ``ngspice -v`` (cacheada por binario y mtime)."""
+    try:
+        key = (cmd, os.path.getmtime(cmd))
+    except OSError:
+        key = (cmd, 0.0)
+    v = _NGSPICE_VERSIONS.get(key)
+    if v is None:
+        try:
+            r = run([cmd, "-v"], stdout=PIPE, stderr=PIPE, text=True, timeout=10)
+            lines = [ln.strip() for ln in (r.stdout or r.stderr or "").splitlines() if ln.strip()]
+            v = next((ln for ln in lines if "ngspice" in ln.lower()), lines[0] if lines else "unknown")
+        except Exception:
+            v = "unknown"
+        _NGSPICE_VERSIONS[key] = v
+    return v
+
+
+def _include_fingerprints(netlist: str) -> List[Tuple[str, int, int]]:
+    out = []
+    for path in _INCLUDE_RE.findall(netlist):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        out.append((path, st.st_size, st.st_mtime_ns))
+    return out
+
+
+def _rewrite_paths(obj: Any, old: str, new: str) -> Any:
+    if isinstance(obj, str):
+        return obj.replace(old, new)
+    if isinstance(obj, list):
+        return [_rewrite_paths(v, old, new) for v in obj]
+    if isinstance(obj, dict):
+        return {k: _rewrite_paths(v, old, new) for k, v in obj.items()}
+    return obj
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+class SimCache:
+    """Caché en disco local con expulsión LRU por tamaño y contadores hit/miss."""
+    RESULT_FILE = "result.json"
+
+    def __init__(self, root: str, max_bytes: int = 512 * 2**20, staging_ttl_s: float = 6 * 3600) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        # mayor que cualquier timeout_s razonable: un workdir en uso no debe borrarse
+        self.staging_ttl_s = staging_ttl_s
+        self._lock = threading.Lock()
+        self._staging_swept = 0.0
+        # clave -> bytes de la entrada, en orden LRU (más antigua primero); None hasta el primer escaneo
+        self._index: "Optional[OrderedDict[str, int]]" = None
+        self._total = 0
+        self._counters: Dict[str, int] = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypass": 0,
+                                          "staging_swept": 0}
+
+    @classmethod
+    def from_env(cls) -> "SimCache":
+        root = os.getenv("KORELIA_SIM_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "korelia_sim_cache")
+        max_mb = os.getenv("KORELIA_SIM_CACHE_MAX_MB")
+        ttl = os.getenv("KORELIA_SIM_CACHE_STAGING_TTL_S")
+        return cls(root, int(max_mb) * 2**20 if max_mb else 512 * 2**20, float(ttl) if ttl else 6 * 3600)
+
+    # ---------- Claves ----------
+
+    @staticmethod
+    def key(netlist: str, probes: List[str], from_fraction: float, version: str) -> str:
+        norm = "\n".join(ln.rstrip() for ln in netlist.replace("\r\n", "\n").split("\n")).strip()
+        payload = {
+            "netlist": norm,
+            "probes": [str(p) for p in probes],
+            "from_fraction": float(from_fraction),
+            "ngspice": version,
+            "includes": _include_fingerprints(norm),
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    # ---------- Acceso ----------
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._entry_dir(key), self.RESULT_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path)  # marca de uso para el orden LRU tras un reinicio
+        except (OSError, ValueError):
+            self.count("misses")
+            return None
+        with self._lock:
+            self._counters["hits"] += 1
+            index = self._load_index()
+            if key in index:
+                index.move_to_end(key)
+                return result
+        # guardada por otro proceso que comparte el directorio: se indexa para poder expulsarla
+        self._track(key, _dir_size(self._entry_dir(key)))
+        return result
+
+    def staging_dir(self) -> str:
+        """Directorio de trabajo para una simulación que luego se guardará con ``put``."""
+        if time.time() - self._staging_swept > self.staging_ttl_s / 2:
+            # las ejecuciones que sólo fallan nunca llegan a put
+            with self._lock:
+                self._sweep_staging()
+        d = os.path.join(self.root, "_staging", uuid.uuid4().hex)
+        os.makedirs(d)
+        return d
+
+    def put(self, key: str, workdir: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Mueve ``workdir`` a la entrada de ``key`` y devuelve ``result`` con las rutas reescritas."""
+        final = self._entry_dir(key)
+        result = _rewrite_paths(result, workdir, final)
+        with open(os.path.join(workdir, self.RESULT_FILE), "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        try:
+            os.rename(workdir, final)
+        except OSError:
+            # otra ejecución guardó la misma clave primero: nos quedamos con la suya
+            shutil.rmtree(workdir, ignore_errors=True)
+            return result
+        self.count("stores")
+        self._track(key, _dir_size(final))
+        return result
+
+    def discard(self, workdir: str) -> None:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # ---------- Expulsión ----------
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(último uso, bytes, clave) de cada entrada en disco; sólo para el escaneo inicial."""
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard == "_staging" or not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                d = os.path.join(shard_dir, key)
+                try:
+                    used = os.path.getmtime(os.path.join(d, self.RESULT_FILE))
+                except OSError:
+                    used = 0.0
+                out.append((used, _dir_size(d), key))
+        return out
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """Índice LRU en memoria; la primera vez se construye recorriendo el disco (llamar con el lock)."""
+        if self._index is None:
+            self._index = OrderedDict((key, size) for _, size, key in sorted(self._entries()))
+            self._total = sum(self._index.values())
+        return self._index
+
+    def _sweep_staging(self) -> None:
+        """Borra los workdirs de staging sin cambios desde hace más de ``staging_ttl_s`` (llamar con el lock)."""
+        now = time.time()
+        self._staging_swept = now
+        staging = os.path.join(self.root, "_staging")
+        try:
+            names = os.listdir(staging)
+        except OSError:
+            return
+        for name in names:
+            d = os.path.join(staging, name)
+            try:
+                age = now - os.path.getmtime(d)
+            except OSError:
+                continue
+            if age > self.staging_ttl_s:
+                shutil.rmtree(d, ignore_errors=True)
+                self._counters["staging_swept"] += 1
+
+    def _track(self, key: str, size: int) -> None:
+        """Registra (o actualiza) ``key`` como la más reciente y expulsa lo necesario para no pasar de ``max_bytes``."""
+        victims = []
+        with self._lock:
+            self._sweep_staging()
+            index = self._load_index()
+            self._total += size - index.pop(key, 0)
+            index[key] = size
+            while self._total > self.max_bytes and len(index) > 1:
+                old, old_size = index.popitem(last=False)
+                self._total -= old_size
+                victims.append(old)
+                self._counters["evictions"] += 1
+        for old in victims:
+            shutil.rmtree(self._entry_dir(old), ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counters)
+            out["entries"] = len(self._index) if self._index is not None else None
+            out["bytes"] = self._total if self._index is not None else None
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else None
+        out["root"] = self.root
+        out["max_bytes"] = self.max_bytes
+        return out
+
+
+_CACHE: Optional[SimCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_sim_cache() -> Optional[SimCache]:
+    """Caché compartida del proceso; None si KORELIA_SIM_CACHE=0."""
+    global _CACHE
+    if os.getenv("KORELIA_SIM_CACHE", "1").lower() in ("0", "false", "no", "off"):
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = SimCache.from_env()
+        return _CACHE
@@ -0,0 +1,717 @@
+"""
+Netlist ngspice determinista desde el CIG (sin pasar por el LLM).
+
+Recorre los ``ComponentInstance``/``SubcircuitInstance`` del grafo con sus pins/ports y nets
+(``ConnectivityIndex``) y escribe un netlist completo: elementos, ``.include``/``.model``,
+``.options``, análisis y ``.control`` opcional (los WRDATA de las probes los añade spice_autorun).
+
+- Clase -> elemento: Resistor/Capacitor/Inductor -> R/C/L, Diode -> D, MOSFET -> M, BJT -> Q,
+  Source/AC_In -> V/I, BridgeRectifier -> 4 diodos, Transformer -> L+L+K (``K_coupled``) o
+  E/F con sensor (``ideal_FCE``) según hint > ``device_map`` > ``build_policy``; con
+  ``spice_subckt`` (hint) o sin primitiva SPICE -> ``X``.
+- Modelos: hint > part_ref con modelo inline > ``preferred_models`` > ``fallback_models`` >
+  default del ``device_map``; se prefiere el primero que tenga ``.model`` inline en ``libraries``.
+  Si ninguno está definido (ni hay ``.include``) se emite un ``.model`` genérico y se avisa.
+- Nodos: el id de la net; la net de referencia (``naming['ground']``, ``is_reference_ground``
+  o tipo GROUND) es ``0``.
+- Probes según ``probe_contract``: alias, ``iR1`` -> ``i(R1)``, ``v(Vsrc)`` -> ``v(n+,n-)``.
+
+Caché por store y versión: las líneas de cada dispositivo se guardan y tras una mutación sólo se
+regeneran los dispositivos tocados (ChangeSet); un cambio en nets o en el input rehace todo.
+"""
+import json
+import math
+import os
+import re
+import weakref
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..graph.patcher import gc_paused
+from ..schema.spice_schema import DeviceStrategy, SpiceAnalysis, SpiceEmitInput
+from .steady_state import spice_number
+
+
+_NET = "urn:cig:net:"
+_CMP = "urn:cig:cmp:"
+_INST = "urn:cig:inst:"
+_SUBCKT = "urn:cig:subckt:"
+
+# clase del componente -> letra del elemento (las que no aparecen no tienen primitiva SPICE)
+_LETTER = {"Resistor": "R", "Capacitor": "C", "Inductor": "L", "Diode": "D", "DiodeFast": "D",
+           "MOSFET": "M", "BJT": "Q", "Source": "V", "AC_In": "V"}
+# sin clase: se deduce de la primera letra de la referencia
+_CLASS_BY_PREFIX = {"R": "Resistor", "C": "Capacitor", "L": "Inductor", "D": "Diode", "Q": "BJT",
+                    "M": "MOSFET", "V": "Source", "I": "Source", "T": "Transformer", "X": "SubcircuitRef"}
+_VALUE_KEYS = {
+    "Resistor": ("R", "resistance", "value", "r"),
+    "Capacitor": ("C", "capacitance", "value", "c"),
+    "Inductor": ("L", "inductance", "value", "l"),
+}
+_BASE_UNITS = ("ohms", "ohm", "Ω", "hz", "vrms", "f", "h", "v", "a", "s", "w")
+_SI_PREFIX = {"": "", "f": "f", "p": "p", "n": "n", "u": "u", "µ": "u", "μ": "u", "m": "m",
+              "k": "k", "K": "k", "M": "meg", "Meg": "meg", "meg": "meg", "G": "g", "T": "t"}
+_QTY_RE = re.compile(r"^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([A-Za-zµμΩ]*)\s*$")
+
+# roles canónicos de pin por clase (sinónimos en minúsculas)
+_ROLES = {
+    "source": (("+", {"+", "p", "pos", "plus", "positive", "l", "line", "in+"}),
+               ("-", {"-", "n", "neg", "minus", "negative", "neutral", "in-"})),
+    "Diode": (("a", {"a", "anode", "+", "p"}), ("k", {"k", "c", "cathode", "-", "n"})),
+    "MOSFET": (("d", {"d", "drain"}), ("g", {"g", "gate"}), ("s", {"s", "source"}),
+               ("b", {"b", "bulk", "body", "sub"})),
+    "BJT": (("c", {"c", "collector"}), ("b", {"b", "base"}), ("e", {"e", "emitter"})),
+    "BridgeRectifier": (("~", {"~", "ac", "ac1", "ac2", "ac+", "ac-", "l", "n"}),
+                        ("+", {"+", "pos", "dc+", "out+", "v+"}), ("-", {"-", "neg", "dc-", "out-", "v-"})),
+}
+_OPTIONAL_ROLES = {"b"}  # bulk del MOSFET (si falta, a source)
+_GENERIC_MODEL = {"D": "D(IS=1e-14 RS=0.01)", "M": "NMOS(LEVEL=1 VTO=3 KP=20)", "Q": "NPN(BF=100)"}
+_MODEL_DEFAULT = {"D": "default_diode", "M": "default_mosfet"}
+_MODEL_LINE_RE = re.compile(r"^\s*\.(?:model|subckt)\s+(\S+)", re.I | re.M)
+_PROBE_CALL_RE = re.compile(r"\b([vViI])\(([^()]*)\)")
+_BARE_I_RE = re.compile(r"^\s*[iI]_?([A-Za-z]\w*)\s*$")
+_ALIAS_RE = re.compile(r"@alias:(\w+)")
+
+
+# ---------- Valores ----------
+
+def _fmt(value: Any) -> str:
+    return format(value, ".12g") if isinstance(value, (int, float)) and not isinstance(value, bool) else str(value).strip()
+
+
+@lru_cache(maxsize=4096)
+def spice_value(value: Any, unit: Optional[str] = None) -> str:
+    """
+    Valor SPICE de un parámetro: ``(10, 'kOhm')`` -> ``10k``, ``(1, 'MOhm')`` -> ``1meg``,
+    ``'100 uF'`` -> ``100u``. Un sufijo SPICE sin unidad base se deja tal cual (``'1M'`` es mili).
+    """
+    if isinstance(value, str) and unit is None:
+        m = _QTY_RE.match(value)
+        if m is None:
+            return value.strip()
+        value, unit = m.group(1), m.group(2)
+        if not any(unit.lower().endswith(b.lower()) for b in _BASE_UNITS):
+            return value + unit
+    if not unit:
+        return _fmt(value)
+    for base in _BASE_UNITS:
+        if unit.lower().endswith(base.lower()):
+            prefix = unit[:len(unit) - len(base)]
+            break
+    else:
+        prefix = unit
+    suffix = _SI_PREFIX.get(prefix, _SI_PREFIX.get(prefix.lower()))
+    return _fmt(value) + (suffix if suffix is not None else "")
+
+
+def _param(props: Dict[str, Any], keys) -> Optional[str]:
+    """Primer parámetro presente de ``keys`` (prop plana o {'value','unit'}) como valor SPICE."""
+    for k in keys:
+        v = props.get(k)
+        if v is None:
+            continue
+        unit = None
+        if isinstance(v, dict):
+            v, unit = v.get("value"), v.get("unit")
+        if isinstance(v, (int, float, str)):
+            return spice_value(v, unit)
+    return None
+
+
+def _node_name(net_id: str) -> str:
+    return re.sub(r"[^\w+\-.:]", "_", net_id)
+
+
+def _element(letter: str, ref: str) -> str:
+    return ref if ref[:1].upper() == letter else letter + ref
+
+
+# ---------- Contexto por input ----------
+
+class _Emit:
+    """Lo que no depende del dispositivo: hints, modelos disponibles, estrategia, tierra y análisis."""
+
+    def __init__(self, store, spec: SpiceEmitInput) -> None:
+        self.spec = spec
+        self.policy = spec.build_policy
+        self.hints = {h.ref: h for h in spec.component_hints}
+        # modelos inline: nombre lógico o real -> (nombre real, texto)
+        self.models: Dict[str, Tuple[str, str]] = {}
+        for lib in spec.libraries:
+            for key, text in lib.models.items():
+                m = _MODEL_LINE_RE.match(text)
+                name = m.group(1) if m else key
+                line = text.strip() if m else f".model {key} {text.strip()}"
+                self.models[key.lower()] = self.models[name.lower()] = (name, line)
+        self.has_includes = any(lib.include for lib in spec.libraries)
+        self.analyses = self._analyses()
+        self.has_tran = any(a.kind.value == "tran" for a in self.analyses)
+        self.has_ac = any(a.kind.value == "ac" for a in self.analyses)
+        self.ground = self._ground(store)
+        self._nodes: Dict[str, str] = {}
+        self._model_memo: Dict[Tuple, Tuple[str, str]] = {}
+
+    def node(self, net: str) -> str:
+        """Nodo SPICE de una net (``0`` la de referencia)."""
+        name = self._nodes.get(net)
+        if name is None:
+            name = self._nodes[net] = "0" if net == self.ground else _node_name(net[len(_NET):])
+        return name
+
+    def strategy(self, hint) -> DeviceStrategy:
+        t = hint.transformer if hint else None
+        if t is not None and "strategy" in t.model_fields_set:
+            return t.strategy
+        if "transformer_strategy" in self.spec.device_map.model_fields_set or self.policy is None:
+            return self.spec.device_map.transformer_strategy
+        return self.policy.transformer_strategy
+
+    def default(self, key: str) -> Optional[str]:
+        return (self.policy.defaults.get(key) if self.policy else None) or None
+
+    def _by_class(self, table: Dict[str, str], cls: str) -> Optional[str]:
+        low = {k.lower(): v for k, v in table.items()}
+        for c in ((cls, "Diode") if cls == "DiodeFast" else (cls,)):
+            if c.lower() in low:
+                return low[c.lower()]
+        return None
+
+    def model(self, letter: str, cls: str, part_ref: Optional[str], hint) -> Tuple[str, str]:
+        """(nombre, origen) del modelo: 'inline', 'include' o 'generic'."""
+        key = (letter, cls, part_ref, hint.spice_model_name if hint else None)
+        got = self._model_memo.get(key)
+        if got is None:
+            got = self._model_memo[key] = self._resolve_model(*key)
+        return got
+
+    def _resolve_model(self, letter: str, cls: str, part_ref: Optional[str], hinted: Optional[str]) -> Tuple[str, str]:
+        candidates = [hinted]
+        if part_ref and part_ref.lower() in self.models:
+            candidates.append(part_ref)
+        if self.policy is not None:
+            candidates += [self._by_class(self.policy.preferred_models, cls),
+                           self._by_class(self.policy.fallback_models, cls)]
+        attr = _MODEL_DEFAULT.get(letter)
+        candidates.append(getattr(self.spec.device_map, attr) if attr else None)
+        candidates = [c for c in candidates if c]
+        for c in candidates:
+            if c.lower() in self.models:
+                return self.models[c.lower()][0], "inline"
+        if candidates and self.has_includes:
+            return candidates[0], "include"
+        return (candidates[0] if candidates else f"{cls.upper()}_GENERIC"), "generic"
+
+    def _analyses(self) -> List[SpiceAnalysis]:
+        if self.spec.analyses:
+            return list(self.spec.analyses)
+        out = []
+        for a in (self.policy.analyses_default if self.policy else []):
+            params = dict(a.get("params") or {}) if isinstance(a.get("params"), dict) else \
+                {k: v for k, v in a.items() if k != "kind"}
+            out.append(SpiceAnalysis(kind=a.get("kind", "op"), params=params))
+        return out
+
+    def _ground(self, store) -> Optional[str]:
+        nets = store.nodes_by_type("Net")
+        wanted = (self.policy.naming.get("ground") if self.policy else None) or self.spec.net_name_map.get("gnd")
+        if wanted and _NET + wanted in nets:
+            return _NET + wanted
+        for pick in (lambda p: p.get("is_reference_ground"), lambda p: str(p.get("type") or "").upper() == "GROUND"):
+            for n in nets:
+                if pick(store.node_props(n)):
+                    return n
+        return next((n for n in nets if "gnd" in n.lower() or "ground" in n.lower()), None)
+
+
+# ---------- Dispositivos ----------
+
+class _Device:
+    """Líneas de un dispositivo y lo que aporta al netlist (modelos, elementos para probes, avisos)."""
+    __slots__ = ("lines", "models", "elements", "warnings", "errors")
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+        self.models: List[Tuple[str, str, str]] = []       # (nombre, origen, letra)
+        self.elements: Dict[str, Tuple[str, List[str]]] = {}  # ref/elemento -> (elemento, nodos)
+        self.warnings: List[str] = []
+        self.errors: List[str] = []
+
+
+def _pin_tokens(pin: str, props: Dict[str, Any], hint) -> List[str]:
+    pin_id = pin.rsplit("#", 1)[-1].split(":", 1)[-1]
+    tokens = []
+    if hint is not None:
+        tokens += [hint.roles.get(pin_id), hint.roles.get(str(props.get("name")))]
+    tokens += [props.get("role"), props.get("name"), pin_id]
+    return [str(t).strip().lower() for t in tokens if t is not None and str(t).strip()]
+
+
+def _order_pins(store, pins: List[str], roles, hint) -> Optional[List[str]]:
+    """Pins en el orden de ``roles`` (None si algún rol no se identifica; los repetidos, en orden)."""
+    slots: Dict[str, List[str]] = {r: [] for r, _ in roles}
+    for pin in pins:
+        for t in _pin_tokens(pin, store.node_props(pin), hint):
+            role = next((r for r, syn in roles if t in syn), None)
+            if role is not None:
+                slots[role].append(pin)
+                break
+        else:
+            return None
+    out = []
+    for r, _ in roles:
+        if not slots[r] and r not in _OPTIONAL_ROLES:
+            return None
+        out += slots[r]
+    return out
+
+
+def _emit_component(store, ctx: _Emit, urn: str, dev: _Device) -> None:
+    ref = urn[len(_CMP):]
+    props = store.node_props(urn)
+    hint = ctx.hints.get(ref)
+    cls = props.get("class") or _CLASS_BY_PREFIX.get(ref[:1].upper(), "Generic")
+    pins = store.connectivity.pins_of_component(urn)
+
+    net_of = store.connectivity.net_of_terminal
+
+    def node(pin: str) -> str:
+        net = net_of(pin)
+        if net is None:
+            dev.warnings.append(f"{ref}: pin '{pin.rsplit(':', 1)[-1]}' sin net (nodo propio)")
+            return _node_name(f"nc_{ref}_{pin.rsplit(':', 1)[-1]}")
+        return ctx.node(net)
+
+    def ordered(kind: str) -> List[str]:
+        got = _order_pins(store, pins, _ROLES[kind], hint)
+        if got is None:
+            dev.warnings.append(f"{ref}: roles de pin no identificados, se usa el orden de los pins")
+            return pins
+        return got
+
+    if hint is not None and hint.spice_subckt:
+        _emit_subckt_call(dev, ref, [node(p) for p in pins], hint.spice_subckt, hint.spice_params)
+        return
+    if cls == "Connector":
+        dev.lines.append(f"* {ref}: conector (sin elemento SPICE)")
+        return
+    if cls not in _LETTER and cls not in ("BridgeRectifier", "Transformer"):
+        dev.warnings.append(f"{ref}: clase '{cls}' sin primitiva SPICE ni spice_subckt en component_hints, se omite")
+        dev.lines.append(f"* {ref}: {cls} omitido")
+        return
+    if len(pins) < 2:
+        dev.errors.append(f"{ref}: necesita al menos 2 pins")
+        return
+    if cls in _VALUE_KEYS:
+        letter = _LETTER[cls]
+        value = _param(props, _VALUE_KEYS[cls]) or ctx.default(letter)
+        if value is None:
+            dev.errors.append(f"{ref}: falta el valor ({'/'.join(_VALUE_KEYS[cls][:2])})")
+            value = "0"
+        name = _element(letter, ref)
+        nodes = [node(pins[0]), node(pins[1])]
+        line = f"{name} {nodes[0]} {nodes[1]} {value}"
+        if "ic" in props or "IC" in props:
+            line += f" ic={_param(props, ('ic', 'IC'))}"
+        dev.lines.append(line)
+        dev.elements[ref] = (name, nodes)
+    elif cls in ("Diode", "DiodeFast", "MOSFET", "BJT"):
+        letter = _LETTER[cls]
+        nodes = [node(p) for p in ordered("Diode" if letter == "D" else cls)]
+        if letter == "M" and len(nodes) == 3:
+            nodes.append(nodes[2])  # bulk a source
+        model, origin = ctx.model(letter, cls, props.get("part_ref"), hint)
+        dev.models.append((model, origin, letter))
+        name = _element(letter, ref)
+        dev.lines.append(" ".join([name, *nodes, model]))
+        dev.elements[ref] = (name, nodes)
+    elif cls == "BridgeRectifier":
+        p = ordered("BridgeRectifier")
+        if len(p) != 4:
+            dev.errors.append(f"{ref}: un puente necesita 4 pins (~, ~, +, -)")
+            return
+        ac1, ac2, pos, neg = (node(x) for x in p)
+        model, origin = ctx.model("D", "Diode", props.get("part_ref"), hint)
+        dev.models.append((model, origin, "D"))
+        base = _element("D", ref)
+        for i, (a, k) in enumerate(((ac1, pos), (ac2, pos), (neg, ac1), (neg, ac2)), 1):
+            dev.lines.append(f"{base}_{i} {a} {k} {model}")
+    elif cls in ("Source", "AC_In"):
+        _emit_source(ctx, dev, ref, cls, props, [node(x) for x in ordered("source")])
+    else:
+        _emit_transformer(store, ctx, dev, ref, props, hint, pins, node)
+
+
+def _emit_subckt_call(dev: _Device, ref: str, nodes: List[str], subckt: str, params: Dict[str, Any]) -> None:
+    name = _element("X", ref)
+    args = [f"{k}={spice_value(v)}" for k, v in params.items()]
+    dev.lines.append(" ".join([name, *nodes, subckt] + args))
+    dev.elements[ref] = (name, nodes)
+    dev.models.append((subckt, "subckt", "X"))
+
+
+def _emit_source(ctx: _Emit, dev: _Device, ref: str, cls: str, props: Dict[str, Any], nodes: List[str]) -> None:
+    current = _param(props, ("I", "current", "Idc"))
+    letter = "I" if current is not None and _param(props, ("V", "voltage", "Vdc")) is None else "V"
+    name = _element(letter, ref)
+    wave = next((str(props[k]).strip() for k in ("waveform", "spice", "stimulus") if isinstance(props.get(k), str)), None)
+    intent = ctx.spec.source_intent
+    if wave is None and cls == "AC_In":
+        vrms = (intent.vin_rms if intent else None)
+        vrms = vrms if vrms is not None else spice_number(_param(props, ("Vrms", "vin_rms", "V", "voltage")) or "")
+        freq = (intent.line_frequency_hz if intent else None) or \
+            spice_number(_param(props, ("f", "frequency", "freq")) or "") or 50.0
+        kind = intent.vin_kind if intent else "sine_mains"
+        if kind in ("custom", "pwl") and intent.custom:
+            wave = intent.custom
+        elif vrms is None:
+            dev.errors.append(f"{ref}: AC_In sin Vrms (params o source_intent.vin_rms)")
+            wave = "DC 0"
+        elif kind == "dc":
+            wave = f"DC {_fmt(vrms)}"
+        elif kind == "ac_small_signal" or not ctx.has_tran:
+            wave = f"DC 0 AC {_fmt(round(vrms * math.sqrt(2), 6))}"
+        else:
+            wave = f"SINE(0 {_fmt(round(vrms * math.sqrt(2), 6))} {_fmt(freq)})"
+    if wave is None:
+        value = current if letter == "I" else _param(props, ("V", "voltage", "Vdc", "dc", "value"))
+        if value is None:
+            dev.errors.append(f"{ref}: fuente sin valor (V/I o waveform)")
+            value = "0"
+        wave = f"DC {value}"
+        ac = _param(props, ("ac", "AC"))
+        if ac is not None and ctx.has_ac:
+            wave += f" AC {ac}"
+    dev.lines.append(f"{name} {nodes[0]} {nodes[1]} {wave}" if len(nodes) >= 2 else f"* {ref}: fuente sin 2 pins")
+    if len(nodes) >= 2:
+        dev.elements[ref] = (name, nodes[:2])
+
+
+def _emit_transformer(store, ctx: _Emit, dev: _Device, ref: str, props: Dict[str, Any], hint, pins, node) -> None:
+    th = hint.transformer if hint else None
+    if th is not None and th.primary_nodes and th.secondary_nodes:
+        pri = [_node_name(n) for n in th.primary_nodes[:2]]
+        sec = [_node_name(n) for n in th.secondary_nodes[:2]]
+    else:
+        p_pins, s_pins = [], []
+        for pin in pins:
+            tokens = _pin_tokens(pin, store.node_props(pin), hint)
+            side = next((t[0] for t in tokens if t[:1] in ("p", "s")), None)
+            (s_pins if side == "s" else p_pins if side == "p" else []).append(pin)
+        if len(p_pins) != 2 or len(s_pins) != 2:
+            p_pins, s_pins = pins[:2], pins[2:4]
+            dev.warnings.append(f"{ref}: pins primario/secundario no identificados, se usa el orden (P1 P2 S1 S2)")
+        pri, sec = [node(p) for p in p_pins], [node(p) for p in s_pins]
+    if len(pri) != 2 or len(sec) != 2:
+        dev.errors.append(f"{ref}: un trafo necesita 2 nodos de primario y 2 de secundario")
+        return
+    ratio = (th.ratio if th else None) or spice_number(_param(props, ("ratio", "n", "turns_ratio")) or "") \
+        or spice_number(ctx.default("ratio") or "") or 1.0
+    strategy = ctx.strategy(hint)
+    lp = (th.Lp if th else None) or _param(props, ("Lp", "Lpri", "L")) or ctx.default("Lp")
+    if strategy == DeviceStrategy.AUTO:
+        strategy = DeviceStrategy.K_COUPLED if lp else DeviceStrategy.IDEAL_FCE
+    if strategy == DeviceStrategy.K_COUPLED:
+        if lp is None:
+            dev.warnings.append(f"{ref}: sin Lp (hint, params o defaults), se usa 1m")
+            lp = "1m"
+        k = (th.k if th else None) or spice_number(_param(props, ("k", "K", "coupling")) or "") \
+            or spice_number(ctx.default("k") or "") or 0.999
+        ls = _param(props, ("Ls", "Lsec")) or _fmt(float(f"{(spice_number(lp) or 0.0) / ratio ** 2:.6g}"))
+        dev.lines += [f"L{ref}_P {pri[0]} {pri[1]} {lp}", f"L{ref}_S {sec[0]} {sec[1]} {ls}",
+                      f"K{ref} L{ref}_P L{ref}_S {_fmt(k)}"]
+    else:
+        # trafo ideal: Vs = Vp/n (E) y el primario absorbe Is/n (F sobre el sensor del secundario)
+        mid = f"{ref}_sx"
+        dev.lines += [f"E{ref} {sec[0]} {mid} {pri[0]} {pri[1]} {_fmt(1.0 / ratio)}",
+                      f"V{ref}_SENSE {mid} {sec[1]} 0",
+                      f"F{ref} {pri[0]} {pri[1]} V{ref}_SENSE {_fmt(-1.0 / ratio)}"]
+        if lp is not None:
+            dev.lines.append(f"L{ref}_M {pri[0]} {pri[1]} {lp}")
+    if "0" not in sec:
+        # referencia DC del secundario aislado (si no, matriz singular)
+        dev.lines.append(f"R{ref}_ISO {sec[1]} 0 1G")
+    dev.elements[ref] = (f"L{ref}_P" if strategy == DeviceStrategy.K_COUPLED else f"V{ref}_SENSE", pri + sec)
+
+
+def _emit_instance(store, ctx: _Emit, urn: str, dev: _Device) -> None:
+    ref = urn[len(_INST):]
+    props = store.node_props(urn)
+    of = props.get("of")
+    ports = store.node_props(_SUBCKT + of).get("ports") if of else None
+    if ports:
+        terms = [f"{urn}#port:{p}" for p in ports]
+    else:
+        terms = [p for p in store.adjacent(urn, ["portOf"])]
+    nodes = []
+    for t in terms:
+        net = store.connectivity.net_of_terminal(t)
+        if net is None:
+            dev.warnings.append(f"{ref}: port '{t.rsplit(':', 1)[-1]}' sin net")
+            net = _NET + f"nc_{ref}_{t.rsplit(':', 1)[-1]}"
+        nodes.append(ctx.node(net))
+    params = {k: (v["value"] if isinstance(v, dict) else v) for k, v in props.items()
+              if k not in ("of", "domain") and v is not None and not isinstance(v, (list, bool))}
+    hint = ctx.hints.get(ref)
+    _emit_subckt_call(dev, ref, nodes, (hint.spice_subckt if hint and hint.spice_subckt else of) or "?",
+                      {**params, **(hint.spice_params if hint else {})})
+
+
+def _device(store, ctx: _Emit, urn: str) -> _Device:
+    dev = _Device()
+    if urn.startswith(_CMP):
+        _emit_component(store, ctx, urn, dev)
+    else:
+        _emit_instance(store, ctx, urn, dev)
+    return dev
+
+
+# ---------- Cabecera, análisis y probes ----------
+
+def _analysis_line(a: SpiceAnalysis) -> Optional[str]:
+    p = a.params
+    kind = a.kind.value
+    if kind == "op":
+        return ".op"
+    if kind == "tran":
+        tstop = p.get("tstop")
+        if not tstop:
+            return None
+        tstep = p.get("tstep") or _fmt(float(f"{(spice_number(tstop) or 0.0) / 1000:.3g}"))
+        args = [tstep, tstop] + [p[k] for k in ("tstart", "tmax") if p.get(k)]
+        return ".tran " + " ".join(args) + (" uic" if str(p.get("uic", "")).lower() in ("1", "true", "yes") else "")
+    if kind == "ac":
+        return " ".join([".ac", p.get("variation") or p.get("sweep") or "dec", p.get("points", "100"),
+                         p.get("f_start") or p.get("fstart") or "1", p.get("f_stop") or p.get("fstop") or "1Meg"])
+    if kind == "dc":
+        src = p.get("src") or p.get("source")
+        if not src or not all(p.get(k) for k in ("start", "stop", "step")):
+            return None
+        return f".dc {src} {p['start']} {p['stop']} {p['step']}"
+    return None
+
+
+def _include_line(path: str, spec: SpiceEmitInput) -> str:
+    lr = spec.library_resolution
+    if lr.mode == "absolute_only" and lr.base_dir and not os.path.isabs(path):
+        path = os.path.join(lr.base_dir, path)
+    return f'.include "{path}"'
+
+
+def _resolve_probes(spec: SpiceEmitInput, ground: Optional[str], nodes: set,
+                    elements: Dict[str, Tuple[str, List[str]]]) -> Tuple[List[str], List[str]]:
+    """Probes de ``spec`` resueltas contra el netlist emitido y los problemas encontrados."""
+    pc = spec.probe_contract
+    aliases: Dict[str, Tuple[str, str]] = {}
+    for table in ((spec.build_policy.node_aliases if spec.build_policy else {}), spec.net_name_map, pc.alias_policy):
+        aliases.update({k.lower(): (v, "node") for k, v in table.items()})
+    aliases.update({a.name.lower(): (a.value, a.kind.value) for a in spec.aliases})
+    gnd_names = {"0", "gnd"} | ({ground[len(_NET):].lower()} if ground else set())
+    by_lower = {n.lower(): n for n in nodes}
+    elems = {}
+    for ref, el in elements.items():
+        elems[ref.lower()] = elems[el[0].lower()] = el
+    issues: List[str] = []
+
+    def node(arg: str) -> Optional[str]:
+        arg = arg.strip()
+        if arg.lower() in aliases and aliases[arg.lower()][1] == "node":
+            arg = aliases[arg.lower()][0]
+        if arg.lower() in gnd_names:
+            return "0"
+        return by_lower.get(_node_name(arg).lower())
+
+    def call(m: "re.Match") -> str:
+        fn, args = m.group(1).lower(), [a for a in m.group(2).split(",") if a.strip()]
+        if fn == "i":
+            name = args[0].strip() if args else ""
+            if name.lower() in aliases and aliases[name.lower()][1] == "branch":
+                name = aliases[name.lower()][0]
+            el = elems.get(name.lower())
+            if el is None:
+                issues.append(f"probe {m.group(0)}: elemento '{name}' inexistente")
+                return m.group(0)
+            return f"i({el[0]})"
+        if len(args) == 1 and args[0].strip().lower() in elems and node(args[0]) is None:
+            # v(Vsrc)/v(R1) no es un nodo: tensión entre los dos terminales del elemento
+            el = elems[args[0].strip().lower()]
+            if len(el[1]) >= 2 and (el[0][:1].upper() != "V" or not pc.allow_vsource_names):
+                pos, neg = el[1][:2]
+                return f"v({pos})" if neg == "0" else f"v({pos},{neg})"
+        resolved = []
+        for a in args:
+            n = node(a)
+            if n is None:
+                issues.append(f"probe {m.group(0)}: nodo '{a.strip()}' inexistente")
+                n = a.strip()
+            resolved.append(n)
+        if len(resolved) == 2 and resolved[1] == "0":
+            resolved = resolved[:1]
+        return f"v({','.join(resolved)})"
+
+    out = []
+    for expr in spec.probes:
+        def alias(m: "re.Match") -> str:
+            value, kind = aliases.get(m.group(1).lower(), (None, None))
+            if value is None:
+                issues.append(f"probe {expr}: alias '{m.group(1)}' desconocido")
+                return m.group(1)
+            return value
+        text = expr.strip()
+        whole = _ALIAS_RE.fullmatch(text)
+        if whole and whole.group(1).lower() in aliases:
+            value, kind = aliases[whole.group(1).lower()]
+            text = value if kind == "expr" or "(" in value else f"i({value})" if kind == "branch" else f"v({value})"
+        else:
+            text = _ALIAS_RE.sub(alias, text)
+        bare = _BARE_I_RE.match(text)
+        if bare and "(" not in text and bare.group(1).lower() in elems:
+            if pc.require_i_parentheses:
+                text = f"i({bare.group(1)})"
+        elif "(" not in text and node(text) is not None:
+            text = f"v({text})"
+        out.append(_PROBE_CALL_RE.sub(call, text))
+    for name in pc.required_nodes_exist:
+        if node(name) is None:
+            issues.append(f"required_nodes_exist: nodo '{name}' inexistente")
+    return out, issues
+
+
+# ---------- Emisión con caché por versión ----------
+
+class _EmitCache:
+    """Líneas por dispositivo + resultado, válidos mientras no cambien ``store.version`` ni el input."""
+
+    def __init__(self, store) -> None:
+        self.changes = store.track_changes()
+        self.version = -1
+        self.key: Optional[str] = None
+        self.ctx: Optional[_Emit] = None
+        self.devices: Dict[str, _Device] = {}
+        self.result: Optional[Dict[str, Any]] = None
+
+    def _dirty(self, store) -> Optional[set]:
+        """Dispositivos a regenerar tras el delta, o None si hay que rehacerlo todo."""
+        delta = self.changes.drain()
+        dirty = set()
+        for n in list(delta.nodes) + [u for _, u, _ in delta.edges] + [v for _, _, v in delta.edges]:
+            if n.startswith((_NET, _SUBCKT)):
+                return None
+            owner = n.split("#", 1)[0]
+            if owner.startswith((_CMP, _INST)):
+                dirty.add(owner)
+        return dirty
+
+    def emit(self, store, spec: SpiceEmitInput) -> Dict[str, Any]:
+        # exclude_unset: lo explícito cuenta (p.ej. device_map.transformer_strategy frente a build_policy)
+        key = json.dumps(spec.model_dump(mode="json", exclude_unset=True), sort_keys=True)
+        if self.result is not None and self.version == store.version and self.key == key:
+            return {**self.result, "cache": {"hit": True}}
+        # como en apply_patch_batch: miles de listas/strings sin ciclos, el GC cíclico sólo estorba
+        with gc_paused():
+            return self._emit(store, spec, key)
+
+    def _emit(self, store, spec: SpiceEmitInput, key: str) -> Dict[str, Any]:
+        dirty = self._dirty(store)
+        if dirty is None or self.key != key or self.ctx is None:
+            self.ctx = _Emit(store, spec)
+            dirty = None
+        order = store.nodes_by_type("ComponentInstance") + store.nodes_by_type("SubcircuitInstance")
+        devices: Dict[str, _Device] = {}
+        for urn in order:
+            dev = self.devices.get(urn) if dirty is not None and urn not in dirty else None
+            devices[urn] = dev if dev is not None else _device(store, self.ctx, urn)
+        self.devices, self.key, self.version = devices, key, store.version
+        self.result = _assemble(store, spec, self.ctx, devices)
+        return {**self.result, "cache": {"hit": False}}
+
+
+def _assemble(store, spec: SpiceEmitInput, ctx: _Emit, devices: Dict[str, _Device]) -> Dict[str, Any]:
+    policy = spec.build_policy
+    strict = policy is not None and policy.strictness == "strict"
+    warnings: List[str] = []
+    errors: List[str] = []
+    lines = [f"* {spec.title or 'korelia CIG netlist'}"]
+    if spec.library_resolution.mode == "inline_only":
+        if ctx.has_includes:
+            warnings.append("library_resolution=inline_only: se omiten los .include")
+    else:
+        lines += [_include_line(lib.include, spec) for lib in spec.libraries if lib.include]
+    options = spec.options or (policy.options_default if policy else {})
+    if options:
+        lines.append(".options " + " ".join(f"{k}={v}" if v != "" else k for k, v in options.items()))
+    body: List[str] = []
+    used: Dict[str, Tuple[str, str]] = {}
+    elements: Dict[str, Tuple[str, List[str]]] = {}
+    nodes = {"0"}
+    required = {c.lower() for c in spec.library_resolution.require_models_for}
+    unmodeled = set()
+    for urn, dev in devices.items():
+        body += dev.lines
+        warnings += dev.warnings
+        errors += dev.errors
+        elements.update(dev.elements)
+        for name, origin, letter in dev.models:
+            used.setdefault(name, (origin, letter))
+            if origin == "generic":
+                unmodeled.add(store.node_props(urn).get("class") or "")
+        for _, ns in dev.elements.values():
+            nodes.update(ns)
+    if ctx.ground is None and devices:
+        warnings.append("No hay net de referencia (GROUND/is_reference_ground): ningún nodo es 0")
+    models: List[str] = []
+    generic: List[str] = []
+    for name, (origin, letter) in used.items():
+        if origin == "inline":
+            models.append(ctx.models[name.lower()][1])
+        elif origin == "generic" and letter in _GENERIC_MODEL:
+            models.append(f".model {name} {_GENERIC_MODEL[letter]}")
+            generic.append(name)
+        elif origin == "subckt" and name.lower() in ctx.models:
+            models.append(ctx.models[name.lower()][1])
+        elif origin == "subckt" and not ctx.has_includes:
+            warnings.append(f"subcircuito '{name}' sin definición (libraries)")
+    if generic:
+        warnings.append("Modelos genéricos (sin .model en libraries): " + ", ".join(generic))
+    missing = sorted(c for c in unmodeled if c.lower() in required)
+    if missing:
+        errors.append("library_resolution.require_models_for sin modelo explícito: " + ", ".join(missing))
+    analyses = [ln for ln in (_analysis_line(a) for a in ctx.analyses) if ln] or [".op"]
+    lines += body + models + analyses
+    controls = spec.controls or (policy.controls_default if policy else [])
+    if controls and spec.control_contract.ownership != "user_provided":
+        minimal = [ln for ln in spec.control_contract.minimal_lines if ln not in controls]
+        lines += [".control", *minimal, *controls, ".endc"]
+    lines.append(".end")
+    probes, issues = _resolve_probes(spec, ctx.ground, nodes, elements)
+    (errors if strict else warnings).extend(issues)
+    return {
+        "ok": not errors,
+        "netlist": "\n".join(lines) + "\n",
+        "probes": probes,
+        "warnings": warnings,
+        "errors": errors,
+        "ground": ctx.ground[len(_NET):] if ctx.ground else None,
+        "models": {name: origin for name, (origin, _) in used.items()},
+        "stats": {"devices": len(devices), "lines": len(lines), "nodes": len(nodes)},
+        "version": store.version,
+    }
+
+
+_EMIT_CACHES: "weakref.WeakKeyDictionary[Any, _EmitCache]" = weakref.WeakKeyDictionary()
+
+
+def emit_spice(store, spec: Optional[SpiceEmitInput] = None) -> Dict[str, Any]:
+    """
+    Netlist ngspice del CIG de ``store``: {ok, netlist, probes, warnings, errors, ground, models,
+    stats, version, cache}. Repetir con la misma versión del store y el mismo input es gratis;
+    tras un parche sólo se regeneran los dispositivos tocados.
+    """
+    spec = spec or SpiceEmitInput()
+    cache = _EMIT_CACHES.get(store)
+    if cache is None:
+        cache = _EmitCache(store)
+        _EMIT_CACHES[store] = cache
+    return cache.emit(store, spec)
+
+
+__all__ = ["emit_spice", "spice_value"]
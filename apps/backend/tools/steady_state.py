@@ -0,0 +1,263 @@
+"""
+Régimen permanente ciclo a ciclo: parada temprana de ``.tran`` largos.
+
+Las fuentes conmutadas necesitan ``.tran`` largos para llegar al régimen permanente y el
+``tstop`` lo adivina el agente. ``cycle_convergence`` compara la media de una probe en ventanas
+consecutivas de un número entero de periodos de conmutación (periodo estimado por FFT) y da
+la probe por convergida cuando:
+
+- las medias de las ventanas del último ``hold`` del tiempo simulado están dentro de ``tol``
+  de la última (descarta picos de sobreoscilación, donde la pendiente pasa por cero), y
+- la deriva restante extrapolada de los saltos entre ventanas (serie geométrica) también.
+
+``tol`` es ``rel_tol`` de la escala de la probe o, si la probe es un KPI de ``kpi_contract``
+con banda min/max, una décima de la banda: el veredicto del KPI ya no cambia al seguir simulando.
+
+``SteadyMonitor`` aplica el criterio a todas las probes vigiladas; lo usa la sesión de libngspice
+mientras el análisis corre en su hilo de fondo y, en batch, ``steady_posthoc`` sobre el resultado
+completo para indicar dónde se podría haber parado.
+"""
+import math
+import re
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .waveform import _segment_means, _window, ripple_frequency
+
+
+# ---------- Números SPICE ----------
+
+_SPICE_NUM_RE = re.compile(r"^([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(meg|mil|[tgkmunpf])?", re.I)
+_SPICE_SCALE = {"t": 1e12, "g": 1e9, "meg": 1e6, "k": 1e3, "m": 1e-3, "mil": 25.4e-6,
+                "u": 1e-6, "n": 1e-9, "p": 1e-12, "f": 1e-15}
+_TRAN_LINE_RE = re.compile(r"^\s*\.?tran\s+(\S+)\s+(\S+)", re.I | re.M)
+
+
+def spice_number(text: str) -> Optional[float]:
+    """'10m' -> 0.01, '2.2Meg' -> 2.2e6 (las unidades tras el sufijo se ignoran)."""
+    m = _SPICE_NUM_RE.match(text.strip())
+    if m is None:
+        return None
+    return float(m.group(1)) * _SPICE_SCALE.get((m.group(2) or "").lower(), 1.0)
+
+
+def tran_stop(netlist: str) -> Optional[float]:
+    """``tstop`` del primer ``.tran``/``tran`` del netlist (None si no hay o no es numérico)."""
+    m = _TRAN_LINE_RE.search(netlist)
+    return spice_number(m.group(2)) if m else None
+
+
+# ---------- KPIs -> probes ----------
+
+def _norm(expr: str) -> str:
+    return re.sub(r"\s+", "", expr).lower()
+
+
+def match_kpi_targets(targets: Dict[str, Dict[str, float]], probes: List[str],
+                      aliases: Iterable[Tuple[str, str, str]] = (),
+                      net_name_map: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, Dict[str, float]], List[str]]:
+    """
+    Asigna cada KPI de ``kpi_contract.targets`` a una probe: por expresión exacta, por alias
+    (nombre, valor, tipo node/branch/expr) o por ``net_name_map``. Devuelve ({probe: target}, KPIs sin probe).
+    """
+    by_norm = {_norm(p): p for p in probes}
+    alias_map = {name.lower(): (value, kind) for name, value, kind in aliases}
+    nets = {k.lower(): v for k, v in (net_name_map or {}).items()}
+    matched: Dict[str, Dict[str, float]] = {}
+    unmatched: List[str] = []
+    for name, target in targets.items():
+        candidates = [name]
+        if name.lower() in alias_map:
+            value, kind = alias_map[name.lower()]
+            candidates.append(value if "(" in value else f"i({value})" if kind == "branch" else f"v({value})")
+        if name.lower() in nets:
+            candidates.append(f"v({nets[name.lower()]})")
+        probe = next((by_norm[_norm(c)] for c in candidates if _norm(c) in by_norm), None)
+        if probe is None:
+            unmatched.append(name)
+        else:
+            matched[probe] = dict(target)
+    return matched, unmatched
+
+
+def _target_tol(target: Optional[Dict[str, float]]) -> Optional[float]:
+    if target and "min" in target and "max" in target and target["max"] > target["min"]:
+        return 0.1 * (target["max"] - target["min"])
+    return None
+
+
+def _in_range(value: float, target: Dict[str, float]) -> bool:
+    return target.get("min", -math.inf) <= value <= target.get("max", math.inf)
+
+
+# ---------- Criterio ciclo a ciclo ----------
+
+def _g(value: Optional[float]) -> Optional[float]:
+    return None if value is None or not math.isfinite(value) else float(f"{value:.6g}")
+
+
+def cycle_convergence(x, y, rel_tol: float = 0.005, abs_tol: Optional[float] = None,
+                      period: Optional[float] = None, cycles: int = 3, hold: float = 0.2,
+                      max_windows: int = 64) -> Optional[Dict[str, Any]]:
+    """
+    ¿Ha llegado ``y`` a su régimen permanente en ``x[-1]``? Ventanas de un número entero de
+    periodos (``period`` o el del rizado del tramo final; sin rizado, 1/``max_windows`` de la
+    duración). None si no hay eje de tiempo válido. ``moving`` es False si la media no se ha
+    movido desde la primera ventana (p.ej. antes de un arranque suave): no cuenta como convergencia.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = min(x.size, y.size)
+    x, y = x[:n], y[:n]
+    if n < 16 or not x[-1] > x[0] or np.any(np.diff(x) < 0):
+        return None
+    duration = x[-1] - x[0]
+    xw, yw, _ = _window(x, y, 0.5)
+    p2p = float(yw.max() - yw.min())
+    span = float(y.max() - y.min())
+    if period is None:
+        f = ripple_frequency(xw, yw) if p2p > 0.1 * rel_tol * max(abs(float(yw.mean())), span) else None
+        period = 1.0 / f if f else None
+    win = duration / max_windows
+    if period and period < duration:
+        win = period * max(1.0, round(win / period))
+    n_win = max(cycles + 2, int(math.ceil(hold * duration / win)))
+    out: Dict[str, Any] = {"t": float(x[-1]), "period": _g(period), "window": _g(win), "converged": False,
+                           "moving": False}
+    if n_win * win > duration:
+        return out  # aún no hay suficientes ventanas
+    edges = x[-1] - win * np.arange(n_win, -1, -1)
+    i0 = max(int(np.searchsorted(x, edges[0])) - 1, 0)
+    means = _segment_means(x[i0:], y[i0:], edges)
+    final = float(means[-1])
+    last = y[x >= edges[-2]]
+    # escala: el valor final o, si es ~0, el rizado de la última ventana
+    tol = rel_tol * max(abs(final), float(last.max() - last.min()))
+    if abs_tol is not None:
+        tol = min(tol, abs_tol) if tol > 0 else abs_tol
+    initial = float(_segment_means(x, y, x[0] + np.array([0.0, win]))[0])
+    moving = abs(final - initial) > tol
+    held = bool(np.all(np.abs(means - final) <= tol))
+    d = np.diff(means[-(cycles + 2):])
+    drift = 0.0
+    if np.all(d > 0) or np.all(d < 0):
+        # tendencia monótona: saltos ~ r^k -> queda |d_k| r / (1 - r)
+        r = (abs(d[-1]) / abs(d[0])) ** (1.0 / (d.size - 1))
+        drift = abs(d[-1]) * r / (1.0 - r) if r < 1.0 else math.inf
+    out.update(value=_g(final), tol=_g(tol), drift=_g(drift) if math.isfinite(drift) else None,
+               windows=int(n_win), moving=bool(moving), converged=bool(held and drift <= tol and moving))
+    return out
+
+
+class SteadyMonitor:
+    """
+    Criterio de parada sobre varias probes: convergen todas las que se mueven (y al menos una)
+    y se ha simulado al menos ``min_time``. ``spec`` es el dict que viaja a la sesión de ngspice
+    (``steady_spec``).
+    """
+
+    def __init__(self, spec: Dict[str, Any]) -> None:
+        self.probes: List[str] = list(spec["probes"])
+        self.abs_tol: Dict[str, Optional[float]] = dict(spec.get("abs_tol") or {})
+        self.rel_tol = float(spec.get("rel_tol", 0.005))
+        self.cycles = int(spec.get("cycles", 3))
+        self.min_time = float(spec.get("min_time") or 0.0)
+        self.interval_s = float(spec.get("interval_s", 0.25))
+        self.checks = 0
+
+    def check(self, x, ys: Dict[str, Any], period: Optional[float] = None) -> Dict[str, Any]:
+        self.checks += 1
+        per_probe = {}
+        for expr in self.probes:
+            y = ys.get(expr)
+            res = cycle_convergence(x, y, self.rel_tol, self.abs_tol.get(expr), period, self.cycles) \
+                if y is not None else None
+            per_probe[expr] = res
+        valid = [r for r in per_probe.values() if r is not None]
+        moving = [r for r in valid if r["moving"]]
+        t = float(x[-1]) if len(x) else 0.0
+        converged = bool(moving) and all(r["converged"] for r in moving) and t >= self.min_time
+        return {"converged": converged, "t": t, "probes": per_probe}
+
+
+def steady_spec(probes: List[str], targets: Dict[str, Dict[str, float]], rel_tol: float,
+                tstop: Optional[float], min_fraction: float = 0.05) -> Dict[str, Any]:
+    """
+    Parámetros serializables del monitor: se vigilan las probes con KPI (o todas si no hay)
+    y no se para antes de ``min_fraction`` de ``tstop``.
+    """
+    watched = [p for p in probes if p in targets] or list(probes)
+    return {
+        "probes": watched,
+        "abs_tol": {p: _target_tol(targets.get(p)) for p in watched},
+        "rel_tol": rel_tol,
+        "cycles": 3,
+        "min_time": min_fraction * tstop if tstop else 0.0,
+        "interval_s": 0.25,
+    }
+
+
+def steady_fraction(verdict: Dict[str, Any], x0: float, frac: float) -> float:
+    """
+    ``from_fraction`` tras una parada temprana: las métricas se toman sobre el tramo final ya
+    verificado como estable (si empieza después de ``frac``), no sobre la mitad del transitorio.
+    """
+    spans = [p["windows"] * p["window"] for p in verdict["probes"].values() if p and p.get("converged")]
+    duration = verdict["t"] - x0
+    if not spans or duration <= 0:
+        return frac
+    return max(frac, min(1.0 - max(spans) / duration, 0.99))
+
+
+def steady_report(verdict: Optional[Dict[str, Any]], targets: Dict[str, Dict[str, float]],
+                  mode: str, sim_time: Optional[float], tstop: Optional[float]) -> Dict[str, Any]:
+    """Resultado ``steady`` de spice_autorun: punto de convergencia y valor/KPI de cada probe vigilada."""
+    out: Dict[str, Any] = {"mode": mode, "converged": False, "converged_at": None,
+                           "sim_time": _g(sim_time), "tstop": _g(tstop)}
+    if not verdict:
+        return out
+    out["converged"] = verdict["converged"]
+    out["converged_at"] = _g(verdict["t"]) if verdict["converged"] else None
+    probes = {}
+    for expr, res in verdict["probes"].items():
+        entry: Dict[str, Any] = {k: res.get(k) for k in ("value", "tol", "drift", "period", "converged")} \
+            if res else {"converged": False}
+        if expr in targets:
+            entry["target"] = targets[expr]
+            if res and res.get("value") is not None:
+                entry["in_range"] = _in_range(res["value"], targets[expr])
+        probes[expr] = entry
+    out["probes"] = probes
+    return out
+
+
+def steady_posthoc(x, ys: Dict[str, Any], spec: Dict[str, Any], checks: int = 64) -> Optional[Dict[str, Any]]:
+    """
+    Aplica el monitor al resultado completo en ``checks`` instantes equiespaciados (como si se
+    vigilara durante la simulación): el primer veredicto convergido o, si no hay, el del final.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if x.size < 16 or not x[-1] > x[0]:
+        return None
+    monitor = SteadyMonitor(spec)
+    # periodo común estimado sobre todo el resultado (no varía entre instantes)
+    periods = {}
+    for expr in monitor.probes:
+        y = ys.get(expr)
+        if y is not None:
+            res = cycle_convergence(x, y, monitor.rel_tol, monitor.abs_tol.get(expr), cycles=monitor.cycles)
+            periods[expr] = res["period"] if res else None
+    period = next((p for p in periods.values() if p), None)
+    verdict = None
+    for t in np.linspace(x[0], x[-1], checks + 1)[1:]:
+        end = int(np.searchsorted(x, t, side="right"))
+        verdict = monitor.check(x[:end], {e: (np.asarray(y)[:end] if y is not None else None) for e, y in ys.items()},
+                                period)
+        if verdict["converged"]:
+            break
+    return verdict
+
+
+__all__ = ["spice_number", "tran_stop", "match_kpi_targets", "cycle_convergence", "SteadyMonitor",
+           "steady_spec", "steady_fraction", "steady_report", "steady_posthoc"]
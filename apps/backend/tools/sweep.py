@@ -0,0 +1,301 @@
+"""
+Barridos paramétricos y Monte Carlo sobre ``spice_autorun``.
+
+Cada punto es el netlist base con los parámetros sustituidos (``.param`` o valor de R/C/L) y se
+simula en un pool de procesos acotado; cada simulación usa su propio workdir (los de
+``spice_autorun``: staging de la caché o ``tempfile``). Devuelve una tabla compacta con las
+métricas por probe y las medidas ``.meas`` de cada punto, más estadísticas por columna.
+
+El progreso se emite por punto terminado: al stream ``custom`` de LangGraph si la tool corre
+dentro del agente, como evento ``on_custom_event`` de LangChain si hay callbacks, y al
+``on_progress`` opcional de ``run_sweep``.
+"""
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple, Union
+
+import numpy as np
+from langchain_core.tools import tool
+
+from ..schema.spice_schema import SpiceAutorunInput, SpiceSweepInput
+
+
+ParamValue = Union[float, int, str]
+
+_ELEMENT_PREFIXES = ("r", "c", "l")
+
+
+# ---------- Puntos del barrido ----------
+
+def _fmt(value: ParamValue) -> str:
+    return format(value, ".12g") if isinstance(value, (int, float)) else str(value).strip()
+
+
+def apply_params(netlist: str, params: Dict[str, ParamValue]) -> str:
+    """
+    Sustituye parámetros en el netlist:
+    - nombre definido en un ``.param`` -> se reescribe su valor;
+    - nombre de un elemento R/C/L (``R1``...) -> se reescribe su valor (4º campo);
+    - si no existe, se añade ``.param nombre=valor`` tras la línea de título.
+    """
+    lines = netlist.splitlines()
+    pending = dict(params)
+    for i, ln in enumerate(lines):
+        low = ln.strip().lower()
+        if low.startswith(".param"):
+            for name in list(pending):
+                pat = re.compile(r"(\b{}\s*=\s*)(\{{[^}}]*\}}|[^\s{{]+)".format(re.escape(name)), re.I)
+                new, n = pat.subn(lambda m, v=_fmt(pending[name]): m.group(1) + v, ln)
+                if n:
+                    ln = new
+                    del pending[name]
+            lines[i] = ln
+        elif low and low[0] in _ELEMENT_PREFIXES:
+            parts = ln.split()
+            name = next((k for k in pending if k.lower() == parts[0].lower()), None)
+            if name is not None and len(parts) >= 4:
+                parts[3] = _fmt(pending.pop(name))
+                lines[i] = " ".join(parts)
+    if pending:
+        extra = ".param " + " ".join(f"{k}={_fmt(v)}" for k, v in pending.items())
+        lines.insert(1 if lines else 0, extra)
+    return "\n".join(lines)
+
+
+def _draw(quantity, n: int, dist: str, rng: np.random.Generator) -> np.ndarray:
+    """``n`` valores de ``quantity`` dentro de su tolerancia (gauss: tol = 3 sigma)."""
+    nominal = float(quantity.value)
+    tol = quantity.tol
+    if tol is None or n <= 0:
+        return np.full(max(n, 1), nominal)
+    u = rng.uniform(-1.0, 1.0, n) if dist == "uniform" else rng.normal(0.0, 1.0 / 3.0, n)
+    spread = abs(nominal) * tol.value / 100.0 if (tol.unit or "").strip() == "%" else tol.value
+    return nominal + u * spread
+
+
+def sweep_points(spec: SpiceSweepInput) -> List[Dict[str, ParamValue]]:
+    """Producto cartesiano de ``grid`` × ``samples`` sorteos Monte Carlo de ``tolerances``."""
+    names = list(spec.grid)
+    grid = [dict(zip(names, combo)) for combo in itertools.product(*(spec.grid[k] for k in names))] or [{}]
+    if not spec.tolerances:
+        return grid
+    rng = np.random.default_rng(spec.seed)
+    n = max(1, spec.samples)
+    points = []
+    for base in grid:
+        draws = {k: _draw(q, n, spec.distribution, rng) for k, q in spec.tolerances.items()}
+        for j in range(n):
+            points.append({**base, **{k: float(v[j]) for k, v in draws.items()}})
+    return points
+
+
+# ---------- Ejecución ----------
+
+def _run_point(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Proceso hijo: una simulación completa con ``spice_autorun`` (su propio workdir)."""
+    from .run_tools import spice_autorun
+    t0 = time.perf_counter()
+    try:
+        res = json.loads(spice_autorun.func(SpiceAutorunInput(**payload)))
+    except Exception as e:
+        return {"error": repr(e), "elapsed_s": time.perf_counter() - t0}
+    return {
+        "returncode": res.get("returncode"),
+        "error": res.get("error"),
+        "workdir": res.get("workdir"),
+        "probes": {p["expr"]: p.get("metrics") for p in res.get("probes", [])},
+        "measures": res.get("measures", {}),
+        "cache_hit": bool(res.get("cache", {}).get("hit")),
+        "elapsed_s": time.perf_counter() - t0,
+    }
+
+
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+# nº de procesos de _EXECUTOR (ProcessPoolExecutor no lo expone públicamente)
+_EXECUTOR_SIZE = 0
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _executor(broken: Optional[ProcessPoolExecutor] = None) -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido (``spawn``: el servidor tiene hilos), tamaño ``KORELIA_SWEEP_WORKERS``.
+    Con ``broken`` se sustituye ese pool sólo si sigue siendo el actual: si otro barrido ya lo recreó,
+    se devuelve el nuevo sin tocarlo (cerrarlo cancelaría los puntos que otros acaban de enviar).
+    """
+    global _EXECUTOR, _EXECUTOR_SIZE
+    with _EXECUTOR_LOCK:
+        if broken is not None and _EXECUTOR is broken:
+            _EXECUTOR.shutdown(wait=False, cancel_futures=True)
+            _EXECUTOR = None
+        if _EXECUTOR is None:
+            size = os.getenv("KORELIA_SWEEP_WORKERS")
+            _EXECUTOR_SIZE = int(size) if size else (os.cpu_count() or 1)
+            _EXECUTOR = ProcessPoolExecutor(_EXECUTOR_SIZE, mp_context=multiprocessing.get_context("spawn"))
+        return _EXECUTOR
+
+
+def _isolated_pool() -> ProcessPoolExecutor:
+    """Pool de un solo proceso para reintentar un punto sin arriesgar el pool compartido."""
+    return ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"))
+
+
+def close_sweep_pool() -> None:
+    """Cierra el pool de procesos de los barridos (se recrea al siguiente barrido)."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=True, cancel_futures=True)
+            _EXECUTOR = None
+
+
+def _emit_progress(event: Dict[str, Any]) -> None:
+    try:
+        from langgraph.config import get_stream_writer
+        get_stream_writer()({"spice_sweep": event})
+        return
+    except (ImportError, RuntimeError):
+        pass
+    try:
+        from langchain_core.callbacks import dispatch_custom_event
+        dispatch_custom_event("spice_sweep_progress", event)
+    except RuntimeError:
+        pass  # fuera de un run (tests, scripts): sólo on_progress
+
+
+def _table(points: List[Dict[str, ParamValue]], results: List[Dict[str, Any]], probes: List[str]) -> Dict[str, Any]:
+    params = list(points[0]) if points else []
+    meas = sorted({k for r in results for k in (r.get("measures") or {})})
+    metric_cols = [f"{p}.{m}" for p in probes for m in ("avg", "rms", "p2p")]
+    columns = ["point"] + params + metric_cols + [f"meas.{k}" for k in meas]
+    rows, failed = [], []
+    for i, (pt, r) in enumerate(zip(points, results)):
+        if r.get("error") or r.get("returncode") not in (0, None):
+            failed.append({"point": i, "params": pt, "error": r.get("error") or f"returncode={r.get('returncode')}",
+                           "workdir": r.get("workdir")})
+            continue
+        row: List[Any] = [i] + [pt[k] for k in params]
+        for p in probes:
+            m = (r.get("probes") or {}).get(p) or {}
+            row += [m.get("avg"), m.get("rms"), m.get("p2p")]
+        row += [(r.get("measures") or {}).get(k) for k in meas]
+        rows.append(row)
+    stats = {}
+    for j, col in enumerate(columns[1 + len(params):], start=1 + len(params)):
+        vals = np.array([row[j] for row in rows if row[j] is not None], dtype=np.float64)
+        if vals.size:
+            stats[col] = {"min": float(vals.min()), "max": float(vals.max()),
+                          "mean": float(vals.mean()), "std": float(vals.std())}
+    return {"columns": columns, "rows": rows, "failed": failed, "stats": stats}
+
+
+def run_sweep(spec: SpiceSweepInput,
+              on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Simula todos los puntos con a lo sumo ``max_workers`` en vuelo y devuelve la tabla."""
+    points = sweep_points(spec)
+    if len(points) > spec.max_points:
+        return {"error": f"{len(points)} puntos > max_points={spec.max_points}", "points": len(points)}
+    probes = list(spec.probes)
+    base_payload = {
+        "mode": "netlist", "probes": probes, "from_fraction": spec.from_fraction, "timeout_s": spec.timeout_s,
+        "use_cache": spec.use_cache, "output": spec.output, "backend": spec.backend,
+        "summary_points": 0,  # la tabla sólo usa métricas y medidas
+    }
+    pool = _executor()
+    workers = min(spec.max_workers or _EXECUTOR_SIZE, _EXECUTOR_SIZE, max(1, len(points)))
+    results: List[Optional[Dict[str, Any]]] = [None] * len(points)
+    t0 = time.perf_counter()
+    todo = iter(range(len(points)))
+    # future -> (punto, pool al que se envió)
+    in_flight: Dict[Any, Tuple[int, ProcessPoolExecutor]] = {}
+    ready: List[Tuple[int, Dict[str, Any]]] = []
+    retried: Set[int] = set()
+    done_count = 0
+
+    def payload_of(i: int) -> Dict[str, Any]:
+        return dict(base_payload, input_text=apply_params(spec.input_text, points[i]))
+
+    def submit_next() -> bool:
+        nonlocal pool
+        i = next(todo, None)
+        if i is None:
+            return False
+        payload = payload_of(i)
+        for _ in range(3):
+            try:
+                in_flight[pool.submit(_run_point, payload)] = (i, pool)
+                return True
+            except RuntimeError:
+                # pool roto o cerrado (otro barrido, close_sweep_pool): se pasa al actual
+                pool = _executor(broken=pool)
+        ready.append((i, {"error": "no se pudo enviar el punto al pool de procesos"}))
+        return True
+
+    for _ in range(workers):
+        if not submit_next():
+            break
+    while in_flight or ready:
+        if not ready:
+            finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for fut in finished:
+                i, used = in_flight.pop(fut)
+                isolated = i in retried
+                if isolated:
+                    used.shutdown(wait=False)
+                try:
+                    ready.append((i, fut.result()))
+                except BrokenProcessPool as e:
+                    if isolated:
+                        ready.append((i, {"error": f"worker caído: {e!r}"}))
+                        continue
+                    # un worker murió (quizá de otro barrido): no se sabe qué punto lo tiró, así que cada
+                    # punto afectado se reintenta una vez en un proceso propio que no puede romper el pool
+                    pool = _executor(broken=used)
+                    retried.add(i)
+                    iso = _isolated_pool()
+                    in_flight[iso.submit(_run_point, payload_of(i))] = (i, iso)
+                except Exception as e:
+                    ready.append((i, {"error": repr(e)}))
+        while ready:
+            i, results[i] = ready.pop(0)
+            done_count += 1
+            event = {"done": done_count, "total": len(points), "point": i, "params": points[i],
+                     "ok": not results[i].get("error") and results[i].get("returncode") in (0, None),
+                     "elapsed_s": round(time.perf_counter() - t0, 3)}
+            _emit_progress(event)
+            if on_progress is not None:
+                on_progress(event)
+            submit_next()
+
+    out = _table(points, results, probes)
+    out.update({
+        "points": len(points),
+        "ok": len(out["rows"]),
+        "workers": workers,
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+        "cache_hits": sum(1 for r in results if r and r.get("cache_hit")),
+    })
+    return out
+
+
+@tool("spice_sweep")
+def spice_sweep(input_data: SpiceSweepInput) -> str:
+    """
+    Barrido paramétrico / Monte Carlo de un netlist con spice_autorun en paralelo.
+    - grid: {nombre: [valores]} -> producto cartesiano. El nombre es un `.param` del netlist
+      (úsalo como {nombre} en los valores) o la referencia de una R/C/L (R1, Cout...).
+    - tolerances: {nombre: {value, tol:{value, unit:'%'|unidad}}} -> `samples` sorteos por punto
+      del grid (distribution 'gauss' con tol = 3σ, o 'uniform'), reproducibles con `seed`.
+    Devuelve JSON compacto {columns, rows, failed, stats{col:{min,max,mean,std}}, points, ok, elapsed_s}.
+    Las filas tienen: point, parámetros, <probe>.avg/.rms/.p2p y meas.<nombre> de cada .meas.
+    """
+    return json.dumps(run_sweep(input_data), ensure_ascii=False, separators=(",", ":"))
+
+
+__all__ = ["spice_sweep", "run_sweep", "sweep_points", "apply_params", "close_sweep_pool"]
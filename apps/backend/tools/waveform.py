@@ -0,0 +1,533 @@
+"""
+Carga vectorizada de formas de onda y métricas ponderadas por tiempo (NumPy).
+
+ngspice usa paso de tiempo variable: en los tramos con mucha actividad hay muchas más
+muestras que en los tramos planos, así que la media aritmética de las muestras sesga
+avg/RMS hacia las transiciones. Aquí las integrales se hacen por trapecios sobre el eje x
+(tiempo en ``.tran``), y la ventana ``from_fraction`` se toma en tiempo, no en muestras.
+
+Las probes se leen de CSV WRDATA o de un rawfile binario de ngspice (``RawFile``, mapeado en
+memoria); ``Waveform`` las expone con carga perezosa. ``summarize`` resume una probe en un
+tamaño fijo (envolvente min/max, rizado por FFT, régimen permanente, settling y overshoot).
+"""
+import io
+import os
+import re
+import warnings
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+
+# ---------- Carga ----------
+
+# Campo de WRDATA de ngspice (``% e``): [signo|espacio] d.ddddde±dd, ancho fijo por columna
+_FIELD_RE = re.compile(rb"([+-]?)(\d)\.(\d+)[eE]([+-])(\d+)$")
+_TOKEN_RE = re.compile(rb"\S+")
+_POW10 = np.array([10.0 ** k for k in range(309)])
+
+
+class _FixedField:
+    """Posiciones (dentro de la línea) de un campo ``% e`` de ancho fijo."""
+
+    def __init__(self, line: bytes, span: Tuple[int, int]) -> None:
+        start, end = span
+        m = _FIELD_RE.match(line[start:end])
+        if m is None:
+            raise ValueError("campo no numérico")
+        self.sign = start if m.group(1) else (start - 1 if start > 0 and line[start - 1:start] == b" " else None)
+        self.digit0 = start + len(m.group(1))
+        self.frac = range(self.digit0 + 2, self.digit0 + 2 + len(m.group(3)))
+        self.e = self.frac.stop
+        self.exp = range(self.e + 2, end)
+
+    def decode(self, rows: np.ndarray) -> Optional[np.ndarray]:
+        """Valor de cada fila del bloque ``rows`` (bytes, filas x ancho); None si alguna no encaja."""
+        digit_cols = [self.digit0, *self.frac, *self.exp]
+        d = rows[:, digit_cols]
+        if not ((d >= 48) & (d <= 57)).all():
+            return None
+        if not ((rows[:, self.digit0 + 1] == 46).all()                       # '.'
+                and ((rows[:, self.e] | 32) == 101).all()                      # 'e' / 'E'
+                and np.isin(rows[:, self.e + 1], (43, 45)).all()):             # '+' / '-'
+            return None
+        if self.sign is not None and not np.isin(rows[:, self.sign], (32, 43, 45)).all():
+            return None
+        d = d - 48
+        nf = len(self.frac)
+        mant = d[:, 0].astype(np.int64)
+        for i in range(1, nf + 1):
+            mant = mant * 10 + d[:, i]
+        exp = np.zeros(rows.shape[0], dtype=np.int64)
+        for i in range(nf + 1, d.shape[1]):
+            exp = exp * 10 + d[:, i]
+        exp = np.where(rows[:, self.e + 1] == 45, -exp, exp) - nf
+        mag = np.abs(exp)
+        if mag.size and int(mag.max()) >= _POW10.size:
+            return None  # subnormales/extremos: que decida el parser general
+        p = _POW10[mag]
+        # mantisa entera exacta; con |exp| <= 22 la potencia también lo es y el resultado coincide
+        # con strtod; fuera de ese rango el error es de 1 ulp como mucho
+        out = np.where(exp >= 0, mant * p, mant / p)
+        if self.sign is not None:
+            out = np.where(rows[:, self.sign] == 45, -out, out)
+        return out
+
+
+def _parse_fixed_width(raw: np.ndarray, chunk_rows: int = 1 << 16) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Camino rápido para WRDATA de ngspice: todas las líneas con el mismo ancho y formato."""
+    nl = np.flatnonzero(raw[:4096] == 10)
+    if nl.size == 0:
+        return None
+    width = int(nl[0]) + 1
+    if raw.size % width:
+        return None
+    rows = raw.reshape(-1, width)
+    line = rows[0].tobytes()
+    spans = [m.span() for m in _TOKEN_RE.finditer(line)]
+    if len(spans) < 2:
+        return None
+    try:
+        fields = (_FixedField(line, spans[0]), _FixedField(line, spans[1]))
+    except ValueError:
+        return None
+    n = rows.shape[0]
+    x = np.empty(n)
+    y = np.empty(n)
+    # por bloques: cada bloque cabe en caché y se recorre una vez por columna de dígitos
+    for i in range(0, n, chunk_rows):
+        block = np.ascontiguousarray(rows[i:i + chunk_rows])
+        if not (block[:, -1] == 10).all():
+            return None
+        bx = fields[0].decode(block)
+        by = fields[1].decode(block) if bx is not None else None
+        if by is None:
+            return None
+        x[i:i + chunk_rows] = bx
+        y[i:i + chunk_rows] = by
+    return x, y
+
+
+def _parse_text(buf: bytes) -> Optional[np.ndarray]:
+    first = buf[:buf.find(b"\n")] if b"\n" in buf else buf
+    ncols = len(first.split())
+    if ncols < 2:
+        return None
+    rows = buf.count(b"\n") + (0 if buf.endswith(b"\n") else 1)
+    with warnings.catch_warnings():
+        # fromstring avisa (DeprecationWarning) si encuentra un token no numérico
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            flat = np.fromstring(buf, dtype=np.float64, sep=" ")
+        except (DeprecationWarning, ValueError):
+            flat = None
+    if flat is not None and flat.size == rows * ncols:
+        return flat.reshape(rows, ncols)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        data = np.genfromtxt(io.BytesIO(buf), dtype=np.float64, usecols=(0, 1),
+                             invalid_raise=False, ndmin=2)
+    return data[~np.isnan(data).any(axis=1)] if data.size else data
+
+
+def load_wrdata(path: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    (x, y) de un fichero WRDATA: primera columna = escala, segunda = valor (parte real si es
+    complejo). None si no se puede leer o no hay datos.
+
+    1) Ancho fijo (lo que escribe ngspice): el fichero se mapea en memoria como matriz de bytes
+       (filas x ancho de línea) y cada columna numérica se decodifica vectorizada.
+    2) Texto general: parser en C de ``np.fromstring`` si todas las líneas tienen las mismas
+       columnas; si no (avisos intercalados, líneas truncadas) ``np.genfromtxt`` saltando las
+       líneas inválidas.
+    """
+    try:
+        if os.path.getsize(path) == 0:
+            return None
+        raw = np.memmap(path, dtype=np.uint8, mode="r")
+    except (OSError, ValueError):
+        return None
+    wave = _parse_fixed_width(raw)
+    if wave is not None:
+        return wave
+    data = _parse_text(raw.tobytes())
+    if data is None or data.shape[0] == 0:
+        return None
+    return data[:, 0], data[:, 1]
+
+
+# ---------- Métricas ----------
+
+def _window(x: np.ndarray, y: np.ndarray, frac: float) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Tramo final desde ``x0 + frac * (xN - x0)``, con el extremo izquierdo interpolado."""
+    t0 = x[0] + frac * (x[-1] - x[0])
+    i = int(np.searchsorted(x, t0, side="left"))
+    if i == 0 or x[i] == t0:
+        return x[i:], y[i:], x.size - i
+    y0 = y[i - 1] + (y[i] - y[i - 1]) * (t0 - x[i - 1]) / (x[i] - x[i - 1])
+    return np.concatenate(([t0], x[i:])), np.concatenate(([y0], y[i:])), x.size - i
+
+
+def window_metrics(x, y, frac: float) -> Optional[Dict[str, Any]]:
+    """
+    avg/rms/p2p de ``y`` sobre el tramo final (desde ``frac`` del eje x).
+    Si x es monótono creciente con rango > 0 se integra la señal lineal a tramos entre
+    muestras (``weighted``: trapecios para avg, exacto para y²); si no (.op, escala ausente)
+    se usa la media de las muestras desde ``frac``.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = y.size
+    if n == 0:
+        return None
+    frac = frac if 0.0 <= frac < 1.0 else 0.0
+    weighted = bool(n > 1 and x.size == n and x[-1] > x[0] and not np.any(np.diff(x) < 0))
+    if weighted:
+        xw, yw, window_samples = _window(x, y, frac)
+        dt = np.diff(xw)
+        a, b = yw[:-1], yw[1:]
+        span = xw[-1] - xw[0]
+        avg = np.dot(dt, a + b) / (2.0 * span)
+        rms = np.sqrt(max(np.dot(dt, a * a + a * b + b * b) / (3.0 * span), 0.0))
+    else:
+        n0 = int(n * frac)
+        yw = y[n0:] if n0 > 0 else y
+        avg = yw.mean()
+        rms = np.sqrt(np.dot(yw, yw) / yw.size)
+        window_samples = yw.size
+    return {
+        "avg": float(avg),
+        "rms": float(rms),
+        "p2p": float(yw.max() - yw.min()),
+        "samples": int(n),
+        "window_samples": int(window_samples),
+        "weighted": weighted,
+    }
+
+
+
+# ---------- Resumen de forma de onda ----------
+
+def _round(values, digits: int = 5) -> List[float]:
+    return [float(f"{v:.{digits}g}") for v in np.asarray(values, dtype=np.float64)]
+
+
+def envelope(x, y, points: int = 32, log_x: bool = False) -> Dict[str, List[float]]:
+    """
+    Envolvente de tamaño fijo: ``points`` cubetas de igual duración (o por décadas con ``log_x``)
+    con el mínimo y el máximo de cada una (conserva picos de conmutación que un diezmado por
+    muestras perdería).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if y.size <= points:
+        return {"t": _round(x), "min": _round(y), "max": _round(y)}
+    edges = np.geomspace(x[0], x[-1], points + 1) if log_x else np.linspace(x[0], x[-1], points + 1)
+    starts = np.concatenate(([0], np.searchsorted(x, edges[1:-1], side="left")))
+    # cubetas vacías (paso de tiempo mayor que la cubeta): se repite la muestra siguiente
+    starts = np.minimum(starts, y.size - 1)
+    return {
+        "t": _round(np.sqrt(edges[:-1] * edges[1:]) if log_x else 0.5 * (edges[:-1] + edges[1:])),
+        "min": _round(np.minimum.reduceat(y, starts)),
+        "max": _round(np.maximum.reduceat(y, starts)),
+    }
+
+
+def ripple_frequency(x, y, max_points: int = 1 << 16) -> Optional[float]:
+    """Frecuencia dominante (sin DC) de ``y`` remuestreada uniformemente: pico de la FFT con ventana Hann."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if y.size < 16 or not x[-1] > x[0]:
+        return None
+    n = int(min(max_points, 1 << int(np.ceil(np.log2(y.size)))))
+    t = np.linspace(x[0], x[-1], n)
+    yi = np.interp(t, x, y)
+    yi -= yi.mean()
+    if not np.any(yi):
+        return None
+    spec = np.abs(np.fft.rfft(yi * np.hanning(n)))
+    spec[0] = 0.0
+    k = int(np.argmax(spec))
+    if k == 0:
+        return None
+    delta = 0.0
+    if 0 < k < spec.size - 1:
+        # interpolación parabólica entre bins
+        a, b, c = spec[k - 1], spec[k], spec[k + 1]
+        den = a - 2.0 * b + c
+        delta = 0.5 * (a - c) / den if den else 0.0
+    return float((k + delta) / (n * (t[1] - t[0])))
+
+
+def _segment_means(x: np.ndarray, y: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Media temporal (lineal a tramos) de ``y`` entre bordes consecutivos."""
+    integral = np.concatenate(([0.0], np.cumsum(np.diff(x) * (y[:-1] + y[1:]) * 0.5)))
+    at = np.interp(edges, x, integral)
+    return np.diff(at) / np.diff(edges)
+
+
+def summarize(x, y, frac: float = 0.5, points: int = 32, time_domain: bool = True,
+              rel_tol: float = 0.01, segments: int = 20) -> Optional[Dict[str, Any]]:
+    """
+    Resumen acotado de una probe (tamaño independiente de la duración de la simulación):
+    - envelope: min/max por cubeta (``points`` cubetas).
+    - ripple_hz / ripple_p2p: frecuencia dominante (FFT) y p2p del tramo final (desde ``frac``).
+    - steady_state / t_steady: la media por segmento (``segments`` tramos, alineados a periodos
+      de rizado si los hay) se mantiene dentro de ``rel_tol`` del valor final desde ``t_steady``.
+    - final, settling_time (permanece en ±max(2 %, rizado) del final) y overshoot_pct (pico
+      sobre la envolvente de rizado respecto al salto inicial→final).
+    Sin eje de tiempo (``.ac``/``.dc``) sólo se devuelve la envolvente.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if y.size < 2 or x.size != y.size or not x[-1] > x[0] or np.any(np.diff(x) < 0):
+        return None
+    if not time_domain:
+        # barridos .ac/.dc: sólo la forma (por décadas si el barrido es logarítmico)
+        return {"envelope": envelope(x, y, points, log_x=bool(x[0] > 0 and x[-1] / x[0] >= 100))}
+    out: Dict[str, Any] = {"envelope": envelope(x, y, points)}
+    xw, yw, _ = _window(x, y, frac)
+    ripple_p2p = float(yw.max() - yw.min())
+    # un rizado por debajo de rel_tol/10 de la escala de la señal es ruido numérico
+    scale = max(abs(float(yw.mean())), float(y.max() - y.min()))
+    f = ripple_frequency(xw, yw) if ripple_p2p > 0.1 * rel_tol * scale else None
+    out["ripple_hz"] = f
+    out["ripple_p2p"] = ripple_p2p
+
+    duration = x[-1] - x[0]
+    seg = duration / segments
+    if f:
+        # segmentos de un número entero de periodos de rizado para que éste no mueva la media
+        seg = min(max(1.0, np.round(seg * f)) / f, duration / 3.0)
+    n_seg = max(int(duration // seg), 1)
+    edges = x[-1] - seg * np.arange(n_seg, -1, -1)
+    means = _segment_means(x, y, edges)
+    final = float(means[-1])
+    tol = rel_tol * max(abs(final), float(y.max() - y.min()))
+    ok = np.abs(means - final) <= tol
+    # primer segmento desde el que todos los siguientes están dentro de tolerancia
+    first = n_seg - int(np.argmin(ok[::-1])) if not ok.all() else 0
+    steady = n_seg - first >= 3
+    out["final"] = final
+    out["steady_state"] = bool(steady)
+    out["t_steady"] = float(edges[first] - x[0]) if steady else None
+
+    last = y[x >= edges[-2]]
+    band = max(0.02 * abs(final), float(last.max() - last.min()))
+    outside = np.nonzero(np.abs(y - final) > band)[0]
+    out["settling_time"] = (float(x[outside[-1] + 1] - x[0]) if outside.size and outside[-1] + 1 < x.size
+                            else 0.0) if steady else None
+    step = final - y[0]
+    if steady and abs(step) > tol:
+        peak = y.max() if step > 0 else y.min()
+        half_ripple = 0.5 * float(last.max() - last.min())
+        over = (abs(peak - final) - half_ripple) / abs(step) if (peak - final) * step > 0 else 0.0
+        out["overshoot_pct"] = round(float(max(over, 0.0)) * 100.0, 3)
+    else:
+        out["overshoot_pct"] = None
+    return out
+
+# ---------- Rawfile de ngspice ----------
+
+class RawPlot:
+    """Un plot de un rawfile: cabecera parseada y datos mapeados en memoria bajo demanda."""
+
+    def __init__(self, path: str, header: Dict[str, str], variables: List[Tuple[str, str]],
+                 offset: int, binary: bool) -> None:
+        self.path = path
+        self.title = header.get("title", "")
+        self.name = header.get("plotname", "")
+        self.flags = header.get("flags", "real").lower()
+        self.variables = variables
+        self.n_points = int(header.get("no. points", "0"))
+        self.offset = offset
+        self.binary = binary
+        self._data: Optional[np.ndarray] = None
+
+    @property
+    def complex(self) -> bool:
+        return "complex" in self.flags
+
+    @property
+    def nbytes(self) -> int:
+        return self.n_points * len(self.variables) * (16 if self.complex else 8)
+
+    @property
+    def data(self) -> np.ndarray:
+        """Matriz (puntos x variables); en binario es un ``np.memmap`` de sólo lectura (sin copia)."""
+        if self._data is None:
+            dtype = np.complex128 if self.complex else np.float64
+            shape = (self.n_points, len(self.variables))
+            if self.binary:
+                self._data = np.memmap(self.path, dtype=dtype, mode="r", offset=self.offset, shape=shape)
+            else:
+                self._data = _parse_raw_values(self.path, self.offset, shape, self.complex)
+        return self._data
+
+    def index(self, name: str) -> Optional[int]:
+        """Índice de la variable ``name`` (acepta ``v(n)``/``n`` e ``i(x)``/``x#branch``)."""
+        want = _raw_aliases(name)
+        for i, (var, _) in enumerate(self.variables):
+            if _raw_aliases(var) & want:
+                return i
+        return None
+
+    def vector(self, i: int) -> np.ndarray:
+        """Columna ``i`` como vista real (parte real si el plot es complejo)."""
+        col = self.data[:, i]
+        return col.real if self.complex else col
+
+
+def _raw_aliases(name: str) -> set:
+    n = name.strip().lower().replace(" ", "")
+    out = {n}
+    m = re.match(r"^([vi])\((.+)\)$", n)
+    if m:
+        out.add(m.group(2) if m.group(1) == "v" else f"{m.group(2)}#branch")
+    elif n.endswith("#branch"):
+        out.add(f"i({n[:-7]})")
+    else:
+        out.add(f"v({n})")
+    return out
+
+
+def _parse_raw_values(path: str, offset: int, shape: Tuple[int, int], is_complex: bool) -> np.ndarray:
+    """Bloque ``Values:`` (rawfile ascii): índice de punto seguido de un valor por variable."""
+    n_points, n_vars = shape
+    with open(path, "rb") as f:
+        f.seek(offset)
+        tokens = f.read().replace(b",", b" ").split()
+    per_point = 1 + n_vars * (2 if is_complex else 1)
+    vals = np.array(tokens[:n_points * per_point], dtype=np.float64).reshape(n_points, per_point)[:, 1:]
+    if is_complex:
+        return vals[:, 0::2] + 1j * vals[:, 1::2]
+    return vals
+
+
+class RawFile:
+    """
+    Rawfile de ngspice (``write`` con ``filetype=binary``). Sólo se leen las cabeceras al abrir;
+    los datos de cada plot se mapean en memoria cuando se piden. Los ficheros pueden contener
+    varios plots seguidos (p.ej. ``.op`` y ``.tran``).
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.plots: List[RawPlot] = []
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            pos = 0
+            while pos < size:
+                f.seek(pos)
+                plot = self._read_header(f)
+                if plot is None:
+                    break
+                self.plots.append(plot)
+                if not plot.binary:
+                    break  # ascii: no se calcula el tamaño del bloque; sólo un plot
+                pos = plot.offset + plot.nbytes
+
+    def _read_header(self, f) -> Optional[RawPlot]:
+        header: Dict[str, str] = {}
+        variables: List[Tuple[str, str]] = []
+        n_vars = 0
+        while True:
+            raw = f.readline()
+            if not raw:
+                return None
+            line = raw.decode("latin-1").rstrip("\r\n")
+            key, _, value = line.partition(":")
+            key = key.strip().lower()
+            if key in ("binary", "values"):
+                return RawPlot(self.path, header, variables, f.tell(), key == "binary")
+            if key == "variables":
+                n_vars = int(header.get("no. variables", "0"))
+                for _ in range(n_vars):
+                    parts = f.readline().decode("latin-1").split()
+                    variables.append((parts[1], parts[2] if len(parts) > 2 else ""))
+                continue
+            if key:
+                header[key] = value.strip()
+
+    def plot(self, name: Optional[str] = None) -> Optional[RawPlot]:
+        """Último plot (el análisis final) o el primero cuyo nombre contenga ``name``."""
+        if name is None:
+            return self.plots[-1] if self.plots else None
+        return next((p for p in self.plots if name.lower() in p.name.lower()), None)
+
+
+def write_rawfile(path: str, plotname: str, scale_name: str, x, vectors: List[Tuple[str, Any]],
+                  title: str = "korelia") -> None:
+    """Rawfile binario real de un único plot: escala + un vector por probe (misma longitud)."""
+    cols = [np.asarray(x, dtype=np.float64)] + [np.asarray(v, dtype=np.float64) for _, v in vectors]
+    names = [scale_name] + [name for name, _ in vectors]
+    lines = [f"Title: {title}", f"Plotname: {plotname}", "Flags: real",
+             f"No. Variables: {len(cols)}", f"No. Points: {cols[0].size}", "Variables:"]
+    lines += [f"\t{i}\t{name}\t{'time' if i == 0 else 'voltage'}" for i, name in enumerate(names)]
+    with open(path, "wb") as f:
+        f.write(("\n".join(lines) + "\nBinary:\n").encode("latin-1"))
+        np.column_stack(cols).astype("<f8").tofile(f)
+
+
+# ---------- Formas de onda perezosas ----------
+
+class Waveform:
+    """
+    Forma de onda de una probe que se carga al primer acceso a ``x``/``y``: un CSV de WRDATA
+    (``load_wrdata``) o una variable de un rawfile (vista sobre el ``memmap``, sin copia).
+    """
+
+    def __init__(self, expr: str, path: str, raw: Optional[RawFile] = None, position: Optional[int] = None) -> None:
+        self.expr = expr
+        self.path = path
+        self._raw = raw
+        # columna del rawfile (1 = primera tras la escala) si el nombre de la probe no aparece
+        self._position = position
+        self._xy: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._var: Optional[str] = None
+        self._loaded = False
+
+    def _load(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if not self._loaded:
+            self._loaded = True
+            if self._raw is None:
+                self._xy = load_wrdata(self.path)
+            else:
+                plot = self._raw.plot()
+                if plot is not None and plot.n_points:
+                    i = plot.index(self.expr)
+                    if i is None and self._position is not None and len(plot.variables) > self._position:
+                        i = self._position
+                    if i is not None:
+                        self._xy = (plot.vector(0), plot.vector(i))
+                        self._var = plot.variables[i][0]
+        return self._xy
+
+    @property
+    def available(self) -> bool:
+        return self._load() is not None
+
+    @property
+    def x(self) -> Optional[np.ndarray]:
+        xy = self._load()
+        return xy[0] if xy is not None else None
+
+    @property
+    def y(self) -> Optional[np.ndarray]:
+        xy = self._load()
+        return xy[1] if xy is not None else None
+
+    def metrics(self, frac: float) -> Optional[Dict[str, Any]]:
+        xy = self._load()
+        return window_metrics(xy[0], xy[1], frac) if xy is not None else None
+
+    def summary(self, frac: float, points: int = 32, time_domain: bool = True) -> Optional[Dict[str, Any]]:
+        xy = self._load()
+        return summarize(xy[0], xy[1], frac, points, time_domain) if xy is not None else None
+
+    def ref(self) -> Dict[str, Any]:
+        """Referencia al artefacto para el JSON de resultado."""
+        if self._raw is None:
+            return {"csv": self.path}
+        self._load()
+        return {"raw": self.path, "var": self._var}
@@ -1,7 +1,7 @@
 import { NextRequest } from "next/server";
 
 export const runtime = "nodejs";
-export const maxDuration = 30;
+export const maxDuration = 300;
 
 export async function POST(req: NextRequest) {
   const body = await req.json();
@@ -16,30 +16,66 @@ export async function POST(req: NextRequest) {
   const resp = await fetch(`${backend}/chat`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ messages }),
+    // thread_id: sesión durable en el backend (retoma historial y ejecuciones cortadas)
+    body: JSON.stringify({ messages, thread_id: body?.thread_id, resume: body?.resume }),
+    // si el usuario cierra la pestaña se corta la conexión y el backend cancela el agente
+    signal: req.signal,
   });
   console.log("[chat-api] backend status", resp.status);
   if (!resp.ok) {
     return new Response(await resp.text(), { status: resp.status });
   }
   
-  // Stream the response from backend
+  // The backend streams SSE frames (start/token/step/progress/error/end); the page consumes plain text
+  const reader = resp.body?.getReader();
+  const decoder = new TextDecoder();
+  const encoder = new TextEncoder();
+
+  const render = (event: string, data: any): string => {
+    switch (event) {
+      case "token":
+        return data.text ?? "";
+      case "step":
+        return data.content ? `\n[${data.step}] ${data.content}\n` : "";
+      case "progress":
+        return `\n[${data.tool}] ${data.done}/${data.total} (${data.elapsed_s}s)\n`;
+      case "resume":
+        return `\n[resume] ${(data.next || []).join(", ")}\n`;
+      case "error":
+        return `\n\nError: ${data.message}\n`;
+      default:
+        return "";
+    }
+  };
+
   const stream = new ReadableStream({
     async start(controller) {
-      const reader = resp.body?.getReader();
-      const decoder = new TextDecoder();
-      
       if (!reader) {
         controller.close();
         return;
       }
-      
+
+      let buffer = "";
       try {
         while (true) {
           const { done, value } = await reader.read();
           if (done) break;
-          const chunk = decoder.decode(value, { stream: true });
-          controller.enqueue(new TextEncoder().encode(chunk));
+          buffer += decoder.decode(value, { stream: true });
+          let sep;
+          while ((sep = buffer.indexOf("\n\n")) !== -1) {
+            const frame = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = "message";
+            let data = "";
+            for (const line of frame.split("\n")) {
+              if (line.startsWith("event: ")) event = line.slice(7);
+              else if (line.startsWith("data: ")) data += line.slice(6);
+            }
+            if (!data) continue; // heartbeat (": ping")
+            if (event === "end") return;
+            const text = render(event, JSON.parse(data));
+            if (text) controller.enqueue(encoder.encode(text));
+          }
         }
       } catch (error) {
         console.error("[chat-api] stream error", error);
@@ -47,6 +83,10 @@ export async function POST(req: NextRequest) {
         controller.close();
       }
     },
+    cancel() {
+      // el cliente dejó de leer: cerrar la conexión con el backend
+      reader?.cancel();
+    },
   });
   
   return new Response(stream, {
@@ -56,5 +96,3 @@ export async function POST(req: NextRequest) {
     },
   });
 }
-
-